@@ -0,0 +1,24 @@
+"""
+관리자용 엔드포인트 인증.
+
+ADMIN_TOKEN 환경변수를 설정하면 /admin/* 경로가 열리며, 요청 헤더 X-Admin-Token(또는
+Authorization: Bearer <토큰>)이 일치해야 합니다. ADMIN_TOKEN이 없으면 관리자 경로는 모두 404입니다.
+"""
+import os
+import hmac
+
+from fastapi import HTTPException, Request
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def require_admin(request: Request):
+    """FastAPI 의존성: 관리자 토큰을 확인합니다."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404)
+    supplied = request.headers.get("x-admin-token", "")
+    authorization = request.headers.get("authorization", "")
+    if not supplied and authorization.lower().startswith("bearer "):
+        supplied = authorization[7:].strip()
+    if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="관리자 토큰이 필요합니다.")
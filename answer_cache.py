@@ -0,0 +1,294 @@
+"""
+채팅 의미 기반 답변 캐시.
+
+학생들이 자주 반복하는 학습 방법 질문("집중력 높이는 법", "계획표 어떻게 짜요")은
+분류 → 검색 → gpt-4o 전체 경로를 매번 다시 탈 필요가 없습니다.
+advice/direct 경로의 답변을 질문 임베딩과 함께 보관했다가, 같은 프로필 구간·같은 경로에서
+코사인 유사도가 CHAT_CACHE_THRESHOLD 이상인 질문이 오면 저장된 답변을 그대로 돌려줍니다.
+
+- 캐시하지 않는 턴: 이미지 첨부, curriculum 경로(문제 풀이/개념 설명), 오류 응답
+- 조회·저장은 이전 대화가 없는 독립 질문일 때만 합니다. 후속 질문은 맥락을 무시한 저장 답변을 받지 않고,
+  앞선 대화에 기대는 답변은 다른 학생에게 가지 않습니다 (제외 이유 "followup").
+- 프로필 구간: 학교급 + 주요 항목 T점수 구간(낮음/보통/높음). 보고서가 없으면 "none" 구간.
+- 캐시 대상 턴의 답변은 개인 보고서 대신 프로필 구간 정보(profile_context: 학교급, 항목별 낮음/보통/높음)만으로
+  만듭니다. 같은 구간의 다른 학생에게 그대로 돌려주므로 이름·점수·보고서 내용이 답변에 들어가지 않게 하고,
+  그래도 학생 이름 일부나 T점수가 들어간 답변(contains_personal_data)은 저장하지 않습니다 (제외 이유 "personal_data").
+- 항목은 저장 후 CHAT_CACHE_TTL초가 지나면 만료되고, CHAT_CACHE_MAX_ENTRIES를 넘으면 가장 오래 쓰지 않은 것부터 뺍니다.
+- 캐시는 프로세스별 메모리에 있습니다 (serve.py 멀티 프로세스에서는 워커마다 따로 채워짐).
+
+적중률과 절약한 응답 시간은 /metrics(esli_chat_cache_*)와 /admin/chat-cache 에서 볼 수 있습니다.
+"""
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Sequence, Tuple
+
+import numpy as np
+from fastapi import APIRouter, Depends
+
+from admin import require_admin
+from background import after_fork
+from metrics import register_collector
+
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "true").lower() == "true"
+CHAT_CACHE_THRESHOLD = float(os.getenv("CHAT_CACHE_THRESHOLD", "0.93"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "86400"))
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "2000"))
+CHAT_CACHE_ROUTES = tuple(r.strip() for r in os.getenv("CHAT_CACHE_ROUTES", "advice,direct").split(",") if r.strip())
+
+NO_PROFILE = "none"
+# 프로필 구간을 나누는 항목 (T점수 평균 100, 표준편차 15 기준: 86 미만 낮음 / 114 이하 보통 / 그 초과 높음,
+# typing_rules의 판정 기준과 같음)
+PROFILE_CATEGORIES = ("학습전략", "학습기술", "스트레스민감성", "학습효능감")
+
+
+def _band(t_score) -> str:
+    if t_score is None:
+        return "-"
+    t = float(t_score)
+    return "L" if t < 86 else ("M" if t <= 114 else "H")
+
+
+def profile_bucket(latest_response) -> str:
+    """학생의 최신 검사 결과(SurveyResponse)로 프로필 구간을 정합니다."""
+    if latest_response is None or not latest_response.scores_json:
+        return NO_PROFILE
+    try:
+        scores = json.loads(latest_response.scores_json)
+    except (TypeError, ValueError):
+        return NO_PROFILE
+    bands = "".join(_band((scores.get(name) or {}).get('t_score')) for name in PROFILE_CATEGORIES)
+    return f"{latest_response.school_level or '-'}:{bands}"
+
+
+_BAND_LABELS = {"L": "낮음", "M": "보통", "H": "높음", "-": "정보 없음"}
+
+
+def profile_context(bucket: str) -> str:
+    """캐시할 답변을 만들 때 개인 보고서 대신 쓰는 시스템 컨텍스트 (구간 정보만, 이름·점수 없음)"""
+    shared = "이 답변은 비슷한 학습 성향의 여러 학생에게 함께 보여집니다. 학생 이름을 부르거나 개별 점수를 언급하지 마세요."
+    if bucket == NO_PROFILE:
+        return f"{shared}\n학생의 검사 결과 정보가 없습니다. 필요하면 학습 성향 검사를 먼저 받아 보도록 안내하세요."
+    level, bands = bucket.split(":", 1)
+    lines = [f"- {name}: {_BAND_LABELS.get(band, band)}" for name, band in zip(PROFILE_CATEGORIES, bands)]
+    return f"{shared}\n학교급: {level}\n주요 항목 수준 (T점수 기준):\n" + "\n".join(lines)
+
+
+def _name_parts(student_name: Optional[str]) -> List[str]:
+    # 전체 이름, 띄어쓴 각 부분, 성을 뺀 이름(세 글자 이상일 때, 예: 김민우 → 민우)
+    if not student_name or not student_name.strip():
+        return []
+    name = student_name.strip()
+    parts = {name} | {p for p in name.split() if len(p) >= 2}
+    if len(name) >= 3 and " " not in name:
+        parts.add(name[1:])
+    return sorted(parts, key=len, reverse=True)
+
+
+def contains_personal_data(response: str, student_name: Optional[str], latest_response) -> bool:
+    """답변에 학생 이름(일부 포함)이나 학생의 T점수가 들어 있으면 True (캐시 저장 금지)"""
+    if any(part in response for part in _name_parts(student_name)):
+        return True
+    if latest_response is None or not latest_response.scores_json:
+        return False
+    try:
+        scores = json.loads(latest_response.scores_json)
+    except (TypeError, ValueError):
+        return False
+    t_scores = {str(int(data['t_score'])) for data in scores.values()
+                if isinstance(data, dict) and data.get('t_score') is not None}
+    return any(re.search(rf"(?<!\d){t}(?!\d)", response) for t in t_scores)
+
+
+def cache_skip_reason(route: str, has_image: bool, has_history: bool = False) -> Optional[str]:
+    """
+    이 턴을 캐시에서 제외해야 하면 이유를, 아니면 None을 반환합니다.
+    이전 대화가 있는 후속 질문은 맥락에 따라 답이 달라지므로 조회·저장 모두 하지 않습니다.
+    """
+    if not CHAT_CACHE_ENABLED:
+        return "disabled"
+    if has_image:
+        return "image"
+    if has_history:
+        return "followup"
+    if route not in CHAT_CACHE_ROUTES:
+        return route
+    return None
+
+
+def _empty_stats() -> dict:
+    return {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "saved_ms": 0.0, "skipped": {}}
+
+
+def _normalize(vector: Sequence[float]) -> Optional[np.ndarray]:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm > 0 else None
+
+
+class SemanticAnswerCache:
+    """
+    (프로필 구간, 경로)별로 정규화한 질문 임베딩 행렬을 두고, 조회 때 행렬곱 한 번으로 가장 가까운 질문을 찾습니다.
+    항목 순서(OrderedDict)가 곧 LRU 순서이며, 적중한 항목은 맨 뒤로 옮깁니다.
+    """
+
+    def __init__(self, threshold: float = CHAT_CACHE_THRESHOLD, ttl: float = CHAT_CACHE_TTL,
+                 max_entries: int = CHAT_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._scopes: dict = {}      # (구간, 경로) → [항목 ID]
+        self._matrices: dict = {}    # (구간, 경로) → (항목 ID 배열, 임베딩 행렬), 변경 시 무효화
+        self._next_id = 0
+        self.stats = _empty_stats()
+
+    # --- 내부 ---
+    def _remove(self, entry_id: int, reason: str):
+        entry = self._entries.pop(entry_id)
+        scope = (entry["bucket"], entry["route"])
+        self._scopes[scope].remove(entry_id)
+        if not self._scopes[scope]:
+            del self._scopes[scope]
+        self._matrices.pop(scope, None)
+        self.stats[reason] += 1
+
+    def _purge_expired(self, scope: Tuple[str, str], now: float):
+        for entry_id in [i for i in self._scopes.get(scope, ()) if now - self._entries[i]["created"] > self.ttl]:
+            self._remove(entry_id, "expired")
+
+    def _matrix(self, scope: Tuple[str, str]):
+        cached = self._matrices.get(scope)
+        if cached is None:
+            ids = list(self._scopes.get(scope, ()))
+            if not ids:
+                return [], None
+            cached = self._matrices[scope] = (ids, np.vstack([self._entries[i]["vector"] for i in ids]))
+        return cached
+
+    # --- 공개 API ---
+    def lookup(self, bucket: str, route: str, vector: Sequence[float], lookup_ms: float = 0.0) -> Optional[dict]:
+        """
+        가장 비슷한 저장 질문이 기준 이상이면 {'response', 'similarity', 'question'}을, 아니면 None을 반환합니다.
+        lookup_ms(조회에 든 임베딩 시간 등)는 절약 시간 집계에서 뺍니다.
+        """
+        query = _normalize(vector)
+        if query is None:
+            return None
+        scope = (bucket, route)
+        with self._lock:
+            self._purge_expired(scope, time.monotonic())
+            ids, matrix = self._matrix(scope)
+            if not ids:
+                self.stats["misses"] += 1
+                return None
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.stats["misses"] += 1
+                return None
+            entry_id = ids[best]
+            entry = self._entries[entry_id]
+            self._entries.move_to_end(entry_id)
+            entry["hits"] += 1
+            self.stats["hits"] += 1
+            self.stats["saved_ms"] += max(entry["latency_ms"] - lookup_ms, 0.0)
+            return {"response": entry["response"], "similarity": similarity, "question": entry["question"]}
+
+    def store(self, bucket: str, route: str, vector: Sequence[float], question: str, response: str, latency_ms: float):
+        """답변을 저장합니다. latency_ms는 캐시가 없을 때 이 답변을 만드는 데 걸린 시간(검색 + 생성)입니다."""
+        normalized = _normalize(vector)
+        if normalized is None or self.max_entries <= 0:
+            return
+        scope = (bucket, route)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "bucket": bucket, "route": route, "vector": normalized, "question": question,
+                "response": response, "latency_ms": latency_ms, "created": time.monotonic(), "hits": 0,
+            }
+            self._scopes.setdefault(scope, []).append(entry_id)
+            self._matrices.pop(scope, None)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)), "evictions")
+
+    def skip(self, reason: str):
+        """캐시 대상에서 제외된 턴을 이유별로 셉니다 (image/curriculum 등)."""
+        with self._lock:
+            self.stats["skipped"][reason] = self.stats["skipped"].get(reason, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "entries": len(self._entries),
+                "scopes": len(self._scopes),
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl,
+                "max_entries": self.max_entries,
+                **{k: v for k, v in self.stats.items() if k != "skipped"},
+                "skipped": dict(self.stats["skipped"]),
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                "saved_ms": round(self.stats["saved_ms"], 1),
+            }
+
+    def _reset_after_fork(self):
+        # 부모가 모은 항목은 그대로 써도 되지만, 잠금과 통계는 자식 프로세스 것으로 새로 시작합니다.
+        self._lock = threading.Lock()
+        self.stats = _empty_stats()
+
+
+answer_cache = SemanticAnswerCache()
+after_fork(answer_cache._reset_after_fork)
+
+
+@register_collector
+def _cache_metrics() -> List[str]:
+    stats = answer_cache.get_stats()
+    lines = [
+        "# TYPE esli_chat_cache_lookups_total counter",
+        f'esli_chat_cache_lookups_total{{result="hit"}} {stats["hits"]}',
+        f'esli_chat_cache_lookups_total{{result="miss"}} {stats["misses"]}',
+        "# TYPE esli_chat_cache_skipped_total counter",
+    ]
+    for reason, count in stats["skipped"].items():
+        lines.append(f'esli_chat_cache_skipped_total{{reason="{reason}"}} {count}')
+    lines += [
+        "# TYPE esli_chat_cache_saved_seconds_total counter",
+        f"esli_chat_cache_saved_seconds_total {stats['saved_ms'] / 1000:.3f}",
+        "# TYPE esli_chat_cache_entries gauge",
+        f"esli_chat_cache_entries {stats['entries']}",
+        "# TYPE esli_chat_cache_evictions_total counter",
+        f'esli_chat_cache_evictions_total{{reason="lru"}} {stats["evictions"]}',
+        f'esli_chat_cache_evictions_total{{reason="ttl"}} {stats["expired"]}',
+    ]
+    return lines
+
+
+def create_router() -> APIRouter:
+    router = APIRouter(dependencies=[Depends(require_admin)])
+
+    @router.get("/admin/chat-cache")
+    def cache_stats():
+        return answer_cache.get_stats()
+
+    @router.delete("/admin/chat-cache")
+    def cache_clear():
+        answer_cache.clear()
+        return {"cleared": True}
+
+    return router
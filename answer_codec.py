@@ -0,0 +1,141 @@
+"""
+검사 응답 압축 저장 코덱.
+
+survey_responses.responses_json / survey_progress.progress_data 에 저장하는 응답을
+'문항 버전 + 2비트 응답 벡터' 형태의 짧은 문자열로 인코딩합니다.
+
+    A{버전}:{응답 벡터(base64)}[:{응답 여부 비트맵(base64)}]
+
+- 응답 벡터: 문항 순서대로 (점수-1)을 2비트씩 채운 바이트열
+- 응답 여부 비트맵: 미응답 문항이 있을 때만 붙으며, 응답한 문항은 1, 미응답(sentinel)은 0
+- '{'로 시작하는 기존 JSON 문자열은 그대로 읽어 하위 호환을 유지합니다.
+- 문항 순서에 없는 키나 1~4 범위를 벗어난 값이 있으면 JSON으로 저장합니다.
+
+화면 위치 순서의 점수 목록을 그대로 다루는 encode_answer_positions/decode_answer_positions가 기본 경로이고,
+{문항 텍스트: 값} 딕셔너리용 encode_answers/decode_answers는 문항 체계(questionnaire.get_registry)로 위치를 찾아 위임합니다.
+"""
+import json
+import base64
+from typing import Optional, Sequence, Tuple
+
+from questionnaire import QUESTIONNAIRE_VERSION, QUESTION_IDS, ANSWER_OPTIONS, get_registry
+
+ENCODING_PREFIX = "A"
+_LABEL_TO_SCORE = {label: i + 1 for i, label in enumerate(ANSWER_OPTIONS)}
+
+
+def _to_score(value) -> Optional[int]:
+    """응답 값(1~4 정수 또는 보기 문자열)을 1~4 점수로 변환. 미응답은 None, 해석 불가면 ValueError."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        if value in _LABEL_TO_SCORE:
+            return _LABEL_TO_SCORE[value]
+        raise ValueError(value)
+    score = int(value)
+    if score != value or not 1 <= score <= 4:
+        raise ValueError(value)
+    return score
+
+
+def _pack_bits(values: list, bits: int) -> bytes:
+    per_byte = 8 // bits
+    packed = bytearray((len(values) + per_byte - 1) // per_byte)
+    for i, v in enumerate(values):
+        packed[i // per_byte] |= v << ((i % per_byte) * bits)
+    return bytes(packed)
+
+
+def _unpack_bits(data: bytes, count: int, bits: int) -> list:
+    per_byte = 8 // bits
+    mask = (1 << bits) - 1
+    return [(data[i // per_byte] >> ((i % per_byte) * bits)) & mask for i in range(count)]
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def to_scores(values: Sequence) -> list:
+    """위치 순서의 응답 값(보기 문자열/1~4 정수/None) → 1~4 점수 또는 None 목록. 해석 불가면 ValueError."""
+    return [_to_score(v) for v in values]
+
+
+def encode_answer_positions(scores: Sequence[Optional[int]], version: int = QUESTIONNAIRE_VERSION) -> str:
+    """화면 위치 순서의 점수 목록(1~4, 미응답 None) → 저장용 문자열"""
+    if len(scores) != get_registry(version).question_count:
+        raise ValueError(f"문항 수가 맞지 않습니다: {len(scores)}")
+    encoded = f"{ENCODING_PREFIX}{version}:" + _b64encode(_pack_bits([(s or 1) - 1 for s in scores], 2))
+    if any(s is None for s in scores):
+        encoded += ":" + _b64encode(_pack_bits([0 if s is None else 1 for s in scores], 1))
+    return encoded
+
+
+def encode_answers(responses: dict, version: int = QUESTIONNAIRE_VERSION) -> str:
+    """응답 딕셔너리({문항 텍스트: 점수 또는 보기}) → 저장용 문자열"""
+    try:
+        scores = to_scores(get_registry(version).positions_from_dict(responses))
+    except (KeyError, ValueError, TypeError):
+        # 현재 문항 체계로 표현할 수 없는 응답은 기존 JSON 형식으로 보존
+        return json.dumps(responses, ensure_ascii=False)
+    return encode_answer_positions(scores, version)
+
+
+def decode_answer_positions(data: str, version: Optional[int] = None) -> Tuple[int, list]:
+    """
+    저장용 문자열 → (문항 버전, 화면 위치 순서의 1~4 점수 또는 None 목록).
+    version을 주면 저장된 버전과 달라도 그 버전의 위치 순서로 옮겨 돌려줍니다.
+    기존 JSON 행은 현재 문항 체계로 해석하며, 알 수 없는 문항과 값은 미응답으로 둡니다.
+    """
+    if not data or data.lstrip().startswith("{"):
+        registry = get_registry(version or QUESTIONNAIRE_VERSION)
+        scores: list = [None] * registry.question_count
+        for question, value in (json.loads(data) if data else {}).items():
+            try:
+                scores[registry.positions[QUESTION_IDS[question]]] = _to_score(value)
+            except (KeyError, ValueError, TypeError):
+                continue
+        return registry.version, scores
+    if not data.startswith(ENCODING_PREFIX):
+        raise ValueError(f"알 수 없는 응답 인코딩입니다: {data[:16]}")
+
+    header, _, body = data.partition(":")
+    stored_version = int(header[len(ENCODING_PREFIX):])
+    count = get_registry(stored_version).question_count
+    values_part, _, mask_part = body.partition(":")
+    values = _unpack_bits(_b64decode(values_part), count, 2)
+    answered = _unpack_bits(_b64decode(mask_part), count, 1) if mask_part else [1] * count
+    scores = [value + 1 if flag else None for value, flag in zip(values, answered)]
+    if version is not None and version != stored_version:
+        return version, get_registry(version).remap_positions(scores, stored_version)
+    return stored_version, scores
+
+
+def decode_answers(data: str, as_labels: bool = False) -> dict:
+    """
+    저장용 문자열 → 응답 딕셔너리.
+    as_labels=True면 값을 보기 문자열('아니다' 등)로, 아니면 1~4 정수로 돌려줍니다.
+    기존 JSON 행은 저장된 값을 그대로 반환합니다.
+    """
+    if not data or data.lstrip().startswith("{"):
+        return json.loads(data) if data else {}
+    version, scores = decode_answer_positions(data)
+    registry = get_registry(version)
+    result = {}
+    for position, score in enumerate(scores):
+        if score is None:
+            result[registry.text(position)] = None
+        elif as_labels:
+            result[registry.text(position)] = ANSWER_OPTIONS[score - 1]
+        else:
+            result[registry.text(position)] = score
+    return result
+
+
+def is_encoded(data: Optional[str]) -> bool:
+    """이미 압축 형식으로 저장된 값인지 확인합니다."""
+    return bool(data) and data.startswith(ENCODING_PREFIX)
@@ -0,0 +1,288 @@
+"""
+보고서 아티팩트 저장소.
+
+보고서 본문을 내용 해시(sha256)로 주소를 매겨 압축 저장합니다.
+- 같은 내용은 한 번만 저장되고(중복 제거), 다시 저장하면 수정 시각만 갱신됩니다.
+- 압축: zstandard가 설치되어 있으면 zstd, 없으면 gzip (파일 확장자로 구분)
+- HTML/PDF 변환본은 처음 요청될 때 만들어 같은 방식으로 캐시합니다.
+- 주기 청소(sweep): ARTIFACT_MAX_AGE_DAYS보다 오래됐거나, 전체 크기가 ARTIFACT_MAX_BYTES를
+  넘으면 오래된 것부터 지웁니다. 원본 보고서는 DB(survey_responses/report_jobs)에 남아 있습니다.
+- 다운로드는 create_router()의 /reports/{digest}.{variant} 경로로 제공합니다
+  (ETag/If-None-Match, Range, 압축본 그대로 전송).
+"""
+import os
+import re
+import gzip
+import html
+import time
+import asyncio
+import hashlib
+import tempfile
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import APIRouter, Request, Response
+
+from background import PeriodicWorker
+
+try:
+    import zstandard
+except ImportError:  # requirements에는 포함되어 있지만 없는 환경에서도 동작하도록
+    zstandard = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(BASE_DIR, "artifacts"))
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(512 * 1024 * 1024)))
+ARTIFACT_MAX_AGE_DAYS = float(os.getenv("ARTIFACT_MAX_AGE_DAYS", "30"))
+ARTIFACT_SWEEP_INTERVAL = float(os.getenv("ARTIFACT_SWEEP_INTERVAL", "3600"))
+
+CODEC = "zst" if zstandard is not None else "gz"
+CONTENT_TYPES = {
+    "md": "text/markdown; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+    "pdf": "application/pdf",
+}
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="ko"><head><meta charset="utf-8"><title>{title}</title>
+<style>body{{font-family:sans-serif;max-width:900px;margin:2em auto;line-height:1.6}}
+table{{border-collapse:collapse}}td,th{{border:1px solid #ccc;padding:4px 8px}}</style>
+</head><body>
+{body}
+</body></html>"""
+
+
+class VariantUnavailable(Exception):
+    """변환에 필요한 선택 의존성이 없을 때 (예: PDF 렌더러)"""
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def render_html(markdown_text: str) -> str:
+    try:
+        from markdown_it import MarkdownIt
+        # 보고서에는 사용자가 입력한 학생 이름과 LLM 출력이 들어가므로 원시 HTML은 통과시키지 않습니다 (저장형 XSS 방지).
+        body = MarkdownIt("commonmark", {"html": False}).enable("table").render(markdown_text)
+    except ImportError:
+        body = f"<pre>{html.escape(markdown_text)}</pre>"
+    first_line = markdown_text.strip().splitlines()[0] if markdown_text.strip() else "보고서"
+    return HTML_TEMPLATE.format(title=html.escape(first_line.lstrip("# ")), body=body)
+
+
+def render_pdf(html_text: str) -> bytes:
+    try:
+        from weasyprint import HTML  # 선택 의존성
+    except ImportError:
+        raise VariantUnavailable("PDF 변환기(weasyprint)가 설치되어 있지 않습니다.")
+    return HTML(string=html_text).write_pdf()
+
+
+class ArtifactStore:
+    def __init__(self, root: str = ARTIFACT_DIR, max_bytes: int = ARTIFACT_MAX_BYTES,
+                 max_age_days: float = ARTIFACT_MAX_AGE_DAYS, sweep_interval: float = ARTIFACT_SWEEP_INTERVAL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self._sweeper = PeriodicWorker("artifact-sweeper", sweep_interval, self._sweep_and_log, "보고서 아티팩트 정리")
+
+    # --- 경로 ---
+    def _path(self, digest: str, variant: str, codec: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.{variant}.{codec}")
+
+    def _find(self, digest: str, variant: str) -> Optional[Tuple[str, str]]:
+        for codec in (CODEC, "gz", "zst"):
+            path = self._path(digest, variant, codec)
+            if os.path.exists(path) and (codec != "zst" or zstandard is not None):
+                return path, codec
+        return None
+
+    def _write(self, digest: str, variant: str, data: bytes):
+        path = self._path(digest, variant, CODEC)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 임시 파일에 쓴 뒤 교체해서, 동시에 읽는 쪽이 쓰다 만 파일을 보지 않게 합니다.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_compress(data, CODEC))
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    # --- 저장/조회 ---
+    def put(self, content: str) -> str:
+        """보고서 마크다운을 저장하고 내용 해시를 반환합니다."""
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        found = self._find(digest, "md")
+        if found:
+            os.utime(found[0])  # 최근 사용으로 표시 (청소 대상에서 뒤로)
+        else:
+            self._write(digest, "md", data)
+        self._sweeper.start()
+        return digest
+
+    def load(self, digest: str, variant: str = "md") -> Optional[Tuple[str, bytes]]:
+        """
+        (압축 방식, 압축된 바이트)를 반환합니다. 변환본이 없으면 원본에서 만들어 캐시합니다.
+        원본이 없으면(청소됨/잘못된 해시) None을 반환합니다.
+        """
+        if not _DIGEST_RE.match(digest) or variant not in CONTENT_TYPES:
+            return None
+        found = self._find(digest, variant)
+        if found is None:
+            if variant == "md" or not self._render(digest, variant):
+                return None
+            found = self._find(digest, variant)
+        path, codec = found
+        with open(path, "rb") as f:
+            return codec, f.read()
+
+    def read(self, digest: str, variant: str = "md") -> Optional[bytes]:
+        """압축을 푼 내용을 반환합니다."""
+        loaded = self.load(digest, variant)
+        return _decompress(loaded[1], loaded[0]) if loaded else None
+
+    def _render(self, digest: str, variant: str) -> bool:
+        markdown_bytes = self.read(digest, "md")
+        if markdown_bytes is None:
+            return False
+        html_text = render_html(markdown_bytes.decode("utf-8"))
+        if variant == "html":
+            data = html_text.encode("utf-8")
+        else:
+            data = render_pdf(html_text)
+        self._write(digest, variant, data)
+        return True
+
+    # --- 청소 ---
+    def sweep(self) -> int:
+        """오래된/용량 초과 아티팩트를 지우고, 지운 파일 수를 반환합니다."""
+        if not os.path.isdir(self.root):
+            return 0
+        now = time.time()
+        files = []
+        removed = 0
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                # 중단된 쓰기의 임시 파일, 보관 기간이 지난 파일 제거
+                if (name.endswith(".tmp") and now - st.st_mtime > 3600) or now - st.st_mtime > self.max_age:
+                    removed += self._remove(path)
+                elif not name.endswith(".tmp"):
+                    files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            removed += self._remove(path)
+            total -= size
+        return removed
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except FileNotFoundError:
+            return 0
+
+    def _sweep_and_log(self):
+        removed = self.sweep()
+        if removed:
+            print(f"보고서 아티팩트 {removed}개를 정리했습니다.")
+
+
+artifact_store = ArtifactStore()
+
+
+def report_url(digest: str, variant: str = "md", filename: Optional[str] = None) -> str:
+    url = f"/reports/{digest}.{variant}"
+    if filename:
+        url += f"?name={quote(filename)}"
+    return url
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """단일 'bytes=a-b' 범위를 (시작, 끝) 포함 구간으로 바꿉니다. 여러 구간은 지원하지 않습니다(None → 전체 전송)."""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if start == "":  # 마지막 N바이트
+        length = int(end)
+        return (max(size - length, 0), size - 1) if length else (size, size - 1)
+    end = min(int(end), size - 1) if end else size - 1
+    return int(start), end
+
+
+def create_router(store: ArtifactStore = artifact_store) -> APIRouter:
+    router = APIRouter()
+
+    @router.api_route("/reports/{digest}.{variant}", methods=["GET", "HEAD"])
+    async def get_report(digest: str, variant: str, request: Request, name: Optional[str] = None):
+        # 압축 전송본과 원본은 바이트가 다르므로 Content-Encoding마다 ETag를 따로 둡니다 (강한 검증자, 범위 요청은 원본만).
+        etag = f'"{digest}-{variant}"'
+        encoded_etags = {encoding: f'"{digest}-{variant}-{encoding}"' for encoding in ("gzip", "zstd")}
+        headers = {
+            "ETag": etag,
+            # 내용 해시 주소이므로 바뀌지 않지만, 학생 개인 보고서이므로 공유 캐시(프록시/CDN)에는 두지 않습니다.
+            "Cache-Control": "private, max-age=31536000, immutable",
+            "Accept-Ranges": "bytes",
+            "Vary": "Accept-Encoding",
+        }
+        if name:
+            headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(f'{name}.{variant}')}"
+        if_none_match = request.headers.get("if-none-match", "")
+        matched = next((tag for tag in (etag, *encoded_etags.values()) if tag in if_none_match), None)
+        if matched:
+            return Response(status_code=304, headers={**headers, "ETag": matched})
+
+        try:
+            loaded = await asyncio.to_thread(store.load, digest, variant)
+        except VariantUnavailable as e:
+            return Response(str(e), status_code=501, media_type="text/plain; charset=utf-8")
+        if loaded is None:
+            return Response("보고서를 찾을 수 없습니다. 다시 제출하면 새로 받을 수 있습니다.",
+                            status_code=404, media_type="text/plain; charset=utf-8")
+        codec, compressed = loaded
+        media_type = CONTENT_TYPES[variant]
+
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and if_range and if_range != etag:
+            range_header = None
+        accepted = request.headers.get("accept-encoding", "")
+        encoding = {"gz": "gzip", "zst": "zstd"}[codec]
+        if not range_header and encoding in accepted:
+            # 저장된 압축본을 그대로 전송
+            return Response(compressed, media_type=media_type,
+                            headers={**headers, "ETag": encoded_etags[encoding], "Content-Encoding": encoding})
+
+        body = _decompress(compressed, codec)
+        byte_range = _parse_range(range_header, len(body)) if range_header else None
+        if byte_range is None:
+            return Response(body, media_type=media_type, headers=headers)
+        start, end = byte_range
+        if start >= len(body) or start > end:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(body)}"})
+        return Response(body[start:end + 1], status_code=206, media_type=media_type,
+                        headers={**headers, "Content-Range": f"bytes {start}-{end}/{len(body)}"})
+
+    return router
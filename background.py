@@ -0,0 +1,76 @@
+"""
+백그라운드 스레드 공통 도우미.
+
+- after_fork(callback): fork된 자식 프로세스(serve.py 워커)에서 callback을 부릅니다.
+  부모의 스레드·락·커넥션은 자식에서 쓸 수 없으므로 모듈 싱글턴은 이 훅으로 상태를 비웁니다.
+  훅은 등록(모듈 import) 순서대로 실행됩니다.
+- PeriodicWorker: interval초마다 작업 함수를 실행하는 데몬 스레드 하나.
+  start()는 여러 번 불러도 한 번만 시작하고, fork된 자식에서는 스레드 상태를 스스로 비우므로
+  자식에서 start()를 다시 부르면 됩니다 (소유 모듈이 따로 fork 훅을 둘 필요 없음).
+"""
+import os
+import threading
+import weakref
+from typing import Callable, Optional
+
+
+def after_fork(callback: Callable[[], None]):
+    """fork된 자식에서 callback을 실행하도록 등록합니다 (fork가 없는 플랫폼에서는 아무것도 하지 않음)."""
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=callback)
+
+
+class PeriodicWorker:
+    """
+    interval초마다 task()를 실행합니다. task의 예외는 "{label} 오류: ..."로 출력하고 다음 주기에 다시 실행합니다.
+    stop() 후 start()로 다시 시작할 수 있습니다.
+    """
+
+    def __init__(self, name: str, interval: float, task: Callable[[], None], label: str):
+        self.name = name
+        self.interval = interval
+        self.task = task
+        self.label = label
+        self._reset()
+        _workers.add(self)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.task()
+            except Exception as e:
+                print(f"{self.label} 오류: {e}")
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """스레드를 시작합니다. 이미 실행 중이면 아무것도 하지 않습니다 (요청마다 불러도 가벼움)."""
+        if self.is_running():
+            return
+        with self._lock:
+            if self.is_running():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+# 인스턴스마다 fork 훅을 등록하면 벤치마크처럼 여러 번 만드는 경우 훅이 계속 쌓이므로, 약한 참조로 모아 한 번에 비웁니다.
+_workers: "weakref.WeakSet[PeriodicWorker]" = weakref.WeakSet()
+
+
+def _reset_workers_after_fork():
+    for worker in list(_workers):
+        worker._reset()
+
+
+after_fork(_reset_workers_after_fork)
@@ -0,0 +1,462 @@
+"""
+학급 단위 일괄 보고서 생성.
+
+학생 목록(검사지 CSV 가져오기 또는 저장된 survey_responses)을 받아
+1) 원점수/표준점수를 학생 전체에 대해 한 번에(벡터화) 계산하고
+2) 보고서 LLM 섹션을 BATCH_REPORT_CONCURRENCY명씩 동시에 생성한 뒤 (학생당 네 섹션도 동시, 우선순위 batch)
+3) 보고서 마크다운 묶음 + 요약 CSV를 zip으로 만듭니다.
+
+작업 폴더(BATCH_REPORT_DIR/<batch_id>/)에 입력·점수·완료된 보고서를 그때그때 저장하므로,
+중단된 작업은 resume으로 남은 학생만 이어서 생성합니다. 섹션 호출이 하나라도 실패한 학생은
+저장하지 않고 실패로 세어 다음 resume에서 다시 시도합니다.
+
+명령행:
+    python batch_reports.py run --csv csv/입력검사지.csv --level 중등 [--save]
+    python batch_reports.py run --response-ids 12,13,14
+    python batch_reports.py resume <batch_id>
+관리자 API: POST /admin/batch-reports, GET /admin/batch-reports/{batch_id}, GET /admin/batch-reports/{batch_id}/download
+"""
+import os
+import re
+import csv
+import io
+import json
+import uuid
+import asyncio
+import zipfile
+import argparse
+import threading
+from datetime import datetime
+from typing import Optional, List, Dict
+
+import pandas as pd
+from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi.responses import FileResponse
+
+from admin import require_admin
+from answer_codec import decode_answers
+from background import after_fork
+from database import SessionLocal, SurveyResponse, commit_with_retry
+from esli_01 import calculate_scores_batch
+from esli_02 import (
+    compute_student_scores_batch,
+    build_report_from_scores_async,
+    _new_survey_response,
+    _add_survey_response,
+    REPORT_COMMENT_FAILED,
+)
+from llm_scheduler import PRIORITY_BATCH
+from questionnaire import ANSWER_OPTIONS
+from typing_rules import t_score_frame, classify_motivation
+from metrics import stage_span
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BATCH_REPORT_DIR = os.getenv("BATCH_REPORT_DIR", os.path.join(BASE_DIR, "batch_reports"))
+BATCH_REPORT_CONCURRENCY = int(os.getenv("BATCH_REPORT_CONCURRENCY", "8"))  # 동시에 생성하는 학생 수
+
+NAME_COLUMNS = ("이름", "학생 이름", "성명", "name")
+LEVEL_COLUMNS = ("학교급", "school_level")
+_LABEL_TO_SCORE = {label: i + 1 for i, label in enumerate(ANSWER_OPTIONS)}
+_QUESTION_IN_BRACKETS = re.compile(r"\[(.+)\]\s*$")
+SUMMARY_COLUMNS = [
+    '자기성취', '사회적 관계', '직접적 보상처벌', '학습전략', '학습기술',
+    '목표세우기', '계획하기', '실천하기', '돌아보기', '이해하기', '사고하기', '정리하기', '암기하기', '문제풀기',
+    '스트레스민감성', '학습효능감', '친구관계', '가정환경', '학교환경', '수면조절', '학습집중력',
+    'TV프로그램', '컴퓨터', '스마트기기',
+]
+
+
+# --------------------
+# 입력
+# --------------------
+def _to_score(value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value in _LABEL_TO_SCORE:
+            return _LABEL_TO_SCORE[value]
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def load_students_from_csv(path: str, default_level: str = "초등") -> List[dict]:
+    """
+    검사지 CSV 파일(구글 설문 내보내기: '섹션 (n/7) [질문]' 열, 값은 1~4 또는 보기 문자열)을 학생 목록으로 읽습니다.
+    이름/학교급 열이 없으면 '학생N' / default_level을 씁니다. (명령행 전용, API는 load_students_from_csv_text)
+    """
+    return _students_from_frame(pd.read_csv(path, dtype=str, encoding="utf-8-sig"), default_level)
+
+
+def load_students_from_csv_text(text: str, default_level: str = "초등") -> List[dict]:
+    """CSV 내용 문자열을 학생 목록으로 읽습니다. 서버 파일 경로로 해석하지 않습니다 (API 업로드용)."""
+    return _students_from_frame(pd.read_csv(io.StringIO(text.lstrip("\ufeff")), dtype=str), default_level)
+
+
+def _students_from_frame(df: pd.DataFrame, default_level: str) -> List[dict]:
+    name_col = next((c for c in df.columns if c.strip() in NAME_COLUMNS), None)
+    level_col = next((c for c in df.columns if c.strip() in LEVEL_COLUMNS), None)
+    question_cols = {}
+    for col in df.columns:
+        match = _QUESTION_IN_BRACKETS.search(col)
+        if match:
+            question_cols[col] = match.group(1).strip()
+    students = []
+    for i, row in enumerate(df.to_dict("records"), start=1):
+        responses = {}
+        for col, question in question_cols.items():
+            score = _to_score(row.get(col))
+            if score is not None:
+                responses[question] = score
+        name = (row.get(name_col) or "").strip() if name_col else ""
+        level = (row.get(level_col) or "").strip() if level_col else ""
+        students.append({"name": name or f"학생{i}", "school_level": level or default_level, "responses": responses})
+    return students
+
+
+def load_students_from_db(response_ids: List[int], default_level: str = "초등") -> List[dict]:
+    """저장된 검사 결과의 응답을 다시 읽습니다 (보고서 본문은 읽지 않음)."""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(SurveyResponse.id, SurveyResponse.student_name, SurveyResponse.school_level, SurveyResponse.responses_json)
+            .filter(SurveyResponse.id.in_(response_ids))
+            .all()
+        )
+    finally:
+        db.close()
+    by_id = {row[0]: row for row in rows}
+    missing = [rid for rid in response_ids if rid not in by_id]
+    if missing:
+        print(f"--- [경고] 없는 검사 결과 ID는 건너뜁니다: {missing} ---")
+    return [
+        {"name": by_id[rid][1], "school_level": by_id[rid][2] or default_level,
+         "responses": decode_answers(by_id[rid][3]), "response_id": rid}
+        for rid in response_ids if rid in by_id
+    ]
+
+
+# --------------------
+# 작업 폴더 (체크포인트)
+# --------------------
+def _batch_dir(batch_id: str) -> str:
+    if not re.fullmatch(r"[0-9a-zA-Z_-]+", batch_id or ""):
+        raise ValueError(f"잘못된 일괄 작업 ID입니다: {batch_id}")
+    return os.path.join(BATCH_REPORT_DIR, batch_id)
+
+
+def _write_json(path: str, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str, default=None):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def _report_filename(index: int, name: str) -> str:
+    safe = re.sub(r'[\\/:*?"<>|\s]+', "_", name).strip("_") or "student"
+    return f"{index + 1:03d}_{safe}.md"
+
+
+class BatchProgress:
+    """완료/실패 학생 수. 변경될 때마다 progress.json에 기록합니다."""
+
+    def __init__(self, batch_id: str, total: int):
+        self.batch_id = batch_id
+        self.path = os.path.join(_batch_dir(batch_id), "progress.json")
+        self._lock = threading.Lock()
+        self.state = _read_json(self.path) or {}
+        self.state.update({"batch_id": batch_id, "total": total, "status": "running", "failed": {},
+                           "updated_at": datetime.now().isoformat()})
+        self.state.setdefault("created_at", datetime.now().isoformat())
+        self.state.setdefault("done", 0)
+        self.state.setdefault("saved", [])  # DB에 저장한 학생 번호 (resume 시 중복 저장 방지)
+        self._save()
+
+    def _save(self):
+        self.state["updated_at"] = datetime.now().isoformat()
+        _write_json(self.path, self.state)
+
+    def mark_done(self, index: int, name: str):
+        with self._lock:
+            self.state["done"] += 1
+            self.state["failed"].pop(str(index), None)
+            self._save()
+            done, total = self.state["done"], self.state["total"]
+        print(f"--- [일괄 {self.batch_id}] {done}/{total} 완료: {name} ---")
+
+    def is_saved(self, index: int) -> bool:
+        with self._lock:
+            return index in self.state["saved"]
+
+    def mark_saved(self, index: int):
+        with self._lock:
+            self.state["saved"].append(index)
+            self._save()
+
+    def mark_failed(self, index: int, name: str, error: str):
+        with self._lock:
+            self.state["failed"][str(index)] = {"name": name, "error": error}
+            self._save()
+        print(f"--- [일괄 {self.batch_id}] 실패: {name} ({error}) ---")
+
+    def finish(self, status: str, archive: Optional[str] = None):
+        with self._lock:
+            self.state["status"] = status
+            if archive:
+                self.state["archive"] = archive
+            self._save()
+
+
+def create_batch(students: List[dict], save_results: bool = False, batch_id: Optional[str] = None) -> str:
+    """입력 학생 목록을 작업 폴더에 저장하고 batch_id를 반환합니다 (생성은 run_batch)."""
+    batch_id = batch_id or datetime.now().strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:6]
+    directory = _batch_dir(batch_id)
+    os.makedirs(os.path.join(directory, "reports"), exist_ok=True)
+    _write_json(os.path.join(directory, "input.json"), {"save_results": save_results, "students": students})
+    return batch_id
+
+
+# --------------------
+# 생성
+# --------------------
+def _score_students(directory: str, students: List[dict]) -> List[dict]:
+    """학생 전체 점수를 한 번에 계산합니다. 이미 계산해 둔 점수가 있으면 그대로 씁니다 (resume 시 보고서와 일치)."""
+    scores_path = os.path.join(directory, "scores.json")
+    cached = _read_json(scores_path)
+    if cached is not None and len(cached) == len(students):
+        return cached
+    with stage_span("batch", "scoring"):
+        raw_scores_df = calculate_scores_batch([s["responses"] for s in students])
+        scores = compute_student_scores_batch(raw_scores_df, [s["school_level"] for s in students])
+    _write_json(scores_path, scores)
+    return scores
+
+
+def _save_result(student: dict, scores: dict, report_md: str):
+    db = SessionLocal()
+    try:
+        new_response = _new_survey_response(student["name"], student["responses"], scores, report_md,
+                                            student["school_level"])
+        commit_with_retry(db, lambda s: _add_survey_response(s, new_response, scores))
+    finally:
+        db.close()
+
+
+async def _generate(directory: str, students: List[dict], scores: List[dict], progress: BatchProgress,
+                    save_results: bool, concurrency: int):
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    reports_dir = os.path.join(directory, "reports")
+
+    async def one(index: int):
+        student = students[index]
+        path = os.path.join(reports_dir, _report_filename(index, student["name"]))
+        if os.path.exists(path):
+            return
+        async with semaphore:
+            try:
+                report_md = await build_report_from_scores_async(student["name"], scores[index], priority=PRIORITY_BATCH)
+                if REPORT_COMMENT_FAILED in report_md:
+                    raise RuntimeError("일부 섹션의 LLM 코멘트 생성 실패")
+                # 가져온 학생만 저장합니다 (DB에서 읽은 학생은 이미 결과가 있음).
+                if save_results and not student.get("response_id") and not progress.is_saved(index):
+                    await asyncio.to_thread(_save_result, student, scores[index], report_md)
+                    progress.mark_saved(index)
+                tmp = f"{path}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(report_md)
+                os.replace(tmp, path)
+                progress.mark_done(index, student["name"])
+            except Exception as e:
+                progress.mark_failed(index, student["name"], str(e))
+
+    await asyncio.gather(*(one(i) for i in range(len(students))))
+
+
+def _summary_rows(students: List[dict], scores: List[dict], reports_dir: str) -> List[dict]:
+    rows = []
+    # 동기 유형은 전체 학생 T점수 행렬로 한 번에 판정 (판정 불가는 빈 칸)
+    motivations = classify_motivation(t_score_frame(scores)) if scores else []
+    for index, (student, student_scores) in enumerate(zip(students, scores)):
+        filename = _report_filename(index, student["name"])
+        done = os.path.exists(os.path.join(reports_dir, filename))
+        motivation = motivations[index][0] if motivations[index] else ""
+        row = {"번호": index + 1, "이름": student["name"], "학교급": student["school_level"],
+               "상태": "완료" if done else "실패", "보고서": filename if done else "", "동기유형": motivation}
+        for name in SUMMARY_COLUMNS:
+            row[f"{name}_T"] = student_scores.get(name, {}).get('t_score', "")
+        rows.append(row)
+    return rows
+
+
+def _write_archive(directory: str, students: List[dict], scores: List[dict]) -> str:
+    reports_dir = os.path.join(directory, "reports")
+    rows = _summary_rows(students, scores, reports_dir)
+    summary = io.StringIO()
+    writer = csv.DictWriter(summary, fieldnames=list(rows[0].keys()) if rows else ["번호"])
+    writer.writeheader()
+    writer.writerows(rows)
+    archive = os.path.join(directory, "reports.zip")
+    tmp = f"{archive}.tmp"
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("summary.csv", "﻿" + summary.getvalue())  # 엑셀에서 한글이 깨지지 않도록 BOM
+        for row in rows:
+            if row["보고서"]:
+                zf.write(os.path.join(reports_dir, row["보고서"]), f"reports/{row['보고서']}")
+    os.replace(tmp, archive)
+    return archive
+
+
+def run_batch(batch_id: str, concurrency: int = BATCH_REPORT_CONCURRENCY) -> dict:
+    """작업 폴더의 학생들 중 보고서가 없는 학생만 생성하고 zip을 만듭니다. 진행 상태(dict)를 반환합니다."""
+    directory = _batch_dir(batch_id)
+    spec = _read_json(os.path.join(directory, "input.json"))
+    if spec is None:
+        raise ValueError(f"일괄 작업이 없습니다: {batch_id}")
+    students = spec["students"]
+    reports_dir = os.path.join(directory, "reports")
+    progress = BatchProgress(batch_id, len(students))
+    try:
+        scores = _score_students(directory, students)
+        progress.state["done"] = sum(
+            1 for i, s in enumerate(students) if os.path.exists(os.path.join(reports_dir, _report_filename(i, s["name"])))
+        )
+        asyncio.run(_generate(directory, students, scores, progress, spec.get("save_results", False), concurrency))
+        archive = _write_archive(directory, students, scores)
+        progress.finish("done" if not progress.state["failed"] else "partial", archive)
+    except Exception as e:
+        progress.state["error"] = str(e)
+        progress.finish("failed")
+        raise
+    print(f"--- [일괄 {batch_id}] 종료: {progress.state['done']}/{len(students)}명, zip: {progress.state.get('archive')} ---")
+    return progress.state
+
+
+def get_batch_status(batch_id: str) -> Optional[dict]:
+    return _read_json(os.path.join(_batch_dir(batch_id), "progress.json"))
+
+
+_running: Dict[str, threading.Thread] = {}
+_running_lock = threading.Lock()
+
+
+def start_batch(batch_id: str, concurrency: int = BATCH_REPORT_CONCURRENCY) -> bool:
+    """백그라운드 스레드에서 run_batch를 시작합니다. 이미 실행 중이면 False."""
+    with _running_lock:
+        thread = _running.get(batch_id)
+        if thread is not None and thread.is_alive():
+            return False
+
+        def target():
+            try:
+                run_batch(batch_id, concurrency)
+            except Exception as e:
+                print(f"--- [오류] 일괄 보고서 {batch_id} 실패: {e} ---")
+
+        thread = threading.Thread(target=target, name=f"batch-report-{batch_id}", daemon=True)
+        _running[batch_id] = thread
+        thread.start()
+        return True
+
+
+def _reset_after_fork():
+    global _running_lock
+    _running_lock = threading.Lock()
+    _running.clear()
+
+
+after_fork(_reset_after_fork)
+
+
+def create_router() -> APIRouter:
+    router = APIRouter(dependencies=[Depends(require_admin)])
+
+    @router.post("/admin/batch-reports")
+    def create_batch_reports(payload: dict = Body(...)):
+        """
+        본문: {"csv": "<검사지 CSV 내용>"} 또는 {"students": [{"name", "school_level", "responses"}]}
+              또는 {"response_ids": [...]}, 선택: "school_level"(기본 학교급), "save"(가져온 학생 결과 저장)
+        """
+        level = payload.get("school_level") or "초등"
+        if payload.get("csv"):
+            students = load_students_from_csv_text(payload["csv"], level)
+        elif payload.get("response_ids"):
+            students = load_students_from_db([int(i) for i in payload["response_ids"]], level)
+        else:
+            students = [
+                {"name": s.get("name") or f"학생{i}", "school_level": s.get("school_level") or level,
+                 "responses": s.get("responses") or {}}
+                for i, s in enumerate(payload.get("students") or [], start=1)
+            ]
+        if not students:
+            raise HTTPException(status_code=400, detail="학생이 없습니다.")
+        batch_id = create_batch(students, bool(payload.get("save")))
+        start_batch(batch_id)
+        return {"batch_id": batch_id, "total": len(students)}
+
+    @router.post("/admin/batch-reports/{batch_id}/resume")
+    def resume_batch_reports(batch_id: str):
+        try:
+            status = get_batch_status(batch_id)
+        except ValueError:
+            status = None
+        if status is None:
+            raise HTTPException(status_code=404)
+        return {"batch_id": batch_id, "started": start_batch(batch_id)}
+
+    @router.get("/admin/batch-reports/{batch_id}")
+    def batch_reports_status(batch_id: str):
+        try:
+            status = get_batch_status(batch_id)
+        except ValueError:
+            status = None
+        if status is None:
+            raise HTTPException(status_code=404)
+        return status
+
+    @router.get("/admin/batch-reports/{batch_id}/download")
+    def batch_reports_download(batch_id: str):
+        try:
+            status = get_batch_status(batch_id)
+        except ValueError:
+            status = None
+        if not status or not status.get("archive") or not os.path.exists(status["archive"]):
+            raise HTTPException(status_code=404, detail="아직 zip이 만들어지지 않았습니다.")
+        return FileResponse(status["archive"], media_type="application/zip", filename=f"reports-{batch_id}.zip")
+
+    return router
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="학급 일괄 보고서 생성")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run")
+    run.add_argument("--csv", help="검사지 CSV 경로")
+    run.add_argument("--response-ids", help="저장된 검사 결과 ID (쉼표 구분)")
+    run.add_argument("--level", default="초등", help="학교급 열이 없을 때 쓸 학교급")
+    run.add_argument("--save", action="store_true", help="가져온 학생의 결과를 survey_responses에 저장")
+    run.add_argument("--concurrency", type=int, default=BATCH_REPORT_CONCURRENCY)
+    resume = sub.add_parser("resume")
+    resume.add_argument("batch_id")
+    resume.add_argument("--concurrency", type=int, default=BATCH_REPORT_CONCURRENCY)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        if args.csv:
+            loaded = load_students_from_csv(args.csv, args.level)
+        elif args.response_ids:
+            loaded = load_students_from_db([int(i) for i in args.response_ids.split(",") if i.strip()], args.level)
+        else:
+            parser.error("--csv 또는 --response-ids가 필요합니다.")
+        new_id = create_batch(loaded, args.save)
+        print(f"일괄 작업 {new_id}: 학생 {len(loaded)}명")
+        run_batch(new_id, args.concurrency)
+    else:
+        run_batch(args.batch_id, args.concurrency)
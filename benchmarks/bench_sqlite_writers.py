@@ -0,0 +1,108 @@
+"""
+SQLite 동시 쓰기 벤치마크.
+
+N개의 스레드가 동시에 진행상황 저장(save_progress → 즉시 flush)과
+LLM 로그 저장(log_llm_interaction_db)을 반복하며, 처리량과 잠금 오류 수를 측정합니다.
+SQLite 운영 프로파일 적용 전(off)/후(on)를 각각 별도 프로세스에서 실행해 비교합니다.
+
+사용법:
+    python benchmarks/bench_sqlite_writers.py --writers 16 --iterations 50
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_worker_mode(writers: int, iterations: int):
+    """현재 환경변수(DATABASE_URL, DB_SQLITE_PROFILE)로 벤치마크를 수행하고 결과를 JSON으로 출력합니다."""
+    sys.path.insert(0, BASE_DIR)
+    import database
+    from progress_cache import ProgressCache
+    from questionnaire import get_question_order, ANSWER_OPTIONS
+
+    database.init_db()
+    questions = get_question_order()
+    cache = ProgressCache(flush_interval=3600)
+    lock = threading.Lock()
+    stats = {"progress_ok": 0, "progress_err": 0, "log_ok": 0, "log_err": 0}
+    barrier = threading.Barrier(writers)
+
+    def writer(idx: int):
+        session_id = f"bench-{idx}"
+        responses = {q: None for q in questions}
+        barrier.wait()
+        for i in range(iterations):
+            responses[questions[i % len(questions)]] = ANSWER_OPTIONS[i % 4]
+            cache.put(session_id, f"학생{idx}", "중등", responses)
+            progress_ok = cache.flush(session_id) == 1
+
+            db = database.SessionLocal()
+            try:
+                log_ok = database.log_llm_interaction_db(db, "bench", {"writer": idx, "i": i}, "ok")
+            finally:
+                db.close()
+
+            with lock:
+                stats["progress_ok" if progress_ok else "progress_err"] += 1
+                stats["log_ok" if log_ok else "log_err"] += 1
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    started = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    elapsed = time.perf_counter() - started
+
+    total_ok = stats["progress_ok"] + stats["log_ok"]
+    stats.update({
+        "elapsed_sec": round(elapsed, 3),
+        "writes_per_sec": round(total_ok / elapsed, 1) if elapsed else 0.0,
+        "lock_errors": stats["progress_err"] + stats["log_err"],
+    })
+    print(json.dumps(stats))
+
+
+def run_mode(profile: bool, writers: int, iterations: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        env["DB_SQLITE_PROFILE"] = "true" if profile else "false"
+        env.pop("DB_WRITE_RETRIES", None)
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker",
+             "--writers", str(writers), "--iterations", str(iterations)],
+            env=env, cwd=BASE_DIR, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr)
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 동시 쓰기 벤치마크")
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker_mode(args.writers, args.iterations)
+        return
+
+    print(f"writers={args.writers}, iterations={args.iterations} (쓰기 {args.writers * args.iterations * 2}건)")
+    print(f"{'profile':<8} {'elapsed(s)':>10} {'writes/s':>10} {'lock errors':>12}")
+    for label, profile in (("off", False), ("on", True)):
+        result = run_mode(profile, args.writers, args.iterations)
+        print(f"{label:<8} {result['elapsed_sec']:>10} {result['writes_per_sec']:>10} {result['lock_errors']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+부하 테스트용 OpenAI 호환 가짜 서버.
+
+/v1/chat/completions 와 /v1/embeddings 를 흉내 내며, 지연 시간 분포와 오류/429 비율을 설정할 수 있습니다.
+실제 API 요금 없이 OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 로 앱 전체를 돌려볼 수 있습니다.
+
+사용법:
+    python benchmarks/fake_openai.py --port 18080 --latency lognormal --latency-ms 800 --error-rate 0.01 --rate-limit-rate 0.02
+    curl http://127.0.0.1:18080/__stats     # 요청/오류/429 누적 수
+"""
+import json
+import math
+import random
+import asyncio
+import hashlib
+import argparse
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+CLASSIFY_LABELS = ["advice", "curriculum", "direct"]
+
+
+class FakeConfig:
+    def __init__(self, latency: str = "lognormal", latency_ms: float = 800, latency_sigma: float = 0.5,
+                 embedding_latency_ms: float = 80, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0, embedding_dim: int = 3072, seed: int = None):
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.embedding_latency_ms = embedding_latency_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.embedding_dim = embedding_dim
+        self.rng = random.Random(seed)
+
+    def sample_delay(self, mean_ms: float) -> float:
+        """설정한 분포에서 지연 시간(초)을 뽑습니다. lognormal은 평균이 mean_ms가 되도록 보정합니다."""
+        if self.latency == "fixed":
+            ms = mean_ms
+        elif self.latency == "uniform":
+            ms = self.rng.uniform(0, 2 * mean_ms)
+        elif self.latency == "exponential":
+            ms = self.rng.expovariate(1 / mean_ms) if mean_ms > 0 else 0
+        else:
+            mu = math.log(max(mean_ms, 1e-3)) - self.latency_sigma ** 2 / 2
+            ms = self.rng.lognormvariate(mu, self.latency_sigma)
+        return ms / 1000
+
+
+def _token_count(text: str) -> int:
+    return max(1, len(text) // 2)
+
+
+def _message_text(messages: list) -> str:
+    parts = []
+    for m in messages:
+        content = m.get("content", "")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(p.get("text", "") for p in content if p.get("type") == "text")
+    return "\n".join(parts)
+
+
+def _embedding(text: str, dim: int) -> list:
+    # 같은 입력에는 같은 벡터 (캐시/유사도 동작 확인용)
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vec = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI()
+    stats = {"chat": 0, "embeddings": 0, "errors": 0, "rate_limited": 0, "started": time.time()}
+
+    def injected_failure():
+        roll = config.rng.random()
+        if roll < config.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse({"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_error"}},
+                                status_code=429, headers={"retry-after": str(config.retry_after)})
+        if roll < config.rate_limit_rate + config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "Internal error (fake)", "type": "server_error"}}, status_code=500)
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["chat"] += 1
+        failure = injected_failure()
+        if failure is not None:
+            return failure
+        prompt = _message_text(body.get("messages", []))
+        max_tokens = body.get("max_tokens") or 400
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            # 구조화 보고서 호출 (esli_02.call_llm_for_structured_report): 네 섹션을 형식에 맞춰 돌려줌
+            comment = "#### 검사 결과 분석\n가짜 분석입니다.\n\n#### 코칭 코멘트\n\"**가짜 요약**\"\n* **현재 모습**: 가짜 응답입니다."
+            content = json.dumps({"summary": "가짜 종합 요약입니다. " * 8, "motivation": comment,
+                                  "strategy": comment, "hindrance": comment}, ensure_ascii=False)
+            await asyncio.sleep(config.sample_delay(config.latency_ms))
+        elif max_tokens <= 5:
+            # 의도 분류 호출 (esli_03.classify_query_type)
+            content = config.rng.choice(CLASSIFY_LABELS)
+            await asyncio.sleep(config.sample_delay(config.latency_ms / 4))
+        else:
+            content = "가짜 응답입니다. " * max(1, min(max_tokens, 400) // 10)
+            await asyncio.sleep(config.sample_delay(config.latency_ms))
+        prompt_tokens = _token_count(prompt)
+        completion_tokens = _token_count(content)
+        return {
+            "id": f"chatcmpl-fake-{stats['chat']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        stats["embeddings"] += 1
+        failure = injected_failure()
+        if failure is not None:
+            return failure
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        await asyncio.sleep(config.sample_delay(config.embedding_latency_ms))
+        dim = body.get("dimensions") or config.embedding_dim
+        tokens = sum(_token_count(str(t)) for t in inputs)
+        return {
+            "object": "list",
+            "model": body.get("model", "text-embedding-3-large"),
+            "data": [{"object": "embedding", "index": i, "embedding": _embedding(str(t), dim)} for i, t in enumerate(inputs)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/__stats")
+    async def get_stats():
+        return {**stats, "uptime_sec": round(time.time() - stats["started"], 1)}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 호환 가짜 서버 (부하 테스트용)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "exponential", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=800, help="채팅 완성 평균 지연(ms)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal 분포의 sigma")
+    parser.add_argument("--embedding-latency-ms", type=float, default=80)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500 응답 비율")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429 응답 비율")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 응답의 Retry-After(초)")
+    parser.add_argument("--embedding-dim", type=int, default=3072)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeConfig(
+        latency=args.latency, latency_ms=args.latency_ms, latency_sigma=args.latency_sigma,
+        embedding_latency_ms=args.embedding_latency_ms, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+        embedding_dim=args.embedding_dim, seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+종단 간 부하 테스트 드라이버.
+
+가상 학생이 150문항에 차례로 답하며(응답마다 자동 저장 이벤트), 제출하고, 채팅을 주고받습니다.
+동시 학생 수(--levels)를 늘려 가며 엔드포인트별 p50/p95/p99와 처리량을 측정하고,
+처리량 증가가 멈추는 지점(concurrency knee)을 찾습니다.
+
+대상:
+- inproc: 이 프로세스에서 esli_00.create_final_survey()를 만들고 이벤트 핸들러를 직접 호출합니다.
+          Gradio 큐 대신 제출/채팅 이벤트에 concurrency_limit만큼의 세마포어를 적용합니다.
+- http:   실행 중인 서버(esli_00.py/serve.py의 FastAPI 마운트)에 gradio_client로 접속합니다.
+
+LLM은 --fake-openai를 주면 benchmarks/fake_openai.py를 띄워 OPENAI_BASE_URL로 연결합니다(inproc).
+http 대상이면 서버를 OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 로 띄워 두어야 합니다.
+
+사용법:
+    python benchmarks/load_test.py --target inproc --fake-openai --levels 1 2 4 8 16 32 \\
+        --students 8 --db-pool-size 10 --concurrency-limit 15
+    python benchmarks/load_test.py --target http --url http://127.0.0.1:7861/app/ --levels 1 4 16
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_openai.py")
+CHAT_MESSAGES = [
+    "수학 공부를 어떻게 계획하면 좋을까요?",
+    "집중력이 자꾸 떨어지는데 방법이 있을까요?",
+    "분수의 나눗셈을 쉽게 설명해 주세요.",
+    "시험 기간에 불안할 때는 어떻게 해야 하나요?",
+]
+# 처리량이 이 비율보다 적게 늘면 포화(knee)로 봅니다.
+KNEE_GAIN = 1.10
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies[endpoint].append(seconds * 1000)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def summary(self) -> dict:
+        result = {}
+        for endpoint, values in self.latencies.items():
+            values = sorted(values)
+            result[endpoint] = {
+                "count": len(values),
+                "errors": self.errors[endpoint],
+                "p50_ms": round(percentile(values, 50), 1),
+                "p95_ms": round(percentile(values, 95), 1),
+                "p99_ms": round(percentile(values, 99), 1),
+            }
+        return result
+
+
+# --------------------
+# 대상별 클라이언트
+# --------------------
+class InprocTarget:
+    """create_final_survey()의 이벤트 핸들러를 직접 호출합니다."""
+
+    def __init__(self, concurrency_limit: int):
+        import database
+        import esli_00
+        from questionnaire import get_question_order
+
+        database.init_db()
+        database.seed_reference_data()
+        esli_00.start_report_workers()
+        # 핸들러를 문항별 응답 목록으로 호출하므로 전체 렌더링 방식으로 만듭니다.
+        demo = esli_00.create_final_survey("full")
+        fns = demo.fns.values() if isinstance(demo.fns, dict) else demo.fns
+        by_name = {}
+        for block_fn in fns:
+            by_name.setdefault(getattr(block_fn, "name", None) or block_fn.fn.__name__, block_fn.fn)
+        self._autosave = by_name["auto_save_progress"]
+        self._submit = by_name["submit"]
+        self._chat = by_name["chat_respond"]
+        self.question_count = len(get_question_order())
+        # Gradio는 이벤트마다 concurrency_limit을 적용하므로 같은 방식으로 제한합니다.
+        self._submit_limit = asyncio.Semaphore(concurrency_limit)
+        self._chat_limit = asyncio.Semaphore(concurrency_limit)
+
+    def new_session(self, index: int) -> dict:
+        return {"session_id": f"load-{index}-{random.getrandbits(32):08x}", "history": []}
+
+    async def autosave(self, session: dict, name: str, level: str, responses: list) -> bool:
+        status = await self._autosave(session["session_id"], name, level, False, *responses)
+        return "실패" not in status
+
+    async def submit(self, session: dict, name: str, level: str, responses: list) -> bool:
+        async with self._submit_limit:
+            last = None
+            async for last in self._submit(session["session_id"], name, level, *responses):
+                pass
+        return bool(last) and str(last[0]).startswith("✅")
+
+    async def chat(self, session: dict, name: str, message: str) -> bool:
+        async with self._chat_limit:
+            history, _, _ = await self._chat(message, session["history"], None, name)
+        session["history"] = history
+        return bool(history) and "오류" not in str(history[-1][1])
+
+
+class HttpTarget:
+    """실행 중인 Gradio 앱에 gradio_client로 접속합니다 (학생마다 별도 세션)."""
+
+    def __init__(self, url: str, question_count: int):
+        self.url = url
+        self.question_count = question_count
+
+    def new_session(self, index: int) -> dict:
+        from gradio_client import Client
+        return {"client": Client(self.url, verbose=False), "history": []}
+
+    async def autosave(self, session: dict, name: str, level: str, responses: list) -> bool:
+        status = await asyncio.to_thread(
+            session["client"].predict, name, level, False, *responses, api_name="/auto_save_progress"
+        )
+        return "실패" not in str(status)
+
+    async def submit(self, session: dict, name: str, level: str, responses: list) -> bool:
+        result = await asyncio.to_thread(session["client"].predict, name, level, *responses, api_name="/submit")
+        return str(result[0]).startswith("✅")
+
+    async def chat(self, session: dict, name: str, message: str) -> bool:
+        history, _, _ = await asyncio.to_thread(
+            session["client"].predict, message, session["history"], None, name, api_name="/chat_respond"
+        )
+        session["history"] = history
+        return bool(history)
+
+
+# --------------------
+# 시나리오
+# --------------------
+async def run_student(target, index: int, args, recorder: Recorder, rng: random.Random):
+    from questionnaire import sample_answers, get_question_order
+
+    session = await asyncio.to_thread(target.new_session, index) if args.target == "http" else target.new_session(index)
+    name = f"부하{index}"
+    level = rng.choice(["초등", "중등", "고등"])
+    labels = sample_answers(rng)
+    # UI 라디오 순서(중복 문항 포함)대로 답을 채웁니다.
+    answers = [labels[q] for q in get_question_order()]
+    responses = [None] * target.question_count
+    answer_count = min(args.answers, target.question_count)
+
+    async def timed(endpoint, coro):
+        started = time.perf_counter()
+        try:
+            ok = await coro
+        except Exception as e:
+            print(f"[{endpoint}] 오류: {e}")
+            ok = False
+        recorder.add(endpoint, time.perf_counter() - started, ok)
+
+    for i in range(answer_count):
+        responses[i] = answers[i]
+        await timed("autosave", target.autosave(session, name, level, list(responses)))
+        if args.think_ms:
+            await asyncio.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+    if answer_count == target.question_count:
+        await timed("submit", target.submit(session, name, level, list(responses)))
+    for turn in range(args.chat_turns):
+        await timed("chat", target.chat(session, name, rng.choice(CHAT_MESSAGES)))
+
+
+async def run_level(target, concurrency: int, args) -> dict:
+    recorder = Recorder()
+    rng = random.Random(args.seed + concurrency)
+    students = max(args.students, concurrency)
+    queue = asyncio.Queue()
+    for i in range(students):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            index = queue.get_nowait()
+            await run_student(target, concurrency * 100000 + index, args, recorder, rng)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "students": students,
+        "elapsed_sec": round(elapsed, 2),
+        "students_per_sec": round(students / elapsed, 3),
+        "endpoints": recorder.summary(),
+    }
+
+
+def find_knee(levels: list) -> int:
+    """처리량이 KNEE_GAIN 미만으로 늘기 시작하기 직전의 동시성 수준을 반환합니다."""
+    for prev, cur in zip(levels, levels[1:]):
+        if cur["students_per_sec"] < prev["students_per_sec"] * KNEE_GAIN:
+            return prev["concurrency"]
+    return levels[-1]["concurrency"]
+
+
+def start_fake_openai(args) -> subprocess.Popen:
+    proc = subprocess.Popen([
+        sys.executable, FAKE_SERVER, "--port", str(args.fake_port),
+        "--latency-ms", str(args.fake_latency_ms), "--error-rate", str(args.fake_error_rate),
+        "--rate-limit-rate", str(args.fake_rate_limit_rate), "--seed", str(args.seed),
+    ])
+    import httpx
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{args.fake_port}/__stats", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("가짜 OpenAI 서버를 시작하지 못했습니다.")
+
+
+def print_report(results: list, knee: int, args):
+    print()
+    print(f"대상={args.target} DB_POOL_SIZE={os.getenv('DB_POOL_SIZE', '-')} "
+          f"concurrency_limit={os.getenv('GRADIO_CONCURRENCY_LIMIT', '-')}")
+    print(f"{'동시성':>6} {'학생/s':>8} {'endpoint':<10} {'count':>7} {'err':>5} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9}")
+    for level in results:
+        first = True
+        for endpoint, s in sorted(level["endpoints"].items()):
+            head = f"{level['concurrency']:>6} {level['students_per_sec']:>8.3f}" if first else " " * 15
+            print(f"{head} {endpoint:<10} {s['count']:>7} {s['errors']:>5} {s['p50_ms']:>9} {s['p95_ms']:>9} {s['p99_ms']:>9}")
+            first = False
+    print(f"\n처리량 포화 지점(knee): 동시 학생 {knee}명")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="종단 간 부하 테스트")
+    parser.add_argument("--target", choices=["inproc", "http"], default="inproc")
+    parser.add_argument("--url", default="http://127.0.0.1:7861/app/", help="http 대상의 Gradio 앱 URL")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--students", type=int, default=8, help="수준별 최소 학생 수 (동시성보다 작으면 동시성 수)")
+    parser.add_argument("--answers", type=int, default=150, help="학생당 답하는 문항 수 (전체 미만이면 제출 생략)")
+    parser.add_argument("--chat-turns", type=int, default=2)
+    parser.add_argument("--think-ms", type=float, default=0, help="응답 사이 평균 대기 시간")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--db-pool-size", type=int, help="inproc: DB_POOL_SIZE (SQLite면 SQLITE_POOL_SIZE도 같이 설정)")
+    parser.add_argument("--concurrency-limit", type=int, help="inproc: 제출/채팅 concurrency_limit")
+    parser.add_argument("--database-url", help="inproc: 기본은 임시 SQLite 파일")
+    parser.add_argument("--fake-openai", action="store_true", help="가짜 OpenAI 서버를 띄워 사용 (inproc)")
+    parser.add_argument("--fake-port", type=int, default=18080)
+    parser.add_argument("--fake-latency-ms", type=float, default=800)
+    parser.add_argument("--fake-error-rate", type=float, default=0.0)
+    parser.add_argument("--fake-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    fake = None
+    if args.target == "inproc":
+        # 프로젝트 모듈이 import 시점에 읽는 설정이므로 import 전에 환경변수로 지정합니다.
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmp.name, 'load.db')}"
+        os.environ["ARTIFACT_DIR"] = os.path.join(tmp.name, "artifacts")
+        os.environ.setdefault("REPORT_JOB_UI_POLL", "0.1")
+        os.environ.setdefault("REPORT_JOB_POLL_INTERVAL", "0.2")
+        if args.db_pool_size:
+            os.environ["DB_POOL_SIZE"] = os.environ["SQLITE_POOL_SIZE"] = str(args.db_pool_size)
+        if args.concurrency_limit:
+            os.environ["GRADIO_CONCURRENCY_LIMIT"] = str(args.concurrency_limit)
+        if args.fake_openai:
+            fake = start_fake_openai(args)
+            os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.fake_port}/v1"
+            os.environ["OPENAI_API_KEY"] = "fake"
+    sys.path.insert(0, BASE_DIR)
+
+    try:
+        if args.target == "inproc":
+            import esli_00
+            target = InprocTarget(esli_00.GRADIO_CONCURRENCY_LIMIT)
+        else:
+            from questionnaire import get_question_order
+            target = HttpTarget(args.url, len(get_question_order()))
+
+        async def run_all():
+            results = []
+            for concurrency in args.levels:
+                print(f"동시 학생 {concurrency}명 실행 중...")
+                results.append(await run_level(target, concurrency, args))
+            return results
+
+        results = asyncio.run(run_all())
+        knee = find_knee(results)
+        print_report(results, knee, args)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"knee": knee, "levels": results}, f, ensure_ascii=False, indent=2)
+    finally:
+        if fake is not None:
+            fake.terminate()
+            fake.wait()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
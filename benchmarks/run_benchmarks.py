@@ -0,0 +1,209 @@
+"""
+점수 계산/정규화/보고서 조립 마이크로 벤치마크.
+
+각 항목을 여러 번 실행해 중앙값(ms)을 구하고 benchmarks/baselines.json의 기준값과 비교합니다.
+기준값보다 --threshold(기본 20%) 이상 느려진 항목이 있으면 종료 코드 1로 끝납니다.
+입력은 UI의 '샘플 데이터 채우기'와 같은 questionnaire.sample_answers()로 만들고 시드를 고정합니다.
+DB는 임시 SQLite 파일을 사용하며, 보고서 생성의 LLM 호출(call_llm_for_report)은 고정 문자열로 대체합니다.
+
+사용법:
+    python benchmarks/run_benchmarks.py                    # 기준값과 비교
+    python benchmarks/run_benchmarks.py --update-baseline  # 현재 결과를 기준값으로 저장
+    python benchmarks/run_benchmarks.py --only calculate_scores compute_t_and_percentile
+
+기준값은 측정한 머신에 따라 달라지므로, 같은 머신(또는 같은 CI 러너)에서 갱신/비교해야 합니다.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_THRESHOLD = float(os.getenv("BENCH_REGRESSION_THRESHOLD", "0.2"))
+# 이보다 작은 차이(ms)는 측정 잡음으로 보고 회귀로 판정하지 않습니다.
+MIN_DELTA_MS = float(os.getenv("BENCH_MIN_DELTA_MS", "0.05"))
+SEED = 20240501
+
+
+class Benchmark:
+    def __init__(self, name: str, fn, setup=None, repeat: int = 30, warmup: int = 3):
+        self.name = name
+        self.fn = fn
+        self.setup = setup
+        self.repeat = repeat
+        self.warmup = warmup
+
+    def run(self) -> dict:
+        samples = []
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for i in range(self.warmup + self.repeat):
+                if self.setup:
+                    self.setup()
+                started = time.perf_counter()
+                self.fn()
+                elapsed = (time.perf_counter() - started) * 1000
+                if i >= self.warmup:
+                    samples.append(elapsed)
+        samples.sort()
+        return {
+            "median_ms": round(statistics.median(samples), 4),
+            "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 4),
+            "min_ms": round(samples[0], 4),
+            "runs": len(samples),
+        }
+
+
+def build_benchmarks(tmp_dir: str) -> list:
+    """프로젝트 모듈은 임시 DATABASE_URL을 설정한 뒤에 import합니다."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    sys.path.insert(0, BASE_DIR)
+
+    import database
+    import esli_02
+    from esli_01 import calculate_scores
+    from progress_cache import ProgressCache
+    from questionnaire import sample_answers, ANSWER_OPTIONS
+
+    database.init_db()
+    database.seed_reference_data()
+
+    rng = random.Random(SEED)
+    labels = sample_answers(rng)
+    scored = {q: ANSWER_OPTIONS.index(v) + 1 for q, v in labels.items()}
+    school_level = "중등"
+
+    raw_scores_df = calculate_scores(scored)
+    student_scores = esli_02.compute_student_scores(scored, school_level, raw_scores_df)
+    std_info_df = esli_02.get_std_info_df(school_level)
+    percentile_df = esli_02.get_percentile_df()
+    raw_values = {name: data['raw'] for name, data in student_scores.items()}
+
+    def bench_t_and_percentile():
+        for name, raw in raw_values.items():
+            esli_02.compute_t_and_percentile(raw, name, std_info_df, percentile_df)
+
+    def bench_report_assembly():
+        ctx = esli_02.build_report_prompts("벤치", student_scores)
+        esli_02.render_report_md("벤치", ctx, {k: "코멘트" for k in ctx['prompts']})
+
+    # LLM 호출은 고정 문자열로 대체 (네트워크/과금 없이 파이프라인 자체만 측정)
+    esli_02.call_llm_for_report = lambda prompt, **kwargs: "벤치마크용 LLM 코멘트입니다."
+
+    def bench_generate_report():
+        esli_02.generate_report_with_llm("벤치", scored, school_level, raw_scores_df)
+
+    # 진행상황 저장/복원: esli_00.save_progress/load_progress가 사용하는 캐시 + DB 경로
+    cache = ProgressCache(flush_interval=3600)
+    session_ids = iter(range(10 ** 9))
+    current = {}
+
+    def bench_progress_save():
+        sid = f"bench-{next(session_ids)}"
+        current['sid'] = sid
+        cache.put(sid, "벤치", school_level, labels)
+        cache.flush(sid)
+
+    def bench_progress_load():
+        # 새 캐시로 조회해 DB 읽기 + 응답 복원까지 측정 (캐시 미스 경로)
+        ProgressCache(flush_interval=3600).get(current['sid'])
+
+    reference_tables = [
+        database.ReferenceStandard.__table__,
+        database.ReferencePercentile.__table__,
+        database.ReferenceQuestionMap.__table__,
+    ]
+
+    def reset_reference_tables():
+        database.Base.metadata.drop_all(bind=database.engine, tables=reference_tables)
+        database.Base.metadata.create_all(bind=database.engine, tables=reference_tables)
+
+    return [
+        Benchmark("calculate_scores", lambda: calculate_scores(scored)),
+        Benchmark("compute_t_and_percentile", bench_t_and_percentile, repeat=200),
+        Benchmark("report_assembly", bench_report_assembly, repeat=100),
+        Benchmark("generate_report_with_llm", bench_generate_report),
+        Benchmark("progress_save", bench_progress_save, repeat=50),
+        Benchmark("progress_load", bench_progress_load, repeat=50),
+        Benchmark("seed_reference_data_cold", database.seed_reference_data, setup=reset_reference_tables, repeat=10, warmup=1),
+        Benchmark("seed_reference_data_warm", database.seed_reference_data, repeat=20),
+    ]
+
+
+def load_baseline() -> dict:
+    if not os.path.isfile(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def save_baseline(results: dict):
+    data = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+    with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="점수 계산/보고서 조립 마이크로 벤치마크")
+    parser.add_argument("--only", nargs="*", help="실행할 벤치마크 이름")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="허용 회귀 비율 (0.2 = 20%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="결과를 baselines.json에 저장")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            benchmarks = build_benchmarks(tmp)
+        if args.only:
+            benchmarks = [b for b in benchmarks if b.name in args.only]
+        baseline = load_baseline()
+        results = {}
+        regressions = []
+
+        print(f"{'benchmark':<28} {'median(ms)':>11} {'p95(ms)':>10} {'baseline':>10} {'change':>8}")
+        for bench in benchmarks:
+            result = bench.run()
+            results[bench.name] = result
+            base = baseline.get(bench.name, {}).get("median_ms")
+            change = ""
+            if base:
+                ratio = result["median_ms"] / base - 1
+                change = f"{ratio * 100:+.1f}%"
+                if ratio > args.threshold and result["median_ms"] - base > MIN_DELTA_MS:
+                    regressions.append(bench.name)
+                    change += " !"
+            print(f"{bench.name:<28} {result['median_ms']:>11.3f} {result['p95_ms']:>10.3f} "
+                  f"{(f'{base:.3f}' if base else '-'):>10} {change:>8}")
+
+        # 임시 DB 파일을 지우기 전에 커넥션을 닫습니다.
+        import database
+        database.engine.dispose()
+
+    if args.update_baseline:
+        merged = {**baseline, **results}
+        save_baseline(merged)
+        print(f"기준값을 저장했습니다: {BASELINE_PATH}")
+        return 0
+    if regressions:
+        print(f"성능 회귀 ({args.threshold * 100:.0f}% 초과): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
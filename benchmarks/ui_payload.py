@@ -0,0 +1,53 @@
+"""
+검사 화면 초기 페이로드 비교 (SURVEY_UI_MODE=full / wizard).
+
+create_final_survey()로 두 방식의 화면을 만들고, 브라우저가 첫 접속 때 받는 Gradio 설정(config)의
+JSON 크기와 컴포넌트 수, 이벤트 한 번에 서버로 보내는 입력 수(최대)를 출력합니다.
+첫 상호작용 시간(time-to-interactive)은 브라우저 개발자 도구의 Performance 탭에서
+/app 첫 로드를 기록해 비교합니다 (같은 방식으로 SURVEY_UI_MODE만 바꿔 서버를 띄움).
+
+사용법:
+    python benchmarks/ui_payload.py
+    python benchmarks/ui_payload.py --modes wizard
+"""
+import os
+import sys
+import json
+import argparse
+import contextlib
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(mode: str) -> dict:
+    import esli_00
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        demo = esli_00.create_final_survey(mode)
+    config = demo.get_config_file()
+    dependencies = config.get("dependencies", [])
+    return {
+        "mode": mode,
+        "config_bytes": len(json.dumps(config, ensure_ascii=False).encode("utf-8")),
+        "components": len(config.get("components", [])),
+        "radios": sum(1 for c in config.get("components", []) if c.get("type") == "radio"),
+        "events": len(dependencies),
+        "max_event_inputs": max((len(d.get("inputs", [])) for d in dependencies), default=0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="검사 화면 초기 페이로드 비교")
+    parser.add_argument("--modes", nargs="*", default=["full", "wizard"])
+    args = parser.parse_args()
+    sys.path.insert(0, BASE_DIR)
+
+    print(f"{'mode':<8} {'config(KB)':>11} {'components':>11} {'radios':>7} {'events':>7} {'max inputs':>11}")
+    for mode in args.modes:
+        r = measure(mode)
+        print(f"{r['mode']:<8} {r['config_bytes'] / 1024:>11.1f} {r['components']:>11} {r['radios']:>7} "
+              f"{r['events']:>7} {r['max_event_inputs']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+학교급 × 항목 × 기간(월)별 점수 분포 집계.
+
+검사 결과를 저장하는 트랜잭션에서 record_cohort_scores()가 함께 호출되어
+cohort_aggregates(건수, T/원점수 합계와 제곱합)와 cohort_t_histogram(T점수별 건수)을 더해 갑니다.
+분포/백분위 순위 조회는 이 두 테이블만 읽으므로 응답 수와 무관하게 일정한 시간에 끝납니다
+(기간 수 × T점수 칸 수(최대 201)에만 비례).
+
+기존 응답에서 다시 만들기:
+    python cohort_stats.py backfill
+"""
+import json
+import math
+import argparse
+from datetime import datetime
+from typing import Optional, List
+
+import pandas as pd
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import case, delete, func
+
+from admin import require_admin
+from database import (
+    SessionLocal,
+    SurveyResponse,
+    CohortAggregate,
+    CohortHistogram,
+    upsert_increment_rows,
+)
+
+UNKNOWN_LEVEL = "미지정"  # school_level 컬럼이 생기기 전에 저장된 응답
+BACKFILL_BATCH = 2000
+
+
+def period_of(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y-%m")
+
+
+def _cohort_rows(school_level: Optional[str], student_scores: dict, timestamp: datetime):
+    level = school_level or UNKNOWN_LEVEL
+    period = period_of(timestamp)
+    aggregates, histogram = [], []
+    for category, data in student_scores.items():
+        t, raw = data.get('t_score'), data.get('raw')
+        if t is None or raw is None:
+            continue
+        aggregates.append({
+            "level": level, "category": category, "period": period, "count": 1,
+            "sum_t": float(t), "sumsq_t": float(t) ** 2, "sum_raw": float(raw), "sumsq_raw": float(raw) ** 2,
+        })
+        histogram.append({"level": level, "category": category, "period": period, "t_score": int(t), "count": 1})
+    return aggregates, histogram
+
+
+def record_cohort_scores(db, school_level: Optional[str], student_scores: dict, timestamp: Optional[datetime] = None):
+    """
+    한 학생의 항목별 점수를 집계 테이블에 더합니다. 커밋은 호출자가 결과 저장과 함께 수행합니다.
+    (AsyncSession에서는 await db.run_sync(record_cohort_scores, ...)로 호출)
+    """
+    aggregates, histogram = _cohort_rows(school_level, student_scores, timestamp or datetime.now())
+    upsert_increment_rows(db, CohortAggregate, aggregates, ["level", "category", "period"])
+    upsert_increment_rows(db, CohortHistogram, histogram, ["level", "category", "period", "t_score"])
+
+
+# --------------------
+# 조회
+# --------------------
+def _period_filter(query, model, periods: Optional[List[str]]):
+    return query.filter(model.period.in_(periods)) if periods else query
+
+
+def _std(count: int, total: float, sumsq: float) -> Optional[float]:
+    if count < 2:
+        return None
+    variance = (sumsq - total * total / count) / (count - 1)
+    return math.sqrt(max(variance, 0.0))
+
+
+def query_distribution(level: str, category: str, periods: Optional[List[str]] = None) -> dict:
+    """건수/평균/표준편차와 T점수 히스토그램을 반환합니다. periods가 없으면 전체 기간."""
+    db = SessionLocal()
+    try:
+        count, sum_t, sumsq_t, sum_raw, sumsq_raw = _period_filter(
+            db.query(func.sum(CohortAggregate.count), func.sum(CohortAggregate.sum_t), func.sum(CohortAggregate.sumsq_t),
+                     func.sum(CohortAggregate.sum_raw), func.sum(CohortAggregate.sumsq_raw))
+            .filter(CohortAggregate.level == level, CohortAggregate.category == category),
+            CohortAggregate, periods,
+        ).one()
+        buckets = _period_filter(
+            db.query(CohortHistogram.t_score, func.sum(CohortHistogram.count))
+            .filter(CohortHistogram.level == level, CohortHistogram.category == category),
+            CohortHistogram, periods,
+        ).group_by(CohortHistogram.t_score).order_by(CohortHistogram.t_score).all()
+    finally:
+        db.close()
+    count = int(count or 0)
+    return {
+        "level": level,
+        "category": category,
+        "periods": periods or "all",
+        "count": count,
+        "mean_t": round(sum_t / count, 3) if count else None,
+        "std_t": _std(count, sum_t or 0.0, sumsq_t or 0.0),
+        "mean_raw": round(sum_raw / count, 3) if count else None,
+        "std_raw": _std(count, sum_raw or 0.0, sumsq_raw or 0.0),
+        "histogram": {int(t): int(n) for t, n in buckets},
+    }
+
+
+def percentile_rank(level: str, category: str, t_score: float, periods: Optional[List[str]] = None) -> Optional[float]:
+    """
+    집계된 학생들 중 t_score의 백분위 순위(0~100)를 반환합니다. 같은 점수는 절반만 아래로 셉니다.
+    집계가 없으면 None.
+    """
+    db = SessionLocal()
+    try:
+        below, equal, total = _period_filter(
+            db.query(
+                func.sum(case((CohortHistogram.t_score < t_score, CohortHistogram.count), else_=0)),
+                func.sum(case((CohortHistogram.t_score == t_score, CohortHistogram.count), else_=0)),
+                func.sum(CohortHistogram.count),
+            ).filter(CohortHistogram.level == level, CohortHistogram.category == category),
+            CohortHistogram, periods,
+        ).one()
+    finally:
+        db.close()
+    if not total:
+        return None
+    return round(100.0 * ((below or 0) + 0.5 * (equal or 0)) / total, 2)
+
+
+# --------------------
+# 백필
+# --------------------
+def _score_frame(rows) -> pd.DataFrame:
+    """(timestamp, school_level, scores_json) 행들을 항목별 긴 형식 DataFrame으로 펼칩니다."""
+    records = []
+    for timestamp, level, scores_json in rows:
+        try:
+            scores = json.loads(scores_json) if scores_json else {}
+        except (TypeError, ValueError):
+            continue
+        period = period_of(timestamp) if timestamp else "unknown"
+        for category, data in scores.items():
+            if isinstance(data, dict) and data.get('t_score') is not None and data.get('raw') is not None:
+                records.append((level or UNKNOWN_LEVEL, category, period, data['t_score'], data['raw']))
+    return pd.DataFrame.from_records(records, columns=["level", "category", "period", "t", "raw"])
+
+
+def backfill(batch_size: int = BACKFILL_BATCH) -> int:
+    """
+    survey_responses 전체에서 집계 테이블을 다시 만듭니다 (기존 집계는 지우고 한 트랜잭션으로 교체).
+    scores_json만 id 순서로 나눠 읽고, 합계/제곱합/히스토그램은 pandas groupby로 한 번에 계산합니다.
+    새 결과 저장과 겹치면 그 결과가 빠질 수 있으므로 트래픽이 없을 때 실행하세요.
+    """
+    db = SessionLocal()
+    try:
+        frames = []
+        last_id = 0
+        responses = 0
+        while True:
+            batch = (
+                db.query(SurveyResponse.id, SurveyResponse.timestamp, SurveyResponse.school_level, SurveyResponse.scores_json)
+                .filter(SurveyResponse.id > last_id)
+                .order_by(SurveyResponse.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            responses += len(batch)
+            frames.append(_score_frame([row[1:] for row in batch]))
+        df = pd.concat(frames, ignore_index=True) if frames else _score_frame([])
+        df["t"] = df["t"].astype(float)
+        df["raw"] = df["raw"].astype(float)
+
+        keys = ["level", "category", "period"]
+        df["t2"] = df["t"] ** 2
+        df["raw2"] = df["raw"] ** 2
+        agg = df.groupby(keys).agg(count=("t", "size"), sum_t=("t", "sum"), sumsq_t=("t2", "sum"),
+                                   sum_raw=("raw", "sum"), sumsq_raw=("raw2", "sum")).reset_index()
+        hist = (
+            df.assign(t_score=df["t"].astype(int))
+            .groupby(keys + ["t_score"]).size().rename("count").reset_index()
+        )
+
+        db.execute(delete(CohortAggregate))
+        db.execute(delete(CohortHistogram))
+        agg_rows = [{k: (v.item() if hasattr(v, "item") else v) for k, v in row.items()} for row in agg.to_dict("records")]
+        hist_rows = [{k: (v.item() if hasattr(v, "item") else v) for k, v in row.items()} for row in hist.to_dict("records")]
+        for start in range(0, len(agg_rows), 500):
+            db.bulk_insert_mappings(CohortAggregate, agg_rows[start:start + 500])
+        for start in range(0, len(hist_rows), 500):
+            db.bulk_insert_mappings(CohortHistogram, hist_rows[start:start + 500])
+        db.commit()
+        print(f"코호트 집계 백필 완료: 응답 {responses}건, 집계 {len(agg_rows)}행, 히스토그램 {len(hist_rows)}행")
+        return len(agg_rows)
+    except Exception as e:
+        db.rollback()
+        print(f"코호트 집계 백필 중 오류: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def create_router() -> APIRouter:
+    router = APIRouter(dependencies=[Depends(require_admin)])
+
+    def _periods(period: Optional[str]) -> Optional[List[str]]:
+        return [p.strip() for p in period.split(",") if p.strip()] if period else None
+
+    @router.get("/admin/cohorts/distribution")
+    def distribution(level: str, category: str, period: Optional[str] = None):
+        """period: YYYY-MM을 쉼표로 나열 (생략 시 전체 기간)"""
+        return query_distribution(level, category, _periods(period))
+
+    @router.get("/admin/cohorts/percentile-rank")
+    def rank(level: str, category: str, t_score: float, period: Optional[str] = None):
+        value = percentile_rank(level, category, t_score, _periods(period))
+        if value is None:
+            raise HTTPException(status_code=404, detail="해당 구분의 집계가 없습니다.")
+        return {"level": level, "category": category, "t_score": t_score, "percentile_rank": value}
+
+    return router
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="코호트 점수 집계")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH)
+    args = parser.parse_args()
+    from database import init_db
+    init_db()
+    backfill(args.batch_size)
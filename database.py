@@ -1,9 +1,17 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, JSON, Float
+import json
+import time
+import random
+import asyncio
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, DateTime, JSON, Float, Boolean, UniqueConstraint, inspect, text
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import NullPool, QueuePool, AsyncAdaptedQueuePool
 from datetime import datetime
 from dotenv import load_dotenv
-from esli_01 import get_calculations_definitions
+from background import after_fork
+from questionnaire import QUESTION_TEXTS, QUESTION_IDS, get_registry
+from metrics import observe_pool_wait, observe_pool_timeout, observe_pool_event, POOL_CAPACITY
 import pandas as pd
 
 load_dotenv()
@@ -12,6 +20,15 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./learning_assessment.db")
 DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
 DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "0"))
 
+# SQLite 운영 프로파일 (WAL + busy_timeout + 커넥션 풀 + 짧은 쓰기 재시도)
+DB_SQLITE_PROFILE = os.getenv("DB_SQLITE_PROFILE", "true").lower() == "true"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "5"))
+SQLITE_MAX_OVERFLOW = int(os.getenv("SQLITE_MAX_OVERFLOW", "10"))
+DB_WRITE_RETRIES = int(os.getenv("DB_WRITE_RETRIES", "3" if DB_SQLITE_PROFILE else "0"))
+DB_WRITE_RETRY_BACKOFF = float(os.getenv("DB_WRITE_RETRY_BACKOFF", "0.05"))
+
 Base = declarative_base()
 
 class SurveyResponse(Base):
@@ -19,6 +36,7 @@ class SurveyResponse(Base):
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.now)
     student_name = Column(String, index=True, nullable=True)
+    school_level = Column(String, index=True, nullable=True)  # 초등/중등/고등 (이전 행은 NULL)
     responses_json = Column(Text, nullable=False)
     scores_json = Column(Text, nullable=True)
     report_content = Column(Text, nullable=True)
@@ -30,12 +48,113 @@ class LLMLog(Base):
     interaction_type = Column(String, nullable=False)
     input_data = Column(Text, nullable=False)
     output_data = Column(Text, nullable=False)
+    # LLM 호출 계량 (입력 로그 등 호출이 없는 행은 NULL)
+    model = Column(String, nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    total_tokens = Column(Integer, nullable=True)
+    latency_ms = Column(Float, nullable=True)        # 재시도 포함 전체 소요 시간
+    attempts = Column(Integer, nullable=True)        # 1 = 재시도 없음
+    cost_usd = Column(Float, nullable=True)          # LLM_PRICES 기준 추정 비용
+    ok = Column(Boolean, nullable=True)
+    status_code = Column(Integer, nullable=True)     # 실패 시 HTTP 상태 코드
+
+
+# llm_logs 시간별 집계 (llm_usage.py의 롤업 작업이 갱신)
+class LLMUsageRollup(Base):
+    __tablename__ = "llm_usage_rollups"
+    __table_args__ = (UniqueConstraint("hour", "interaction_type", "model", name="uq_llm_usage_rollup"),)
+    id = Column(Integer, primary_key=True, index=True)
+    hour = Column(DateTime, index=True, nullable=False)        # 정시로 내림한 시각
+    interaction_type = Column(String, nullable=False)
+    model = Column(String, nullable=False, default="")
+    calls = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    retries = Column(Integer, nullable=False, default=0)        # attempts - 1 의 합
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    cost_usd = Column(Float, nullable=False, default=0.0)
+    latency_ms_sum = Column(Float, nullable=False, default=0.0)
+    latency_ms_max = Column(Float, nullable=False, default=0.0)
+
+
+# 롤업 진행 위치 (마지막으로 집계한 llm_logs.id, 단일 행)
+class LLMUsageRollupState(Base):
+    __tablename__ = "llm_usage_rollup_state"
+    id = Column(Integer, primary_key=True)
+    last_log_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+# 학교급 × 항목 × 기간(월)별 점수 누적 합계 (cohort_stats.py가 결과 저장 시 함께 갱신)
+class CohortAggregate(Base):
+    __tablename__ = "cohort_aggregates"
+    __table_args__ = (UniqueConstraint("level", "category", "period", name="uq_cohort_aggregate"),)
+    id = Column(Integer, primary_key=True, index=True)
+    level = Column(String, nullable=False)
+    category = Column(String, nullable=False)
+    period = Column(String, nullable=False)            # YYYY-MM
+    count = Column(Integer, nullable=False, default=0)
+    sum_t = Column(Float, nullable=False, default=0.0)
+    sumsq_t = Column(Float, nullable=False, default=0.0)
+    sum_raw = Column(Float, nullable=False, default=0.0)
+    sumsq_raw = Column(Float, nullable=False, default=0.0)
+
+
+# 같은 구분의 T점수 분포 (T는 0~200 정수이므로 점수별 1칸)
+class CohortHistogram(Base):
+    __tablename__ = "cohort_t_histogram"
+    __table_args__ = (UniqueConstraint("level", "category", "period", "t_score", name="uq_cohort_histogram"),)
+    id = Column(Integer, primary_key=True, index=True)
+    level = Column(String, nullable=False)
+    category = Column(String, nullable=False)
+    period = Column(String, nullable=False)
+    t_score = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+# 학교급 × 항목별 원점수 이동 통계 (Welford: 건수/평균/편차제곱합, norms.py가 결과 저장 시 갱신)
+class NormEstimate(Base):
+    __tablename__ = "norm_estimates"
+    __table_args__ = (UniqueConstraint("level", "name", name="uq_norm_estimate"),)
+    id = Column(Integer, primary_key=True, index=True)
+    level = Column(String, nullable=False)
+    name = Column(String, nullable=False)               # 항목명 (reference_standards.name과 같음)
+    count = Column(Integer, nullable=False, default=0)
+    mean = Column(Float, nullable=False, default=0.0)
+    m2 = Column(Float, nullable=False, default=0.0)    # 편차 제곱합 (분산 = m2 / (count - 1))
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+# 규준 스냅샷 (버전). active=True인 스냅샷이 reference_standards 대신 T점수 계산에 쓰입니다.
+class NormSnapshot(Base):
+    __tablename__ = "norm_snapshots"
+    version = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.now)
+    promoted_at = Column(DateTime, nullable=True)
+    active = Column(Boolean, nullable=False, default=False, index=True)
+    min_count = Column(Integer, nullable=False)
+    note = Column(String, nullable=True)
+
+
+class NormSnapshotValue(Base):
+    __tablename__ = "norm_snapshot_values"
+    __table_args__ = (UniqueConstraint("version", "level", "name", name="uq_norm_snapshot_value"),)
+    id = Column(Integer, primary_key=True, index=True)
+    version = Column(Integer, index=True, nullable=False)
+    level = Column(String, nullable=False)
+    name = Column(String, nullable=False)
+    mean = Column(Float, nullable=False)
+    std = Column(Float, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    source = Column(String, nullable=False)             # live(이동 통계) / shipped(표본 부족으로 기존 기준표 유지)
 
 # 검사 진행상황 임시 저장
 class SurveyProgress(Base):
     __tablename__ = "survey_progress"
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String, index=True, nullable=False)  # 세션 식별자
+    session_id = Column(String, index=True, unique=True, nullable=False)  # 세션 식별자 (upsert 충돌 키)
     student_name = Column(String, nullable=True)  # 학생 이름 (입력된 경우)
     school_level = Column(String, nullable=True)  # 학교급
     progress_data = Column(Text, nullable=False)  # JSON 형태의 진행상황
@@ -43,6 +162,26 @@ class SurveyProgress(Base):
     completed = Column(Integer, default=0)  # 완료된 문항 수
     total_questions = Column(Integer, default=150)  # 전체 문항 수
 
+
+class ReportJob(Base):
+    __tablename__ = "report_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, unique=True, index=True, nullable=False)           # 외부 노출용 작업 ID
+    idempotency_key = Column(String, unique=True, index=True, nullable=False)  # 세션+응답 해시 (중복 제출 방지)
+    session_id = Column(String, index=True, nullable=True)
+    student_name = Column(String, nullable=False)
+    school_level = Column(String, nullable=False)
+    responses_json = Column(Text, nullable=False)        # answer_codec 형식의 응답
+    status = Column(String, index=True, nullable=False, default="queued")  # queued/running/done/failed
+    attempts = Column(Integer, default=0)
+    worker_id = Column(String, nullable=True)             # 현재 작업을 점유한 워커
+    lease_until = Column(DateTime, nullable=True)         # 점유 만료 시각 (지나면 다른 워커가 재시도)
+    response_id = Column(Integer, nullable=True)          # 완료 시 survey_responses.id
+    report_content = Column(Text, nullable=True)          # 완료된 보고서 (DB 저장 실패 안내 포함 가능)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
 # 참조 데이터 (표준점수 평균/표준편차)
 class ReferenceStandard(Base):
     __tablename__ = "reference_standards"
@@ -75,26 +214,411 @@ class ReferenceQuestionUnmapped(Base):
     last_seen = Column(DateTime, default=datetime.now)
 
 # 엔진 생성 (SQLite와 기타 DB의 풀 설정 분기)
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL)
-else:
-    engine = create_engine(
-        DATABASE_URL,
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """SQLite 커넥션마다 WAL/동기화/대기시간 PRAGMA를 설정합니다."""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    finally:
+        cursor.close()
+
+
+class _TimedPoolMixin:
+    """
+    커넥션 체크아웃 대기 시간을 재는 풀.
+    SQLAlchemy 풀 이벤트에는 '대기 시작' 시점이 없으므로 _do_get을 감싸 측정하고,
+    사용 중/체크아웃 개수는 _instrument_pool의 풀 이벤트로 집계합니다.
+    (engine.dispose()가 풀을 다시 만들 때도 같은 클래스가 유지됩니다)
+    """
+    metrics_label = "sync"
+
+    def _do_get(self):
+        # max_overflow=-1(무제한)이 아니고 모든 커넥션이 사용 중이면 반납을 기다려야 함
+        exhausted = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            observe_pool_timeout(self.metrics_label)
+            raise
+        observe_pool_wait(self.metrics_label, time.perf_counter() - started, exhausted)
+        return connection
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    metrics_label = "sync"
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+def _instrument_pool(target_engine, label: str):
+    """풀 이벤트(checkout/checkin/connect/invalidate)를 /metrics 지표로 연결합니다."""
+    for event_name in ("checkout", "checkin", "connect", "invalidate"):
+        event.listen(target_engine, event_name,
+                     lambda *args, _name=event_name: observe_pool_event(label, _name))
+    pool = target_engine.pool
+    if isinstance(pool, QueuePool):
+        POOL_CAPACITY.set(pool.size() + max(pool._max_overflow, 0), engine=label)
+
+
+def create_db_engine(url: str = DATABASE_URL, sqlite_profile: bool = DB_SQLITE_PROFILE):
+    """DATABASE_URL 종류에 맞는 엔진을 생성합니다. (벤치마크 등에서 프로파일을 바꿔 재사용)"""
+    if url.startswith("sqlite"):
+        if not sqlite_profile:
+            return create_engine(url)
+        in_memory = url in ("sqlite://", "sqlite:///:memory:")
+        sqlite_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            **({} if in_memory else {
+                "poolclass": TimedQueuePool,
+                "pool_size": SQLITE_POOL_SIZE,
+                "max_overflow": SQLITE_MAX_OVERFLOW,
+                "pool_timeout": 30,
+            }),
+        )
+        if not in_memory:
+            event.listen(sqlite_engine, "connect", _apply_sqlite_pragmas)
+        return sqlite_engine
+    return create_engine(
+        url,
+        poolclass=TimedQueuePool,
         pool_size=DB_POOL_SIZE,
         max_overflow=DB_MAX_OVERFLOW,
         pool_pre_ping=True,
         pool_timeout=30,
     )
+
+
+engine = create_db_engine()
+_instrument_pool(engine, "sync")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+# --------------------
+# 비동기 엔진/세션 (Gradio async 핸들러용, CLI는 위의 동기 SessionLocal 사용)
+# --------------------
+def _to_async_url(url: str) -> str:
+    """동기 DATABASE_URL을 비동기 드라이버(asyncpg/aiosqlite) URL로 변환합니다."""
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            # asyncpg는 sslmode 대신 ssl 파라미터를 사용
+            return "postgresql+asyncpg://" + url[len(prefix):].replace("sslmode=", "ssl=")
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _to_async_url(DATABASE_URL)
+_async_engine = None
+_AsyncSessionLocal = None
+
+
+def get_async_session_factory():
+    """비동기 세션 팩토리를 (처음 호출 시) 생성해 반환합니다."""
+    global _async_engine, _AsyncSessionLocal
+    if _AsyncSessionLocal is not None:
+        return _AsyncSessionLocal
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    if ASYNC_DATABASE_URL.startswith("sqlite"):
+        # aiosqlite 커넥션은 각각 비-데몬 스레드를 가지므로 풀에 쌓아두지 않고 사용 후 바로 닫습니다.
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            poolclass=NullPool,
+            connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        )
+        if DB_SQLITE_PROFILE:
+            event.listen(_async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    else:
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            poolclass=TimedAsyncQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_timeout=30,
+        )
+    _instrument_pool(_async_engine.sync_engine, "async")
+    _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _AsyncSessionLocal
+
+
+async def dispose_async_engine():
+    """비동기 엔진의 커넥션 풀을 정리합니다(종료 시 호출)."""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _AsyncSessionLocal = None
+
+def _reset_engines_after_fork():
+    """
+    fork된 자식 프로세스에서 부모의 커넥션을 공유하지 않도록 풀을 비웁니다.
+    (close=False: 부모가 쓰는 소켓/파일을 자식이 닫지 않도록 버리기만 함)
+    """
+    global _async_engine, _AsyncSessionLocal
+    engine.dispose(close=False)
+    if _async_engine is not None:
+        _async_engine.sync_engine.dispose(close=False)
+    _async_engine = None
+    _AsyncSessionLocal = None
+    # metrics의 fork 훅이 먼저 값을 비우므로(이 모듈이 metrics를 import한 뒤 등록) 풀 용량을 다시 기록합니다.
+    # 비동기 엔진은 자식에서 다시 만들 때 _instrument_pool이 기록합니다.
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        POOL_CAPACITY.set(pool.size() + max(pool._max_overflow, 0), engine="sync")
+
+
+after_fork(_reset_engines_after_fork)
+
+
+def _is_locked_error(e: Exception) -> bool:
+    message = str(getattr(e, "orig", e)).lower()
+    return "database is locked" in message or "database table is locked" in message
+
+
+def commit_with_retry(db, apply, retries: int = None):
+    """
+    apply(db)로 변경을 스테이징하고 커밋합니다.
+    SQLite 잠금 오류(database is locked)는 짧은 지수 백오프 후 재시도하고, 그 외 오류는 그대로 올립니다.
+    """
+    retries = DB_WRITE_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            apply(db)
+            db.commit()
+            return
+        except OperationalError as e:
+            db.rollback()
+            if attempt >= retries or not _is_locked_error(e):
+                raise
+            time.sleep(DB_WRITE_RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+async def commit_with_retry_async(db, apply, retries: int = None):
+    """commit_with_retry의 비동기 버전 (AsyncSession용). apply는 코루틴을 반환해도 됩니다."""
+    retries = DB_WRITE_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            staged = apply(db)
+            if asyncio.iscoroutine(staged):
+                await staged
+            await db.commit()
+            return
+        except OperationalError as e:
+            await db.rollback()
+            if attempt >= retries or not _is_locked_error(e):
+                raise
+            await asyncio.sleep(DB_WRITE_RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def log_llm_interaction_db(db, interaction_type: str, input_data: dict, output_data: str,
+                           usage: dict = None) -> bool:
+    """
+    LLM 상호작용을 데이터베이스에 로그로 남깁니다. 저장 성공 여부를 반환합니다.
+    usage는 계량 컬럼 값입니다 (llm_usage.accounting_fields(result)로 만듭니다).
+    """
+    try:
+        new_log = LLMLog(
+            interaction_type=interaction_type,
+            input_data=json.dumps(input_data, ensure_ascii=False),
+            output_data=output_data,
+            **(usage or {})
+        )
+        commit_with_retry(db, lambda s: s.add(new_log))
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"--- [오류] LLM 로그 DB 저장 실패: {e} ---")
+        return False
+
+
+async def log_llm_interaction_db_async(interaction_type: str, input_data: dict, output_data: str,
+                                       usage: dict = None) -> bool:
+    """log_llm_interaction_db의 비동기 버전. 자체 AsyncSession을 열어 저장합니다."""
+    try:
+        async with get_async_session_factory()() as db:
+            new_log = LLMLog(
+                interaction_type=interaction_type,
+                input_data=json.dumps(input_data, ensure_ascii=False),
+                output_data=output_data,
+                **(usage or {})
+            )
+            await commit_with_retry_async(db, lambda s: s.add(new_log))
+            return True
+    except Exception as e:
+        print(f"--- [오류] LLM 로그 DB 저장 실패: {e} ---")
+        return False
+
+
 def init_db():
     try:
         Base.metadata.create_all(bind=engine)
+        _ensure_progress_session_unique()
+        _ensure_added_columns(SurveyResponse)
+        _ensure_added_columns(LLMLog)
         print("데이터베이스 테이블이 생성되었습니다.")
     except Exception as e:
         print(f"데이터베이스 연결 실패: {e}")
 
 
+def _ensure_progress_session_unique():
+    """
+    기존 DB의 survey_progress.session_id 인덱스를 UNIQUE로 보정합니다.
+    (create_all은 기존 테이블의 인덱스를 바꾸지 않으므로, ON CONFLICT upsert를 위해 별도로 맞춰줍니다)
+    중복 세션 행이 있으면 가장 최근(id 최대) 행만 남깁니다.
+    """
+    index_name = "ix_survey_progress_session_id"
+    indexes = inspect(engine).get_indexes(SurveyProgress.__tablename__)
+    if any(ix.get("unique") and ix.get("column_names") == ["session_id"] for ix in indexes):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "DELETE FROM survey_progress WHERE id NOT IN "
+            "(SELECT MAX(id) FROM survey_progress GROUP BY session_id)"
+        ))
+        if any(ix.get("name") == index_name for ix in indexes):
+            conn.execute(text(f"DROP INDEX {index_name}"))
+        conn.execute(text(f"CREATE UNIQUE INDEX {index_name} ON survey_progress (session_id)"))
+    print("survey_progress.session_id UNIQUE 인덱스 보정 완료")
+
+
+def _ensure_added_columns(model):
+    """
+    기존 DB 테이블에 나중에 추가된 nullable 컬럼을 보정합니다.
+    (예: llm_logs의 계량 컬럼, survey_responses.school_level)
+    create_all은 기존 테이블에 컬럼을 추가하지 않으므로 빠진 컬럼만 ALTER TABLE로 추가합니다.
+    """
+    table = model.__table__
+    existing = {col["name"] for col in inspect(engine).get_columns(table.name)}
+    missing = [col for col in table.columns if col.name not in existing]
+    if not missing:
+        return
+    with engine.begin() as conn:
+        for col in missing:
+            col_type = col.type.compile(dialect=engine.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}"))
+            if col.index:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table.name}_{col.name} ON {table.name} ({col.name})"))
+    print(f"{table.name} 컬럼 추가 완료: {', '.join(col.name for col in missing)}")
+
+
+def upsert_progress_rows(db, rows: list[dict]):
+    """
+    진행상황 여러 건을 단일 INSERT ... ON CONFLICT(session_id) DO UPDATE 문으로 저장합니다.
+    rows의 각 항목은 SurveyProgress 컬럼명을 키로 가집니다. 커밋은 호출자가 수행합니다.
+    DB에 이미 더 최근(last_updated가 더 늦은) 행이 있으면 덮어쓰지 않습니다.
+    주기 플러시와 제출 시점 플러시가 겹쳐 늦게 커밋된 쪽이 옛 값을 쓰는 경우를 막습니다.
+    """
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        # ON CONFLICT 미지원 DB: 행 단위 merge로 대체
+        for row in rows:
+            existing = db.query(SurveyProgress).filter(SurveyProgress.session_id == row["session_id"]).first()
+            if existing:
+                if existing.last_updated and row.get("last_updated") and existing.last_updated > row["last_updated"]:
+                    continue
+                for key, value in row.items():
+                    setattr(existing, key, value)
+            else:
+                db.add(SurveyProgress(**row))
+        return
+    stmt = insert(SurveyProgress).values(rows)
+    update_cols = {key: stmt.excluded[key] for key in rows[0].keys() if key != "session_id"}
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SurveyProgress.session_id],
+        set_=update_cols,
+        where=SurveyProgress.last_updated <= stmt.excluded.last_updated,
+    )
+    db.execute(stmt)
+
+
+def upsert_increment_rows(db, model, rows: list[dict], key_columns: list[str]):
+    """
+    key_columns가 같은 행이 있으면 나머지 컬럼 값을 더하고, 없으면 새로 넣습니다 (카운터/합계 테이블용).
+    PostgreSQL/SQLite는 단일 INSERT ... ON CONFLICT DO UPDATE 문으로 처리합니다. 커밋은 호출자가 수행합니다.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    value_columns = [key for key in rows[0].keys() if key not in key_columns]
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for row in rows:
+            existing = db.query(model).filter_by(**{key: row[key] for key in key_columns}).first()
+            if existing:
+                for key in value_columns:
+                    setattr(existing, key, (getattr(existing, key) or 0) + row[key])
+            else:
+                db.add(model(**row))
+        return
+    # 값은 executemany 파라미터로 넘겨 문장 컴파일 결과가 캐시되게 합니다 (.values(rows)는 매번 새로 컴파일).
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c[key] for key in key_columns],
+        set_={key: table.c[key] + stmt.excluded[key] for key in value_columns},
+    )
+    db.execute(stmt, rows)
+
+
+def upsert_welford_rows(db, model, rows: list[dict], key_columns: list[str]):
+    """
+    (count, mean, m2) 통계를 기존 행과 병합합니다 (Chan 등의 병렬 Welford 결합식).
+    새 관측 하나는 {count: 1, mean: x, m2: 0}으로 넘기면 됩니다. SET 절의 오른쪽은 모두 갱신 전 값을 보므로
+    한 문장으로 원자적으로 갱신되어 여러 워커가 동시에 더해도 안전합니다. 커밋은 호출자가 수행합니다.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for row in rows:
+            existing = db.query(model).filter_by(**{key: row[key] for key in key_columns}).first()
+            if existing is None:
+                db.add(model(**row))
+                continue
+            total = existing.count + row["count"]
+            delta = row["mean"] - existing.mean
+            existing.m2 = existing.m2 + row["m2"] + delta * delta * existing.count * row["count"] / total
+            existing.mean = existing.mean + delta * row["count"] / total
+            existing.count = total
+        return
+    stmt = insert(table)
+    c, ex = table.c, stmt.excluded
+    total = c["count"] + ex["count"]
+    delta = ex["mean"] - c["mean"]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[c[key] for key in key_columns],
+        set_={
+            "count": total,
+            # 정수 나눗셈이 되지 않도록 실수 항을 앞에 둡니다.
+            "mean": c["mean"] + delta * ex["count"] / total,
+            "m2": c["m2"] + ex["m2"] + delta * delta * c["count"] * ex["count"] / total,
+            "updated_at": datetime.now(),
+        },
+    )
+    db.execute(stmt, rows)
+
+
 def seed_reference_data():
     """
     프로젝트의 refer/ 폴더에 있는 참조 CSV들을 읽어 DB에 저장합니다.
@@ -169,25 +693,25 @@ def seed_reference_data():
                 print(f"파일 없음(백분위점수): {pct_path}")
 
         # 질문→항목 매핑 시드 (정확 문항 텍스트 전수 입력, 항상 보정 수행)
+        # 한 문항이 여러 항목에 속할 수 있으므로 (문항, 항목) 쌍 단위로 맞춥니다.
         try:
-            calc = get_calculations_definitions()
-            # 기존 패턴 로드
-            existing = {row.pattern: row for row in session.query(ReferenceQuestionMap).all()}
+            registry = get_registry()
+            wanted = [(QUESTION_TEXTS[qid], name) for name, qids in registry.category_members() for qid in qids]
+            wanted_set = set(wanted)
+            existing = {}
             upserted = 0
-            for key, cfg in calc.items():
-                cols = cfg.get('cols', [])
-                # 이제 모든 키가 표준 항목명이므로 직접 사용
-                std_name = key
-                for question in cols:
-                    q = str(question)
-                    if q in existing:
-                        row = existing[q]
-                        if row.standard_name != std_name:
-                            row.standard_name = std_name
-                            upserted += 1
-                    else:
-                        session.add(ReferenceQuestionMap(pattern=q, standard_name=std_name))
-                        upserted += 1
+            for row in session.query(ReferenceQuestionMap).order_by(ReferenceQuestionMap.id).all():
+                pair = (row.pattern, row.standard_name)
+                if pair in wanted_set and pair not in existing:
+                    existing[pair] = row
+                elif row.pattern in QUESTION_IDS:
+                    # 항목 정의와 맞지 않거나 중복된 문항 매핑 (정의 밖의 키워드 패턴은 그대로 둠)
+                    session.delete(row)
+                    upserted += 1
+            for pattern, std_name in wanted:
+                if (pattern, std_name) not in existing:
+                    session.add(ReferenceQuestionMap(pattern=pattern, standard_name=std_name))
+                    upserted += 1
             if upserted:
                 session.commit()
                 print(f"질문→항목 전수 매핑 보정 완료(upsert): {upserted}건")
@@ -199,6 +723,51 @@ def seed_reference_data():
     finally:
         session.close()
 
+def migrate_answer_encoding(batch_size: int = 200):
+    """
+    JSON 객체로 저장된 기존 응답(responses_json, progress_data)을 압축 형식(answer_codec)으로 변환합니다.
+    이미 변환된 행은 건너뛰므로 여러 번 실행해도 안전합니다.
+    """
+    from answer_codec import encode_answers, decode_answers
+
+    targets = [
+        (SurveyResponse, "responses_json", False),
+        (SurveyProgress, "progress_data", True),
+    ]
+    session = SessionLocal()
+    try:
+        for model, column_name, as_labels in targets:
+            column = getattr(model, column_name)
+            converted = kept = 0
+            last_id = 0
+            while True:
+                rows = (
+                    session.query(model)
+                    .filter(model.id > last_id, column.like("{%"))
+                    .order_by(model.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not rows:
+                    break
+                for row in rows:
+                    last_id = row.id
+                    legacy = getattr(row, column_name)
+                    encoded = encode_answers(decode_answers(legacy, as_labels=as_labels))
+                    if encoded.startswith("{"):
+                        kept += 1  # 현재 문항 체계로 표현할 수 없는 행은 JSON 유지
+                        continue
+                    setattr(row, column_name, encoded)
+                    converted += 1
+                session.commit()
+            print(f"{model.__tablename__}.{column_name} 응답 인코딩 변환: {converted}건 (JSON 유지 {kept}건)")
+    except Exception as e:
+        session.rollback()
+        print(f"응답 인코딩 변환 중 오류: {e}")
+    finally:
+        session.close()
+
 if __name__ == "__main__":
     init_db()
     seed_reference_data()
+    migrate_answer_encoding()
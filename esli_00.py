@@ -1,176 +1,51 @@
 import gradio as gr
-from datetime import datetime
-from typing import Dict, List
+from typing import List
 import pandas as pd
 import os
-import random
-import json
 import uuid
+import asyncio
 
 # --- 프로젝트 모듈 임포트 ---
-from esli_01 import calculate_scores
-from esli_02 import generate_report_with_llm
-from esli_03 import gradio_chat_with_history
-from database import SessionLocal, SurveyProgress, init_db
-
-# --- 질문 목록 정의 ---
-# (기존 questions_part1, questions_part2, questions_part3 변수 내용은 여기에 그대로 유지됩니다)
-# Part I: 학업관련 감정과 행동 패턴
-questions_part1 = {
-    "감정과 행동 패턴 (1/7)": [
-        "마음대로 일이 되지 않으면 불안하다", "다른 친구들에 비해 머리가 많이 나쁜것 같다", "학교에서 은근 따돌림 받는 것 같다",
-        "나에 관한 결정에서 부모님은 항상 내 의견 묻고 결정한다", "학교에서 배우는 것이 나에게 많은 도움이 될 것 같다",
-        "좋지 않는 생각이 떠오르면 자꾸 그 생각이 나서 기분이 나빠진다", "내가 공부한 만큼 또는 그 이상 결과를 얻고 있다",
-        "학교에서 먼저 반겨주고 이야기 건네주는 친구가 있다", "부모님과 밥 먹는 것이 힘들다", "학교 선생님에게 꾸중보다 칭찬을 더 듣는다"
-    ],
-    "감정과 행동 패턴 (2/7)": [
-        "좋지 않은 일이 생기면 배가 아픈 경우가 많다", "아무리 노력해도 좋은 성적을 받을 수 없을 것 같다", "학교 끝나고 친구들과 만나서 놀기도 한다",
-        "부모님이 형제자매나 사촌과 비교하는 말을 자주한다", "담임선생님이 내가 나쁜 학생이라고 불친절하다", "기분 나쁜 일을 겪어도 곧 기분을 푼다",
-        "머리가 좋은 편이어서 친구들보다 쉽게 공부한다", "친구들에게 내가 먼저 말을 걸기가 어렵다", "모든것을 마음대로 결정하는 부모님 때문에 답답하다",
-        "방학때 너무 심심해서 차라리 학교가고 싶다는 생각을 한 적이 있다"
-    ],
-    "감정과 행동 패턴 (3/7)": [
-        "작은 일도 다른 사람들이 어떻게 생각할지 신경이 많이 쓰인다", "어려운 문제라도 충분히 시간이 주어지면 스스로 풀어낼 자신이 있다",
-        "주변 친구들은 대부분 나와 사이가 좋지 않다", "갑자기 깜짝 놀랄 정도로 부모님께서 화를 내는 경우가 자주 있다",
-        "학교에 가면 나도 모르게 무섭거나 짜증나서 별로 가고 싶지 않다", "하고 싶어하는 일을 하기도 전에 잘못될 걱정을 많이 한다",
-        "혼자 문제를 푸는 것보다 다른 사람에게 물어보는 것이 낫다", "친구들과 함께 노는 일은 정말 즐겁다",
-        "가족 중에 나를 이해해주는 사람이 있어서 고민을 이야기 할 수 있다", "학교에 가는 것은 재미있는 일이다"
-    ],
-    "감정과 행동 패턴 (4/7)": [
-        "한 번도 다른 사람에게 거짓말을 해본 적이 없다", "부탁하는 사람들 때문에 가끔 짜증이 날 때도 있다", "실수했을 때 항상 다른 사람에게 사과하고 인정한다",
-        "마음에 들지 않는 사람에게도 언제나 예의바르게 행동한다", "어른이 하는 말이 맞다는 것을 알면서도 반항하고 싶었던 적이 있다",
-        "능력이 부족하다고 생각해서 어떤 일을 중간에 그만둔 적이 있다", "어느 누구와 이야기해도 다른 사람 말을 잘 들어준다",
-        "마음대로 하지 못하면 화가 날 때도 있다", "다른 사람을 이용해서 이익을 얻으려 한 적이 한 번도 없다", "다른 친구가 잘 되는 것이 부러웠던 적이 있다"
-    ],
-    "감정과 행동 패턴 (5/7)": [
-        "억울한 일을 당했을 때, 복수하려는 생각을 가져본 적이 있다", "혼자 공부하다 잠이 오면 잠을 깨는 나만의 방법이 있다",
-        "공부시작하면 마칠 때까지 거의 공부만 한다", "숙제를 하다가도 꼭 봐야하는 TV프로그램이 있다",
-        "매일 1시간 이상 공부와 관련 없이 컴퓨터를 한다 (게임, 인터넷 등)", "핸드폰이나 스마트기기가 없어도 내 생활에 큰 영향은 없다",
-        "밤10시만 되도 잠이 와서 공부하기 어렵다", "공부하려고 앉으면 10분도 안되서 딴 생각에 빠진다", "하루에 1~2시간 이상 TV를 본다",
-        "공부하다가도 게임 인터넷 생각이 나면 컴퓨터를 해야 마음이 편하다"
-    ],
-    "감정과 행동 패턴 (6/7)": [
-        "문자나 인터넷, 게임 등을 위해 하루 1시간 이상 핸드폰을 한다", "학교 수업시간에 자는 경우가 많다",
-        "제대로 공부에 집중하려면 최소 10분이상 준비할 시간이 필요하다", "TV드라마나 어린이 프로그램 한 두편 정도 보는 것은 크게 상관없다",
-        "한밤에 가족들이 모두 자는 동안 몰래 컴퓨터를 하는 경우가 많다", "핸드폰이 거의 1분 간격으로 카톡 알림이 울린다",
-        "단원평가나 학교시험을 위해서는 평소보다 잠을 줄여 공부하는 편이다", "선생님이나 교과서의 설명이 무슨 말인지 알아들을 수가 없다",
-        "친구들과 대화하는 거의 모든 주제는 TV프로그램과 관련된 것이다", "단원평가 전이나 시험 준비할 때에는 게임이나 인터넷에 접속하지 않는다"
-    ],
-    "감정과 행동 패턴 (7/7)": [
-        "친구들과 톡을 주고 받지 못하면 불안하다", "하루 평균 10시간 이상 자는 것 같다", "공부하다가 나도 모르게 시간이 훌쩍 지나간 경우가 많다",
-        "내가 좋아하는 TV프로그램을 놓치면 궁금해서 다른 일을 할 수가 없다", "학교나 학원 친구보다 게임, 인터넷 커뮤니티 친구들과 더 친하다",
-        "스마트폰 데이터가 다 떨어져서 사용못하면 매우 답답하다"
-    ]
-}
-
-# Part II: 학습 방법 및 기술
-questions_part2 = {
-    "학습 방법 및 기술 (1/7)": [
-        "어떤 일을 하기 전에 항상 목표세워 시작한다", "공부 계획을 위한 다이어리나 계획표를 사용한다", "공부하다보면 쉽게 피곤해져서 계속 공부하기 어렵다",
-        "단원평가나 학원 테스트 끝나면 틀린 문제를 다시 풀며 틀린 이유를 확인한다", "공부할 때는 학습 목표를 꼭 확인한다",
-        "공부할 내용의 뜻을 이해하기 보다는 바로 외우는 편이다", "과목에 따라 다르게 사용하는 정리 노트들을 가지고 있다",
-        "중요한 외울 내용들은 꼭 다 외우면서 공부한다", "단원평가를 보면 거의 생각했던 문제가 출제된다"
-    ],
-    "학습 방법 및 기술 (2/7)": [
-        "특별히 되고 싶은 직업이나 장래 희망이 없다", "따로 공부계획을 세우지 않고 그날 그날 공부한다", "공부하기로 마음 먹고 나서도 한참 지나야 겨우 공부를 시작한다",
-        "하루 마무리 할 때에는 오늘 했었던 일을 정리하는 시간을 갖는다", "공부하다가 잘 모르는 단어가 나오면 무슨 뜻인지 찾아보고 넘어간다",
-        "잘 이해되지 않는 내용은 어떻게든 꼭 알아보고 넘어가야 마음이 놓인다", "공부한 내용을 정리노트나 마인드맵을 이용해 공부하지 않는다",
-        "참고서에 잘 정리되어 있어서, 굳이 내가 직접 공부한 내용을 정리할 필요는 없다", "처음 보는 문제도 당황하지 않고 풀어서 맞출 수 있다"
-    ],
-    "학습 방법 및 기술 (3/7)": [
-        "미래에 성공한 나의 모습을 상상하면 마음이 설렌다", "계획을 세워도 지키지 않는 경우가 더 많다", "TV나 주변 소리에도 크게 신경쓰지 않고 공부할 수 있다",
-        "문제를 푼 뒤에는 몇 개를 맞고 틀렸는지만 확인하고 넘어간다", "다른 사람의 도움 없이는 새로 배우는 단원의 내용을 이해하기가 어렵다",
-        "새로운 내용을 배우면 전에 배운 내용과 비교하면서 공부한다", "수업을 들으면 전에 배운 내용들과 관계를 연결지어 공부할 수 있다",
-        "암기할 때 주로 사용하는 나만의 암기법이 있다", "제시된 문제를 잘못 읽어 틀린 문제가 자주 발견된다"
-    ],
-    "학습 방법 및 기술 (4/7)": [
-        "누군가가 목표를 정해주고 나는 그대로 시키는대로만 했으면 좋겠다", "하루에 얼만큼 공부할 수 있을지 잘 모르기 때문에 계획을 미리 짜는 것은 불가능하다",
-        "오늘 할 일은 미루지 않고 끝내려고 노력한다", "좋지 않는 결과가 나오면 왜 그렇게 되었는지 생각해보는 편이다",
-        "수업시간에 수업 듣지 않고 자거나 다른 숙제를 하는 편이다", "혼자서 공부하는 것 보다는 남이 가르쳐주는 것을 듣는 것이 훨씬 좋다",
-        "어떤 단원을 마치고 나면 전체 내용을 다시 정리해본다", "외운것 같아도 막상 기억하려고 하면 기억나질 알아서 책을 뒤적인다",
-        "문제풀이 할때는 물어보는 것이 무엇인지 먼저 파악하고 풀이를 시작한다"
-    ],
-    "학습 방법 및 기술 (5/7)": [
-        "공부할 때는 별로 목표수립은 필요없다", "오늘 해야 할 공부가 계획되어 있다", "게임이나 친구들과 놀이 때문에 계획한 공부시간을 놓치는 경우가 많다",
-        "같은 실수 때문에 잘못을 반복한다고 혼나는 경우가 많다", "선생님 수업 내용을 어렵지 않게 이해할 수 있다",
-        "공부할 때 배우는 내용이 내가 알던 것과 달라서 의문을 가져본 적이 없다", "전체 내용을 보지 않고 밑줄 그은 것만 확인하며 공부해도 충분하다",
-        "공식 같은것 외우지 않아도 충분히 좋은 성적을 받을 수 있다고 생각한다", "나올 만한 예상문제의 답만 외운 뒤 질문을 보자마자 답을 쓰는 경우가 많다"
-    ],
-    "학습 방법 및 기술 (6/7)": [
-        "흥미 있는 대학 학과나 직업에 대해 이것 저것 찾아본 적이 있다", "단원평가나 학교시험의 범위와 일정에 맞춰 계획을 세워 공부한다",
-        "공부하기 어려운 과목도 해야 할 분량은 빼먹지 않고 공부한다", "운이 나빠서 자꾸 일이 잘못 되는 것 같다",
-        "새로 배우는 단원은 여러 번 반복해서 설명을 들어야 겨우 무슨 내용인지 알 수 있다", "새로운 것을 배우면 이전에 배운 내용들이 더욱 잘 이해되는 것 같다",
-        "내 노트는 참고서를 복사한 것처럼 잘 정리되어 있다", "한 번 외운 내용은 오랫동안 잘 기억하는 편이다",
-        "문제 풀 때에 무엇을 어떻게 활용해서 풀지 몰라 답답한 경우가 많다"
-    ],
-    "학습 방법 및 기술 (7/7)": [
-        "목표가 있으면 부담스러워서 목표를 세우지 않고 공부하는 편이다", "계획은 어차피 바뀌므로 굳이 세울 필요가 없다",
-        "책상 앞에 앉아 있지만 집중해서 공부한 시간은 얼마 되지 않는다", "잘된 일들은 굳이 되돌아볼 필요가 없다",
-        "수업을 잘 듣지 못해도 참고서나 자습서를 이용하면 공부에 문제 없다", "참고서에 나온 내용도 왜 그런지 생각을 하면서 공부하는 편이다",
-        "과목별로 일정한 나만의 노트 필기 방법으로 정리한다", "암기에 사용하는 노트가 따로 있다", "한 번 풀어서 맞춘 문제를 다음에 다시 풀어도 자주 틀리는 편이다"
-    ]
-}
-
-# Part III: 학습동기
-questions_part3 = {
-    "공부하는 이유는? (1/3)": [
-        "좋은 성적을 얻으면 용돈을 주시거나 좋은 선물을 사주니까", "남들 다 하는 공부 나만 안하면 불안해서", "공부하며 성장하는 내 모습이 자랑스러워서",
-        "공부 안하면 어른들에게 잔소리 들으니까", "부모님이나 선생님이 기대하는 것을 만족시켜드리기 위해",
-        "내가 원하는 직업을 얻기 위해서는 꼭 공부를 해야 하니까", "공부하는 것은 정말 싫지만 선생님이나 부모님이 하라고 하니까"
-    ],
-    "공부하는 이유는? (2/3)": [
-        "학생은 당연히 공부를 해야 하니까", "공부하며 내가 몰랐던 것들을 알게 되는 것이 즐거워서", "공부하고 남은 시간을 자유롭게 보내기 위해",
-        "부모님이나 선생님이 바라시는 대학에 가기위해", "내가 정한 목표를 하나씩 성취하는 것이 뿌듯해서",
-        "좋은 성적을 받지 못하면 용돈이 줄거나 자유시간이 줄어서", "공부잘하면 다른 아이들이 나를 함부로 대하지 못하니까"
-    ],
-    "공부하는 이유는? (3/3)": [
-        "시험 성적이 떨어지면 부모님께 혼나는 것이 싫어서",
-        "공부잘해서 좋은 성적을 얻으면 다른 사람들이 칭찬해주니까", "다른 사람이 시켜서 하는 것보다 스스로 하는게 더 보람있으니까",
-        "선생님이나 부모님이 공부하라고 한 분량을 맞춰놓아야 하니까", "가족들에게 모범이 되는 모습을 보여주어야 하니까",
-        "공부하는 것은 그 누구보다 나에게 가장 도움이 되니까"
-    ]
-}
+from esli_03 import gradio_chat_with_history_async
+from database import init_db, dispose_async_engine
+from progress_cache import progress_cache
+from questionnaire import ANSWER_OPTIONS, get_registry, sample_answers  # 문항 체계
+from artifact_store import artifact_store, report_url, create_router as create_report_router
+from metrics import create_router as create_metrics_router, install_http_metrics
+from llm_usage import create_router as create_llm_usage_router, start_usage_rollup
+import profiler
+from cohort_stats import create_router as create_cohort_router
+from norms import create_router as create_norms_router
+from batch_reports import create_router as create_batch_reports_router
+from answer_cache import create_router as create_chat_cache_router
+from llm_log_archive import create_router as create_llm_log_router, start_log_archiver
+from report_jobs import (
+    enqueue_report_job,
+    get_report_job_async,
+    start_report_workers,
+    JOB_RUNNING,
+    JOB_DONE,
+    JOB_FAILED,
+)
+
+# 제출/채팅 이벤트별 동시 처리 수 (Gradio concurrency_limit)
+GRADIO_CONCURRENCY_LIMIT = int(os.getenv("GRADIO_CONCURRENCY_LIMIT", "15"))
+# 제출 후 보고서 작업 상태 확인 주기/최대 대기 시간(초)
+REPORT_JOB_UI_POLL = float(os.getenv("REPORT_JOB_UI_POLL", "1"))
+REPORT_JOB_UI_TIMEOUT = float(os.getenv("REPORT_JOB_UI_TIMEOUT", "600"))
+# 설문 화면 방식: full(전체 문항을 한 페이지에 렌더링) / wizard(섹션별 마법사, 현재 섹션 문항만 렌더링)
+SURVEY_UI_MODE = os.getenv("SURVEY_UI_MODE", "full")
 
 # --- 진행상황 저장/복원 함수들 ---
-def save_progress(session_id: str, student_name: str, school_level: str, responses: dict):
-    """검사 진행상황을 데이터베이스에 저장"""
+def save_progress(session_id: str, student_name: str, school_level: str, responses):
+    """
+    검사 진행상황을 write-behind 캐시에 저장 (DB 기록은 주기/제출/종료 시 일괄 수행)
+    responses는 화면 위치 순서의 응답 값 목록입니다.
+    """
     try:
-        print(f"[DEBUG] 저장 시도 - 세션: {session_id}, 이름: {student_name}")
-        db = SessionLocal()
-        try:
-            # 기존 진행상황 찾기
-            progress = db.query(SurveyProgress).filter(SurveyProgress.session_id == session_id).first()
-            
-            # 완료된 문항 수 계산
-            completed_count = sum(1 for v in responses.values() if v is not None and v != "")
-            print(f"[DEBUG] 완료된 문항 수: {completed_count}")
-            
-            if progress:
-                # 기존 기록 업데이트
-                print(f"[DEBUG] 기존 기록 업데이트")
-                progress.student_name = student_name
-                progress.school_level = school_level
-                progress.progress_data = json.dumps(responses, ensure_ascii=False)
-                progress.completed = completed_count
-                progress.last_updated = datetime.now()
-            else:
-                # 새 기록 생성
-                print(f"[DEBUG] 새 기록 생성")
-                progress = SurveyProgress(
-                    session_id=session_id,
-                    student_name=student_name,
-                    school_level=school_level,
-                    progress_data=json.dumps(responses, ensure_ascii=False),
-                    completed=completed_count,
-                    total_questions=150
-                )
-                db.add(progress)
-            
-            db.commit()
-            print(f"[DEBUG] 저장 성공")
-            return True
-        finally:
-            db.close()
+        completed_count = progress_cache.put(session_id, student_name, school_level, responses)
+        print(f"[DEBUG] 캐시 저장 - 세션: {session_id}, 이름: {student_name}, 완료: {completed_count}")
+        return True
     except Exception as e:
         print(f"진행상황 저장 오류: {e}")
         import traceback
@@ -178,38 +53,64 @@ def save_progress(session_id: str, student_name: str, school_level: str, respons
         return False
 
 def load_progress(session_id: str):
-    """세션 ID로 저장된 진행상황 불러오기"""
+    """세션 ID로 저장된 진행상황 불러오기 (캐시 우선, 없으면 DB)"""
     try:
         print(f"[DEBUG] 세션 ID 검색 시도: {session_id}")
-        db = SessionLocal()
-        try:
-            progress = db.query(SurveyProgress).filter(SurveyProgress.session_id == session_id).first()
-            if progress:
-                print(f"[DEBUG] 세션 찾음: {progress.student_name}, 완료: {progress.completed}")
-                return {
-                    'student_name': progress.student_name or "",
-                    'school_level': progress.school_level or "초등",
-                    'responses': json.loads(progress.progress_data),
-                    'completed': progress.completed,
-                    'total_questions': progress.total_questions,
-                    'last_updated': progress.last_updated.strftime('%Y-%m-%d %H:%M:%S')
-                }
-            else:
-                print(f"[DEBUG] 세션을 찾을 수 없음: {session_id}")
-            return None
-        finally:
-            db.close()
+        progress = progress_cache.get(session_id)
+        if progress:
+            print(f"[DEBUG] 세션 찾음: {progress['student_name']}, 완료: {progress['completed']}")
+        else:
+            print(f"[DEBUG] 세션을 찾을 수 없음: {session_id}")
+        return progress
+    except Exception as e:
+        print(f"진행상황 불러오기 오류: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+async def load_progress_async(session_id: str):
+    """load_progress의 비동기 버전 (Gradio async 핸들러용)"""
+    try:
+        progress = await progress_cache.get_async(session_id)
+        if not progress:
+            print(f"[DEBUG] 세션을 찾을 수 없음: {session_id}")
+        return progress
     except Exception as e:
         print(f"진행상황 불러오기 오류: {e}")
         import traceback
         traceback.print_exc()
         return None
 
+def _download_links(digest: str, filename: str) -> str:
+    links = " · ".join(
+        f"[{label}]({report_url(digest, variant, filename)})"
+        for label, variant in (("Markdown", "md"), ("HTML", "html"), ("PDF", "pdf"))
+    )
+    return f"📥 **보고서 다운로드**: {links}"
+
 def generate_session_id():
     """세션 ID 생성"""
     return str(uuid.uuid4())
 
-def create_final_survey():
+def _progress_text(completed: int, total: int) -> str:
+    percentage = round((completed / total) * 100) if total > 0 else 0
+    return f"📊 **진행률**: {completed}/{total} ({percentage}%)"
+
+def _section_header(section) -> str:
+    return f"## {section.part}\n{section.instruction}\n\n### {section.title}"
+
+def _section_nav(index: int, total: int) -> str:
+    return f"**섹션 {index + 1}/{total}**"
+
+def create_final_survey(mode: str = SURVEY_UI_MODE):
+    """
+    검사 화면을 만듭니다.
+    mode="wizard"면 섹션별 마법사로, 가장 큰 섹션 크기만큼의 라디오만 만들어 두고 섹션을 옮길 때 라벨/값만 바꿉니다.
+    응답은 서버 쪽 State(화면 위치 순서 점수 목록) 하나에 모이므로 첫 화면 설정(config)과 DOM이 작고,
+    응답/이동 이벤트도 전체 문항 대신 바뀐 값만 주고받습니다.
+    """
+    registry = get_registry()
+    wizard = mode == "wizard"
     with gr.Blocks(title="종합 학습 진단 검사", theme=gr.themes.Soft()) as demo:
         gr.Markdown("# 종합 학습 진단 검사")
         
@@ -221,7 +122,7 @@ def create_final_survey():
             with gr.Column(scale=2):
                 sample_checkbox = gr.Checkbox(label="🎯 샘플 데이터로 테스트하기", value=False, info="체크하면 모든 설문이 임의의 값으로 자동 채워집니다")
             with gr.Column(scale=1):
-                progress_info = gr.Markdown("📊 **진행률**: 0/150 (0%)")
+                progress_info = gr.Markdown(f"📊 **진행률**: 0/{registry.question_count} (0%)")
             
         # 현재 세션 ID 표시 (세션 입력 필드 바로 위)
         current_session_display = gr.Markdown("")
@@ -247,32 +148,39 @@ def create_final_survey():
             with gr.Column(scale=3):
                 gr.Markdown("### 📝 학습 성향 검사")
 
-                all_responses: Dict[str, gr.Radio] = {}
-                question_texts: List[str] = []
-                options = ["아니다", "조금 아니다", "조금 그렇다", "그렇다"]
-
-                # 질문 UI 동적 생성
-                question_sets = [
-                    ("Part I: 학업관련 감정과 행동 패턴", questions_part1, "자신의 생각이나 행동과 가장 가깝다고 느끼는 곳에 표시해주세요."),
-                    ("Part II: 학습 방법 및 기술", questions_part2, "자신의 공부 습관과 가장 가깝다고 느끼는 곳에 표시해주세요."),
-                    ("Part III: 학습동기", questions_part3, "내가 왜 공부하는지, 그 이유와 가장 가깝다고 느끼는 곳에 표시해주세요.")
-                ]
-
-                for title, questions, instruction in question_sets:
-                    gr.Markdown(f"## {title}")
-                    gr.Markdown(instruction)
-                    for section, qs in questions.items():
-                        gr.Markdown(f"### {section}")
-                        for i, q_text in enumerate(qs):
-                            key = f"{title}_{section}_{i}"
-                            all_responses[key] = gr.Radio(options, label=q_text)
-                            question_texts.append(q_text)
+                # 질문 UI 동적 생성 (문항 체계의 섹션 구성, 라디오 목록의 순서 = 화면 위치)
+                answer_radios: List[gr.Radio] = []
+                if wizard:
+                    answers_state = gr.State(value=[None] * registry.question_count)
+                    section_state = gr.State(value=0)
+                    first = registry.sections[0]
+                    section_header = gr.Markdown(_section_header(first))
+                    slot_radios: List[gr.Radio] = []
+                    for slot in range(registry.max_section_size):
+                        visible = first.start + slot < first.stop
+                        slot_radios.append(gr.Radio(ANSWER_OPTIONS, label=registry.text(first.start + slot) if visible else "",
+                                                    visible=visible))
+                    with gr.Row():
+                        prev_btn = gr.Button("◀ 이전 섹션", interactive=False, scale=1)
+                        section_nav = gr.Markdown(_section_nav(0, len(registry.sections)))
+                        next_btn = gr.Button("다음 섹션 ▶", interactive=len(registry.sections) > 1, scale=1)
+                    wizard_view = [section_state, section_header] + slot_radios + [section_nav, prev_btn, next_btn]
+                else:
+                    current_part = None
+                    for section in registry.sections:
+                        if section.part != current_part:
+                            current_part = section.part
+                            gr.Markdown(f"## {section.part}")
+                            gr.Markdown(section.instruction)
+                        gr.Markdown(f"### {section.title}")
+                        for position in range(section.start, section.stop):
+                            answer_radios.append(gr.Radio(ANSWER_OPTIONS, label=registry.text(position)))
 
                 submit_btn = gr.Button("제출", variant="primary")
                 output_text = gr.Textbox(label="처리 상태", interactive=False, placeholder="모든 문항에 답변 후 제출 버튼을 눌러주세요.")
                 report_output = gr.Markdown(label="학습 성향 분석 보고서", visible=False)
-                # MD 파일 다운로드 버튼
-                download_btn = gr.File(label="보고서(MD) 다운로드", file_count="single", visible=False)
+                # 보고서 다운로드 링크 (artifact_store의 /reports 경로)
+                download_btn = gr.Markdown(visible=False)
 
             # 우측: 채팅 영역
             with gr.Column(scale=2):
@@ -292,63 +200,96 @@ def create_final_survey():
         # 샘플 데이터 자동 채우기 함수
         def fill_sample_data(use_sample):
             if use_sample:
-                # 각 설문에 임의의 값(1-4) 할당
-                options = ["아니다", "조금 아니다", "조금 그렇다", "그렇다"]
-                updates = []
-                for _ in all_responses:
-                    random_choice = random.choice(options)
-                    updates.append(gr.update(value=random_choice))
-                return updates
+                # 각 설문에 임의의 값(1-4) 할당 (sample_answers는 화면 순서로 채워짐)
+                return [gr.update(value=value) for value in sample_answers().values()]
             else:
                 # 체크 해제 시 모든 값을 None으로 초기화
-                updates = []
-                for _ in all_responses:
-                    updates.append(gr.update(value=None))
-                return updates
+                return [gr.update(value=None) for _ in answer_radios]
 
         def update_progress_info(*responses):
             """진행률 정보 업데이트"""
             completed = sum(1 for r in responses if r is not None and r != "")
-            total = len(responses)
-            percentage = round((completed / total) * 100) if total > 0 else 0
-            return f"📊 **진행률**: {completed}/{total} ({percentage}%)"
-        
-        def auto_save_progress(session_id, name, school_level_value, sample_checkbox, *responses):
-            """자동 저장 (응답 변경 시마다 호출)"""
+            return _progress_text(completed, len(responses))
+
+        def _auto_save(session_id, name, school_level_value, sample_checkbox, responses) -> str:
             # 샘플 데이터 모드이면 저장하지 않음
             if sample_checkbox:
                 return ""
-                
+
             if name and name.strip():  # 이름이 입력된 경우에만 저장
-                response_dict = {}
-                for i, response in enumerate(responses):
-                    if i < len(question_texts):
-                        response_dict[question_texts[i]] = response
-                
-                if save_progress(session_id, name.strip(), school_level_value, response_dict):
+                if save_progress(session_id, name.strip(), school_level_value, responses):
                     completed = sum(1 for r in responses if r is not None and r != "")
-                    return f"💾 자동 저장됨 ({completed}/150)"
+                    return f"💾 자동 저장됨 ({completed}/{registry.question_count})"
                 else:
                     return "❌ 저장 실패"
             return ""
+
+        @profiler.profiled("auto_save_progress")
+        async def auto_save_progress(session_id, name, school_level_value, sample_checkbox, *responses):
+            """자동 저장 (응답 변경 시마다 호출, 메모리 캐시에만 기록하므로 스레드를 점유하지 않음)"""
+            return _auto_save(session_id, name, school_level_value, sample_checkbox, responses)
+
+        # --- 섹션별 마법사 (wizard 모드) ---
+        def section_view(index, answers):
+            """섹션 index를 화면에 채우는 출력 (wizard_view 순서)"""
+            section = registry.sections[index]
+            slots = []
+            for slot in range(registry.max_section_size):
+                position = section.start + slot
+                if position < section.stop:
+                    score = answers[position]
+                    slots.append(gr.update(label=registry.text(position), visible=True,
+                                           value=None if score is None else ANSWER_OPTIONS[score - 1]))
+                else:
+                    slots.append(gr.update(value=None, visible=False))
+            last = len(registry.sections) - 1
+            return [index, _section_header(section)] + slots + [
+                _section_nav(index, last + 1), gr.update(interactive=index > 0), gr.update(interactive=index < last)
+            ]
+
+        def prev_section(index, answers):
+            return section_view(max(index - 1, 0), answers)
+
+        def next_section(index, answers):
+            return section_view(min(index + 1, len(registry.sections) - 1), answers)
+
+        def make_answer_slot(slot):
+            @profiler.profiled("auto_save_progress")
+            async def answer_slot(session_id, name, school_level_value, sample_checkbox, answers, index, value):
+                """마법사 문항 응답: State의 해당 위치만 바꾸고 진행률/자동 저장을 한 번에 처리"""
+                answers = list(answers)
+                answers[registry.sections[index].start + slot] = None if value is None else ANSWER_OPTIONS.index(value) + 1
+                completed = sum(1 for s in answers if s is not None)
+                status = _auto_save(session_id, name, school_level_value, sample_checkbox, answers)
+                return answers, _progress_text(completed, registry.question_count), status
+            return answer_slot
+
+        async def save_answers(session_id, name, school_level_value, sample_checkbox, answers):
+            """이름/학교급 변경 시 자동 저장 (wizard 모드)"""
+            return _auto_save(session_id, name, school_level_value, sample_checkbox, answers)
+
+        def fill_sample_answers(use_sample, index):
+            """샘플 데이터 채우기 (wizard 모드): State를 바꾸고 현재 섹션만 다시 그립니다."""
+            if use_sample:
+                answers = [ANSWER_OPTIONS.index(value) + 1 for value in sample_answers().values()]
+            else:
+                answers = [None] * registry.question_count
+            completed = sum(1 for s in answers if s is not None)
+            return [answers, _progress_text(completed, registry.question_count)] + section_view(index, answers)
         
         def show_current_session_id(session_id_value):
             """현재 세션 ID 표시"""
             return f"🔑 **현재 세션**: `{session_id_value}`\n💡 위 ID를 저장해두시면 나중에 이어서 검사할 수 있습니다! 이름부터 쓰세요."
         
-        def load_previous_progress(session_input_value):
+        async def load_previous_progress(session_input_value):
             """이전 진행상황 불러오기"""
             if not session_input_value or not session_input_value.strip():
-                return [gr.update() for _ in all_responses] + [gr.update(), gr.update(), "세션 ID를 입력해주세요"]
+                return [gr.update() for _ in answer_radios] + [gr.update(), gr.update(), "세션 ID를 입력해주세요"]
             
-            progress_data = load_progress(session_input_value.strip())
+            progress_data = await load_progress_async(session_input_value.strip())
             if progress_data:
-                # 응답 데이터 복원
-                updates = []
-                loaded_responses = progress_data['responses']
-                for question in question_texts:
-                    value = loaded_responses.get(question, None)
-                    updates.append(gr.update(value=value))
+                # 응답 데이터 복원 (화면 위치 순서)
+                updates = [gr.update(value=value) for value in progress_data['answers']]
                 
                 # 이름과 학교급 복원
                 name_update = gr.update(value=progress_data['student_name'])
@@ -359,43 +300,104 @@ def create_final_survey():
                 
                 return updates + [name_update, school_update, status_msg]
             else:
-                return [gr.update() for _ in all_responses] + [gr.update(), gr.update(), "❌ 해당 세션을 찾을 수 없습니다. 먼저 이름을 입력하고 설문에 답변하여 진행상황을 저장해주세요."]
+                return [gr.update() for _ in answer_radios] + [gr.update(), gr.update(), "❌ 해당 세션을 찾을 수 없습니다. 먼저 이름을 입력하고 설문에 답변하여 진행상황을 저장해주세요."]
 
-        def submit(session_id_value, name, school_level_value, *responses):
+        async def load_previous_answers(session_input_value):
+            """이전 진행상황 불러오기 (wizard 모드): 첫 미응답 문항이 있는 섹션을 보여줍니다."""
+            unchanged = [gr.update() for _ in range(2 + len(wizard_view))]
+            if not session_input_value or not session_input_value.strip():
+                return unchanged + [gr.update(), gr.update(), "세션 ID를 입력해주세요"]
+
+            progress_data = await load_progress_async(session_input_value.strip())
+            if not progress_data:
+                return unchanged + [gr.update(), gr.update(), "❌ 해당 세션을 찾을 수 없습니다. 먼저 이름을 입력하고 설문에 답변하여 진행상황을 저장해주세요."]
+            answers = [None if label is None else ANSWER_OPTIONS.index(label) + 1 for label in progress_data['answers']]
+            index = registry.section_index(answers.index(None)) if None in answers else 0
+            completed = sum(1 for s in answers if s is not None)
+            return (
+                [answers, _progress_text(completed, registry.question_count)] + section_view(index, answers)
+                + [gr.update(value=progress_data['student_name']), gr.update(value=progress_data['school_level']),
+                   f"✅ 진행상황 복원 완료! (마지막 저장: {progress_data['last_updated']})"]
+            )
+
+        @profiler.profiled("submit")
+        async def submit(session_id_value, name, school_level_value, *responses):
+            # Gradio 응답(문자열)을 화면 위치 순서의 점수(숫자)로 변환
+            scored_responses = [None if resp is None else ANSWER_OPTIONS.index(resp) + 1 for resp in responses]
+            async for outputs in _submit_scores(session_id_value, name, school_level_value, scored_responses):
+                yield outputs
+
+        @profiler.profiled("submit")
+        async def submit_answers(session_id_value, name, school_level_value, answers):
+            """제출 (wizard 모드, State의 점수 목록 사용)"""
+            async for outputs in _submit_scores(session_id_value, name, school_level_value, list(answers)):
+                yield outputs
+
+        async def _submit_scores(session_id_value, name, school_level_value, scored_responses):
             if not name or not name.strip():
-                return "오류: 이름을 입력해주세요.", gr.update(visible=False)
+                yield "오류: 이름을 입력해주세요.", gr.update(visible=False), gr.update(visible=False)
+                return
 
-            if None in responses:
-                none_index = responses.index(None)
-                unanswered_question = question_texts[none_index]
-                return f"'{unanswered_question}' 질문에 답변해주세요.", gr.update(visible=False)
+            if None in scored_responses:
+                none_index = scored_responses.index(None)
+                section = registry.sections[registry.section_index(none_index)]
+                unanswered_question = registry.text(none_index)
+                yield f"[{section.title}] '{unanswered_question}' 질문에 답변해주세요.", gr.update(visible=False), gr.update(visible=False)
+                return
 
-            try:
-                # Gradio 응답(문자열)을 점수(숫자)로 변환
-                to_score = {"아니다": 1, "조금 아니다": 2, "조금 그렇다": 3, "그렇다": 4}
-                scored_responses = {q_text: to_score[resp] for q_text, resp in zip(question_texts, responses)}
+            # 제출 시점에 캐시에 쌓인 진행상황을 DB에 반영
+            await progress_cache.flush_async(session_id_value)
 
-                # 1. 원점수 계산 (esli_01)
-                # calculate_scores가 scored_responses 딕셔너리를 처리할 수 있도록 수정되었다고 가정
-                raw_scores_df = calculate_scores(scored_responses)
-                
-                # 2. 보고서 생성 및 DB 저장 (esli_02)
-                # generate_report_with_llm이 scored_responses 딕셔너리와 학교급을 함께 받는다고 가정
-                report_content = generate_report_with_llm(student_name=name.strip(), responses=scored_responses, school_level=school_level_value, raw_scores_df=raw_scores_df)
-                # Markdown 보고서를 MD 파일로 저장
-                file_name = f"report_{session_id_value}.md"
-                with open(file_name, 'w', encoding='utf-8') as f:
-                    f.write(report_content)
-                file_update = file_name
+            try:
+                # 보고서 생성(점수 계산 → LLM → DB 저장)은 백그라운드 작업 큐에서 수행 (report_jobs)
+                # 같은 세션/응답으로 다시 제출하면 기존 작업을 이어서 확인합니다.
+                job_id = await profiler.to_thread(
+                    enqueue_report_job, session_id_value, name.strip(), school_level_value, scored_responses
+                )
+                # 보고서 작업 자체는 워커 스레드에서 'report_job' 프로파일(같은 작업 ID)로 기록됩니다.
+                profiler.annotate(job_id=job_id)
+                waited = 0.0
+                job = None
+                while waited < REPORT_JOB_UI_TIMEOUT:
+                    job = await get_report_job_async(job_id)
+                    if job is None or job['status'] in (JOB_DONE, JOB_FAILED):
+                        break
+                    state = "생성 중" if job['status'] == JOB_RUNNING else "대기 중"
+                    yield (
+                        f"⏳ 보고서 {state}입니다... ({int(waited)}초 경과)\n\n"
+                        f"📋 작업 ID: `{job_id}` — 연결이 끊겨도 같은 답변으로 다시 제출하면 결과를 이어서 받을 수 있습니다.",
+                        gr.update(visible=False),
+                        gr.update(visible=False)
+                    )
+                    await asyncio.sleep(REPORT_JOB_UI_POLL)
+                    waited += REPORT_JOB_UI_POLL
+
+                if job is None or job['status'] not in (JOB_DONE, JOB_FAILED):
+                    yield (
+                        f"보고서 생성이 지연되고 있습니다. 잠시 후 같은 답변으로 다시 제출해주세요. (작업 ID: `{job_id}`)",
+                        gr.update(visible=False),
+                        gr.update(visible=False)
+                    )
+                    return
+
+                report_content = job['report_content']
+                if job['status'] == JOB_FAILED and not report_content:
+                    yield f"분석 처리 중 심각한 오류 발생: {job['error']}", gr.update(visible=False), gr.update(visible=False)
+                    return
+
+                # 보고서를 내용 해시로 압축 저장하고 다운로드 링크 생성
+                digest = await profiler.to_thread(artifact_store.put, report_content)
+                file_update = _download_links(digest, f"{name.strip()}_학습진단보고서")
 
                 if "데이터베이스 저장에 실패했습니다" in report_content or "[LLM 코멘트 생성 실패" in report_content:
-                     return (
-                         f"보고서 생성 중 일부 오류가 발생했습니다. 하지만 생성된 내용은 다음과 같습니다.",
-                         gr.update(value=report_content, visible=True),
-                         gr.update(value=file_update, visible=True)
-                     )
-                
-                return (
+                    yield (
+                        f"보고서 생성 중 일부 오류가 발생했습니다. 하지만 생성된 내용은 다음과 같습니다.",
+                        gr.update(value=report_content, visible=True),
+                        gr.update(value=file_update, visible=True)
+                    )
+                    return
+
+                yield (
                     f"✅ 분석이 완료되었습니다! 아래에서 결과를 확인하세요.\n\n📋 **이 세션의 ID**: `{session_id_value}` (향후 이어서 하기용)",
                     gr.update(value=report_content, visible=True),
                     gr.update(value=file_update, visible=True)
@@ -405,13 +407,14 @@ def create_final_survey():
                 import traceback
                 traceback.print_exc()
                 # 오류 시 다운로드 버튼 숨김
-                return (
+                yield (
                     f"분석 처리 중 심각한 오류 발생: {e}",
                     gr.update(visible=False),
                     gr.update(visible=False)
                 )
 
-        def chat_respond(message, history, image, name):
+        @profiler.profiled("chat_respond")
+        async def chat_respond(message, history, image, name):
             if not (message and message.strip()) and not image:
                 return history, "", None # 메시지와 이미지가 모두 없으면 아무것도 하지 않음
             
@@ -422,59 +425,92 @@ def create_final_survey():
                 return history, "", None
 
             # esli_03의 채팅 함수 호출
-            response = gradio_chat_with_history(message, history, image, student_name)
+            response = await gradio_chat_with_history_async(message, history, image, student_name)
             history.append((message, response))
             return history, "", None # 입력창과 이미지 업로드 초기화
 
         # 이벤트 바인딩
-        all_components = [session_id, name_input, school_level] + list(all_responses.values())
-        submit_btn.click(
-            fn=submit,
-            inputs=all_components,
-            outputs=[output_text, report_output, download_btn],
-            concurrency_limit=15
-        )
+        if wizard:
+            submit_btn.click(
+                fn=submit_answers,
+                inputs=[session_id, name_input, school_level, answers_state],
+                outputs=[output_text, report_output, download_btn],
+                concurrency_limit=GRADIO_CONCURRENCY_LIMIT
+            )
+            sample_checkbox.change(
+                fn=fill_sample_answers,
+                inputs=[sample_checkbox, section_state],
+                outputs=[answers_state, progress_info] + wizard_view
+            )
+            prev_btn.click(fn=prev_section, inputs=[section_state, answers_state], outputs=wizard_view)
+            next_btn.click(fn=next_section, inputs=[section_state, answers_state], outputs=wizard_view)
+            # 사용자가 고른 경우에만(input) 저장: 섹션 이동으로 값을 바꿔 끼울 때는 이벤트가 생기지 않습니다.
+            for slot, slot_radio in enumerate(slot_radios):
+                slot_radio.input(
+                    fn=make_answer_slot(slot),
+                    inputs=[session_id, name_input, school_level, sample_checkbox, answers_state, section_state, slot_radio],
+                    outputs=[answers_state, progress_info, save_status]
+                )
+            for field in (name_input, school_level):
+                field.change(
+                    fn=save_answers,
+                    inputs=[session_id, name_input, school_level, sample_checkbox, answers_state],
+                    outputs=[save_status]
+                )
+            load_progress_btn.click(
+                fn=load_previous_answers,
+                inputs=[session_input],
+                outputs=[answers_state, progress_info] + wizard_view + [name_input, school_level, save_status]
+            )
+        else:
+            all_components = [session_id, name_input, school_level] + answer_radios
+            submit_btn.click(
+                fn=submit,
+                inputs=all_components,
+                outputs=[output_text, report_output, download_btn],
+                concurrency_limit=GRADIO_CONCURRENCY_LIMIT
+            )
 
-        # 샘플 체크박스 이벤트 바인딩
-        sample_checkbox.change(
-            fn=fill_sample_data,
-            inputs=[sample_checkbox],
-            outputs=list(all_responses.values())
-        )
-        
-        # 진행상황 자동 저장 및 진행률 업데이트 (응답 변경 시마다)
-        for response_component in all_responses.values():
-            response_component.change(
-                fn=update_progress_info,
-                inputs=list(all_responses.values()),
-                outputs=[progress_info]
+            # 샘플 체크박스 이벤트 바인딩
+            sample_checkbox.change(
+                fn=fill_sample_data,
+                inputs=[sample_checkbox],
+                outputs=answer_radios
             )
-            # 이름이 입력된 경우 자동 저장
-            response_component.change(
+
+            # 진행상황 자동 저장 및 진행률 업데이트 (응답 변경 시마다)
+            for response_component in answer_radios:
+                response_component.change(
+                    fn=update_progress_info,
+                    inputs=answer_radios,
+                    outputs=[progress_info]
+                )
+                # 이름이 입력된 경우 자동 저장
+                response_component.change(
+                    fn=auto_save_progress,
+                    inputs=[session_id, name_input, school_level, sample_checkbox] + answer_radios,
+                    outputs=[save_status]
+                )
+
+            # 이름이나 학교급 변경 시에도 자동 저장
+            name_input.change(
                 fn=auto_save_progress,
-                inputs=[session_id, name_input, school_level, sample_checkbox] + list(all_responses.values()),
+                inputs=[session_id, name_input, school_level, sample_checkbox] + answer_radios,
                 outputs=[save_status]
             )
-        
-        # 이름이나 학교급 변경 시에도 자동 저장
-        name_input.change(
-            fn=auto_save_progress,
-            inputs=[session_id, name_input, school_level, sample_checkbox] + list(all_responses.values()),
-            outputs=[save_status]
-        )
-        school_level.change(
-            fn=auto_save_progress,
-            inputs=[session_id, name_input, school_level, sample_checkbox] + list(all_responses.values()),
-            outputs=[save_status]
-        )
-        
-        # 진행상황 불러오기 버튼
-        load_progress_btn.click(
-            fn=load_previous_progress,
-            inputs=[session_input],
-            outputs=list(all_responses.values()) + [name_input, school_level, save_status]
-        )
-        
+            school_level.change(
+                fn=auto_save_progress,
+                inputs=[session_id, name_input, school_level, sample_checkbox] + answer_radios,
+                outputs=[save_status]
+            )
+
+            # 진행상황 불러오기 버튼
+            load_progress_btn.click(
+                fn=load_previous_progress,
+                inputs=[session_input],
+                outputs=answer_radios + [name_input, school_level, save_status]
+            )
+
         # 페이지 로드 시 현재 세션 ID 표시
         demo.load(
             fn=show_current_session_id,
@@ -486,20 +522,76 @@ def create_final_survey():
             fn=chat_respond,
             inputs=[chat_input, chatbot, image_input, name_input],
             outputs=[chatbot, chat_input, image_input],
-            concurrency_limit=15
+            concurrency_limit=GRADIO_CONCURRENCY_LIMIT
         )
         chat_input.submit(
             fn=chat_respond,
             inputs=[chat_input, chatbot, image_input, name_input],
             outputs=[chatbot, chat_input, image_input],
-            concurrency_limit=15
+            concurrency_limit=GRADIO_CONCURRENCY_LIMIT
         )
 
     return demo
 
+def create_app(survey_app):
+    """Gradio 앱을 FastAPI에 마운트한 ASGI 앱 (Render 단일 프로세스 / serve.py 워커 공용)"""
+    from fastapi import FastAPI, Response
+    from fastapi.responses import RedirectResponse
+
+    app = FastAPI()
+
+    # 헬스체크 엔드포인트 추가
+    @app.get("/health")
+    async def health_check():
+        return {"status": "healthy", "service": "learning-assessment", "pid": os.getpid()}
+
+    @app.on_event("shutdown")
+    async def dispose_db():
+        # 비동기 DB 커넥션 풀 정리
+        await dispose_async_engine()
+
+    @app.get("/")
+    async def root():
+        # 루트 경로 접속 시 Gradio 앱으로 리다이렉트
+        return RedirectResponse(url="/app", status_code=302)
+
+    # Render의 내부 헬스체크가 HEAD / 를 칠 때 405가 되지 않도록 보완
+    @app.head("/")
+    async def root_head():
+        return Response(status_code=200)
+
+    # 보고서 다운로드 (ETag/Range 지원)
+    app.include_router(create_report_router())
+    # Prometheus 지표 (/metrics) 및 요청 소요 시간
+    app.include_router(create_metrics_router())
+    install_http_metrics(app)
+    # 관리자: LLM 사용량/비용 집계 (ADMIN_TOKEN 설정 시)
+    app.include_router(create_llm_usage_router())
+    # 관리자: 느린 요청 프로파일 (PROFILE_SAMPLE_RATE / PROFILE_SLOW_MS 설정 시 기록)
+    app.include_router(profiler.create_router())
+    # 관리자: 학교급·항목·월별 점수 분포와 백분위 순위
+    app.include_router(create_cohort_router())
+    # 관리자: 규준 드리프트/스냅샷/승격
+    app.include_router(create_norms_router())
+    # 관리자: 학급 일괄 보고서 (zip + 요약 CSV)
+    app.include_router(create_batch_reports_router())
+    # 관리자: 채팅 답변 캐시 적중률/절약 시간, 비우기
+    app.include_router(create_chat_cache_router())
+    # 관리자: llm_logs 기간 분할·보관 현황과 보관분 포함 조회
+    app.include_router(create_llm_log_router())
+
+    return gr.mount_gradio_app(app, survey_app, path="/app")
+
+
 if __name__ == "__main__":
     # 데이터베이스 초기화 (새 테이블 포함)
     init_db()
+    # 보고서 작업 워커 시작 (재시작 전에 남아 있던 작업도 이어서 처리)
+    start_report_workers()
+    # LLM 사용량 시간별 집계
+    start_usage_rollup()
+    # llm_logs 지난 기간 롤오버/보관
+    start_log_archiver()
     
     survey_app = create_final_survey()
     # Gradio v4: 전역 queue(deprecated) 대신 이벤트별 concurrency_limit 사용
@@ -511,28 +603,9 @@ if __name__ == "__main__":
     
     if is_render:
         # Render 환경: FastAPI로 감싸서 실행
-        from fastapi import FastAPI, Response
-        from fastapi.responses import RedirectResponse
         import uvicorn
-        
-        app = FastAPI()
-        
-        # 헬스체크 엔드포인트 추가
-        @app.get("/health")
-        async def health_check():
-            return {"status": "healthy", "service": "learning-assessment"}
-        
-        @app.get("/")
-        async def root():
-            # 루트 경로 접속 시 Gradio 앱으로 리다이렉트
-            return RedirectResponse(url="/app", status_code=302)
-
-        # Render의 내부 헬스체크가 HEAD / 를 칠 때 405가 되지 않도록 보완
-        @app.head("/")
-        async def root_head():
-            return Response(status_code=200)
-        
-        app = gr.mount_gradio_app(app, survey_app, path="/app")
+
+        app = create_app(survey_app)
         
         # uvloop/httptools 사용 시 약간의 성능 향상
         try:
@@ -542,10 +615,8 @@ if __name__ == "__main__":
         except Exception:
             uvicorn.run(app, host="0.0.0.0", port=port)
     else:
-        # 로컬 환경: 기존 방식
-        survey_app.launch(
-            server_name=host,
-            server_port=port,
-            share=False,
-            inbrowser=False
-        )
\ No newline at end of file
+        # 로컬 환경: 보고서 다운로드 경로(/reports)를 쓰기 위해 같은 FastAPI 앱으로 실행
+        import uvicorn
+
+        print(f"http://{'localhost' if host == '0.0.0.0' else host}:{port}/app 에서 접속하세요.")
+        uvicorn.run(create_app(survey_app), host=host, port=port)
\ No newline at end of file
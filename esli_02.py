@@ -1,9 +1,11 @@
 import pandas as pd
-import openai
+import numpy as np
 import os
 from datetime import datetime
 from dotenv import load_dotenv
 import json
+import time
+import asyncio
 from typing import Optional, Dict, List, Tuple
 
 # 데이터베이스 연동을 위한 import
@@ -16,11 +18,21 @@ from database import (
     seed_reference_data,
     ReferenceQuestionMap,
     ReferenceQuestionUnmapped,
+    commit_with_retry,
+    commit_with_retry_async,
+    get_async_session_factory,
+    log_llm_interaction_db,
 )
+from answer_codec import encode_answers
+from cohort_stats import record_cohort_scores
+from norms import record_norm_observation, active_norm_version, load_snapshot_norms, NORM_REFRESH_INTERVAL
+from llm_usage import accounting_fields
+from llm_gateway import get_gateway, LLMResult
+from llm_scheduler import PRIORITY_REPORT
+from metrics import stage_span
+from typing_rules import motivation_for, strategy_for, hindrance_for
 
 load_dotenv()
-# 환경 변수에서 OpenAI API 키를 읽어옵니다
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
 
 # --------------------
@@ -29,6 +41,9 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 STD_INFO_CACHE: Dict[str, pd.DataFrame] = {}
 PERCENTILE_DF_CACHE: Optional[pd.DataFrame] = None
 QUESTION_MAP_CACHE: Optional[List[Tuple[str, str]]] = None
+_REFERENCE_READY = False
+NORM_VERSION: Optional[int] = None  # STD_INFO_CACHE를 채운 규준 버전 (0 = 기본 기준표)
+_NORM_CHECKED_AT = 0.0
 
 # --------------------
 # 표준점수(T) 설정 (본 프로젝트는 평균 100, 표준편차 15 스케일)
@@ -37,10 +52,35 @@ T_MEAN = 100
 T_SD = 15
 
 
+def _sync_norm_version():
+    """활성 규준 버전이 바뀌었으면(norms.promote) 기준표 캐시를 비웁니다. NORM_REFRESH_INTERVAL초에 한 번만 조회."""
+    global NORM_VERSION, _NORM_CHECKED_AT
+    now = time.monotonic()
+    if NORM_VERSION is not None and now - _NORM_CHECKED_AT < NORM_REFRESH_INTERVAL:
+        return
+    _NORM_CHECKED_AT = now
+    try:
+        version = active_norm_version()
+    except Exception:
+        version = NORM_VERSION or 0  # 테이블이 아직 없는 등
+    if version != NORM_VERSION:
+        STD_INFO_CACHE.clear()
+        NORM_VERSION = version
+
+
 def get_std_info_df(level: str) -> pd.DataFrame:
     global STD_INFO_CACHE
+    _sync_norm_version()
     if level in STD_INFO_CACHE:
         return STD_INFO_CACHE[level]
+    snapshot = load_snapshot_norms(NORM_VERSION, level) if NORM_VERSION else {}
+    if snapshot:
+        df = pd.DataFrame({
+            "평균": {name: mean for name, (mean, _) in snapshot.items()},
+            "표준편차": {name: std for name, (_, std) in snapshot.items()},
+        })
+        STD_INFO_CACHE[level] = df
+        return df
     session = SessionLocal()
     try:
         rows = session.query(ReferenceStandard).filter(ReferenceStandard.level == level).all()
@@ -86,6 +126,24 @@ def get_question_map_pairs() -> List[Tuple[str, str]]:
         session.close()
 
 
+def preload_reference_data():
+    """
+    기준표(모든 학교급)/백분위/질문 매핑을 메모리 캐시에 미리 올립니다.
+    멀티 프로세스 모드(serve.py)에서는 fork 전에 호출해 워커들이 같은 메모리를 읽기 전용으로 공유합니다.
+    """
+    _ensure_reference_data()
+    session = SessionLocal()
+    try:
+        levels = [row[0] for row in session.query(ReferenceStandard.level).distinct()]
+    finally:
+        session.close()
+    for level in levels:
+        get_std_info_df(level)
+    get_percentile_df()
+    get_question_map_pairs()
+    return levels
+
+
 def compute_t_and_percentile(raw_value: float, std_name: str, std_info_df: pd.DataFrame, percentile_df: pd.DataFrame) -> Tuple[int, int]:
     """원점수와 기준표로부터 T점수와 백분위를 계산한다.
     - 표준편차가 0이거나 NaN이면 T=100, 백분위는 50(또는 표에 100이 있으면 해당 값)
@@ -114,6 +172,10 @@ def compute_t_and_percentile(raw_value: float, std_name: str, std_info_df: pd.Da
     elif t_score > 200:
         t_score = 200
 
+    return int(t_score), _percentile_of_t(t_score, percentile_df)
+
+
+def _percentile_of_t(t_score: int, percentile_df: pd.DataFrame) -> int:
     # 백분위 계산
     if t_score in percentile_df.index:
         pct = int(percentile_df.loc[t_score, '백분위'])
@@ -131,315 +193,542 @@ def compute_t_and_percentile(raw_value: float, std_name: str, std_info_df: pd.Da
         pct = 99
     if t_score <= 20 and pct > 0:
         pct = max(0, pct)
+    return int(pct)
+
+
+def compute_t_and_percentile_matrix(raw: pd.DataFrame, std_info_df: pd.DataFrame,
+                                    percentile_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    compute_t_and_percentile의 벡터화 버전 (행: 학생, 열: 기준표에 있는 항목).
+    같은 연산 순서로 계산하므로 학생마다 호출한 결과와 값이 같습니다. 반환값: (T점수, 백분위)
+    """
+    mean = std_info_df.loc[raw.columns, '평균'].astype(float)
+    std = std_info_df.loc[raw.columns, '표준편차'].astype(float)
+    valid_std = std.notna() & (std != 0)
+    z = (raw - mean) / std.where(valid_std)
+    t = np.round(T_MEAN + T_SD * z)
+    t = t.where(np.broadcast_to(valid_std.to_numpy(), t.shape), T_MEAN).clip(0, 200).astype(int)
+    # T는 0~200 정수이므로 백분위는 점수별로 한 번만 구해 표로 찾습니다.
+    lookup = np.array([_percentile_of_t(score, percentile_df) for score in range(201)])
+    pct = pd.DataFrame(lookup[t.to_numpy()], index=t.index, columns=t.columns)
+    return t, pct
+
+
+REPORT_SYSTEM_PROMPT = "당신은 학생의 학습 성향 데이터를 분석하고 조언하는 전문 학습 코치입니다. 주어진 데이터를 기반으로, 학생에게 친절하고 지지적이지만, 전문적인 말투를 사용해 독창적인 보고서를 작성해 주세요.  T점수나 백분위 등의 표현을 지양하고 딱딱한 설명서가 아닌, 학생의 성장을 돕는 따뜻한 조언의 느낌을 담아주세요."
+
+
+def _report_messages(prompt: str) -> list:
+    return [
+        {"role": "system", "content": REPORT_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+REPORT_COMMENT_FAILED = "[LLM 코멘트 생성 실패"  # 실패한 섹션에 들어가는 문구 (일괄 생성에서 재시도 대상 판별)
+
 
-    return int(t_score), int(pct)
+def _report_comment(result: LLMResult) -> str:
+    if result.ok:
+        return result.content.strip()
+    print(f"--- OpenAI API 호출 중 오류 발생: {result.error} ---")
+    return f"--- {REPORT_COMMENT_FAILED}: {result.error}] ---"
 
 
-def call_llm_for_report(prompt):
+def _log_report_call(messages: list, section: Optional[str], result: LLMResult, comment: str):
+    """보고서 섹션 호출을 토큰/지연/비용과 함께 llm_logs에 남깁니다."""
+    db = SessionLocal()
+    try:
+        log_llm_interaction_db(db, "report_output" if result.ok else "report_error",
+                               {"section": section, "messages": messages}, comment,
+                               usage=accounting_fields(result))
+    finally:
+        db.close()
+
+
+def call_llm_for_report(prompt, priority: int = PRIORITY_REPORT, flow: Optional[str] = None, section: Optional[str] = None):
     """
     OpenAI의 LLM을 호출하여 프롬프트에 대한 맞춤형 보고서 내용을 생성합니다.
+    보고서 호출은 채팅보다 낮은 우선순위로 스케줄링되며, flow(학생 이름)별로 공정하게 배분됩니다.
     """
+    messages = _report_messages(prompt)
+    result = get_gateway().chat(messages, model="gpt-4o", temperature=0.75, priority=priority, flow=flow)
+    comment = _report_comment(result)
+    _log_report_call(messages, section, result, comment)
+    return comment
+
+
+async def call_llm_for_report_async(prompt, priority: int = PRIORITY_REPORT, flow: Optional[str] = None,
+                                    section: Optional[str] = None):
+    """
+    call_llm_for_report의 비동기 버전.
+    보고서 작업 워커는 작업마다 새 이벤트 루프를 쓰므로, 로그는 비동기 엔진 대신 동기 세션으로 스레드에서 저장합니다.
+    """
+    messages = _report_messages(prompt)
+    result = await get_gateway().achat(messages, model="gpt-4o", temperature=0.75, priority=priority, flow=flow)
+    comment = _report_comment(result)
+    await asyncio.to_thread(_log_report_call, messages, section, result, comment)
+    return comment
+
+
+def _ensure_reference_data():
+    """테이블/참조데이터 시드를 프로세스당 한 번만 보장합니다."""
+    global _REFERENCE_READY
+    if _REFERENCE_READY:
+        return
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "당신은 학생의 학습 성향 데이터를 분석하고 조언하는 전문 학습 코치입니다. 주어진 데이터를 기반으로, 학생에게 친절하고 지지적이지만, 전문적인 말투를 사용해 독창적인 보고서를 작성해 주세요.  T점수나 백분위 등의 표현을 지양하고 딱딱한 설명서가 아닌, 학생의 성장을 돕는 따뜻한 조언의 느낌을 담아주세요."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.75,
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"--- OpenAI API 호출 중 오류 발생: {e} ---")
-        return f"--- [LLM 코멘트 생성 실패: {e}] ---"
+        init_db()
+        seed_reference_data()
+        _REFERENCE_READY = True
+    except Exception:
+        pass
 
 
-def generate_report_with_llm(student_name: str, responses: dict, school_level: str = "초등", raw_scores_df: Optional[pd.DataFrame] = None):
+def compute_student_scores(responses: dict, school_level: str = "초등", raw_scores_df: Optional[pd.DataFrame] = None) -> dict:
     """
-    학생 데이터를 분석하고 LLM을 호출하여 맞춤형 보고서를 생성하고, 결과를 DB에 저장합니다.
+    원점수를 표준점수(T)/백분위로 변환해 {항목명: {'raw', 't_score', 'percentile'}} 형태로 반환합니다.
     - 원점수는 가능하면 외부에서 계산된 값을 그대로 사용합니다(raw_scores_df 전달 시).
     - raw_scores_df가 없을 경우에만 안전한 fallback 방식(질문→항목 매핑 기반)으로 원점수를 근사합니다.
     """
-    db = SessionLocal()
-    try:
-        # --- 1. 데이터 로드 및 계산 ---
-        # CSV 파일 로드 대신, Gradio 앱에서 직접 받은 responses 딕셔너리를 사용합니다.
-        # 참조값은 DB에서 조회 (사용자가 선택한 학교급 기준)
-        ref_level = school_level
-        # 테이블/시드 보장 (배포 환경에서 테이블 미생성 대비)
+    # --- 1. 데이터 로드 및 계산 ---
+    # CSV 파일 로드 대신, Gradio 앱에서 직접 받은 responses 딕셔너리를 사용합니다.
+    # 참조값은 DB에서 조회 (사용자가 선택한 학교급 기준)
+    ref_level = school_level
+    # 테이블/시드 보장 (배포 환경에서 테이블 미생성 대비, 프로세스당 1회)
+    _ensure_reference_data()
+    std_info_df = get_std_info_df(ref_level)
+    percentile_df = get_percentile_df()
+
+    # 1) 선계산된 원점수 사용 (esli_01.calculate_scores 결과)
+    student_raw_scores = {}
+    if raw_scores_df is not None and isinstance(raw_scores_df, pd.DataFrame) and not raw_scores_df.empty:
         try:
-            init_db()
-            seed_reference_data()
-        except Exception:
-            pass
-        std_info_df = get_std_info_df(ref_level)
-        percentile_df = get_percentile_df()
-
-        # 1) 선계산된 원점수 사용 (esli_01.calculate_scores 결과)
-        student_raw_scores = {}
-        if raw_scores_df is not None and isinstance(raw_scores_df, pd.DataFrame) and not raw_scores_df.empty:
-            try:
-                row_dict = raw_scores_df.iloc[0].to_dict()
-                for k, v in row_dict.items():
-                    # NaN/None 방지 및 숫자 변환
-                    try:
-                        student_raw_scores[str(k)] = float(v)
-                    except Exception:
-                        continue
-            except Exception:
-                student_raw_scores = {}
-
-        # 2) fallback: 질문→항목 매핑 기반 근사 (가능한 한 사용 지양)
-        if not student_raw_scores:
-            pattern_to_name = get_question_map_pairs()
-            buckets = {}
-            for q, val in responses.items():
-                hit = False
-                # 정확 일치 우선
-                for pattern, name in pattern_to_name:
-                    if q == pattern:
-                        buckets.setdefault(name, []).append(val)
-                        hit = True
-                        break
-                if hit:
+            row_dict = raw_scores_df.iloc[0].to_dict()
+            for k, v in row_dict.items():
+                # NaN/None 방지 및 숫자 변환
+                try:
+                    student_raw_scores[str(k)] = float(v)
+                except Exception:
                     continue
-                # 포함 패턴 fallback
-                for pattern, name in pattern_to_name:
-                    if pattern in q:
-                        buckets.setdefault(name, []).append(val)
-                        hit = True
-                        break
-                # 미매핑 저장 (관찰용)
-                if not hit:
+        except Exception:
+            student_raw_scores = {}
+
+    # 2) fallback: 질문→항목 매핑 기반 근사 (가능한 한 사용 지양)
+    if not student_raw_scores:
+        pattern_to_name = get_question_map_pairs()
+        exact_names = {}
+        for pattern, name in pattern_to_name:
+            exact_names.setdefault(pattern, name)
+        buckets = {}
+        for q, val in responses.items():
+            hit = False
+            # 정확 일치 우선
+            if q in exact_names:
+                buckets.setdefault(exact_names[q], []).append(val)
+                continue
+            # 포함 패턴 fallback
+            for pattern, name in pattern_to_name:
+                if pattern in q:
+                    buckets.setdefault(name, []).append(val)
+                    hit = True
+                    break
+            # 미매핑 저장 (관찰용)
+            if not hit:
+                try:
+                    um_sess = SessionLocal()
                     try:
-                        um_sess = SessionLocal()
-                        try:
-                            row = um_sess.query(ReferenceQuestionUnmapped).filter_by(question_text=q).first()
-                            if row:
-                                row.count = (row.count or 0) + 1
-                                row.last_seen = datetime.now()
-                            else:
-                                um_sess.add(ReferenceQuestionUnmapped(question_text=q))
-                            um_sess.commit()
-                        finally:
-                            um_sess.close()
-                    except Exception:
-                        pass
-            for name, vals in buckets.items():
-                if len(vals) > 0:
-                    # 기존 근사식(1~4 척도 평균 × 25)은 기준표 스케일과 다를 수 있으므로
-                    # fallback에서만 제한적으로 사용
-                    student_raw_scores[name] = float(sum(vals)) / len(vals) * 25
-
-
-        # 표준점수 계산
-        student_scores = {}
-        for std_name, raw_val in student_raw_scores.items():
-            if std_name in std_info_df.index:
-                t_score, percentile = compute_t_and_percentile(raw_val, std_name, std_info_df, percentile_df)
-                student_scores[std_name] = {
-                    'raw': raw_val,
-                    't_score': t_score,
-                    'percentile': percentile,
-                }
-
-        # 필수 항목 기본값 보정(동기 3종 + 전략/기술 구성요소 + 전략/기술 종합)
-        required_list = [
-            '자기성취', '사회적 관계', '직접적 보상처벌',
-            '목표세우기', '계획하기', '실천하기', '돌아보기',
-            '이해하기', '사고하기', '정리하기', '암기하기', '문제풀기',
-            '학습전략', '학습기술',
-        ]
-        for required in required_list:
-            if required not in student_scores and required in std_info_df.index:
-                mean = float(std_info_df.loc[required, '평균'])
-                t_score, percentile = compute_t_and_percentile(mean, required, std_info_df, percentile_df)
-                student_scores[required] = {
-                    'raw': mean,
-                    't_score': t_score,
-                    'percentile': percentile,
-                }
-
-        # 복합 지표(학습전략/학습기술) 보정: 구성 항목 평균으로 raw 근사 후 표준점수 계산
-        def ensure_composite(composite_name: str, part_names: list[str]):
-            if composite_name in student_scores:
-                return
-            available = [student_scores[p]['raw'] for p in part_names if p in student_scores]
-            if len(available) == 0 or composite_name not in std_info_df.index:
-                return
-            raw_approx = float(sum(available)) / len(available)
-            t_score, percentile = compute_t_and_percentile(raw_approx, composite_name, std_info_df, percentile_df)
-            student_scores[composite_name] = {
-                'raw': raw_approx,
+                        row = um_sess.query(ReferenceQuestionUnmapped).filter_by(question_text=q).first()
+                        if row:
+                            row.count = (row.count or 0) + 1
+                            row.last_seen = datetime.now()
+                        else:
+                            um_sess.add(ReferenceQuestionUnmapped(question_text=q))
+                        um_sess.commit()
+                    finally:
+                        um_sess.close()
+                except Exception:
+                    pass
+        for name, vals in buckets.items():
+            if len(vals) > 0:
+                # 기존 근사식(1~4 척도 평균 × 25)은 기준표 스케일과 다를 수 있으므로
+                # fallback에서만 제한적으로 사용
+                student_raw_scores[name] = float(sum(vals)) / len(vals) * 25
+
+
+    # 표준점수 계산
+    student_scores = {}
+    for std_name, raw_val in student_raw_scores.items():
+        if std_name in std_info_df.index:
+            t_score, percentile = compute_t_and_percentile(raw_val, std_name, std_info_df, percentile_df)
+            student_scores[std_name] = {
+                'raw': raw_val,
+                't_score': t_score,
+                'percentile': percentile,
+            }
+
+    return _complete_student_scores(student_scores, std_info_df, percentile_df)
+
+
+def compute_student_scores_batch(raw_scores_df: pd.DataFrame, school_levels: List[str]) -> List[dict]:
+    """
+    여러 학생의 원점수(esli_01.calculate_scores_batch 결과)를 학교급별로 한 번에 표준점수로 바꿉니다.
+    반환값은 행 순서대로 compute_student_scores와 같은 형태의 dict 목록입니다.
+    """
+    _ensure_reference_data()
+    percentile_df = get_percentile_df()
+    levels = pd.Series(list(school_levels), index=raw_scores_df.index)
+    results: List[Optional[dict]] = [None] * len(raw_scores_df)
+    positions = {index: i for i, index in enumerate(raw_scores_df.index)}
+    for level, group_index in levels.groupby(levels).groups.items():
+        std_info_df = get_std_info_df(level)
+        raw = raw_scores_df.loc[group_index].apply(pd.to_numeric, errors='coerce').astype(float)
+        columns = [c for c in raw.columns if str(c) in std_info_df.index]
+        raw = raw[columns].rename(columns=str)
+        t, pct = compute_t_and_percentile_matrix(raw, std_info_df, percentile_df)
+        raw_values, t_values, pct_values = raw.to_numpy(), t.to_numpy(), pct.to_numpy()
+        for row, index in enumerate(raw.index):
+            student_scores = {
+                name: {'raw': float(raw_values[row, col]), 't_score': int(t_values[row, col]),
+                       'percentile': int(pct_values[row, col])}
+                for col, name in enumerate(raw.columns)
+            }
+            results[positions[index]] = _complete_student_scores(student_scores, std_info_df, percentile_df)
+    return results
+
+
+def _complete_student_scores(student_scores: dict, std_info_df: pd.DataFrame, percentile_df: pd.DataFrame) -> dict:
+    """빠진 필수 항목을 기준 평균으로 채우고 복합 지표(학습전략/학습기술)를 보정합니다."""
+    # 필수 항목 기본값 보정(동기 3종 + 전략/기술 구성요소 + 전략/기술 종합)
+    required_list = [
+        '자기성취', '사회적 관계', '직접적 보상처벌',
+        '목표세우기', '계획하기', '실천하기', '돌아보기',
+        '이해하기', '사고하기', '정리하기', '암기하기', '문제풀기',
+        '학습전략', '학습기술',
+    ]
+    for required in required_list:
+        if required not in student_scores and required in std_info_df.index:
+            mean = float(std_info_df.loc[required, '평균'])
+            t_score, percentile = compute_t_and_percentile(mean, required, std_info_df, percentile_df)
+            student_scores[required] = {
+                'raw': mean,
                 't_score': t_score,
                 'percentile': percentile,
             }
 
-        ensure_composite('학습전략', ['목표세우기', '계획하기', '실천하기', '돌아보기'])
-        ensure_composite('학습기술', ['이해하기', '사고하기', '정리하기', '암기하기', '문제풀기'])
-
-        # --- 2. 보고서 각 섹션별 LLM 프롬프트 생성 및 호출 (기존 코드와 동일) ---
-        m_type, _, m_reason, m_coaching = get_motivation_analysis(student_scores)
-        motivation_prompt = f"""
-        '학습 동기'에 대한 분석 및 코칭 코멘트를 작성해줘.
-
-        [학생 데이터 요약]
-        - 학생 이름: {student_name}
-        - 주요 동기 유형: {m_type}
-        - 자기 성취 동기 점수: T점수 {student_scores['자기성취']['t_score']} (백분위 {student_scores['자기성취']['percentile']}%)
-        - 사회적 관계 동기 점수: T점수 {student_scores['사회적 관계']['t_score']} (백분위 {student_scores['사회적 관계']['percentile']}%)
-        - 직접적 보상/처벌 동기 점수: T점수 {student_scores['직접적 보상처벌']['t_score']} (백분위 {student_scores['직접적 보상처벌']['percentile']}%)
-
-        [참고 가이드라인]
-        - 핵심 특징: {m_reason}
-        - 코칭 방향: {m_coaching}
-
-        [작성 지침]
-        - 위의 데이터와 가이드라인을 '참고'하여, 너만의 독창적이고 전문적인 코멘트를 생성해줘.
-        - 딱딱한 설명이 아닌, 학생의 마음을 이해하고 성장을 지지하는 따뜻한 조언의 형태로 작성해줘.
-        - 아래 출력 형식을 반드시 지켜줘.
-
-        [출력 형식]
-        #### 검사 결과 분석
-        (여기에 데이터 기반의 객관적인 분석 작성)
-
-        #### 코칭 코멘트
-        "**여기에 한 줄 요약 코멘트 작성**"
-        * **현재 모습**: (여기에 학생의 현재 상태 묘사)
-        * **성장의 기회**: (여기에 긍정적 측면과 성장 가능성 묘사)
-        * **코칭 제안**: (여기에 구체적인 조언 작성)
-        """
-        motivation_comment = call_llm_for_report(motivation_prompt)
-
-        # 2-2. 학습 전략/기술 프롬프트
-        s_analysis, s_coaching_title = get_strategy_analysis(student_scores)
-        def t(item: str) -> int:
-            try:
-                return int(student_scores[item]['t_score'])
-            except Exception:
-                return 100
-        strategy_prompt = f"""
-        '학습 전략/기술'에 대한 분석 및 코칭 코멘트를 작성해줘.
-
-        [학생 데이터 요약]
-        - 종합 분석: {s_analysis}
-        - 학습 전략 종합 점수: T점수 {t('학습전략')} (백분위 {student_scores.get('학습전략', {}).get('percentile', 50)}%)
-        - 학습 기술 종합 점수: T점수 {t('학습기술')} (백분위 {student_scores.get('학습기술', {}).get('percentile', 50)}%)
-        - 강점 항목: 사고하기 (T={t('사고하기')})
-        - 약점 항목: 목표세우기 (T={t('목표세우기')}), 이해하기 (T={t('이해하기')}), 문제풀기 (T={t('문제풀기')})
-
-        [참고 가이드라인]
-        - 핵심 특징: {s_analysis}
-        - 코칭 방향: "{s_coaching_title}" 이 제목에 어울리는 내용으로, 전략(목표/계획) 보완과 기술(이해/문제풀이) 강화를 조언해줘.
-
-        [작성 지침]
-        - 강점(사고력)을 인정해주고, 약점(전략)을 보완하면 더 크게 성장할 수 있다는 점을 강조해줘.
-        - 구체적인 활동 예시를 들어 조언해줘.
-        - 아래 출력 형식을 반드시 지켜줘.
-
-        [출력 형식]
-        #### 검사 결과 분석
-        (여기에 데이터 기반의 객관적인 분석 작성)
-
-        #### 코칭 코멘트
-        "**여기에 한 줄 요약 코멘트 작성**"
-        * **현재 모습**: (여기에 학생의 현재 상태 묘사)
-        * **성장의 기회**: (여기에 긍정적 측면과 성장 가능성 묘사)
-        * **코칭 제안**: (여기에 구체적인 조언을 1, 2번으로 나누어 작성)
-        """
-        strategy_comment = call_llm_for_report(strategy_prompt)
-
-        # 2-3. 학습 방해 요인 프롬프트
-        h_analysis, h_coaching_title = get_hindrance_analysis(student_scores)
-        hindrance_prompt = f"""
-        '학습 방해 심리/행동'에 대한 분석 및 코칭 코멘트를 작성해줘.
-
-        [학생 데이터 요약]
-        - 종합 분석: {h_analysis}
-        - 주요 점수: 스트레스민감성(T={student_scores['스트레스민감성']['t_score']}), 학습효능감(T={student_scores['학습효능감']['t_score']}), 학습집중력(T={student_scores['학습집중력']['t_score']})
-        - 모든 방해 요인 점수가 안정적인 범위에 있음.
-
-        [참고 가이드라인]
-        - 핵심 특징: {h_analysis}
-        - 코칭 방향: "{h_coaching_title}" 이 제목처럼, 이미 훌륭한 기반을 갖추고 있음을 칭찬하고, 이 강점을 활용하여 동기와 전략을 키워나가도록 격려해줘.
-
-        [작성 지침]
-        - 학생이 이미 가진 강점(정서적 안정, 자기 통제력)을 구체적으로 칭찬하며 자신감을 심어줘.
-        - 이 튼튼한 기반 위에서 다른 영역(동기, 전략)을 발전시켜 나갈 때임을 강조해줘.
-        - 아래 출력 형식을 반드시 지켜줘.
-
-        [출력 형식]
-        #### 검사 결과 분석
-        (여기에 데이터 기반의 객관적인 분석 작성)
-
-        #### 코칭 코멘트
-        "**여기에 한 줄 요약 코멘트 작성**"
-        * **현재 모습**: (여기에 학생의 현재 상태 묘사)
-        * **성장의 기회**: (여기에 긍정적 측면과 성장 가능성 묘사)
-        * **코칭 제안**: (여기에 구체적인 조언 작성)
-        """
-        hindrance_comment = call_llm_for_report(hindrance_prompt)
-
-        # --- 3. 점수 테이블 생성 (시각적 개선) ---
-        score_table_md = "### 📊 **학습 성향 측정 결과**\n\n"
-        score_table_md += "> 전국 학생 데이터와 비교한 표준점수(T점수)와 백분위 결과입니다.\n\n"
-        score_table_md += "| 🎯 구분 | 📋 영역 | 📈 원점수 | 🎯 표준점수(T) | 📊 백분위(%) |\n"
-        score_table_md += "| :---: | :---: | :---: | :---: | :---: |\n"
-        categories_in_order = {
-            "💪 학습 동기": ['직접적 보상처벌', '사회적 관계', '자기성취'],
-            "🎯 학습 전략": ['목표세우기', '계획하기', '실천하기', '돌아보기', '학습전략'],
-            "🧠 학습 기술": ['이해하기', '사고하기', '정리하기', '암기하기', '문제풀기', '학습기술'],
-            "😰 방해요인(심리)": ['스트레스민감성', '학습효능감', '친구관계', '가정환경', '학교환경'],
-            "📱 방해요인(행동)": ['수면조절', '학습집중력', 'TV프로그램', '컴퓨터', '스마트기기']
+    # 복합 지표(학습전략/학습기술) 보정: 구성 항목 평균으로 raw 근사 후 표준점수 계산
+    def ensure_composite(composite_name: str, part_names: list[str]):
+        if composite_name in student_scores:
+            return
+        available = [student_scores[p]['raw'] for p in part_names if p in student_scores]
+        if len(available) == 0 or composite_name not in std_info_df.index:
+            return
+        raw_approx = float(sum(available)) / len(available)
+        t_score, percentile = compute_t_and_percentile(raw_approx, composite_name, std_info_df, percentile_df)
+        student_scores[composite_name] = {
+            'raw': raw_approx,
+            't_score': t_score,
+            'percentile': percentile,
         }
-        
-        for group, items in categories_in_order.items():
-            for idx, item in enumerate(items):
-                if item in student_scores:
-                    score_data = student_scores[item]
-                    item_name = '**종합**' if item in ['학습전략', '학습기술'] else item.replace('세우기','').replace('하기','')
-                    
-                    # 백분위에 따른 시각적 표시
-                    percentile = score_data['percentile']
-                    if percentile >= 84:
-                        level_icon = "🔥"
-                    elif percentile >= 50:
-                        level_icon = "✅"
-                    else:
-                        level_icon = "⚠️"
-                    
-                    group_name = group if idx == 0 else ""  # 첫 번째 항목에만 그룹명 표시
-                    score_table_md += f"| {group_name} | {item_name} | {score_data['raw']:.1f} | **{score_data['t_score']}** | {level_icon} **{percentile}%** |\n"
-
-        # 점수 테이블 범례 추가
-        score_table_md += "\n**📌 백분위 해석 가이드**\n"
-        score_table_md += "- 🔥 **84% 이상**: 상위 16% (매우 우수)\n"
-        score_table_md += "- ✅ **50% 이상**: 평균 이상 (양호)\n"
-        score_table_md += "- ⚠️ **50% 미만**: 평균 이하 (개선 필요)\n\n"
-
-        # 3-2. 종합 요약 프롬프트 (전반적인 경향성만 설명)
-        summary_prompt = f"""
-        학생의 전반적인 학습 성향을 종합하여 간결한 요약문을 작성해줘.
-        
-        [학생 데이터 요약]
-        - 학생 이름: {student_name}
-        - 주요 동기 유형: {m_type}
-        - 학습 전략/기술 분석: {s_analysis}
-        - 학습 방해 요인 분석: {h_analysis}
-        - 구체적인 점수나 수치는 언급하지 말고, 전반적인 경향성만 설명해줘 : {score_table_md}
-        
-        [작성 지침]
-        - 학생의 학습 성향을 10문장내로 간결하게 요약해줘.
-        - 학생의 강점과 개선이 필요한 부분을 균형있게 언급해줘.
-        - 따뜻하고 격려적인 톤으로 작성해줘.
-        
-        [출력 형식]
-        학생의 학습 성향을 간결하게 요약한 8-10문장의 문단 (제목이나 서식 없이 본문만)
-        """
-        summary_comment = call_llm_for_report(summary_prompt)
-
-        # --- 4. 최종 보고서 텍스트 (가독성 향상된 마크다운)
-        report_md = f"""# 📊 {student_name} 학생 학습 성향 분석 종합 보고서
+
+    ensure_composite('학습전략', ['목표세우기', '계획하기', '실천하기', '돌아보기'])
+    ensure_composite('학습기술', ['이해하기', '사고하기', '정리하기', '암기하기', '문제풀기'])
+
+    return student_scores
+
+
+# 점수표(와 구조화 프롬프트의 점수 요약)에 싣는 항목 순서
+REPORT_CATEGORY_GROUPS = {
+    "💪 학습 동기": ['직접적 보상처벌', '사회적 관계', '자기성취'],
+    "🎯 학습 전략": ['목표세우기', '계획하기', '실천하기', '돌아보기', '학습전략'],
+    "🧠 학습 기술": ['이해하기', '사고하기', '정리하기', '암기하기', '문제풀기', '학습기술'],
+    "😰 방해요인(심리)": ['스트레스민감성', '학습효능감', '친구관계', '가정환경', '학교환경'],
+    "📱 방해요인(행동)": ['수면조절', '학습집중력', 'TV프로그램', '컴퓨터', '스마트기기']
+}
+
+
+def build_report_prompts(student_name: str, student_scores: dict) -> dict:
+    """
+    보고서 작성에 필요한 규칙 기반 분석 결과, 점수표, 섹션별 LLM 프롬프트를 만듭니다.
+    반환값의 'prompts'는 motivation → strategy → hindrance → summary 순서입니다.
+    """
+    # --- 2. 보고서 각 섹션별 LLM 프롬프트 생성 (기존 코드와 동일) ---
+    m_type, _, m_reason, m_coaching = get_motivation_analysis(student_scores)
+    motivation_prompt = f"""
+    '학습 동기'에 대한 분석 및 코칭 코멘트를 작성해줘.
+
+    [학생 데이터 요약]
+    - 학생 이름: {student_name}
+    - 주요 동기 유형: {m_type}
+    - 자기 성취 동기 점수: T점수 {student_scores['자기성취']['t_score']} (백분위 {student_scores['자기성취']['percentile']}%)
+    - 사회적 관계 동기 점수: T점수 {student_scores['사회적 관계']['t_score']} (백분위 {student_scores['사회적 관계']['percentile']}%)
+    - 직접적 보상/처벌 동기 점수: T점수 {student_scores['직접적 보상처벌']['t_score']} (백분위 {student_scores['직접적 보상처벌']['percentile']}%)
+
+    [참고 가이드라인]
+    - 핵심 특징: {m_reason}
+    - 코칭 방향: {m_coaching}
+
+    [작성 지침]
+    - 위의 데이터와 가이드라인을 '참고'하여, 너만의 독창적이고 전문적인 코멘트를 생성해줘.
+    - 딱딱한 설명이 아닌, 학생의 마음을 이해하고 성장을 지지하는 따뜻한 조언의 형태로 작성해줘.
+    - 아래 출력 형식을 반드시 지켜줘.
+
+    [출력 형식]
+    #### 검사 결과 분석
+    (여기에 데이터 기반의 객관적인 분석 작성)
+
+    #### 코칭 코멘트
+    "**여기에 한 줄 요약 코멘트 작성**"
+    * **현재 모습**: (여기에 학생의 현재 상태 묘사)
+    * **성장의 기회**: (여기에 긍정적 측면과 성장 가능성 묘사)
+    * **코칭 제안**: (여기에 구체적인 조언 작성)
+    """
+
+    # 2-2. 학습 전략/기술 프롬프트
+    s_analysis, s_coaching_title = get_strategy_analysis(student_scores)
+    def t(item: str) -> int:
+        try:
+            return int(student_scores[item]['t_score'])
+        except Exception:
+            return 100
+    strategy_prompt = f"""
+    '학습 전략/기술'에 대한 분석 및 코칭 코멘트를 작성해줘.
+
+    [학생 데이터 요약]
+    - 종합 분석: {s_analysis}
+    - 학습 전략 종합 점수: T점수 {t('학습전략')} (백분위 {student_scores.get('학습전략', {}).get('percentile', 50)}%)
+    - 학습 기술 종합 점수: T점수 {t('학습기술')} (백분위 {student_scores.get('학습기술', {}).get('percentile', 50)}%)
+    - 강점 항목: 사고하기 (T={t('사고하기')})
+    - 약점 항목: 목표세우기 (T={t('목표세우기')}), 이해하기 (T={t('이해하기')}), 문제풀기 (T={t('문제풀기')})
+
+    [참고 가이드라인]
+    - 핵심 특징: {s_analysis}
+    - 코칭 방향: "{s_coaching_title}" 이 제목에 어울리는 내용으로, 전략(목표/계획) 보완과 기술(이해/문제풀이) 강화를 조언해줘.
+
+    [작성 지침]
+    - 강점(사고력)을 인정해주고, 약점(전략)을 보완하면 더 크게 성장할 수 있다는 점을 강조해줘.
+    - 구체적인 활동 예시를 들어 조언해줘.
+    - 아래 출력 형식을 반드시 지켜줘.
+
+    [출력 형식]
+    #### 검사 결과 분석
+    (여기에 데이터 기반의 객관적인 분석 작성)
+
+    #### 코칭 코멘트
+    "**여기에 한 줄 요약 코멘트 작성**"
+    * **현재 모습**: (여기에 학생의 현재 상태 묘사)
+    * **성장의 기회**: (여기에 긍정적 측면과 성장 가능성 묘사)
+    * **코칭 제안**: (여기에 구체적인 조언을 1, 2번으로 나누어 작성)
+    """
+
+    # 2-3. 학습 방해 요인 프롬프트
+    h_analysis, h_coaching_title = get_hindrance_analysis(student_scores)
+    hindrance_prompt = f"""
+    '학습 방해 심리/행동'에 대한 분석 및 코칭 코멘트를 작성해줘.
+
+    [학생 데이터 요약]
+    - 종합 분석: {h_analysis}
+    - 주요 점수: 스트레스민감성(T={student_scores['스트레스민감성']['t_score']}), 학습효능감(T={student_scores['학습효능감']['t_score']}), 학습집중력(T={student_scores['학습집중력']['t_score']})
+    - 모든 방해 요인 점수가 안정적인 범위에 있음.
+
+    [참고 가이드라인]
+    - 핵심 특징: {h_analysis}
+    - 코칭 방향: "{h_coaching_title}" 이 제목처럼, 이미 훌륭한 기반을 갖추고 있음을 칭찬하고, 이 강점을 활용하여 동기와 전략을 키워나가도록 격려해줘.
+
+    [작성 지침]
+    - 학생이 이미 가진 강점(정서적 안정, 자기 통제력)을 구체적으로 칭찬하며 자신감을 심어줘.
+    - 이 튼튼한 기반 위에서 다른 영역(동기, 전략)을 발전시켜 나갈 때임을 강조해줘.
+    - 아래 출력 형식을 반드시 지켜줘.
+
+    [출력 형식]
+    #### 검사 결과 분석
+    (여기에 데이터 기반의 객관적인 분석 작성)
+
+    #### 코칭 코멘트
+    "**여기에 한 줄 요약 코멘트 작성**"
+    * **현재 모습**: (여기에 학생의 현재 상태 묘사)
+    * **성장의 기회**: (여기에 긍정적 측면과 성장 가능성 묘사)
+    * **코칭 제안**: (여기에 구체적인 조언 작성)
+    """
+
+    # --- 3. 점수 테이블 생성 (시각적 개선) ---
+    score_table_md = "### 📊 **학습 성향 측정 결과**\n\n"
+    score_table_md += "> 전국 학생 데이터와 비교한 표준점수(T점수)와 백분위 결과입니다.\n\n"
+    score_table_md += "| 🎯 구분 | 📋 영역 | 📈 원점수 | 🎯 표준점수(T) | 📊 백분위(%) |\n"
+    score_table_md += "| :---: | :---: | :---: | :---: | :---: |\n"
+    for group, items in REPORT_CATEGORY_GROUPS.items():
+        for idx, item in enumerate(items):
+            if item in student_scores:
+                score_data = student_scores[item]
+                item_name = '**종합**' if item in ['학습전략', '학습기술'] else item.replace('세우기','').replace('하기','')
+                
+                # 백분위에 따른 시각적 표시
+                percentile = score_data['percentile']
+                if percentile >= 84:
+                    level_icon = "🔥"
+                elif percentile >= 50:
+                    level_icon = "✅"
+                else:
+                    level_icon = "⚠️"
+                
+                group_name = group if idx == 0 else ""  # 첫 번째 항목에만 그룹명 표시
+                score_table_md += f"| {group_name} | {item_name} | {score_data['raw']:.1f} | **{score_data['t_score']}** | {level_icon} **{percentile}%** |\n"
+
+    # 점수 테이블 범례 추가
+    score_table_md += "\n**📌 백분위 해석 가이드**\n"
+    score_table_md += "- 🔥 **84% 이상**: 상위 16% (매우 우수)\n"
+    score_table_md += "- ✅ **50% 이상**: 평균 이상 (양호)\n"
+    score_table_md += "- ⚠️ **50% 미만**: 평균 이하 (개선 필요)\n\n"
+
+    # 3-2. 종합 요약 프롬프트 (전반적인 경향성만 설명)
+    summary_prompt = f"""
+    학생의 전반적인 학습 성향을 종합하여 간결한 요약문을 작성해줘.
+    
+    [학생 데이터 요약]
+    - 학생 이름: {student_name}
+    - 주요 동기 유형: {m_type}
+    - 학습 전략/기술 분석: {s_analysis}
+    - 학습 방해 요인 분석: {h_analysis}
+    - 구체적인 점수나 수치는 언급하지 말고, 전반적인 경향성만 설명해줘 : {score_table_md}
+    
+    [작성 지침]
+    - 학생의 학습 성향을 10문장내로 간결하게 요약해줘.
+    - 학생의 강점과 개선이 필요한 부분을 균형있게 언급해줘.
+    - 따뜻하고 격려적인 톤으로 작성해줘.
+    
+    [출력 형식]
+    학생의 학습 성향을 간결하게 요약한 8-10문장의 문단 (제목이나 서식 없이 본문만)
+    """
+
+    return {
+        'm_type': m_type,
+        's_analysis': s_analysis,
+        'h_analysis': h_analysis,
+        'score_table_md': score_table_md,
+        'prompts': {
+            'motivation': motivation_prompt,
+            'strategy': strategy_prompt,
+            'hindrance': hindrance_prompt,
+            'summary': summary_prompt,
+        },
+    }
+
+
+# --------------------
+# 구조화 생성: 네 섹션을 JSON 응답 한 번으로 받기 (REPORT_GENERATION_MODE=structured)
+# 학생 정보·점수·공통 형식 지침을 한 번만 보내므로 섹션별 4회 호출보다 입력 토큰과 요청 수가 크게 줄어듭니다.
+# 응답에서 형식이 맞지 않는 섹션만 기존 섹션별 프롬프트로 다시 생성합니다.
+# --------------------
+REPORT_GENERATION_MODE = os.getenv("REPORT_GENERATION_MODE", "sections")  # sections(섹션별 4회) / structured(1회)
+REPORT_STRUCTURED_MAX_TOKENS = int(os.getenv("REPORT_STRUCTURED_MAX_TOKENS", "4000"))
+REPORT_SECTIONS = ('motivation', 'strategy', 'hindrance', 'summary')
+_COMMENT_HEADINGS = ("#### 검사 결과 분석", "#### 코칭 코멘트")
+
+
+def build_structured_report_prompt(student_name: str, student_scores: dict) -> str:
+    """네 섹션을 한 번에 요청하는 프롬프트. 점수는 표 대신 '항목 T/백분위' 한 줄로 요약합니다."""
+    m_type, _, m_reason, m_coaching = get_motivation_analysis(student_scores)
+    s_analysis, s_coaching_title = get_strategy_analysis(student_scores)
+    h_analysis, h_coaching_title = get_hindrance_analysis(student_scores)
+    score_line = ", ".join(
+        f"{item} {student_scores[item]['t_score']}/{student_scores[item]['percentile']}"
+        for items in REPORT_CATEGORY_GROUPS.values() for item in items if item in student_scores
+    )
+    return f"""아래 학생 데이터로 학습 성향 보고서의 네 섹션을 작성해 JSON 객체 하나로만 답해줘.
+
+[학생 데이터]
+- 이름: {student_name}
+- 항목별 T점수/백분위(%): {score_line}
+
+[섹션별 가이드]
+- motivation (학습 동기): 주요 동기 유형은 {m_type}. 핵심 특징: {m_reason} 코칭 방향: {m_coaching}
+- strategy (학습 전략/기술): {s_analysis} 코칭 방향: "{s_coaching_title}"에 어울리게 강점은 인정하고, 전략(목표/계획) 보완과 기술(이해/문제풀이) 강화를 구체적인 활동 예시로 조언. 코칭 제안은 1, 2번으로 나누어 작성.
+- hindrance (학습 방해 심리/행동): {h_analysis} 코칭 방향: "{h_coaching_title}". 이미 가진 강점은 구체적으로 칭찬.
+- summary (종합 요약): 세 영역을 종합해 강점과 개선점을 균형 있게, 따뜻하고 격려하는 8-10문장의 한 문단. 점수·수치·제목·서식 없이 본문만.
+
+[motivation/strategy/hindrance 공통 형식 (마크다운)]
+#### 검사 결과 분석
+(데이터 기반의 객관적인 분석)
+
+#### 코칭 코멘트
+"**한 줄 요약 코멘트**"
+* **현재 모습**: (학생의 현재 상태)
+* **성장의 기회**: (긍정적 측면과 성장 가능성)
+* **코칭 제안**: (구체적인 조언)
+
+[출력 JSON]
+{{"summary": "...", "motivation": "...", "strategy": "...", "hindrance": "..."}}"""
+
+
+def parse_structured_report(content: str) -> Tuple[dict, List[str]]:
+    """
+    구조화 응답을 검증해 (통과한 섹션 코멘트, 다시 생성할 섹션 목록)을 반환합니다.
+    JSON이 아니면 모든 섹션을, 값이 비었거나 필수 소제목이 빠진 섹션은 그 섹션만 다시 생성합니다.
+    """
+    text = (content or "").strip()
+    start, end = text.find("{"), text.rfind("}")  # 코드 블록(```json)으로 감싼 응답도 허용
+    try:
+        data = json.loads(text[start:end + 1]) if start >= 0 else None
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return {}, list(REPORT_SECTIONS)
+    comments, invalid = {}, []
+    for section in REPORT_SECTIONS:
+        value = data.get(section)
+        if (not isinstance(value, str) or not value.strip()
+                or (section != 'summary' and not all(heading in value for heading in _COMMENT_HEADINGS))):
+            invalid.append(section)
+            continue
+        comments[section] = value.strip()
+    return comments, invalid
+
+
+def _structured_report_request(student_name: str, student_scores: dict) -> Tuple[list, dict]:
+    messages = _report_messages(build_structured_report_prompt(student_name, student_scores))
+    options = {"model": "gpt-4o", "temperature": 0.75, "max_tokens": REPORT_STRUCTURED_MAX_TOKENS,
+               "response_format": {"type": "json_object"}}
+    return messages, options
+
+
+def _structured_report_result(result: LLMResult) -> Tuple[dict, List[str], str]:
+    comments, invalid = parse_structured_report(result.content) if result.ok else ({}, list(REPORT_SECTIONS))
+    if invalid:
+        print(f"--- 구조화 보고서 응답 검증 실패 섹션: {', '.join(invalid)} → 섹션별 호출로 대체 ---")
+    return comments, invalid, (result.content if result.ok else _report_comment(result))
+
+
+def call_llm_for_structured_report(student_name: str, student_scores: dict,
+                                   priority: int = PRIORITY_REPORT) -> Tuple[dict, List[str]]:
+    """네 섹션을 한 번에 생성합니다. 반환값: (검증을 통과한 섹션 코멘트, 섹션별로 다시 생성할 섹션 목록)"""
+    messages, options = _structured_report_request(student_name, student_scores)
+    result = get_gateway().chat(messages, priority=priority, flow=student_name, **options)
+    comments, invalid, logged = _structured_report_result(result)
+    _log_report_call(messages, "structured", result, logged)
+    return comments, invalid
+
+
+async def call_llm_for_structured_report_async(student_name: str, student_scores: dict,
+                                               priority: int = PRIORITY_REPORT) -> Tuple[dict, List[str]]:
+    """call_llm_for_structured_report의 비동기 버전."""
+    messages, options = _structured_report_request(student_name, student_scores)
+    result = await get_gateway().achat(messages, priority=priority, flow=student_name, **options)
+    comments, invalid, logged = _structured_report_result(result)
+    await asyncio.to_thread(_log_report_call, messages, "structured", result, logged)
+    return comments, invalid
+
+
+def render_report_md(student_name: str, report_ctx: dict, comments: dict) -> str:
+    """섹션별 LLM 코멘트를 최종 마크다운 보고서로 조립합니다."""
+    m_type = report_ctx['m_type']
+    s_analysis = report_ctx['s_analysis']
+    h_analysis = report_ctx['h_analysis']
+    score_table_md = report_ctx['score_table_md']
+    motivation_comment = comments['motivation']
+    strategy_comment = comments['strategy']
+    hindrance_comment = comments['hindrance']
+    summary_comment = comments['summary']
+
+    # --- 4. 최종 보고서 텍스트 (가독성 향상된 마크다운)
+    report_md = f"""# 📊 {student_name} 학생 학습 성향 분석 종합 보고서
 
 ---
 
@@ -496,64 +785,144 @@ def generate_report_with_llm(student_name: str, responses: dict, school_level: s
 ---
 *📅 생성일시: {datetime.now().strftime('%Y년 %m월 %d일 %H시 %M분')}*
 """
+    return report_md
+
+
+def _new_survey_response(student_name: str, responses: dict, student_scores: dict, report_md: str,
+                         school_level: Optional[str] = None) -> SurveyResponse:
+    return SurveyResponse(
+        student_name=student_name,
+        school_level=school_level,
+        timestamp=datetime.now(),  # 코호트 집계 기간과 같은 시각을 쓰도록 미리 채웁니다.
+        responses_json=encode_answers(responses),
+        scores_json=json.dumps(student_scores, ensure_ascii=False),
+        report_content=report_md
+    )
+
+
+def _add_survey_response(db, new_response: SurveyResponse, student_scores: dict):
+    """결과 행 추가와 코호트 집계·규준 이동 통계 갱신을 같은 트랜잭션에 넣습니다 (commit_with_retry의 apply에서 호출)."""
+    db.add(new_response)
+    record_cohort_scores(db, new_response.school_level, student_scores, new_response.timestamp)
+    record_norm_observation(db, new_response.school_level, student_scores)
 
-        # --- 4. 결과를 데이터베이스에 저장 ---
+
+def _db_save_failed_report(report_md: str) -> str:
+    # DB 저장에 실패하더라도 보고서 내용은 반환하여 사용자에게 보여줄 수 있도록 함
+    return f"데이터베이스 저장에 실패했습니다. 하지만 보고서는 생성되었습니다.\n\n{report_md}"
+
+
+def generate_report_with_llm(student_name: str, responses: dict, school_level: str = "초등", raw_scores_df: Optional[pd.DataFrame] = None):
+    """
+    학생 데이터를 분석하고 LLM을 호출하여 맞춤형 보고서를 생성하고, 결과를 DB에 저장합니다.
+    - 원점수는 가능하면 외부에서 계산된 값을 그대로 사용합니다(raw_scores_df 전달 시).
+    - raw_scores_df가 없을 경우에만 안전한 fallback 방식(질문→항목 매핑 기반)으로 원점수를 근사합니다.
+    """
+    db = SessionLocal()
+    try:
+        # --- 1. 데이터 로드 및 계산 ---
+        with stage_span("report", "normalization"):
+            student_scores = compute_student_scores(responses, school_level, raw_scores_df)
+
+        # --- 2~3. 섹션별 LLM 코멘트 생성 ---
+        with stage_span("report", "prompt_build"):
+            report_ctx = build_report_prompts(student_name, student_scores)
+        comments, pending = {}, list(report_ctx['prompts'])
+        if REPORT_GENERATION_MODE == "structured":
+            with stage_span("report", "llm_structured"):
+                comments, pending = call_llm_for_structured_report(student_name, student_scores)
+        for section in pending:
+            with stage_span("report", f"llm_{section}"):
+                comments[section] = call_llm_for_report(report_ctx['prompts'][section], flow=student_name, section=section)
+
+        # --- 4. 최종 보고서 텍스트
+        with stage_span("report", "render"):
+            report_md = render_report_md(student_name, report_ctx, comments)
+
+        # --- 5. 결과를 데이터베이스에 저장 ---
         try:
-            new_response = SurveyResponse(
-                student_name=student_name,
-                responses_json=json.dumps(responses, ensure_ascii=False),
-                scores_json=json.dumps(student_scores, ensure_ascii=False),
-                report_content=report_md
-            )
-            db.add(new_response)
-            db.commit()
+            new_response = _new_survey_response(student_name, responses, student_scores, report_md, school_level)
+            with stage_span("report", "db_save"):
+                commit_with_retry(db, lambda s: _add_survey_response(s, new_response, student_scores))
             db.refresh(new_response)
             print(f"--- [성공] {student_name} 학생의 검사 결과가 데이터베이스에 저장되었습니다. (ID: {new_response.id}) ---")
             return report_md # 성공 시 생성된 보고서 내용을 반환
         except Exception as e:
             db.rollback()
             print(f"--- [오류] 데이터베이스 저장 중 오류 발생: {e} ---")
-            # DB 저장에 실패하더라도 보고서 내용은 반환하여 사용자에게 보여줄 수 있도록 함
-            return f"데이터베이스 저장에 실패했습니다. 하지만 보고서는 생성되었습니다.\n\n{report_md}"
+            return _db_save_failed_report(report_md)
 
     finally:
         db.close()
 
 
-# --- 도우미 함수들 (규칙 기반 분석 로직) ---
+async def build_report_async(student_name: str, responses: dict, school_level: str = "초등",
+                             raw_scores_df: Optional[pd.DataFrame] = None) -> Tuple[str, dict]:
+    """
+    점수 계산 → 네 섹션 LLM 호출(동시) → 마크다운 조립까지 수행합니다. DB에는 저장하지 않습니다.
+    반환값: (보고서 마크다운, 항목별 점수)
+    """
+    with stage_span("report", "normalization"):
+        student_scores = compute_student_scores(responses, school_level, raw_scores_df)
+    report_md = await build_report_from_scores_async(student_name, student_scores)
+    return report_md, student_scores
+
+
+async def build_report_from_scores_async(student_name: str, student_scores: dict,
+                                         priority: int = PRIORITY_REPORT, mode: Optional[str] = None) -> str:
+    """
+    이미 계산된 점수로 네 섹션 LLM 호출(동시) → 마크다운 조립을 수행합니다.
+    mode(기본 REPORT_GENERATION_MODE)가 structured면 한 번의 호출로 받고, 검증에 실패한 섹션만 동시에 다시 생성합니다.
+    """
+    with stage_span("report", "prompt_build"):
+        report_ctx = build_report_prompts(student_name, student_scores)
+    comments, sections = {}, list(report_ctx['prompts'].keys())
+
+    async def section_comment(section: str) -> str:
+        # 섹션 호출은 동시에 진행되므로 스팬도 섹션별로 따로 잽니다.
+        with stage_span("report", f"llm_{section}"):
+            return await call_llm_for_report_async(report_ctx['prompts'][section], priority=priority,
+                                                   flow=student_name, section=section)
+
+    with stage_span("report", "llm_total"):
+        if (mode or REPORT_GENERATION_MODE) == "structured":
+            with stage_span("report", "llm_structured"):
+                comments, sections = await call_llm_for_structured_report_async(student_name, student_scores, priority)
+        results = await asyncio.gather(*(section_comment(section) for section in sections))
+    comments.update(zip(sections, results))
+    with stage_span("report", "render"):
+        return render_report_md(student_name, report_ctx, comments)
+
+
+async def generate_report_with_llm_async(student_name: str, responses: dict, school_level: str = "초등", raw_scores_df: Optional[pd.DataFrame] = None):
+    """
+    generate_report_with_llm의 비동기 버전 (Gradio async 핸들러용).
+    네 섹션의 LLM 호출을 동시에 진행하고, DB 저장은 비동기 세션으로 수행합니다.
+    """
+    report_md, student_scores = await build_report_async(student_name, responses, school_level, raw_scores_df)
+
+    try:
+        async with get_async_session_factory()() as db:
+            new_response = _new_survey_response(student_name, responses, student_scores, report_md, school_level)
+
+            async def apply(s):
+                await s.run_sync(_add_survey_response, new_response, student_scores)
+
+            with stage_span("report", "db_save"):
+                await commit_with_retry_async(db, apply)
+            print(f"--- [성공] {student_name} 학생의 검사 결과가 데이터베이스에 저장되었습니다. (ID: {new_response.id}) ---")
+            return report_md
+    except Exception as e:
+        print(f"--- [오류] 데이터베이스 저장 중 오류 발생: {e} ---")
+        return _db_save_failed_report(report_md)
+
+
+# --- 도우미 함수들 (규칙 기반 분석 로직, 규칙 표는 typing_rules) ---
 def get_motivation_analysis(scores):
-    t_self_achieve = scores['자기성취']['t_score']
-    t_social = scores['사회적 관계']['t_score']
-    t_reward_punish = scores['직접적 보상처벌']['t_score']
-    if t_self_achieve > 114:
-        return "자기 주도적 학습형", "자기 주도적 학습형에 가장 가까운 특성을 보이고 있습니다.", "자신이 원하는 이상이나 직업 등, 자신이 관심 있는 분야의 호기심을 충족시키기 위해 공부를 합니다.", "학습에 대한 호기심을 꾸준히 가질 수 있도록, 학생이 스스로 찾고 노력하는 것을 자주 격려하고 지지해 주시기 바랍니다."
-    elif t_social > 114:
-        return "사회 기대적 학습형", "사회 기대적 학습형에 가장 가까운 특성을 보이고 있습니다.", "다른 사람에게 좋은 모습을 보여주어야 한다는 생각에 공부를 합니다.", "자신이 타인의 기대에 부응하고 있다고 느끼도록 해주시기 바랍니다."
-    elif t_self_achieve > 85:
-        return "현상 유지적 학습형", "현상 유지적 학습형에 가장 가까운 특성을 보이고 있습니다.", "막연히 지금보다 나은 사람이 되거나 나의 미래를 준비하기 위해 공부하고자 생각합니다.", "적극적으로 학생이 원하는 것을 찾을 수 있도록 도와주는 것이 필요합니다."
-    elif t_social > 85:
-        return "군중 심리적 학습형", "군중 심리적 학습형에 가장 가까운 특성을 보이고 있습니다.", "다른 친구들이 모두 공부를 할 때 자신도 공부 하지 않으면 뒤쳐질 것이란 생각으로 공부를 하는 학생들입니다.", "자신이 어떤 사람이고 무엇을 좋아하는지 탐색하면서, 자기 자신을 믿을 수 있도록 끊임없이 칭찬과 격려를 해주는 것이 필요합니다."
-    elif t_reward_punish > 114:
-        return "타인 주도적 학습형", "타인 주도적 학습형에 가장 가까운 특성을 보이고 있습니다.", "용돈이나 선물처럼 누가 약속한 물질적인 보상을 얻기 위해 공부하거나, 공부를 하지 않아서 혼이 나는 것을 피하기 위한 목적으로 공부를 합니다.", "학생이 공부를 하는 것을 인정해주고 칭찬하여 꼭 눈에 보이는 보상이 아니더라도 공부를 통해 만족감을 얻을 수 있도록 해주는 것이 좋습니다."
-    else:
-        return "학습 동기 부재형", "학습 동기 부재형에 가장 가까운 특성을 보이고 있습니다.", "공부를 하는 이유가 그 어떤 것을 통해서도 생기지 않는 경우입니다.", "학생이 좋아하는 것이 무엇인지 찾아보고, 좋아하는 것과 공부가 연결될 수 있는 고리를 찾아보시기 바랍니다."
+    return motivation_for(scores)
 
 def get_strategy_analysis(scores):
-    t_strategy = scores['학습전략']['t_score']
-    t_skill = scores['학습기술']['t_score']
-    def get_level(score):
-        if score > 114: return '상'
-        if score >= 86: return '중'
-        return '하'
-    strategy_level, skill_level = get_level(t_strategy), get_level(t_skill)
-    analysis_map = {('상', '상'): "학습 전략과 기술이 모두 뛰어난 상태입니다.", ('상', '중'): "학습 전략 부분은 뛰어나지만, 학습 기술 부분은 일반적인 수준입니다.", ('상', '하'): "학습 전략 부분은 뛰어나지만, 학습 기술 부분이 취약합니다.", ('중', '상'): "학습 기술 부분은 뛰어나지만, 학습 전략 부분은 일반적인 수준입니다.", ('중', '중'): "학습 전략과 기술 부분 모두 일반적인 수준입니다.", ('중', '하'): "학습 전략 부분은 일반적인 반면, 학습 기술 부분이 취약합니다.", ('하', '상'): "학습 기술 부분은 뛰어나지만, 학습 전략 부분이 취약합니다.", ('하', '중'): "학습 기술 부분은 일반적인 반면, 학습 전략 부분이 취약합니다.", ('하', '하'): "학습 전략과 기술이 모두 취약한 상태입니다."}
-    coaching_map = {('하', '중'): "생각하는 힘은 좋지만, 체계적인 학습 관리와 효율적인 공부법이 필요해요."}
-    return analysis_map.get((strategy_level, skill_level), ""), coaching_map.get(('하', '중'), "맞춤형 코칭이 필요합니다.")
+    return strategy_for(scores)
 
 def get_hindrance_analysis(scores):
-    psych_hindrance = any([scores['스트레스민감성']['t_score'] > 114, scores['학습효능감']['t_score'] < 86, scores['친구관계']['t_score'] < 86, scores['가정환경']['t_score'] < 86, scores['학교환경']['t_score'] < 86])
-    behav_hindrance = any([scores['수면조절']['t_score'] < 86, scores['학습집중력']['t_score'] < 86, scores['TV프로그램']['t_score'] > 114, scores['컴퓨터']['t_score'] > 114, scores['스마트기기']['t_score'] > 114])
-    if not psych_hindrance and not behav_hindrance: return "학습을 방해하는 심리적, 행동적 요인 모두 특별히 나쁜 영역 없이 긍정적인 상태를 보이고 있습니다.", "공부에 집중할 수 있는 좋은 마음과 행동 습관을 가지고 있어요."
-    if psych_hindrance and not behav_hindrance: return "학습 방해 부분에서는 심리적 부분에서 좋지 않은 영향을 받고 있는 것 같습니다.", "심리적 안정감을 찾기 위한 노력이 필요합니다."
-    if not psych_hindrance and behav_hindrance: return "학습 방해 부분에서는 행동적 부분에서 좋지 않은 영향을 받고 있는 것 같습니다.", "학습 습관을 개선하기 위한 노력이 필요합니다."
-    return "학습 방해 부분에서는 심리적 부분과 행동적 부분 모두 좋지 않은 영향을 받고 있는 것 같습니다.", "심리적, 행동적 측면 모두 개선이 필요합니다."
+    return hindrance_for(scores)
@@ -1,24 +1,34 @@
 import os
-import openai
+import time
+import threading
 from dotenv import load_dotenv
-from langchain_community.embeddings import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores import Chroma
-import json
 from datetime import datetime
 import base64
 from PIL import Image
 import io
+from sqlalchemy import select
 
 # 데이터베이스 연동을 위한 import
-from sqlalchemy.orm import Session
-from database import SessionLocal, LLMLog, SurveyResponse
-
-# OpenAI v1 클라이언트
-from openai import OpenAI
+from database import (
+    SessionLocal,
+    SurveyResponse,
+    get_async_session_factory,
+    log_llm_interaction_db,
+    log_llm_interaction_db_async,
+)
+
+# 공용 LLM 게이트웨이 (채팅/분류/임베딩 모두 사용)
+from background import after_fork
+from llm_gateway import get_gateway
+from llm_scheduler import PRIORITY_INTERACTIVE
+from metrics import stage_span
+from llm_usage import accounting_fields
+from answer_cache import answer_cache, profile_bucket, profile_context, cache_skip_reason, contains_personal_data
+import profiler
 
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI()
 
 # --- 설정 ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -28,8 +38,27 @@ CURRICULUM_DB_DIR = os.path.join(CHROMA_DB_DIR, "curriculum")
 LOG_DIR = os.path.join(BASE_DIR, "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 
+class GatewayEmbeddings(Embeddings):
+    """LangChain 벡터스토어용 임베딩 어댑터 (공용 LLM 게이트웨이 사용)"""
+
+    def __init__(self, model: str = "text-embedding-3-large"):
+        self.model = model
+
+    def embed_documents(self, texts):
+        return get_gateway().embed(list(texts), model=self.model)
+
+    def embed_query(self, text):
+        return get_gateway().embed([text], model=self.model)[0]
+
+    async def aembed_documents(self, texts):
+        return await get_gateway().aembed(list(texts), model=self.model)
+
+    async def aembed_query(self, text):
+        return (await get_gateway().aembed([text], model=self.model))[0]
+
+
 # 벡터 DB 로드 (RAG 자료용)
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+embeddings = GatewayEmbeddings(model="text-embedding-3-large")
 
 def _make_retriever(path: str):
     try:
@@ -40,10 +69,35 @@ def _make_retriever(path: str):
         pass
     return None
 
-_default_vs = Chroma(persist_directory=CHROMA_DB_DIR, embedding_function=embeddings)
-default_retriever = _default_vs.as_retriever(search_kwargs={"k": 3})
-advice_retriever = _make_retriever(ADVICE_DB_DIR) or default_retriever
-curriculum_retriever = _make_retriever(CURRICULUM_DB_DIR) or default_retriever
+# Chroma 핸들(내부 SQLite 커넥션 포함)은 프로세스마다 처음 사용할 때 엽니다.
+# 벡터 데이터 자체는 디스크(chroma_db)에서 여러 워커 프로세스가 읽기 전용으로 공유합니다.
+_retrievers: dict = {}
+_retrievers_lock = threading.Lock()
+
+
+def get_retrievers() -> dict:
+    """{'default', 'advice', 'curriculum'} 리트리버를 (현재 프로세스에서 처음 호출 시) 생성해 반환합니다."""
+    if _retrievers:
+        return _retrievers
+    with _retrievers_lock:
+        if not _retrievers:
+            default_vs = Chroma(persist_directory=CHROMA_DB_DIR, embedding_function=embeddings)
+            default_retriever = default_vs.as_retriever(search_kwargs={"k": 3})
+            _retrievers.update({
+                'default': default_retriever,
+                'advice': _make_retriever(ADVICE_DB_DIR) or default_retriever,
+                'curriculum': _make_retriever(CURRICULUM_DB_DIR) or default_retriever,
+            })
+    return _retrievers
+
+
+def _reset_retrievers_after_fork():
+    global _retrievers_lock
+    _retrievers.clear()
+    _retrievers_lock = threading.Lock()
+
+
+after_fork(_reset_retrievers_after_fork)
 
 # 대화 기록을 관리할 변수
 conversation_history = []
@@ -66,88 +120,88 @@ SYSTEM_PROMPT = """
 참고 자료 사용 원칙: 필요한 경우에만 외부 자료(학습조언/교육과정) 또는 개인 보고서를 선택적으로 참고합니다.
 """
 
-def classify_query_type(text: str, has_image: bool = False) -> str:
+CLASSIFY_ALLOWED = ("advice", "curriculum", "direct")
+CLASSIFY_SYSTEM_PROMPT = (
+    "You are a precise intent classifier. "
+    "Classify the user's query into exactly one of these labels: 'advice' | 'curriculum' | 'direct'. "
+    "Output ONLY the label in lowercase with no extra words.\n\n"
+    "Definitions:\n"
+    "- advice: Questions seeking learning methods, study strategies, time management, motivation, memory, note-taking, coaching.\n"
+    "- curriculum: Subject matter, concepts/definitions/formulas/proofs, problem solving, exam/unit content, exercises across subjects (math, language, science, etc.).\n"
+    "- direct: General chat or simple questions that don't require external references.\n\n"
+    "Notes:\n"
+    "- If an image is provided with a problem or worksheet, it is often 'curriculum'.\n"
+    "- Choose the single most appropriate label."
+)
+
+
+def _classify_messages(text: str, has_image: bool) -> list:
+    content = f"has_image: {bool(has_image)}\ntext: {text or ''}"
+    return [
+        {"role": "system", "content": CLASSIFY_SYSTEM_PROMPT},
+        {"role": "user", "content": content},
+    ]
+
+
+def _normalize_label(raw: str, has_image: bool) -> str:
+    label = (raw or "").strip().lower().replace("`", "")
+    # 허용 값 정규화
+    if label not in CLASSIFY_ALLOWED:
+        # 응답 문구 안에 허용 토큰이 포함되어 있으면 추출
+        extracted = None
+        for tok in CLASSIFY_ALLOWED:
+            if tok in label:
+                extracted = tok
+                break
+        label = extracted or ("curriculum" if has_image else "direct")
+    return label
+
+
+def classify_query_type(text: str, has_image: bool = False, flow: str = None) -> str:
     """LLM을 사용해 사용자 의도를 분류하여 RAG 라우팅 결정.
+    flow는 스케줄러의 공정 배분 단위(학생 이름)입니다.
     returns: 'advice' | 'curriculum' | 'direct'
     """
-    allowed = {"advice", "curriculum", "direct"}
     # 빈 입력 처리
     if not (text and text.strip()) and not has_image:
         return "direct"
 
     db = SessionLocal()
     try:
-        system_prompt = (
-            "You are a precise intent classifier. "
-            "Classify the user's query into exactly one of these labels: 'advice' | 'curriculum' | 'direct'. "
-            "Output ONLY the label in lowercase with no extra words.\n\n"
-            "Definitions:\n"
-            "- advice: Questions seeking learning methods, study strategies, time management, motivation, memory, note-taking, coaching.\n"
-            "- curriculum: Subject matter, concepts/definitions/formulas/proofs, problem solving, exam/unit content, exercises across subjects (math, language, science, etc.).\n"
-            "- direct: General chat or simple questions that don't require external references.\n\n"
-            "Notes:\n"
-            "- If an image is provided with a problem or worksheet, it is often 'curriculum'.\n"
-            "- Choose the single most appropriate label."
-        )
-        content = f"has_image: {bool(has_image)}\ntext: {text or ''}"
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": content},
-        ]
+        messages = _classify_messages(text, has_image)
         # 입력 로그
-        try:
-            log_llm_interaction_db(db, "classify_input", {"messages": messages}, "")
-        except Exception:
-            pass
-
-        resp = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            temperature=0,
-            max_tokens=5,
-        )
-        label = (resp.choices[0].message.content or "").strip().lower().replace("`", "")
-        # 허용 값 정규화
-        if label not in allowed:
-            # 응답 문구 안에 허용 토큰이 포함되어 있으면 추출
-            extracted = None
-            for tok in allowed:
-                if tok in label:
-                    extracted = tok
-                    break
-            label = extracted or ("curriculum" if has_image else "direct")
-
-        try:
-            log_llm_interaction_db(db, "classify_output", {"messages": messages}, label)
-        except Exception:
-            pass
+        log_llm_interaction_db(db, "classify_input", {"messages": messages}, "")
+        result = get_gateway().chat(messages, model="gpt-4o", temperature=0, max_tokens=5,
+                                    priority=PRIORITY_INTERACTIVE, flow=flow)
+        if not result.ok:
+            # 오류 시 안전한 기본값 + 오류 로그
+            log_llm_interaction_db(db, "classify_error", {"text": text, "has_image": has_image}, result.error,
+                                   usage=accounting_fields(result))
+            return "curriculum" if has_image else "direct"
+        label = _normalize_label(result.content, has_image)
+        log_llm_interaction_db(db, "classify_output", {"messages": messages}, label, usage=accounting_fields(result))
         return label
-    except Exception as e:
-        # 오류 시 안전한 기본값 + 오류 로그
-        try:
-            log_llm_interaction_db(db, "classify_error", {"text": text, "has_image": has_image}, str(e))
-        except Exception:
-            pass
-        return "curriculum" if has_image else "direct"
     finally:
-        try:
-            db.close()
-        except Exception:
-            pass
+        db.close()
+
+
+async def classify_query_type_async(text: str, has_image: bool = False, flow: str = None) -> str:
+    """classify_query_type의 비동기 버전."""
+    if not (text and text.strip()) and not has_image:
+        return "direct"
+
+    messages = _classify_messages(text, has_image)
+    await log_llm_interaction_db_async("classify_input", {"messages": messages}, "")
+    result = await get_gateway().achat(messages, model="gpt-4o", temperature=0, max_tokens=5,
+                                         priority=PRIORITY_INTERACTIVE, flow=flow)
+    if not result.ok:
+        await log_llm_interaction_db_async("classify_error", {"text": text, "has_image": has_image}, result.error,
+                                           usage=accounting_fields(result))
+        return "curriculum" if has_image else "direct"
+    label = _normalize_label(result.content, has_image)
+    await log_llm_interaction_db_async("classify_output", {"messages": messages}, label, usage=accounting_fields(result))
+    return label
 
-def log_llm_interaction_db(db: Session, interaction_type: str, input_data: dict, output_data: str):
-    """LLM 상호작용을 데이터베이스에 로그로 남깁니다."""
-    try:
-        new_log = LLMLog(
-            interaction_type=interaction_type,
-            input_data=json.dumps(input_data, ensure_ascii=False),
-            output_data=output_data
-        )
-        db.add(new_log)
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        print(f"--- [오류] LLM 로그 DB 저장 실패: {e} ---")
 
 def encode_image_to_base64(image_path):
     """이미지 파일을 Base64로 인코딩합니다."""
@@ -161,6 +215,82 @@ def encode_image_to_base64(image_path):
         print(f"--- [오류] 이미지 인코딩 실패: {e} ---")
         return None
 
+
+def _personal_report_context(student_name: str, latest_response) -> str:
+    if latest_response and latest_response.report_content:
+        print(f"--- [정보] {student_name} 학생의 최신 보고서를 DB에서 로드했습니다. ---")
+        return f"다음은 {student_name} 학생의 학습 성향 분석 보고서입니다. 이 내용을 최우선으로 참고하여 답변하세요.\n\n--- 학생 보고서 시작 ---\n{latest_response.report_content}\n--- 학생 보고서 끝 ---"
+    return f"{student_name} 학생의 학습 성향 분석 보고서를 찾을 수 없습니다. 검사를 먼저 받도록 안내하세요."
+
+
+def _latest_report_query(student_name: str):
+    return (
+        select(SurveyResponse)
+        .where(SurveyResponse.student_name == student_name)
+        .order_by(SurveyResponse.timestamp.desc())
+        .limit(1)
+    )
+
+
+def _search(retriever, user_message: str, query_vector=None):
+    # 답변 캐시 조회에 쓴 질문 임베딩이 있으면 다시 임베딩하지 않고 벡터로 검색합니다.
+    if query_vector is not None and hasattr(retriever, "vectorstore"):
+        return retriever.vectorstore.similarity_search_by_vector(query_vector, **retriever.search_kwargs)
+    return retriever.invoke(user_message)
+
+
+def _retrieve_context(qtype: str, user_message: str, query_vector=None) -> str:
+    if qtype == 'advice':
+        # 학습방법/코칭 류 → 개인 보고서 + 학습조언 RAG
+        docs = _search(get_retrievers()['advice'], user_message, query_vector)
+    elif qtype == 'curriculum':
+        # 교육과정/개념/풀이 류 → 교육과정 RAG
+        docs = get_retrievers()['curriculum'].invoke(user_message)
+    else:
+        # direct: RAG 생략하여 빠른 응답
+        docs = []
+    return "\n\n".join(getattr(d, 'page_content', '') for d in docs)
+
+
+def _build_chat_messages(personal_report: str, selected_ctx: str, history: list, user_message: str, image_path: str = None) -> list:
+    context = personal_report
+    if selected_ctx:
+        context += "\n\n--- 추가 참고 자료 ---\n" + selected_ctx
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": context}
+    ] + [dict(m) for m in history]
+
+    # 이미지 처리
+    if image_path:
+        base64_image = encode_image_to_base64(image_path)
+        if base64_image:
+            # 마지막 사용자 메시지에 이미지 추가
+            messages[-1]['content'] = [
+                {"type": "text", "text": user_message},
+                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
+            ]
+    return messages
+
+
+CHAT_ERROR_RESPONSE = "죄송합니다. 답변을 생성하는 동안 문제가 발생했습니다. 다시 시도해 주세요."
+
+
+def _cache_hit_log(user_message: str, bucket: str, qtype: str, hit: dict) -> dict:
+    return {"query": user_message, "bucket": bucket, "route": qtype,
+            "similarity": round(hit['similarity'], 4), "cached_question": hit['question']}
+
+
+def _store_answer(bucket: str, qtype: str, query_vector, user_message: str, ai_response: str,
+                  student_name: str, latest_response, latency_ms: float):
+    # 구간 정보만으로 만들었어도 이름·점수가 섞여 들어간 답변은 다른 학생에게 가지 않도록 저장하지 않습니다.
+    if contains_personal_data(ai_response, student_name, latest_response):
+        answer_cache.skip("personal_data")
+        return
+    answer_cache.store(bucket, qtype, query_vector, user_message, ai_response, latency_ms)
+
+
 def get_ai_response(user_message: str, history: list, image_path: str = None, student_name: str = None):
     """사용자 메시지에 대한 AI의 응답을 생성하고 DB에 로그를 남깁니다."""
     global conversation_history
@@ -169,73 +299,76 @@ def get_ai_response(user_message: str, history: list, image_path: str = None, st
         # --- 컨텍스트 준비 ---
         # 1. 학생 개인 보고서 조회 (DB)
         personal_report = ""
+        latest_response = None
         if student_name:
             try:
-                latest_response = db.query(SurveyResponse).filter(SurveyResponse.student_name == student_name).order_by(SurveyResponse.timestamp.desc()).first()
-                if latest_response and latest_response.report_content:
-                    personal_report = f"다음은 {student_name} 학생의 학습 성향 분석 보고서입니다. 이 내용을 최우선으로 참고하여 답변하세요.\n\n--- 학생 보고서 시작 ---\n{latest_response.report_content}\n--- 학생 보고서 끝 ---"
-                    print(f"--- [정보] {student_name} 학생의 최신 보고서를 DB에서 로드했습니다. ---")
-                else:
-                    personal_report = f"{student_name} 학생의 학습 성향 분석 보고서를 찾을 수 없습니다. 검사를 먼저 받도록 안내하세요."
+                with stage_span("chat", "report_lookup"):
+                    latest_response = db.execute(_latest_report_query(student_name)).scalars().first()
+                personal_report = _personal_report_context(student_name, latest_response)
             except Exception as e:
                 print(f"--- [오류] {student_name} 학생의 보고서 DB 조회 실패: {e} ---")
                 personal_report = "학생 보고서를 조회하는 중 오류가 발생했습니다."
 
         # 2. 질의 유형 분류 및 선택적 RAG 활용
-        qtype = classify_query_type(user_message, has_image=bool(image_path))
-        selected_ctx = ""
-        if qtype == 'advice':
-            # 학습방법/코칭 류 → 개인 보고서 + 학습조언 RAG
-            docs = advice_retriever.invoke(user_message) if advice_retriever else []
-            selected_ctx = "\n\n".join(getattr(d, 'page_content', '') for d in docs)
-        elif qtype == 'curriculum':
-            # 교육과정/개념/풀이 류 → 교육과정 RAG
-            docs = curriculum_retriever.invoke(user_message) if curriculum_retriever else []
-            selected_ctx = "\n\n".join(getattr(d, 'page_content', '') for d in docs)
+        with stage_span("chat", "classification"):
+            qtype = classify_query_type(user_message, has_image=bool(image_path), flow=student_name)
+
+        # 3. 답변 캐시 (advice/direct, 이미지 없는 독립 질문만 조회·저장)
+        #    캐시 대상 턴은 개인 보고서 대신 프로필 구간 정보로 답변을 만듭니다 (다른 학생에게 그대로 돌려주므로).
+        bucket = profile_bucket(latest_response)
+        query_vector = None
+        skip_reason = cache_skip_reason(qtype, bool(image_path), bool(conversation_history))
+        if skip_reason is None:
+            started = time.perf_counter()
+            try:
+                with stage_span("chat", "cache_lookup"):
+                    query_vector = embeddings.embed_query(user_message)
+                    hit = answer_cache.lookup(bucket, qtype, query_vector, (time.perf_counter() - started) * 1000)
+            except Exception as e:
+                print(f"--- [경고] 답변 캐시 조회 실패: {e} ---")
+                answer_cache.skip("embedding_error")
+                hit = None
+            if hit:
+                ai_response = hit['response']
+                log_llm_interaction_db(db, "chat_cache_hit", _cache_hit_log(user_message, bucket, qtype, hit), ai_response)
+                conversation_history.append({"role": "user", "content": user_message})
+                conversation_history.append({"role": "assistant", "content": ai_response})
+                conversation_history = conversation_history[-20:]
+                return ai_response
         else:
-            # direct: RAG 생략하여 빠른 응답
-            selected_ctx = ""
+            answer_cache.skip(skip_reason)
 
-        context = personal_report
-        if selected_ctx:
-            context += "\n\n--- 추가 참고 자료 ---\n" + selected_ctx
+        generation_started = time.perf_counter()
+        with stage_span("chat", "retrieval"):
+            selected_ctx = _retrieve_context(qtype, user_message, query_vector)
 
         # --- 메시지 구성 ---
         # 대화 기록 관리 (최근 20턴 유지)
         conversation_history.append({"role": "user", "content": user_message})
         conversation_history = conversation_history[-20:] # user-assistant 10쌍 = 20턴
-
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "system", "content": context}
-        ] + conversation_history
-
-        # 이미지 처리
-        if image_path:
-            base64_image = encode_image_to_base64(image_path)
-            if base64_image:
-                # 마지막 사용자 메시지에 이미지 추가
-                messages[-1]['content'] = [
-                    {"type": "text", "text": user_message},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
-                ]
+        report_context = profile_context(bucket) if query_vector is not None else personal_report
+        messages = _build_chat_messages(report_context, selected_ctx, conversation_history, user_message, image_path)
 
         # --- LLM 호출 및 로깅 ---
-        try:
+        with stage_span("chat", "logging"):
             log_llm_interaction_db(db, "chat_input", {"messages": messages}, "")
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=2000
-            )
-            ai_response = response.choices[0].message.content.strip()
-            log_llm_interaction_db(db, "chat_output", {"messages": messages}, ai_response)
-        except Exception as e:
-            error_message = f"--- [오류] OpenAI API 호출 실패: {e} ---"
-            print(error_message)
-            ai_response = "죄송합니다. 답변을 생성하는 동안 문제가 발생했습니다. 다시 시도해 주세요."
-            log_llm_interaction_db(db, "chat_error", {"messages": messages}, error_message)
+        with stage_span("chat", "llm"):
+            result = get_gateway().chat(messages, model="gpt-4o", temperature=0.7, max_tokens=2000,
+                                        priority=PRIORITY_INTERACTIVE, flow=student_name)
+        with stage_span("chat", "logging"):
+            if result.ok:
+                ai_response = result.content.strip()
+                log_llm_interaction_db(db, "chat_output", {"messages": messages}, ai_response,
+                                       usage=accounting_fields(result))
+                if query_vector is not None:
+                    _store_answer(bucket, qtype, query_vector, user_message, ai_response, student_name, latest_response,
+                                  (time.perf_counter() - generation_started) * 1000)
+            else:
+                error_message = f"--- [오류] OpenAI API 호출 실패: {result.error} ---"
+                print(error_message)
+                ai_response = CHAT_ERROR_RESPONSE
+                log_llm_interaction_db(db, "chat_error", {"messages": messages}, error_message,
+                                       usage=accounting_fields(result))
 
         # 대화 기록에 AI 응답 추가
         conversation_history.append({"role": "assistant", "content": ai_response})
@@ -245,26 +378,110 @@ def get_ai_response(user_message: str, history: list, image_path: str = None, st
         db.close()
 
 
-def gradio_chat_with_history(message: str, history: list, image, student_name: str = None):
-    """Gradio 인터페이스를 위한 챗봇 함수"""
-    global conversation_history
+async def get_ai_response_async(user_message: str, history: list, image_path: str = None, student_name: str = None):
+    """
+    get_ai_response의 비동기 버전 (Gradio async 핸들러용).
+    전역 conversation_history 대신 전달받은 history만 사용하므로 동시 요청 간에 대화가 섞이지 않습니다.
+    """
+    personal_report = ""
+    latest_response = None
+    if student_name:
+        try:
+            with stage_span("chat", "report_lookup"):
+                async with get_async_session_factory()() as db:
+                    latest_response = (await db.execute(_latest_report_query(student_name))).scalars().first()
+            personal_report = _personal_report_context(student_name, latest_response)
+        except Exception as e:
+            print(f"--- [오류] {student_name} 학생의 보고서 DB 조회 실패: {e} ---")
+            personal_report = "학생 보고서를 조회하는 중 오류가 발생했습니다."
+
+    with stage_span("chat", "classification"):
+        qtype = await classify_query_type_async(user_message, has_image=bool(image_path), flow=student_name)
+
+    # 답변 캐시 (advice/direct, 이미지 없는 독립 질문만 조회·저장, 캐시 대상 턴은 프로필 구간 정보로 생성)
+    bucket = profile_bucket(latest_response)
+    query_vector = None
+    skip_reason = cache_skip_reason(qtype, bool(image_path), bool(history))
+    if skip_reason is None:
+        started = time.perf_counter()
+        try:
+            with stage_span("chat", "cache_lookup"):
+                query_vector = await embeddings.aembed_query(user_message)
+                hit = answer_cache.lookup(bucket, qtype, query_vector, (time.perf_counter() - started) * 1000)
+        except Exception as e:
+            print(f"--- [경고] 답변 캐시 조회 실패: {e} ---")
+            answer_cache.skip("embedding_error")
+            hit = None
+        if hit:
+            ai_response = hit['response']
+            await log_llm_interaction_db_async("chat_cache_hit", _cache_hit_log(user_message, bucket, qtype, hit), ai_response)
+            return ai_response
+    else:
+        answer_cache.skip(skip_reason)
+
+    generation_started = time.perf_counter()
+    # Chroma 검색은 동기 API이므로 짧게 스레드로 위임
+    with stage_span("chat", "retrieval"):
+        selected_ctx = await profiler.to_thread(_retrieve_context, qtype, user_message, query_vector)
+
+    turns = (list(history) + [{"role": "user", "content": user_message}])[-20:]
+    report_context = profile_context(bucket) if query_vector is not None else personal_report
+    messages = await profiler.to_thread(_build_chat_messages, report_context, selected_ctx, turns, user_message, image_path)
+
+    with stage_span("chat", "logging"):
+        await log_llm_interaction_db_async("chat_input", {"messages": messages}, "")
+    with stage_span("chat", "llm"):
+        result = await get_gateway().achat(messages, model="gpt-4o", temperature=0.7, max_tokens=2000,
+                                             priority=PRIORITY_INTERACTIVE, flow=student_name)
+    with stage_span("chat", "logging"):
+        if result.ok:
+            ai_response = result.content.strip()
+            await log_llm_interaction_db_async("chat_output", {"messages": messages}, ai_response,
+                                                 usage=accounting_fields(result))
+            if query_vector is not None:
+                _store_answer(bucket, qtype, query_vector, user_message, ai_response, student_name, latest_response,
+                              (time.perf_counter() - generation_started) * 1000)
+        else:
+            error_message = f"--- [오류] OpenAI API 호출 실패: {result.error} ---"
+            print(error_message)
+            ai_response = CHAT_ERROR_RESPONSE
+            await log_llm_interaction_db_async("chat_error", {"messages": messages}, error_message,
+                                                 usage=accounting_fields(result))
+    return ai_response
+
+
+def _gradio_history_to_messages(history: list) -> list:
     # Gradio의 history 형식을 OpenAI 형식으로 변환
-    conversation_history = []
+    messages = []
     for user_msg, ai_msg in history:
-        conversation_history.append({"role": "user", "content": user_msg})
+        messages.append({"role": "user", "content": user_msg})
         if ai_msg:
-            conversation_history.append({"role": "assistant", "content": ai_msg})
+            messages.append({"role": "assistant", "content": ai_msg})
+    return messages
 
+
+def _image_to_path(image):
     # 이미지가 파일 객체인 경우 .name 속성을 사용하고, 문자열인 경우 그대로 사용
-    image_path = None
     if image:
         if hasattr(image, 'name'):
-            image_path = image.name
+            return image.name
         elif isinstance(image, str):
-            image_path = image
-    response = get_ai_response(message, conversation_history, image_path=image_path, student_name=student_name)
+            return image
+    return None
+
+
+def gradio_chat_with_history(message: str, history: list, image, student_name: str = None):
+    """Gradio 인터페이스를 위한 챗봇 함수"""
+    global conversation_history
+    conversation_history = _gradio_history_to_messages(history)
+    response = get_ai_response(message, conversation_history, image_path=_image_to_path(image), student_name=student_name)
     return response
 
+
+async def gradio_chat_with_history_async(message: str, history: list, image, student_name: str = None):
+    """Gradio async 핸들러를 위한 챗봇 함수"""
+    return await get_ai_response_async(message, _gradio_history_to_messages(history), image_path=_image_to_path(image), student_name=student_name)
+
 # CLI 테스트용 함수
 def chat_cli():
     print("[ESLI 상담 에이전트 - CLI]")
@@ -0,0 +1,298 @@
+"""
+공용 LLM 게이트웨이.
+
+보고서(esli_02)와 채팅(esli_03)이 함께 쓰는 단일 비동기 OpenAI 클라이언트를 관리합니다.
+- httpx 커넥션 풀(LLM_MAX_CONNECTIONS / LLM_MAX_KEEPALIVE) 공유
+- 호출별 전체 마감시간(LLM_TIMEOUT, 재시도 포함)
+- 429/5xx/연결 오류에 대한 지터 지수 백오프 재시도(LLM_MAX_RETRIES)
+- 성공/실패를 모두 LLMResult 하나로 반환
+- 채팅 완성은 llm_scheduler의 RPM/TPM 토큰 버킷과 우선순위 대기열을 거쳐 실행
+클라이언트는 게이트웨이 전용 이벤트 루프 스레드에서만 사용되며, 동기 호출(chat/embed)과
+다른 이벤트 루프의 비동기 호출(achat/aembed)은 모두 이 루프로 위임됩니다.
+OPENAI_BASE_URL을 지정하면 로컬 가짜 서버 등 OpenAI 호환 엔드포인트로 보낼 수 있습니다.
+"""
+import os
+import time
+import random
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Optional, List
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+
+from background import after_fork
+from llm_scheduler import LLMScheduler, PRIORITY_INTERACTIVE, estimate_tokens, WAIT_BUCKETS
+from metrics import register_collector
+
+load_dotenv()
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "0.5"))
+LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX", "8"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+
+DEFAULT_CHAT_MODEL = "gpt-4o"
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-large"
+
+
+@dataclass
+class LLMResult:
+    """LLM 호출 결과 (성공/실패 공통)"""
+    ok: bool
+    content: str = ""
+    model: str = ""
+    usage: dict = field(default_factory=dict)  # prompt_tokens / completion_tokens / total_tokens
+    latency: float = 0.0                        # 재시도를 포함한 전체 소요 시간(초)
+    attempts: int = 0
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+
+
+class LLMError(Exception):
+    """실패한 LLMResult를 예외로 다뤄야 할 때 사용합니다."""
+
+    def __init__(self, result: LLMResult):
+        super().__init__(result.error)
+        self.result = result
+
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, (openai.APIConnectionError, openai.APITimeoutError, asyncio.TimeoutError)):
+        return True
+    if isinstance(e, openai.RateLimitError):
+        return True
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code >= 500
+    return False
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    """429 응답의 Retry-After 헤더(초)를 읽습니다."""
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_delay(attempt: int) -> float:
+    # full jitter: [0, min(max, base * 2^attempt)]
+    return random.uniform(0, min(LLM_RETRY_MAX, LLM_RETRY_BASE * (2 ** attempt)))
+
+
+class LLMGateway:
+    def __init__(self, base_url: Optional[str] = OPENAI_BASE_URL, timeout: float = LLM_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[AsyncOpenAI] = None
+        self._lock = threading.Lock()
+        # 게이트웨이 루프 안에서만 사용되는 전역 스케줄러
+        self.scheduler = LLMScheduler()
+
+    # --- 전용 이벤트 루프 ---
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None and self._thread is not None and self._thread.is_alive():
+            return self._loop
+        with self._lock:
+            if self._loop is not None and self._thread is not None and self._thread.is_alive():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                ready.set()
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name="llm-gateway", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+            self._client = None
+            return loop
+
+    def _get_client(self) -> AsyncOpenAI:
+        # 게이트웨이 루프 안에서만 호출됩니다.
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_KEEPALIVE),
+                timeout=httpx.Timeout(self.timeout, connect=LLM_CONNECT_TIMEOUT),
+            )
+            self._client = AsyncOpenAI(base_url=self.base_url, http_client=http_client, max_retries=0)
+        return self._client
+
+    def _submit(self, coro):
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    async def _delegate(self, coro):
+        """호출한 이벤트 루프를 막지 않고 게이트웨이 루프에서 코루틴을 실행합니다."""
+        loop = self._ensure_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    # --- 재시도 공통 ---
+    async def _with_retries(self, call, timeout: Optional[float]):
+        """call()을 마감시간 안에서 재시도하며 실행합니다. (결과, 시도 횟수, 오류)를 반환합니다."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError("LLM 호출 마감시간 초과")
+                return await asyncio.wait_for(call(), timeout=remaining), attempt, None
+            except Exception as e:
+                if attempt > self.max_retries or not _is_retryable(e):
+                    return None, attempt, e
+                delay = _retry_after(e) or _backoff_delay(attempt - 1)
+                if time.monotonic() + delay >= deadline:
+                    return None, attempt, e
+                await asyncio.sleep(delay)
+
+    # --- 채팅 완성 ---
+    async def _chat(self, messages: list, model: str, timeout: Optional[float],
+                    priority: int, flow: Optional[str], **kwargs) -> LLMResult:
+        started = time.monotonic()
+        try:
+            client = self._get_client()
+        except openai.OpenAIError as e:  # API 키 미설정 등
+            return LLMResult(ok=False, model=model, error=f"{type(e).__name__}: {e}")
+        estimated = estimate_tokens(messages, kwargs.get("max_tokens"))
+
+        async def call():
+            # 재시도도 요청 한 건으로 계산되므로 시도마다 허가를 받습니다.
+            await self.scheduler.acquire(estimated, priority, flow)
+            actual = None
+            try:
+                response = await client.chat.completions.create(model=model, messages=messages, **kwargs)
+                if getattr(response, "usage", None):
+                    actual = response.usage.total_tokens
+                return response
+            finally:
+                self.scheduler.settle(estimated, actual)
+
+        response, attempts, error = await self._with_retries(call, timeout)
+        latency = time.monotonic() - started
+        if error is not None:
+            return LLMResult(
+                ok=False, model=model, latency=latency, attempts=attempts,
+                error=f"{type(error).__name__}: {error}",
+                status_code=getattr(error, "status_code", None),
+            )
+        usage = response.usage.model_dump() if getattr(response, "usage", None) else {}
+        return LLMResult(
+            ok=True,
+            content=(response.choices[0].message.content or ""),
+            model=response.model or model,
+            usage={k: usage.get(k) for k in ("prompt_tokens", "completion_tokens", "total_tokens")},
+            latency=latency,
+            attempts=attempts,
+        )
+
+    async def achat(self, messages: list, model: str = DEFAULT_CHAT_MODEL, timeout: Optional[float] = None,
+                    priority: int = PRIORITY_INTERACTIVE, flow: Optional[str] = None, **kwargs) -> LLMResult:
+        """
+        비동기 채팅 완성. kwargs는 chat.completions.create에 그대로 전달됩니다(temperature, max_tokens 등).
+        priority는 llm_scheduler의 우선순위, flow는 같은 우선순위 안에서 공정 배분할 단위(학생/세션)입니다.
+        """
+        return await self._delegate(self._chat(messages, model, timeout, priority, flow, **kwargs))
+
+    def chat(self, messages: list, model: str = DEFAULT_CHAT_MODEL, timeout: Optional[float] = None,
+             priority: int = PRIORITY_INTERACTIVE, flow: Optional[str] = None, **kwargs) -> LLMResult:
+        """동기 채팅 완성 (CLI 등 동기 코드용)."""
+        return self._submit(self._chat(messages, model, timeout, priority, flow, **kwargs)).result()
+
+    def get_metrics(self) -> dict:
+        """스케줄러 대기열 깊이/대기 시간 지표 (게이트웨이 루프에서 읽어 일관된 값을 반환)."""
+        async def read():
+            return self.scheduler.get_metrics()
+        return self._submit(read()).result(timeout=5)
+
+    # --- 임베딩 ---
+    async def _embed(self, texts: List[str], model: str, timeout: Optional[float]) -> List[List[float]]:
+        try:
+            client = self._get_client()
+        except openai.OpenAIError as e:
+            raise LLMError(LLMResult(ok=False, model=model, error=f"{type(e).__name__}: {e}"))
+        response, _, error = await self._with_retries(
+            lambda: client.embeddings.create(model=model, input=texts), timeout
+        )
+        if error is not None:
+            raise LLMError(LLMResult(ok=False, model=model, error=f"{type(error).__name__}: {error}",
+                                     status_code=getattr(error, "status_code", None)))
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    async def aembed(self, texts: List[str], model: str = DEFAULT_EMBEDDING_MODEL, timeout: Optional[float] = None) -> List[List[float]]:
+        """비동기 임베딩. 실패 시 LLMError를 발생시킵니다."""
+        return await self._delegate(self._embed(texts, model, timeout))
+
+    def embed(self, texts: List[str], model: str = DEFAULT_EMBEDDING_MODEL, timeout: Optional[float] = None) -> List[List[float]]:
+        """동기 임베딩. 실패 시 LLMError를 발생시킵니다."""
+        return self._submit(self._embed(texts, model, timeout)).result()
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def _reset_gateway_after_fork():
+    # 부모의 이벤트 루프 스레드/HTTP 커넥션은 자식으로 넘어오지 않으므로 새 게이트웨이를 만들게 합니다.
+    global _gateway, _gateway_lock
+    _gateway = None
+    _gateway_lock = threading.Lock()
+
+
+after_fork(_reset_gateway_after_fork)
+
+
+def get_gateway() -> LLMGateway:
+    """프로세스 공용 게이트웨이를 반환합니다."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
+
+
+@register_collector
+def _scheduler_metrics() -> List[str]:
+    """/metrics용 스케줄러 지표 (게이트웨이를 아직 쓰지 않은 프로세스에서는 루프를 띄우지 않음)"""
+    if _gateway is None:
+        return []
+    metrics = _gateway.get_metrics()
+    lines = [
+        "# TYPE esli_llm_rpm_available gauge",
+        f"esli_llm_rpm_available {metrics['rpm_available']}",
+        "# TYPE esli_llm_tpm_available gauge",
+        f"esli_llm_tpm_available {metrics['tpm_available']}",
+        "# TYPE esli_llm_queue_depth gauge",
+    ]
+    for name, stats in metrics["priorities"].items():
+        lines.append(f'esli_llm_queue_depth{{priority="{name}"}} {stats["queue_depth"]}')
+    lines.append("# TYPE esli_llm_scheduler_wait_seconds histogram")
+    for name, stats in metrics["priorities"].items():
+        cumulative = 0
+        for bound, count in zip([*map(str, WAIT_BUCKETS), "+Inf"], stats["wait_seconds_buckets"].values()):
+            cumulative += count
+            lines.append(f'esli_llm_scheduler_wait_seconds_bucket{{priority="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'esli_llm_scheduler_wait_seconds_sum{{priority="{name}"}} {stats["wait_seconds_sum"]}')
+        lines.append(f'esli_llm_scheduler_wait_seconds_count{{priority="{name}"}} {stats["granted"]}')
+    return lines
@@ -0,0 +1,501 @@
+"""
+llm_logs 기간 분할과 보관(아카이브).
+
+채팅 한 턴마다 본문이 큰 행이 여러 개 쌓이므로, llm_logs를 기간(LLM_LOG_PARTITION: month/day)별로 나눠
+최근 구간만 DB에 두고 오래된 구간은 압축 Parquet 파일로 옮깁니다.
+
+- PostgreSQL: llm_logs를 timestamp 기준 RANGE 파티션 테이블로 씁니다 (llm_logs_p<기간>, 기본 파티션
+  llm_logs_default). 앞으로 쓸 파티션은 LLM_LOG_PREMAKE개 미리 만듭니다.
+  기존 일반 테이블은 `python llm_log_archive.py partition`으로 한 번 변환합니다.
+- SQLite: llm_logs는 현재 기간만 담는 활성 테이블이고, 지난 기간의 행은 llm_logs_p<기간> 롤오버 테이블로
+  옮깁니다 (INSERT ... SELECT + DELETE를 한 트랜잭션으로).
+- 공통: 기간이 끝난 지 LLM_LOG_HOT_DAYS일이 지난 파티션/롤오버 테이블은
+  LLM_LOG_ARCHIVE_DIR/llm_logs_<기간>.parquet(zstd)로 내보내고 행 수를 확인한 뒤 삭제합니다.
+  LLM_LOG_ARCHIVE_RETENTION_DAYS(0 = 무기한)가 지난 보관 파일은 지웁니다.
+- 사용량 집계(llm_usage.rollup_once)가 아직 읽지 않은 행(id > last_log_id)은 옮기거나 보관하지 않습니다.
+  SQLite는 id 재사용을 막기 위해 가장 큰 id의 행도 활성 테이블에 남깁니다.
+- query_logs(start, end): DB와 보관 파일에서 기간이 겹치는 곳만 읽어 합쳐 돌려줍니다
+  (Parquet은 열/조건 푸시다운으로 필요한 부분만 읽음).
+
+여러 워커가 동시에 돌려도 한 프로세스만 작업하도록 보관 폴더의 잠금 파일(flock)을 씁니다.
+
+명령행:
+    python llm_log_archive.py run [--vacuum]
+    python llm_log_archive.py status
+    python llm_log_archive.py partition          # PostgreSQL: 기존 llm_logs를 파티션 테이블로 변환
+    python llm_log_archive.py query --start 2026-01-01 --end 2026-02-01 [--type chat] [--bodies]
+관리자 API: GET /admin/llm-logs, GET /admin/llm-logs/partitions, POST /admin/llm-logs/archive
+"""
+import os
+import re
+import json
+import argparse
+from datetime import datetime, timedelta
+from typing import Optional, List
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import Table, Column, MetaData, select, insert, delete, func, inspect, text
+
+from admin import require_admin
+from background import PeriodicWorker
+from database import engine, LLMLog, LLMUsageRollupState
+
+try:
+    import fcntl
+except ImportError:  # Windows 개발 환경: 프로세스 간 잠금 없이 동작
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LLM_LOG_ARCHIVE_ENABLED = os.getenv("LLM_LOG_ARCHIVE_ENABLED", "true").lower() == "true"
+LLM_LOG_ARCHIVE_DIR = os.getenv("LLM_LOG_ARCHIVE_DIR", os.path.join(BASE_DIR, "archives", "llm_logs"))
+LLM_LOG_PARTITION = os.getenv("LLM_LOG_PARTITION", "month")          # month / day
+LLM_LOG_HOT_DAYS = float(os.getenv("LLM_LOG_HOT_DAYS", "30"))       # 기간이 끝나고 DB에 더 두는 기간
+LLM_LOG_ARCHIVE_RETENTION_DAYS = float(os.getenv("LLM_LOG_ARCHIVE_RETENTION_DAYS", "365"))
+LLM_LOG_ARCHIVE_INTERVAL = float(os.getenv("LLM_LOG_ARCHIVE_INTERVAL", "3600"))
+LLM_LOG_ARCHIVE_BATCH = int(os.getenv("LLM_LOG_ARCHIVE_BATCH", "5000"))
+LLM_LOG_PREMAKE = int(os.getenv("LLM_LOG_PREMAKE", "2"))
+
+TABLE = LLMLog.__tablename__
+DEFAULT_PARTITION = f"{TABLE}_default"
+_PARTITION_RE = re.compile(rf"^{TABLE}_p(\d{{6}}|\d{{8}})$")
+_ARCHIVE_RE = re.compile(rf"^{TABLE}_(\d{{6}}|\d{{8}})(?:\.(\d+))?\.parquet$")
+# 본문을 뺀 조회용 열 (include_bodies=True면 input_data/output_data 포함)
+BODY_COLUMNS = ("input_data", "output_data")
+
+
+# --------------------
+# 기간 계산
+# --------------------
+def period_start(moment: datetime, unit: str = LLM_LOG_PARTITION) -> datetime:
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day if unit == "day" else day.replace(day=1)
+
+
+def next_period(start: datetime, unit: str = LLM_LOG_PARTITION) -> datetime:
+    if unit == "day":
+        return start + timedelta(days=1)
+    return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+
+
+def period_key(start: datetime, unit: str = LLM_LOG_PARTITION) -> str:
+    return start.strftime("%Y%m%d" if unit == "day" else "%Y%m")
+
+
+def parse_period_key(key: str):
+    """'YYYYMM' 또는 'YYYYMMDD' → (시작, 끝)"""
+    unit = "day" if len(key) == 8 else "month"
+    start = datetime.strptime(key, "%Y%m%d" if unit == "day" else "%Y%m")
+    return start, next_period(start, unit)
+
+
+def _periods(first: datetime, stop: datetime) -> List[datetime]:
+    """first가 속한 기간부터 stop 이전에 시작하는 기간들의 시작 시각"""
+    starts, start = [], period_start(first)
+    while start < stop:
+        starts.append(start)
+        start = next_period(start)
+    return starts
+
+
+# --------------------
+# 테이블 도우미
+# --------------------
+def _log_table(name: str) -> Table:
+    """llm_logs와 같은 열을 가진 name 테이블 (롤오버/파티션 조회·생성용)"""
+    return Table(name, MetaData(), *[
+        Column(c.name, c.type, primary_key=c.primary_key) for c in LLMLog.__table__.columns
+    ])
+
+
+def _column_names(include_bodies: bool = True) -> List[str]:
+    return [c.name for c in LLMLog.__table__.columns if include_bodies or c.name not in BODY_COLUMNS]
+
+
+def partition_tables() -> List[str]:
+    """DB에 있는 기간 테이블(PostgreSQL 파티션 / SQLite 롤오버 테이블) 이름, 기간 순"""
+    return sorted(name for name in inspect(engine).get_table_names() if _PARTITION_RE.match(name))
+
+
+def _rolled_up_id(conn) -> int:
+    """사용량 집계가 끝난 마지막 llm_logs.id (집계 전인 행은 옮기지 않음)"""
+    value = conn.execute(select(LLMUsageRollupState.last_log_id).where(LLMUsageRollupState.id == 1)).scalar()
+    return value or 0
+
+
+def is_partitioned(conn) -> bool:
+    if engine.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :name"
+    ), {"name": TABLE}).first() is not None
+
+
+# --------------------
+# PostgreSQL: 파티션 생성 / 변환
+# --------------------
+def _create_pg_partition(conn, start: datetime) -> bool:
+    name = f"{TABLE}_p{period_key(start)}"
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return False
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM ('{start.isoformat()}') "
+        f"TO ('{next_period(start).isoformat()}')"
+    ))
+    return True
+
+
+def ensure_pg_partitions(conn, now: Optional[datetime] = None) -> List[str]:
+    """현재 기간과 앞으로 LLM_LOG_PREMAKE개 기간의 파티션을 만듭니다."""
+    start, created = period_start(now or datetime.now()), []
+    for _ in range(LLM_LOG_PREMAKE + 1):
+        if _create_pg_partition(conn, start):
+            created.append(period_key(start))
+        start = next_period(start)
+    return created
+
+
+def convert_to_partitioned():
+    """
+    PostgreSQL의 기존 llm_logs(일반 테이블)를 timestamp RANGE 파티션 테이블로 바꿉니다 (한 트랜잭션).
+    기본키는 (id, timestamp)가 되고 id 시퀀스는 그대로 이어 씁니다. timestamp가 비어 있는 행은 id 순서상
+    가장 가까운 시각이 없으므로 변환 시각으로 채웁니다.
+    """
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("파티션 변환은 PostgreSQL에서만 지원합니다 (SQLite는 롤오버 테이블 사용).")
+    columns = ", ".join(_column_names())
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            print(f"{TABLE}는 이미 파티션 테이블입니다.")
+            return
+        old = f"{TABLE}_unpartitioned"
+        conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {old}"))
+        conn.execute(text(f"ALTER INDEX IF EXISTS {TABLE}_pkey RENAME TO {old}_pkey"))
+        conn.execute(text(f"ALTER INDEX IF EXISTS ix_{TABLE}_id RENAME TO ix_{old}_id"))
+        conn.execute(text(
+            f"CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)"
+        ))
+        conn.execute(text(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, timestamp)"))
+        conn.execute(text(f"ALTER SEQUENCE IF EXISTS {TABLE}_id_seq OWNED BY {TABLE}.id"))
+        conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+        first = conn.execute(text(f"SELECT MIN(timestamp) FROM {old}")).scalar()
+        now = datetime.now()
+        for start in _periods(first or now, period_start(now)):
+            _create_pg_partition(conn, start)
+        ensure_pg_partitions(conn, now)
+        conn.execute(text(
+            f"INSERT INTO {TABLE} ({columns}) SELECT {columns.replace('timestamp', 'COALESCE(timestamp, now())')} "
+            f"FROM {old}"
+        ))
+        moved = conn.execute(text(f"SELECT COUNT(*) FROM {TABLE}")).scalar()
+        conn.execute(text(f"DROP TABLE {old}"))
+    print(f"{TABLE} 파티션 변환 완료: {moved}행")
+
+
+# --------------------
+# SQLite: 롤오버
+# --------------------
+def rollover_sqlite(conn, now: Optional[datetime] = None) -> dict:
+    """지난 기간의 (집계가 끝난) 행을 기간별 롤오버 테이블로 옮기고 {기간: 행 수}를 반환합니다."""
+    current = period_start(now or datetime.now())
+    live = LLMLog.__table__
+    rolled = _rolled_up_id(conn)
+    max_id = conn.execute(select(func.max(live.c.id))).scalar() or 0
+    movable = (live.c.id <= rolled) & (live.c.id < max_id)
+    first = conn.execute(select(func.min(live.c.timestamp)).where(movable, live.c.timestamp < current)).scalar()
+    if first is None:
+        return {}
+    names = _column_names()
+    moved = {}
+    for start in _periods(first, current):
+        in_period = movable & (live.c.timestamp >= start) & (live.c.timestamp < next_period(start))
+        if not conn.execute(select(func.count()).select_from(live).where(in_period)).scalar():
+            continue
+        target = _log_table(f"{TABLE}_p{period_key(start)}")
+        target.create(conn, checkfirst=True)
+        count = conn.execute(insert(target).from_select(names, select(*[live.c[n] for n in names]).where(in_period))).rowcount
+        conn.execute(delete(live).where(in_period))
+        moved[period_key(start)] = count
+    return moved
+
+
+# --------------------
+# 보관 (Parquet)
+# --------------------
+def _arrow_schema(include_bodies: bool = True):
+    import pyarrow as pa
+    types = {
+        "id": pa.int64(), "timestamp": pa.timestamp("us"), "prompt_tokens": pa.int64(),
+        "completion_tokens": pa.int64(), "total_tokens": pa.int64(), "latency_ms": pa.float64(),
+        "attempts": pa.int64(), "cost_usd": pa.float64(), "ok": pa.bool_(), "status_code": pa.int64(),
+    }
+    return pa.schema([(name, types.get(name, pa.string())) for name in _column_names(include_bodies)])
+
+
+def _archive_path(key: str) -> str:
+    """이미 보관된 기간에 늦게 들어온 행은 llm_logs_<기간>.1.parquet처럼 이어 붙입니다."""
+    path, part = os.path.join(LLM_LOG_ARCHIVE_DIR, f"{TABLE}_{key}.parquet"), 0
+    while os.path.exists(path):
+        part += 1
+        path = os.path.join(LLM_LOG_ARCHIVE_DIR, f"{TABLE}_{key}.{part}.parquet")
+    return path
+
+
+def archive_table(conn, name: str) -> Optional[dict]:
+    """기간 테이블 하나를 Parquet으로 내보내고, 행 수가 맞으면 테이블을 삭제합니다."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    key = _PARTITION_RE.match(name).group(1)
+    table = _log_table(name)
+    schema = _arrow_schema()
+    os.makedirs(LLM_LOG_ARCHIVE_DIR, exist_ok=True)
+    path = _archive_path(key)
+    tmp = f"{path}.tmp"
+    written = 0
+    result = conn.execution_options(stream_results=True).execute(select(table).order_by(table.c.id))
+    with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+        for rows in result.partitions(LLM_LOG_ARCHIVE_BATCH):
+            batch = {field.name: [row._mapping[field.name] for row in rows] for field in schema}
+            writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+            written += len(rows)
+    expected = conn.execute(select(func.count()).select_from(table)).scalar()
+    if written != expected or pq.ParquetFile(tmp).metadata.num_rows != written:
+        os.remove(tmp)
+        raise RuntimeError(f"{name} 보관 행 수 불일치: {written} / {expected}")
+    if not written:
+        os.remove(tmp)
+    else:
+        os.replace(tmp, path)
+    if engine.dialect.name == "postgresql":
+        conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
+    return {"period": key, "rows": written, "path": path if written else None,
+            "bytes": os.path.getsize(path) if written else 0}
+
+
+def archive_files() -> List[dict]:
+    """보관 파일 목록 [{'period', 'path', 'start', 'end', 'bytes'}], 기간 순"""
+    if not os.path.isdir(LLM_LOG_ARCHIVE_DIR):
+        return []
+    files = []
+    for filename in sorted(os.listdir(LLM_LOG_ARCHIVE_DIR)):
+        match = _ARCHIVE_RE.match(filename)
+        if not match:
+            continue
+        start, end = parse_period_key(match.group(1))
+        path = os.path.join(LLM_LOG_ARCHIVE_DIR, filename)
+        files.append({"period": match.group(1), "path": path, "start": start, "end": end,
+                      "bytes": os.path.getsize(path)})
+    return files
+
+
+def _max_id(conn, name: str) -> int:
+    table = _log_table(name)
+    return conn.execute(select(func.max(table.c.id))).scalar() or 0
+
+
+class _ArchiveLock:
+    """보관 폴더 잠금 파일로 여러 프로세스 중 하나만 작업하게 합니다 (얻지 못하면 acquired=False)."""
+
+    def __enter__(self):
+        self.acquired, self._file = True, None
+        if fcntl is None:
+            return self
+        os.makedirs(LLM_LOG_ARCHIVE_DIR, exist_ok=True)
+        self._file = open(os.path.join(LLM_LOG_ARCHIVE_DIR, ".lock"), "w")
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.acquired = False
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            self._file.close()  # 닫으면 잠금도 풀림
+
+
+def run_once(now: Optional[datetime] = None, vacuum: bool = False) -> dict:
+    """분할(파티션 생성/롤오버) → 오래된 기간 보관 → 보관 파일 보존 기간 정리를 한 번 수행합니다."""
+    now = now or datetime.now()
+    summary = {"created": [], "rolled_over": {}, "archived": [], "skipped": [], "deleted_archives": []}
+    with _ArchiveLock() as lock:
+        if not lock.acquired:
+            summary["skipped"].append("다른 프로세스가 보관 작업 중")
+            return summary
+        dialect = engine.dialect.name
+        with engine.begin() as conn:
+            if dialect == "postgresql":
+                if is_partitioned(conn):
+                    summary["created"] = ensure_pg_partitions(conn, now)
+                else:
+                    summary["skipped"].append(f"{TABLE}가 파티션 테이블이 아님 (python llm_log_archive.py partition)")
+                    return summary
+            elif dialect == "sqlite":
+                summary["rolled_over"] = rollover_sqlite(conn, now)
+
+        cold_before = now - timedelta(days=LLM_LOG_HOT_DAYS)
+        for name in partition_tables():
+            _, end = parse_period_key(_PARTITION_RE.match(name).group(1))
+            if end > cold_before:
+                continue
+            with engine.begin() as conn:
+                # PostgreSQL 파티션에는 집계 전 행이 남아 있을 수 있으므로 집계가 따라잡은 뒤 보관합니다.
+                if _max_id(conn, name) > _rolled_up_id(conn):
+                    summary["skipped"].append(f"{name}: 사용량 집계 대기")
+                    continue
+                summary["archived"].append(archive_table(conn, name))
+
+        if LLM_LOG_ARCHIVE_RETENTION_DAYS > 0:
+            expire_before = now - timedelta(days=LLM_LOG_ARCHIVE_RETENTION_DAYS)
+            for archive in archive_files():
+                if archive["end"] <= expire_before:
+                    os.remove(archive["path"])
+                    summary["deleted_archives"].append(os.path.basename(archive["path"]))
+
+        if vacuum and dialect == "sqlite" and (summary["archived"] or summary["rolled_over"]):
+            # 삭제한 공간은 다음 쓰기에 재사용되지만, 파일 크기를 줄이려면 VACUUM이 필요합니다.
+            with engine.connect() as conn:
+                conn.execute(text("VACUUM"))
+    return summary
+
+
+# --------------------
+# 조회
+# --------------------
+def _row_dict(mapping) -> dict:
+    return {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in mapping.items()}
+
+
+def query_logs(start: datetime, end: datetime, interaction_type: Optional[str] = None,
+               include_bodies: bool = False, limit: int = 1000) -> dict:
+    """
+    [start, end) 구간의 로그를 DB(활성 테이블·롤오버 테이블)와 보관 파일에서 모아 시각 순으로 반환합니다.
+    기간이 겹치지 않는 롤오버 테이블과 보관 파일은 읽지 않습니다.
+    """
+    names = _column_names(include_bodies)
+    rows, sources = [], []
+
+    tables = [TABLE]
+    if engine.dialect.name != "postgresql":  # PostgreSQL은 상위 테이블 조회가 파티션을 알아서 고름
+        for name in partition_tables():
+            p_start, p_end = parse_period_key(_PARTITION_RE.match(name).group(1))
+            if p_start < end and p_end > start:
+                tables.append(name)
+    with engine.connect() as conn:
+        for name in tables:
+            table = _log_table(name)
+            stmt = select(*[table.c[n] for n in names]).where(table.c.timestamp >= start, table.c.timestamp < end)
+            if interaction_type:
+                stmt = stmt.where(table.c.interaction_type == interaction_type)
+            # 한 테이블에서 limit건을 넘는지 알 수 있도록 한 건 더 읽습니다 (truncated 판정).
+            rows.extend(_row_dict(r._mapping) for r in conn.execute(stmt.order_by(table.c.timestamp).limit(limit + 1)))
+            sources.append(name)
+
+    archives = [a for a in archive_files() if a["start"] < end and a["end"] > start]
+    if archives:
+        import pyarrow.parquet as pq
+        filters = [("timestamp", ">=", start), ("timestamp", "<", end)]
+        if interaction_type:
+            filters.append(("interaction_type", "==", interaction_type))
+        for archive in archives:
+            for record in pq.read_table(archive["path"], columns=names, filters=filters).to_pylist():
+                rows.append(_row_dict(record))
+            sources.append(os.path.basename(archive["path"]))
+
+    rows.sort(key=lambda r: (r["timestamp"] or "", r["id"]))
+    return {"start": start.isoformat(), "end": end.isoformat(), "sources": sources,
+            "truncated": len(rows) > limit, "rows": rows[:limit]}
+
+
+def status() -> dict:
+    with engine.connect() as conn:
+        live_rows = conn.execute(select(func.count()).select_from(LLMLog.__table__)).scalar()
+        partitions = [{"table": name, "period": _PARTITION_RE.match(name).group(1),
+                       "rows": conn.execute(select(func.count()).select_from(_log_table(name))).scalar()}
+                      for name in partition_tables()]
+        partitioned = is_partitioned(conn)
+    return {
+        "dialect": engine.dialect.name,
+        "partitioned": partitioned,
+        "unit": LLM_LOG_PARTITION,
+        "hot_days": LLM_LOG_HOT_DAYS,
+        "archive_retention_days": LLM_LOG_ARCHIVE_RETENTION_DAYS,
+        "live_rows": live_rows,
+        "partitions": partitions,
+        "archives": [{"period": a["period"], "file": os.path.basename(a["path"]), "bytes": a["bytes"]}
+                     for a in archive_files()],
+    }
+
+
+# --------------------
+# 백그라운드 작업
+# --------------------
+def _archive_tick():
+    summary = run_once()
+    if summary["rolled_over"] or summary["archived"] or summary["deleted_archives"]:
+        print(f"LLM 로그 보관: {json.dumps(summary, ensure_ascii=False, default=str)}")
+
+
+log_archiver = PeriodicWorker("llm-log-archive", LLM_LOG_ARCHIVE_INTERVAL, _archive_tick, "LLM 로그 보관")
+
+
+def start_log_archiver():
+    if LLM_LOG_ARCHIVE_ENABLED:
+        log_archiver.start()
+
+
+def _parse_time(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"시각 형식이 잘못되었습니다: {value} (예: 2026-01-31T09:00)")
+
+
+def create_router() -> APIRouter:
+    router = APIRouter(dependencies=[Depends(require_admin)])
+
+    @router.get("/admin/llm-logs")
+    def llm_logs(start: str, end: str, interaction_type: Optional[str] = None,
+                 include_bodies: bool = False, limit: int = 500):
+        """보관분을 포함한 [start, end) 구간 로그 (include_bodies=true면 입력/출력 본문 포함)"""
+        return query_logs(_parse_time(start), _parse_time(end), interaction_type, include_bodies, min(limit, 5000))
+
+    @router.get("/admin/llm-logs/partitions")
+    def llm_log_partitions():
+        return status()
+
+    @router.post("/admin/llm-logs/archive")
+    def llm_log_archive_now():
+        return run_once()
+
+    return router
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="llm_logs 기간 분할·보관")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run")
+    run.add_argument("--vacuum", action="store_true", help="SQLite: 보관 후 VACUUM으로 파일 크기 축소")
+    sub.add_parser("status")
+    sub.add_parser("partition")
+    query = sub.add_parser("query")
+    query.add_argument("--start", required=True)
+    query.add_argument("--end", required=True)
+    query.add_argument("--type", dest="interaction_type")
+    query.add_argument("--bodies", action="store_true")
+    query.add_argument("--limit", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        print(json.dumps(run_once(vacuum=args.vacuum), ensure_ascii=False, indent=1, default=str))
+    elif args.command == "status":
+        print(json.dumps(status(), ensure_ascii=False, indent=1))
+    elif args.command == "partition":
+        convert_to_partitioned()
+    else:
+        result = query_logs(datetime.fromisoformat(args.start), datetime.fromisoformat(args.end),
+                            args.interaction_type, args.bodies, args.limit)
+        for row in result["rows"]:
+            print(json.dumps(row, ensure_ascii=False))
+        print(f"# {len(result['rows'])}행, 출처: {', '.join(result['sources'])}"
+              + (" (limit에서 잘림)" if result["truncated"] else ""))
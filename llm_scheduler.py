@@ -0,0 +1,194 @@
+"""
+프로세스 전역 LLM 호출 스케줄러.
+
+모든 채팅 완성 호출(보고서, 의도 분류, 채팅 응답)은 llm_gateway를 거치며,
+게이트웨이는 호출 직전에 이 스케줄러에서 실행 허가를 받습니다.
+- 분당 요청 수(LLM_RPM_LIMIT)와 분당 토큰 수(LLM_TPM_LIMIT) 토큰 버킷
+- 우선순위: 대화형(채팅/분류) > 보고서 > 일괄 처리
+- 같은 우선순위 안에서는 흐름(flow, 예: 학생/세션)별 라운드로빈으로 공정하게 배분
+- 대기열 깊이/대기 시간 지표 제공 (get_metrics)
+스케줄러는 게이트웨이 이벤트 루프 안에서만 사용되므로 별도 락 없이 asyncio로 동작합니다.
+"""
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Optional, Dict
+
+LLM_RPM_LIMIT = float(os.getenv("LLM_RPM_LIMIT", "500"))
+LLM_TPM_LIMIT = float(os.getenv("LLM_TPM_LIMIT", "300000"))
+# 한국어 위주 프롬프트 기준 대략적인 글자/토큰 비율 (사전 추정용, 호출 후 실제 usage로 보정)
+LLM_CHARS_PER_TOKEN = float(os.getenv("LLM_CHARS_PER_TOKEN", "2"))
+LLM_DEFAULT_COMPLETION_TOKENS = int(os.getenv("LLM_DEFAULT_COMPLETION_TOKENS", "1000"))
+
+PRIORITY_INTERACTIVE = 0  # 채팅 응답, 의도 분류
+PRIORITY_REPORT = 1       # 제출 직후 보고서 생성
+PRIORITY_BATCH = 2        # 학급 단위 일괄 생성 등
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_REPORT: "report",
+    PRIORITY_BATCH: "batch",
+}
+
+# 대기 시간 히스토그램 경계(초)
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60)
+
+
+def estimate_tokens(messages: list, max_tokens: Optional[int] = None) -> int:
+    """메시지 길이와 완성 토큰 상한으로 요청이 소비할 토큰 수를 추정합니다."""
+    chars = 0
+    for m in messages:
+        content = m.get("content", "")
+        if isinstance(content, str):
+            chars += len(content)
+        else:
+            # 멀티모달 메시지: 텍스트 파트만 세고 이미지는 고정 비용으로 근사
+            for part in content:
+                chars += len(part.get("text", "")) if part.get("type") == "text" else 1000
+    return int(chars / LLM_CHARS_PER_TOKEN) + (max_tokens or LLM_DEFAULT_COMPLETION_TOKENS)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """amount만큼 꺼낼 수 있을 때까지 남은 시간(초). 용량보다 큰 요청은 가득 찼을 때 허용합니다."""
+        self._refill()
+        needed = min(amount, self.capacity) - self.tokens
+        return 0.0 if needed <= 0 else needed / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    def adjust(self, delta: float):
+        """실제 사용량과 추정치의 차이를 반영합니다(양수면 추가 차감, 음수면 환급)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "enqueued", "priority")
+
+    def __init__(self, future: asyncio.Future, tokens: int, priority: int):
+        self.future = future
+        self.tokens = tokens
+        self.priority = priority
+        self.enqueued = time.monotonic()
+
+
+class LLMScheduler:
+    def __init__(self, rpm: float = LLM_RPM_LIMIT, tpm: float = LLM_TPM_LIMIT):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        # 우선순위 → (flow → 대기열) ; OrderedDict 순서로 라운드로빈
+        self._queues: Dict[int, "OrderedDict[str, deque]"] = {p: OrderedDict() for p in PRIORITY_NAMES}
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._stats = {
+            p: {"granted": 0, "wait_sum": 0.0, "wait_max": 0.0, "buckets": [0] * (len(WAIT_BUCKETS) + 1)}
+            for p in PRIORITY_NAMES
+        }
+
+    async def acquire(self, tokens: int, priority: int = PRIORITY_INTERACTIVE, flow: Optional[str] = None) -> int:
+        """실행 허가를 받을 때까지 대기합니다. 차감한 토큰 추정치를 반환합니다(settle에 사용)."""
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop.create_future(), tokens, priority)
+        self._queues[priority].setdefault(flow or "", deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            # 마감시간 초과 등으로 취소되면 대기열에서 빠집니다(이미 허가된 경우 토큰은 환급).
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.settle(tokens, 0)
+            raise
+        return tokens
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        """호출이 끝난 뒤 실제 토큰 사용량으로 TPM 버킷을 보정합니다."""
+        if actual is None:
+            return
+        self.tokens.adjust(actual - estimated)
+        self._dispatch()
+
+    def _next_waiter(self):
+        """가장 높은 우선순위에서, 흐름 간 라운드로빈으로 다음 대기자를 고릅니다."""
+        for priority in sorted(self._queues):
+            flows = self._queues[priority]
+            while flows:
+                flow, queue = next(iter(flows.items()))
+                while queue and queue[0].future.done():
+                    queue.popleft()  # 취소된 대기자 정리
+                if not queue:
+                    del flows[flow]
+                    continue
+                return flow, queue
+        return None, None
+
+    def _dispatch(self):
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        while True:
+            flow, queue = self._next_waiter()
+            if queue is None:
+                return
+            waiter = queue[0]
+            delay = max(self.requests.wait_time(1), self.tokens.wait_time(waiter.tokens))
+            if delay > 0:
+                self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            queue.popleft()
+            flows = self._queues[waiter.priority]
+            # 방금 처리한 흐름은 라운드로빈 순서의 맨 뒤로
+            del flows[flow]
+            if queue:
+                flows[flow] = queue
+            self.requests.take(1)
+            self.tokens.take(waiter.tokens)
+            self._record_wait(waiter)
+            waiter.future.set_result(None)
+
+    def _record_wait(self, waiter: _Waiter):
+        waited = time.monotonic() - waiter.enqueued
+        stats = self._stats[waiter.priority]
+        stats["granted"] += 1
+        stats["wait_sum"] += waited
+        stats["wait_max"] = max(stats["wait_max"], waited)
+        for i, bound in enumerate(WAIT_BUCKETS):
+            if waited <= bound:
+                stats["buckets"][i] += 1
+                break
+        else:
+            stats["buckets"][-1] += 1
+
+    def get_metrics(self) -> dict:
+        """우선순위별 대기열 깊이와 대기 시간 통계를 반환합니다."""
+        metrics = {
+            "rpm_available": round(self.requests.tokens, 1),
+            "tpm_available": round(self.tokens.tokens, 1),
+            "priorities": {},
+        }
+        for priority, name in PRIORITY_NAMES.items():
+            stats = self._stats[priority]
+            depth = sum(
+                sum(1 for w in queue if not w.future.done())
+                for queue in self._queues[priority].values()
+            )
+            metrics["priorities"][name] = {
+                "queue_depth": depth,
+                "granted": stats["granted"],
+                "wait_seconds_sum": round(stats["wait_sum"], 3),
+                "wait_seconds_max": round(stats["wait_max"], 3),
+                "wait_seconds_buckets": dict(zip([*map(str, WAIT_BUCKETS), "+Inf"], stats["buckets"])),
+            }
+        return metrics
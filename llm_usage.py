@@ -0,0 +1,254 @@
+"""
+LLM 호출 계량과 시간별 집계.
+
+- accounting_fields(result): LLMResult를 llm_logs 계량 컬럼 값(dict)으로 바꿉니다.
+  토큰 수는 OpenAI 응답의 usage, 비용은 LLM_PRICES(USD / 1M 토큰) 기준 추정치입니다.
+- rollup_once(): 마지막으로 집계한 llm_logs.id 이후의 호출 행만 읽어
+  (시각(정시), interaction_type, model)별 합계를 llm_usage_rollups에 더합니다.
+  진행 위치(llm_usage_rollup_state)를 compare-and-set으로 옮기므로 여러 워커가 동시에 돌려도
+  같은 행이 두 번 더해지지 않습니다. 막 기록 중인 행을 건너뛰지 않도록 LLM_USAGE_ROLLUP_LAG초보다
+  오래된 행까지만 집계합니다.
+- start_usage_rollup(): LLM_USAGE_ROLLUP_INTERVAL초마다 롤업하는 백그라운드 스레드
+- create_router(): GET /admin/llm-usage (집계 테이블만 읽음, admin.require_admin 필요)
+"""
+import os
+import json
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, update
+
+from admin import require_admin
+from background import PeriodicWorker
+from database import SessionLocal, LLMLog, LLMUsageRollup, LLMUsageRollupState, commit_with_retry
+
+# 모델별 단가 (USD / 1M 토큰): [입력, 출력]. 응답의 모델명(예: gpt-4o-2024-08-06)은 가장 긴 접두어로 찾습니다.
+DEFAULT_LLM_PRICES = {
+    "gpt-4o": [2.50, 10.00],
+    "gpt-4o-mini": [0.15, 0.60],
+    "text-embedding-3-large": [0.13, 0.0],
+    "text-embedding-3-small": [0.02, 0.0],
+}
+LLM_PRICES = {**DEFAULT_LLM_PRICES, **json.loads(os.getenv("LLM_PRICES", "{}"))}
+LLM_USAGE_ROLLUP_INTERVAL = float(os.getenv("LLM_USAGE_ROLLUP_INTERVAL", "300"))
+LLM_USAGE_ROLLUP_LAG = float(os.getenv("LLM_USAGE_ROLLUP_LAG", "30"))
+LLM_USAGE_ROLLUP_BATCH = int(os.getenv("LLM_USAGE_ROLLUP_BATCH", "20000"))
+
+GROUP_COLUMNS = {
+    "hour": LLMUsageRollup.hour,
+    "interaction_type": LLMUsageRollup.interaction_type,
+    "model": LLMUsageRollup.model,
+}
+
+
+def _price(model: Optional[str]):
+    if not model:
+        return None
+    matches = [name for name in LLM_PRICES if model.startswith(name)]
+    return LLM_PRICES[max(matches, key=len)] if matches else None
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> Optional[float]:
+    price = _price(model)
+    if price is None or prompt_tokens is None:
+        return None
+    return round(((prompt_tokens or 0) * price[0] + (completion_tokens or 0) * price[1]) / 1_000_000, 8)
+
+
+def accounting_fields(result) -> dict:
+    """LLMResult → LLMLog 계량 컬럼 값 (실패한 호출도 지연/시도 횟수/상태 코드는 남깁니다)."""
+    usage = result.usage or {}
+    return {
+        "model": result.model or None,
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": usage.get("completion_tokens"),
+        "total_tokens": usage.get("total_tokens"),
+        "latency_ms": round(result.latency * 1000, 1),
+        "attempts": result.attempts,
+        "cost_usd": estimate_cost(result.model, usage.get("prompt_tokens"), usage.get("completion_tokens")),
+        "ok": bool(result.ok),
+        "status_code": result.status_code,
+    }
+
+
+# --------------------
+# 롤업
+# --------------------
+class _RollupRaced(Exception):
+    """다른 워커가 먼저 같은 구간을 집계했을 때"""
+
+
+def _load_state(db) -> LLMUsageRollupState:
+    state = db.get(LLMUsageRollupState, 1)
+    if state is None:
+        try:
+            commit_with_retry(db, lambda s: s.add(LLMUsageRollupState(id=1, last_log_id=0)))
+        except Exception:
+            db.rollback()  # 다른 워커가 먼저 만든 경우
+        state = db.get(LLMUsageRollupState, 1)
+    return state
+
+
+def _aggregate(rows) -> dict:
+    buckets = {}
+    for row in rows:
+        key = (row.timestamp.replace(minute=0, second=0, microsecond=0), row.interaction_type, row.model or "")
+        agg = buckets.setdefault(key, {
+            "calls": 0, "errors": 0, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "total_tokens": 0, "cost_usd": 0.0, "latency_ms_sum": 0.0, "latency_ms_max": 0.0,
+        })
+        agg["calls"] += 1
+        agg["errors"] += 0 if row.ok else 1
+        agg["retries"] += max((row.attempts or 1) - 1, 0)
+        agg["prompt_tokens"] += row.prompt_tokens or 0
+        agg["completion_tokens"] += row.completion_tokens or 0
+        agg["total_tokens"] += row.total_tokens or 0
+        agg["cost_usd"] += row.cost_usd or 0.0
+        agg["latency_ms_sum"] += row.latency_ms or 0.0
+        agg["latency_ms_max"] = max(agg["latency_ms_max"], row.latency_ms or 0.0)
+    return buckets
+
+
+def rollup_once() -> int:
+    """새 llm_logs 호출 행을 집계 테이블에 더하고, 집계한 행 수를 반환합니다."""
+    db = SessionLocal()
+    try:
+        state = _load_state(db)
+        start = state.last_log_id
+        cutoff = datetime.now() - timedelta(seconds=LLM_USAGE_ROLLUP_LAG)
+        upper = (
+            db.query(func.max(LLMLog.id))
+            .filter(LLMLog.id > start, LLMLog.id <= start + LLM_USAGE_ROLLUP_BATCH, LLMLog.timestamp <= cutoff)
+            .scalar()
+        )
+        if not upper:
+            db.rollback()
+            return 0
+        # 본문(input/output)은 읽지 않고 계량 컬럼만 조회. 입력 로그처럼 호출이 없는 행(ok IS NULL)은 제외.
+        rows = (
+            db.query(LLMLog.timestamp, LLMLog.interaction_type, LLMLog.model, LLMLog.prompt_tokens,
+                     LLMLog.completion_tokens, LLMLog.total_tokens, LLMLog.cost_usd, LLMLog.latency_ms,
+                     LLMLog.attempts, LLMLog.ok)
+            .filter(LLMLog.id > start, LLMLog.id <= upper, LLMLog.ok.isnot(None))
+            .all()
+        )
+        buckets = _aggregate(rows)
+
+        def apply(s):
+            # 진행 위치를 먼저 옮겨(행 잠금) 같은 구간을 다른 워커가 중복 집계하지 못하게 합니다.
+            moved = s.execute(
+                update(LLMUsageRollupState)
+                .where(LLMUsageRollupState.id == 1, LLMUsageRollupState.last_log_id == start)
+                .values(last_log_id=upper, updated_at=datetime.now())
+            ).rowcount
+            if moved != 1:
+                raise _RollupRaced()
+            hours = {key[0] for key in buckets}
+            existing = {
+                (r.hour, r.interaction_type, r.model): r
+                for r in s.query(LLMUsageRollup).filter(LLMUsageRollup.hour.in_(hours)).all()
+            } if hours else {}
+            for key, agg in buckets.items():
+                row = existing.get(key)
+                if row is None:
+                    s.add(LLMUsageRollup(hour=key[0], interaction_type=key[1], model=key[2], **agg))
+                    continue
+                for column, value in agg.items():
+                    if column == "latency_ms_max":
+                        row.latency_ms_max = max(row.latency_ms_max or 0.0, value)
+                    else:
+                        setattr(row, column, (getattr(row, column) or 0) + value)
+
+        try:
+            commit_with_retry(db, apply)
+        except _RollupRaced:
+            db.rollback()
+            return 0
+        return len(rows)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def query_usage(hours: float = 24, group_by: tuple = ("interaction_type",)) -> dict:
+    """집계 테이블에서 최근 hours시간의 사용량을 group_by 기준으로 묶어 반환합니다."""
+    columns = [GROUP_COLUMNS[name] for name in group_by]
+    since = (datetime.now() - timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0)
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(
+                *columns,
+                func.sum(LLMUsageRollup.calls), func.sum(LLMUsageRollup.errors), func.sum(LLMUsageRollup.retries),
+                func.sum(LLMUsageRollup.prompt_tokens), func.sum(LLMUsageRollup.completion_tokens),
+                func.sum(LLMUsageRollup.total_tokens), func.sum(LLMUsageRollup.cost_usd),
+                func.sum(LLMUsageRollup.latency_ms_sum), func.max(LLMUsageRollup.latency_ms_max),
+            )
+            .filter(LLMUsageRollup.hour >= since)
+            .group_by(*columns)
+            .order_by(func.sum(LLMUsageRollup.cost_usd).desc())
+            .all()
+        )
+        state = db.get(LLMUsageRollupState, 1)
+    finally:
+        db.close()
+
+    groups = []
+    for row in rows:
+        keys = row[:len(columns)]
+        calls, errors, retries, prompt, completion, total, cost, latency_sum, latency_max = row[len(columns):]
+        groups.append({
+            **{name: (value.isoformat() if isinstance(value, datetime) else value) for name, value in zip(group_by, keys)},
+            "calls": calls,
+            "errors": errors,
+            "retries": retries,
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": total,
+            "cost_usd": round(cost or 0.0, 6),
+            "latency_ms_avg": round((latency_sum or 0.0) / calls, 1) if calls else None,
+            "latency_ms_max": latency_max,
+        })
+    return {
+        "since": since.isoformat(),
+        "group_by": list(group_by),
+        "rolled_up_to_log_id": state.last_log_id if state else 0,
+        "total_cost_usd": round(sum(g["cost_usd"] for g in groups), 6),
+        "total_calls": sum(g["calls"] or 0 for g in groups),
+        "groups": groups,
+    }
+
+
+def _rollup_pending():
+    rolled = rollup_once()
+    while rolled >= LLM_USAGE_ROLLUP_BATCH:  # 밀린 구간은 연달아 처리
+        rolled = rollup_once()
+
+
+usage_rollup = PeriodicWorker("llm-usage-rollup", LLM_USAGE_ROLLUP_INTERVAL, _rollup_pending, "LLM 사용량 집계")
+
+
+def start_usage_rollup():
+    usage_rollup.start()
+
+
+def create_router() -> APIRouter:
+    router = APIRouter(dependencies=[Depends(require_admin)])
+
+    @router.get("/admin/llm-usage")
+    def llm_usage(hours: float = 24, group_by: str = "interaction_type", refresh: bool = False):
+        """
+        LLM 사용량 집계. group_by는 hour/interaction_type/model을 쉼표로 조합합니다.
+        refresh=true면 응답 전에 밀린 로그를 한 번 집계합니다.
+        """
+        names = tuple(name.strip() for name in group_by.split(",") if name.strip())
+        if not names or any(name not in GROUP_COLUMNS for name in names):
+            raise HTTPException(status_code=400, detail=f"group_by는 {', '.join(GROUP_COLUMNS)} 중에서 고르세요.")
+        if refresh:
+            rollup_once()
+        return query_usage(hours, names)
+
+    return router
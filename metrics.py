@@ -0,0 +1,300 @@
+"""
+Prometheus 형식 지표와 단계별 타이밍 스팬.
+
+외부 클라이언트 라이브러리 없이 카운터/게이지/히스토그램을 프로세스 메모리에 모으고,
+render_prometheus()로 텍스트 노출 형식(text/plain; version=0.0.4)을 만듭니다.
+- stage_span(pipeline, stage): 보고서(report)·채팅(chat) 파이프라인의 단계별 소요 시간
+- observe_pool_*(): database.py의 커넥션 풀 이벤트가 호출 (체크아웃 대기/사용 중 개수/고갈)
+- register_collector(fn): 스크레이프 시점에 값을 읽어오는 지표 (LLM 스케줄러 대기열 등)
+- create_router(): /metrics 엔드포인트
+
+serve.py 멀티 워커 모드에서는 워커마다 값이 따로 쌓이므로 각 워커 포트(SERVE_WORKER_BASE_PORT + i)의
+/metrics를 각각 수집해야 합니다. (프록시의 /metrics는 쿠키로 고정된 한 워커의 값만 보여줍니다)
+
+알림 예시 (DB_MAX_OVERFLOW=0 이면 풀 크기가 곧 동시 DB 작업 상한):
+    esli_db_pool_in_use / esli_db_pool_capacity >= 1             # 풀 포화
+    rate(esli_db_pool_exhausted_total[5m]) > 0                    # 빈 커넥션 없이 대기한 체크아웃
+    rate(esli_db_pool_timeouts_total[5m]) > 0                     # pool_timeout 초과로 실패
+    histogram_quantile(0.95, rate(esli_db_pool_checkout_wait_seconds_bucket[5m])) > 0.5
+"""
+import os
+import time
+import threading
+import contextlib
+from typing import Callable, Dict, List, Tuple
+
+from fastapi import APIRouter, Response
+
+from background import after_fork
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# 풀 고갈 경고 로그 최소 간격(초)
+POOL_EXHAUSTED_LOG_INTERVAL = float(os.getenv("POOL_EXHAUSTED_LOG_INTERVAL", "60"))
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+HTTP_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, object] = {}
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with _lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            else:
+                state["counts"][-1] += 1
+            state["sum"] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), state["counts"]):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {state['sum']!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+_metrics: List[_Metric] = []
+_collectors: List[Callable[[], List[str]]] = []
+
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(fn: Callable[[], List[str]]):
+    """스크레이프할 때마다 호출되어 노출 형식 줄 목록을 반환하는 함수를 등록합니다."""
+    _collectors.append(fn)
+    return fn
+
+
+# --------------------
+# 지표 정의
+# --------------------
+STAGE_SECONDS = _register(Histogram(
+    "esli_stage_seconds", "Time spent in each pipeline stage", ("pipeline", "stage")))
+STAGE_ERRORS = _register(Counter(
+    "esli_stage_errors_total", "Pipeline stages that raised an exception", ("pipeline", "stage")))
+
+POOL_CHECKOUT_WAIT = _register(Histogram(
+    "esli_db_pool_checkout_wait_seconds", "Time waiting for a pooled DB connection", ("engine",), POOL_WAIT_BUCKETS))
+POOL_IN_USE = _register(Gauge(
+    "esli_db_pool_in_use", "Connections currently checked out", ("engine",)))
+POOL_CAPACITY = _register(Gauge(
+    "esli_db_pool_capacity", "pool_size + max_overflow", ("engine",)))
+POOL_CHECKOUTS = _register(Counter(
+    "esli_db_pool_checkouts_total", "Connection checkouts", ("engine",)))
+POOL_CONNECTS = _register(Counter(
+    "esli_db_pool_connects_total", "New DBAPI connections opened", ("engine",)))
+POOL_INVALIDATED = _register(Counter(
+    "esli_db_pool_invalidated_total", "Connections invalidated (disconnects etc.)", ("engine",)))
+POOL_EXHAUSTED = _register(Counter(
+    "esli_db_pool_exhausted_total", "Checkouts that found every connection in use and had to wait", ("engine",)))
+POOL_TIMEOUTS = _register(Counter(
+    "esli_db_pool_timeouts_total", "Checkouts that failed after pool_timeout", ("engine",)))
+
+HTTP_SECONDS = _register(Histogram(
+    "esli_http_request_seconds", "HTTP request duration on the FastAPI mount", ("route", "method", "status"), HTTP_BUCKETS))
+
+
+# --------------------
+# 단계별 스팬
+# --------------------
+@contextlib.contextmanager
+def stage_span(pipeline: str, stage: str):
+    """
+    with 블록의 소요 시간을 esli_stage_seconds{pipeline, stage}에 기록합니다.
+    async 함수 안에서도 그대로 쓸 수 있으며, await 대기 시간도 해당 단계에 포함됩니다.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(pipeline=pipeline, stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, pipeline=pipeline, stage=stage)
+
+
+# --------------------
+# DB 커넥션 풀
+# --------------------
+_last_exhausted_log = 0.0
+
+
+def observe_pool_wait(engine_name: str, seconds: float, exhausted: bool):
+    POOL_CHECKOUT_WAIT.observe(seconds, engine=engine_name)
+    if exhausted:
+        POOL_EXHAUSTED.inc(engine=engine_name)
+        global _last_exhausted_log
+        now = time.monotonic()
+        if now - _last_exhausted_log >= POOL_EXHAUSTED_LOG_INTERVAL:
+            _last_exhausted_log = now
+            print(f"--- [경고] DB 커넥션 풀 고갈({engine_name}): 모든 커넥션이 사용 중이라 {seconds:.3f}초 대기했습니다. "
+                  f"DB_POOL_SIZE/DB_MAX_OVERFLOW를 확인하세요. ---")
+
+
+def observe_pool_timeout(engine_name: str):
+    POOL_TIMEOUTS.inc(engine=engine_name)
+    print(f"--- [경고] DB 커넥션 풀 체크아웃 시간 초과({engine_name}) ---")
+
+
+def observe_pool_event(engine_name: str, event_name: str):
+    if event_name == "checkout":
+        POOL_CHECKOUTS.inc(engine=engine_name)
+        POOL_IN_USE.inc(engine=engine_name)
+    elif event_name == "checkin":
+        POOL_IN_USE.dec(engine=engine_name)
+    elif event_name == "connect":
+        POOL_CONNECTS.inc(engine=engine_name)
+    elif event_name == "invalidate":
+        POOL_INVALIDATED.inc(engine=engine_name)
+
+
+# --------------------
+# 노출
+# --------------------
+def render_prometheus() -> str:
+    lines = []
+    with _lock:
+        for metric in _metrics:
+            if not metric._values:
+                continue
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {_escape(e)}")
+    return "\n".join(lines) + "\n"
+
+
+def _route_label(path: str) -> str:
+    # 경로의 첫 구간만 사용해 라벨 개수를 제한합니다 (/app/..., /reports/<digest> 등).
+    head = path.strip("/").split("/", 1)[0]
+    return f"/{head}" if head else "/"
+
+
+def install_http_metrics(app):
+    """FastAPI 앱에 요청 소요 시간 미들웨어를 추가합니다."""
+
+    @app.middleware("http")
+    async def record_http(request, call_next):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # 스트리밍(SSE) 응답은 헤더를 보낸 시점까지만 측정됩니다.
+            HTTP_SECONDS.observe(time.perf_counter() - started, route=_route_label(request.url.path),
+                                 method=request.method, status=status)
+
+
+def create_router() -> APIRouter:
+    router = APIRouter()
+
+    @router.get("/metrics")
+    async def metrics():
+        return Response(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    return router
+
+
+def _reset_after_fork():
+    # 부모에서 쌓인 값은 자식 워커의 값이 아니므로 비웁니다(지표 정의는 유지).
+    global _lock
+    _lock = threading.Lock()
+    for metric in _metrics:
+        metric._values = {}
+
+
+after_fork(_reset_after_fork)
@@ -0,0 +1,321 @@
+"""
+자체 학생 집단 기준의 규준(평균/표준편차) 재추정.
+
+- record_norm_observation(): 결과 저장 트랜잭션에서 항목별 원점수를 norm_estimates에 더합니다.
+  (학교급, 항목)마다 건수/평균/편차제곱합만 갱신하는 Welford 방식이라 응답 하나당 O(1)입니다.
+- create_snapshot(): 현재 이동 통계를 새 버전의 규준으로 고정합니다. 표본이 min_count보다 적은 항목은
+  기존 기준표(refer/표준점수 - *.csv) 값을 그대로 씁니다.
+- promote(version): 스냅샷을 T점수 계산 규준으로 지정합니다 (0 = 기본 기준표로 되돌림).
+  각 프로세스의 esli_02.get_std_info_df는 NORM_REFRESH_INTERVAL초마다 활성 버전을 확인해 캐시를 바꿉니다.
+- drift_report(): 이동 통계와 기본 기준표의 차이 (평균 이동량을 기준표 표준편차 단위로)
+
+명령행:
+    python norms.py backfill | drift | list | snapshot [--min-count N] [--note ...] | promote VERSION
+"""
+import os
+import json
+import math
+import argparse
+from datetime import datetime
+from typing import Optional, Dict, Tuple
+
+import pandas as pd
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import delete, func, update
+
+from admin import require_admin
+from database import (
+    SessionLocal,
+    SurveyResponse,
+    ReferenceStandard,
+    NormEstimate,
+    NormSnapshot,
+    NormSnapshotValue,
+    commit_with_retry,
+    upsert_welford_rows,
+)
+
+NORM_LEVELS = ("초등", "중등", "고등")
+NORM_MIN_COUNT = int(os.getenv("NORM_MIN_COUNT", "200"))            # 스냅샷에 이동 통계를 쓰기 위한 최소 표본
+NORM_DRIFT_THRESHOLD = float(os.getenv("NORM_DRIFT_THRESHOLD", "0.2"))  # 기준표 SD 단위 평균 이동량 경고 기준
+NORM_REFRESH_INTERVAL = float(os.getenv("NORM_REFRESH_INTERVAL", "60"))
+BACKFILL_BATCH = 2000
+
+
+def record_norm_observation(db, school_level: Optional[str], student_scores: dict):
+    """한 학생의 항목별 원점수를 이동 통계에 더합니다. 학교급을 모르면 건너뜁니다. 커밋은 호출자가 수행합니다."""
+    if school_level not in NORM_LEVELS:
+        return
+    rows = [
+        {"level": school_level, "name": name, "count": 1, "mean": float(data['raw']), "m2": 0.0}
+        for name, data in student_scores.items()
+        if data.get('raw') is not None
+    ]
+    upsert_welford_rows(db, NormEstimate, rows, ["level", "name"])
+
+
+def _std_of(count: int, m2: float) -> Optional[float]:
+    return math.sqrt(max(m2, 0.0) / (count - 1)) if count > 1 else None
+
+
+def live_estimates(db) -> Dict[Tuple[str, str], dict]:
+    return {
+        (r.level, r.name): {"count": r.count, "mean": r.mean, "std": _std_of(r.count, r.m2)}
+        for r in db.query(NormEstimate).all()
+    }
+
+
+def shipped_standards(db) -> Dict[Tuple[str, str], dict]:
+    return {(r.level, r.name): {"mean": r.mean, "std": r.std} for r in db.query(ReferenceStandard).order_by(ReferenceStandard.id).all()}
+
+
+# --------------------
+# 스냅샷 / 승격
+# --------------------
+def active_norm_version(db=None) -> int:
+    """활성 스냅샷 버전 (없으면 0 = 기본 기준표)"""
+    own = db is None
+    db = db or SessionLocal()
+    try:
+        version = db.query(NormSnapshot.version).filter(NormSnapshot.active.is_(True)).scalar()
+        return version or 0
+    finally:
+        if own:
+            db.close()
+
+
+def load_snapshot_norms(version: int, level: str) -> Dict[str, Tuple[float, float]]:
+    """스냅샷의 한 학교급 규준 {항목명: (평균, 표준편차)}"""
+    db = SessionLocal()
+    try:
+        rows = db.query(NormSnapshotValue).filter(NormSnapshotValue.version == version,
+                                                  NormSnapshotValue.level == level).order_by(NormSnapshotValue.id).all()
+        # 기준표와 같은 항목 순서 (create_snapshot이 reference_standards 순서대로 넣음)
+        return {r.name: (r.mean, r.std) for r in rows}
+    finally:
+        db.close()
+
+
+def create_snapshot(min_count: int = NORM_MIN_COUNT, note: Optional[str] = None) -> int:
+    """현재 이동 통계로 새 규준 버전을 만들고 버전 번호를 반환합니다 (승격은 따로)."""
+    db = SessionLocal()
+    try:
+        shipped = shipped_standards(db)
+        live = live_estimates(db)
+        version = (db.query(func.max(NormSnapshot.version)).scalar() or 0) + 1
+        values = []
+        for (level, name), base in shipped.items():
+            est = live.get((level, name))
+            if est and est["count"] >= min_count and est["std"]:
+                values.append(NormSnapshotValue(version=version, level=level, name=name, mean=est["mean"],
+                                                std=est["std"], count=est["count"], source="live"))
+            else:
+                values.append(NormSnapshotValue(version=version, level=level, name=name, mean=base["mean"],
+                                                std=base["std"], count=est["count"] if est else 0, source="shipped"))
+
+        def apply(s):
+            s.add(NormSnapshot(version=version, min_count=min_count, note=note))
+            s.add_all(values)
+
+        commit_with_retry(db, apply)
+        live_count = sum(1 for v in values if v.source == "live")
+        print(f"규준 스냅샷 v{version} 생성: 항목 {len(values)}개 중 {live_count}개를 이동 통계로 대체")
+        return version
+    finally:
+        db.close()
+
+
+def promote(version: int):
+    """스냅샷을 활성 규준으로 지정합니다. 0이면 기본 기준표로 되돌립니다."""
+    db = SessionLocal()
+    try:
+        def apply(s):
+            s.execute(update(NormSnapshot).where(NormSnapshot.active.is_(True)).values(active=False))
+            if version:
+                moved = s.execute(
+                    update(NormSnapshot).where(NormSnapshot.version == version)
+                    .values(active=True, promoted_at=datetime.now())
+                ).rowcount
+                if moved != 1:
+                    raise ValueError(f"규준 스냅샷 v{version}이(가) 없습니다.")
+
+        try:
+            commit_with_retry(db, apply)
+        except ValueError:
+            db.rollback()
+            raise
+        print(f"활성 규준: {'v' + str(version) if version else '기본 기준표'} "
+              f"(각 워커는 최대 {NORM_REFRESH_INTERVAL:.0f}초 안에 반영)")
+    finally:
+        db.close()
+
+
+def list_snapshots() -> list:
+    db = SessionLocal()
+    try:
+        live_counts = dict(
+            db.query(NormSnapshotValue.version, func.count())
+            .filter(NormSnapshotValue.source == "live")
+            .group_by(NormSnapshotValue.version).all()
+        )
+        return [
+            {
+                "version": s.version,
+                "created_at": s.created_at.isoformat() if s.created_at else None,
+                "promoted_at": s.promoted_at.isoformat() if s.promoted_at else None,
+                "active": bool(s.active),
+                "min_count": s.min_count,
+                "live_items": live_counts.get(s.version, 0),
+                "note": s.note,
+            }
+            for s in db.query(NormSnapshot).order_by(NormSnapshot.version.desc()).all()
+        ]
+    finally:
+        db.close()
+
+
+# --------------------
+# 드리프트
+# --------------------
+def drift_report(threshold: float = NORM_DRIFT_THRESHOLD) -> dict:
+    """
+    (학교급, 항목)별로 기본 기준표와 이동 통계를 비교합니다.
+    - mean_shift_sd: (이동 평균 - 기준 평균) / 기준 SD
+    - std_ratio: 이동 SD / 기준 SD
+    - z: 평균 차이의 표준오차 대비 크기 (표본이 클수록 작은 이동도 커짐)
+    |mean_shift_sd| >= threshold이고 표본이 NORM_MIN_COUNT 이상이면 drifted로 표시합니다.
+    """
+    db = SessionLocal()
+    try:
+        shipped = shipped_standards(db)
+        live = live_estimates(db)
+        active = active_norm_version(db)
+    finally:
+        db.close()
+    items = []
+    for (level, name), base in sorted(shipped.items()):
+        est = live.get((level, name)) or {"count": 0, "mean": None, "std": None}
+        item = {"level": level, "name": name, "shipped_mean": base["mean"], "shipped_std": base["std"],
+                "count": est["count"], "live_mean": est["mean"], "live_std": est["std"],
+                "mean_shift_sd": None, "std_ratio": None, "z": None, "drifted": False}
+        if est["count"] and base["std"]:
+            shift = (est["mean"] - base["mean"]) / base["std"]
+            item["mean_shift_sd"] = round(shift, 4)
+            item["z"] = round(shift * math.sqrt(est["count"]), 2)
+            if est["std"] is not None:
+                item["std_ratio"] = round(est["std"] / base["std"], 4)
+            item["drifted"] = est["count"] >= NORM_MIN_COUNT and abs(shift) >= threshold
+        items.append(item)
+    return {
+        "active_version": active,
+        "threshold_sd": threshold,
+        "min_count": NORM_MIN_COUNT,
+        "drifted": sum(1 for i in items if i["drifted"]),
+        "items": items,
+    }
+
+
+# --------------------
+# 백필
+# --------------------
+def backfill(batch_size: int = BACKFILL_BATCH) -> int:
+    """
+    survey_responses 전체(학교급이 기록된 행)에서 norm_estimates를 다시 만듭니다.
+    원점수는 id 순서로 나눠 읽고, 건수/평균/분산은 pandas groupby로 한 번에 계산합니다.
+    """
+    db = SessionLocal()
+    try:
+        records = []
+        last_id = 0
+        while True:
+            batch = (
+                db.query(SurveyResponse.id, SurveyResponse.school_level, SurveyResponse.scores_json)
+                .filter(SurveyResponse.id > last_id, SurveyResponse.school_level.in_(NORM_LEVELS))
+                .order_by(SurveyResponse.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            for _, level, scores_json in batch:
+                try:
+                    scores = json.loads(scores_json) if scores_json else {}
+                except (TypeError, ValueError):
+                    continue
+                for name, data in scores.items():
+                    if isinstance(data, dict) and data.get('raw') is not None:
+                        records.append((level, name, float(data['raw'])))
+        df = pd.DataFrame.from_records(records, columns=["level", "name", "raw"])
+        grouped = df.groupby(["level", "name"])["raw"].agg(["count", "mean", "var"]).reset_index()
+        grouped["m2"] = grouped["var"].fillna(0.0) * (grouped["count"] - 1)
+        rows = [
+            {"level": r.level, "name": r.name, "count": int(r.count), "mean": float(r.mean), "m2": float(r.m2)}
+            for r in grouped.itertuples(index=False)
+        ]
+
+        def apply(s):
+            s.execute(delete(NormEstimate))
+            if rows:
+                s.bulk_insert_mappings(NormEstimate, rows)
+
+        commit_with_retry(db, apply)
+        print(f"규준 이동 통계 백필 완료: 원점수 {len(records)}개, (학교급, 항목) {len(rows)}개")
+        return len(rows)
+    finally:
+        db.close()
+
+
+def create_router() -> APIRouter:
+    router = APIRouter(dependencies=[Depends(require_admin)])
+
+    @router.get("/admin/norms/drift")
+    def norms_drift(threshold: float = NORM_DRIFT_THRESHOLD):
+        return drift_report(threshold)
+
+    @router.get("/admin/norms/snapshots")
+    def norms_snapshots():
+        return {"active_version": active_norm_version(), "snapshots": list_snapshots()}
+
+    @router.post("/admin/norms/snapshots")
+    def norms_create_snapshot(min_count: int = NORM_MIN_COUNT, note: Optional[str] = None):
+        return {"version": create_snapshot(min_count, note)}
+
+    @router.post("/admin/norms/promote")
+    def norms_promote(version: int):
+        """version=0이면 기본 기준표로 되돌립니다."""
+        try:
+            promote(version)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return {"active_version": version}
+
+    return router
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="규준 재추정")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backfill")
+    sub.add_parser("drift")
+    sub.add_parser("list")
+    snap = sub.add_parser("snapshot")
+    snap.add_argument("--min-count", type=int, default=NORM_MIN_COUNT)
+    snap.add_argument("--note")
+    prom = sub.add_parser("promote")
+    prom.add_argument("version", type=int)
+    args = parser.parse_args()
+
+    from database import init_db, seed_reference_data
+    init_db()
+    seed_reference_data()
+    if args.command == "backfill":
+        backfill()
+    elif args.command == "drift":
+        print(json.dumps(drift_report(), ensure_ascii=False, indent=2))
+    elif args.command == "list":
+        print(json.dumps(list_snapshots(), ensure_ascii=False, indent=2))
+    elif args.command == "snapshot":
+        create_snapshot(args.min_count, args.note)
+    elif args.command == "promote":
+        promote(args.version)
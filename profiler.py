@@ -0,0 +1,405 @@
+"""
+느린 요청용 샘플링 프로파일러.
+
+@profiled("submit") 처럼 Gradio 핸들러를 감싸면, 선택된 요청이 실행되는 동안 샘플러 스레드가
+PROFILE_INTERVAL_MS마다 스택을 읽어 '벽시계(wall-clock)' 프로파일을 만듭니다.
+- 요청 코루틴이 실행 중이면 이벤트 루프 스레드의 실제 스택 (pandas/SQLAlchemy/PIL 등 동기 호출 포함)
+- await로 멈춰 있으면 await 체인 + "[await] 대기 대상" (LLM 게이트웨이/DB/스레드 대기 등)
+- profiler.to_thread()로 넘긴 작업은 그 워커 스레드의 스택도 "[thread]" 아래에 함께 기록
+- 동기 코드(보고서 작업 워커 등)는 profile_block()으로 현재 스레드를 샘플링
+
+선택 방식 (환경변수):
+- PROFILE_SAMPLE_RATE: 0~1, 이 비율의 요청을 무조건 저장
+- PROFILE_SLOW_MS: 0보다 크면 모든 요청을 샘플링하되, 이 시간보다 오래 걸린 요청만 저장
+둘 다 0(기본)이면 꺼져 있고 핸들러 오버헤드는 없습니다.
+
+결과는 PROFILE_DIR에 gzip JSON(메타 + 접힌 스택 {"a;b;c": 샘플 수})으로 저장되며,
+/admin/profiles 에서 목록을, /admin/profiles/{id}.collapsed 에서 flamegraph.pl/speedscope가
+읽는 접힌 스택 텍스트를 받을 수 있습니다.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import uuid
+import random
+import asyncio
+import inspect
+import functools
+import threading
+import contextlib
+import contextvars
+from datetime import datetime
+from collections import Counter
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+
+from admin import require_admin
+from background import after_fork
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "500"))
+PROFILE_MAX_DEPTH = int(os.getenv("PROFILE_MAX_DEPTH", "128"))
+
+_current: contextvars.ContextVar = contextvars.ContextVar("esli_profile", default=None)
+
+
+def _enabled() -> bool:
+    return PROFILE_SAMPLE_RATE > 0 or PROFILE_SLOW_MS > 0
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack_from(frame, stop=None) -> list:
+    """frame에서 바깥쪽으로 올라가며 라벨 목록(바깥→안쪽 순)을 만듭니다. stop 프레임에서 멈춥니다."""
+    labels = []
+    while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        if frame is stop:
+            break
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _awaitable_frame(obj):
+    return getattr(obj, "cr_frame", None) or getattr(obj, "ag_frame", None) or getattr(obj, "gi_frame", None)
+
+
+def _awaited(obj):
+    return getattr(obj, "cr_await", None) or getattr(obj, "ag_await", None) or getattr(obj, "gi_yieldfrom", None)
+
+
+def _await_chain(root) -> list:
+    """멈춰 있는 코루틴/비동기 제너레이터의 await 체인을 라벨 목록으로 만듭니다."""
+    labels = []
+    obj = root
+    while obj is not None and len(labels) < PROFILE_MAX_DEPTH:
+        frame = _awaitable_frame(obj)
+        if frame is None:
+            break
+        labels.append(_frame_label(frame))
+        obj = _awaited(obj)
+    if obj is not None:
+        labels.append(f"[await] {type(obj).__name__}")
+    return labels
+
+
+class Profile:
+    def __init__(self, endpoint: str, request_id: str, keep: bool):
+        self.endpoint = endpoint
+        self.request_id = request_id
+        self.keep = keep                    # 샘플링 비율로 선택됨 (지연 시간과 무관하게 저장)
+        self.meta = {}
+        self.counts = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.created = datetime.now()
+        self.thread_id = threading.get_ident()
+        self.root = None                    # 감싼 코루틴/비동기 제너레이터 (비동기 핸들러)
+        self.threads = {}                   # to_thread로 넘긴 작업: 스레드 ID → 작업 시작 프레임
+
+    def sample(self, frames: dict):
+        stacks = []
+        current = frames.get(self.thread_id)
+        root_frame = _awaitable_frame(self.root) if self.root is not None else None
+        if self.root is None:
+            if current is not None:
+                stacks.append(_stack_from(current))
+        elif root_frame is not None and current is not None and self._running(current, root_frame):
+            # 요청 코루틴이 지금 이벤트 루프에서 실행 중: 이벤트 루프 기계 부분은 잘라냄
+            stacks.append(_stack_from(current, stop=root_frame))
+        else:
+            stacks.append(_await_chain(self.root))
+        for ident, entry in list(self.threads.items()):
+            frame = frames.get(ident)
+            if frame is not None:
+                # 스레드 풀 기계 부분과 to_thread 래퍼 프레임은 빼고 작업 함수부터 기록
+                stacks.append([f"[thread] {self.endpoint}"] + _stack_from(frame, stop=entry)[1:])
+        for stack in stacks:
+            if stack:
+                self.counts[";".join(stack)] += 1
+        self.samples += 1
+
+    @staticmethod
+    def _running(frame, root_frame) -> bool:
+        while frame is not None:
+            if frame is root_frame:
+                return True
+            frame = frame.f_back
+        return False
+
+    def to_dict(self, duration_ms: float) -> dict:
+        return {
+            "id": self.profile_id,
+            "endpoint": self.endpoint,
+            "request_id": self.request_id,
+            "created": self.created.isoformat(timespec="milliseconds"),
+            "duration_ms": round(duration_ms, 1),
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "samples": self.samples,
+            "pid": os.getpid(),
+            "meta": self.meta,
+            "stacks": dict(self.counts.most_common()),
+        }
+
+    @property
+    def profile_id(self) -> str:
+        return f"{self.created:%Y%m%dT%H%M%S}-{self.endpoint}-{self.request_id}"
+
+
+class Sampler:
+    """활성 프로파일이 있는 동안만 깨어 있는 단일 샘플링 스레드"""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self._active = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._active.add(profile)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def remove(self, profile: Profile):
+        with self._lock:
+            self._active.discard(profile)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    self._wakeup.clear()
+            if not active:
+                self._wakeup.wait()
+                continue
+            frames = sys._current_frames()
+            for profile in active:
+                try:
+                    profile.sample(frames)
+                except Exception:
+                    pass  # 샘플 도중 스택이 바뀌는 경우 등은 그 샘플만 버림
+            del frames
+            time.sleep(self.interval)
+
+    def _reset_after_fork(self):
+        self._active = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+
+sampler = Sampler()
+after_fork(sampler._reset_after_fork)
+
+
+# --------------------
+# 저장소
+# --------------------
+def _profile_path(profile_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}.json.gz")
+
+
+def _save(profile: Profile, duration_ms: float):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    data = json.dumps(profile.to_dict(duration_ms), ensure_ascii=False).encode("utf-8")
+    path = _profile_path(profile.profile_id)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(gzip.compress(data))
+    os.replace(tmp, path)
+    _prune()
+    print(f"--- [프로파일] {profile.endpoint} {profile.request_id}: {duration_ms:.0f}ms, 샘플 {profile.samples}개 저장 ---")
+
+
+def _prune():
+    names = sorted(n for n in os.listdir(PROFILE_DIR) if n.endswith(".json.gz"))
+    for name in names[:max(len(names) - PROFILE_MAX_FILES, 0)]:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(PROFILE_DIR, name))
+
+
+def load_profile(profile_id: str) -> Optional[dict]:
+    if os.path.basename(profile_id) != profile_id:
+        return None
+    try:
+        with open(_profile_path(profile_id), "rb") as f:
+            return json.loads(gzip.decompress(f.read()))
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles(limit: int = 100, endpoint: Optional[str] = None) -> list:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    results = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith(".json.gz"):
+            continue
+        data = load_profile(name[:-len(".json.gz")])
+        if data is None or (endpoint and data["endpoint"] != endpoint):
+            continue
+        data.pop("stacks", None)
+        results.append(data)
+        if len(results) >= limit:
+            break
+    return results
+
+
+def to_collapsed(data: dict) -> str:
+    """flamegraph.pl / speedscope / inferno가 읽는 접힌 스택 형식 ("a;b;c 샘플수")"""
+    return "".join(f"{stack} {count}\n" for stack, count in data["stacks"].items())
+
+
+# --------------------
+# 계측 지점
+# --------------------
+def _start(endpoint: str, request_id: Optional[str]) -> Optional[Profile]:
+    if not _enabled():
+        return None
+    keep = random.random() < PROFILE_SAMPLE_RATE
+    if not keep and PROFILE_SLOW_MS <= 0:
+        return None
+    return Profile(endpoint, request_id or uuid.uuid4().hex[:12], keep)
+
+
+def _finish(profile: Profile):
+    sampler.remove(profile)
+    duration_ms = (time.perf_counter() - profile.started) * 1000
+    if profile.keep or (PROFILE_SLOW_MS > 0 and duration_ms >= PROFILE_SLOW_MS):
+        try:
+            _save(profile, duration_ms)
+        except Exception as e:
+            print(f"--- [오류] 프로파일 저장 실패: {e} ---")
+
+
+def _reset_current(token):
+    try:
+        _current.reset(token)
+    except ValueError:
+        pass  # 비동기 제너레이터가 다른 컨텍스트에서 재개된 경우
+
+
+@contextlib.contextmanager
+def profile_block(endpoint: str, request_id: Optional[str] = None):
+    """동기 코드 블록을 현재 스레드 기준으로 프로파일링합니다."""
+    profile = _start(endpoint, request_id)
+    if profile is None:
+        yield None
+        return
+    token = _current.set(profile)
+    sampler.add(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        _finish(profile)
+
+
+def profiled(endpoint: str):
+    """
+    async 함수/async 제너레이터 핸들러용 데코레이터.
+    감싼 함수의 종류(코루틴/비동기 제너레이터)와 시그니처를 유지하므로 Gradio 이벤트에 그대로 넘길 수 있습니다.
+    """
+    def decorate(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def gen_wrapper(*args, **kwargs):
+                profile = _start(endpoint, None)
+                if profile is None:
+                    async for item in fn(*args, **kwargs):
+                        yield item
+                    return
+                agen = fn(*args, **kwargs)
+                profile.root = agen
+                token = _current.set(profile)
+                sampler.add(profile)
+                try:
+                    async for item in agen:
+                        yield item
+                finally:
+                    _reset_current(token)
+                    _finish(profile)
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            profile = _start(endpoint, None)
+            if profile is None:
+                return await fn(*args, **kwargs)
+            coro = fn(*args, **kwargs)
+            profile.root = coro
+            token = _current.set(profile)
+            sampler.add(profile)
+            try:
+                return await coro
+            finally:
+                _current.reset(token)
+                _finish(profile)
+        return wrapper
+    return decorate
+
+
+def annotate(**values):
+    """현재 프로파일에 메타데이터를 남깁니다 (예: 보고서 작업 ID). 프로파일 중이 아니면 무시됩니다."""
+    profile = _current.get()
+    if profile is not None:
+        profile.meta.update(values)
+
+
+async def to_thread(func, *args, **kwargs):
+    """asyncio.to_thread와 같지만, 프로파일 중이면 워커 스레드의 스택도 함께 샘플링합니다."""
+    profile = _current.get()
+    if profile is None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    def run():
+        ident = threading.get_ident()
+        profile.threads[ident] = sys._getframe()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.threads.pop(ident, None)
+
+    return await asyncio.to_thread(run)
+
+
+# --------------------
+# 관리자 경로
+# --------------------
+def create_router() -> APIRouter:
+    router = APIRouter(dependencies=[Depends(require_admin)])
+
+    @router.get("/admin/profiles")
+    def profiles(limit: int = 100, endpoint: Optional[str] = None):
+        return {"enabled": _enabled(), "sample_rate": PROFILE_SAMPLE_RATE, "slow_ms": PROFILE_SLOW_MS,
+                "profiles": list_profiles(limit, endpoint)}
+
+    @router.get("/admin/profiles/{profile_id}.{fmt}")
+    def profile(profile_id: str, fmt: str):
+        data = load_profile(profile_id)
+        if data is None:
+            raise HTTPException(status_code=404, detail="프로파일을 찾을 수 없습니다.")
+        disposition = {"Content-Disposition": f'attachment; filename="{profile_id}.{fmt}"'}
+        if fmt == "collapsed":
+            return Response(to_collapsed(data), media_type="text/plain; charset=utf-8", headers=disposition)
+        if fmt == "json":
+            return Response(json.dumps(data, ensure_ascii=False), media_type="application/json", headers=disposition)
+        raise HTTPException(status_code=400, detail="형식은 collapsed 또는 json입니다.")
+
+    return router
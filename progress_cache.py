@@ -0,0 +1,227 @@
+import os
+import time
+import atexit
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Union
+
+from sqlalchemy import select
+
+from background import PeriodicWorker, after_fork
+from database import (
+    SessionLocal,
+    SurveyProgress,
+    upsert_progress_rows,
+    commit_with_retry,
+    commit_with_retry_async,
+    get_async_session_factory,
+)
+from answer_codec import encode_answer_positions, decode_answer_positions, to_scores
+from questionnaire import QUESTIONNAIRE_VERSION, ANSWER_OPTIONS, get_registry
+
+# 주기적 플러시 간격(초)과 유휴 세션 캐시 보관 시간(초)
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "10"))
+PROGRESS_CACHE_IDLE_TTL = float(os.getenv("PROGRESS_CACHE_IDLE_TTL", "1800"))
+
+
+class ProgressCache:
+    """
+    검사 진행상황 write-behind 캐시.
+    - 응답 변경(put)은 메모리에만 반영하고 dirty 표시만 남깁니다.
+    - dirty 세션은 타이머(PROGRESS_FLUSH_INTERVAL), 제출(flush), 종료(atexit) 시점에
+      단일 upsert 문으로 한 번에 DB에 기록됩니다.
+    - get은 캐시를 먼저 보고, 없으면 DB에서 읽어 캐시에 채웁니다(read-through).
+    - 응답은 현재 문항 버전의 화면 위치 순서 점수 목록(1~4, 미응답 None)으로 보관합니다.
+    """
+
+    def __init__(self, flush_interval: float = PROGRESS_FLUSH_INTERVAL, idle_ttl: float = PROGRESS_CACHE_IDLE_TTL):
+        self._flusher = PeriodicWorker("progress-flusher", flush_interval, self._flush_and_evict, "진행상황 주기 플러시")
+        self.idle_ttl = idle_ttl
+        self._entries: Dict[str, dict] = {}
+        self._dirty: set = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    # --- 캐시 조작 ---
+    def put(self, session_id: str, student_name: str, school_level: str, responses: Union[Sequence, dict]):
+        """
+        진행상황을 캐시에 반영하고 dirty로 표시합니다(DB 쓰기 없음).
+        responses는 화면 위치 순서의 응답 값(보기 문자열 또는 1~4, 미응답 None)이며,
+        {문항 텍스트: 값} 딕셔너리도 받습니다.
+        """
+        registry = get_registry()
+        if isinstance(responses, dict):
+            responses = registry.positions_from_dict(responses)
+        scores = to_scores(responses)
+        if len(scores) != registry.question_count:
+            raise ValueError(f"문항 수가 맞지 않습니다: {len(scores)}")
+        completed_count = sum(1 for s in scores if s is not None)
+        now = datetime.now()
+        with self._lock:
+            self._entries[session_id] = {
+                'student_name': student_name,
+                'school_level': school_level,
+                'scores': scores,
+                'completed': completed_count,
+                'total_questions': registry.question_count,
+                'last_updated': now,
+                'touched': time.monotonic(),
+            }
+            self._dirty.add(session_id)
+        self._flusher.start()
+        return completed_count
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """캐시 우선 조회, 없으면 DB에서 읽어 캐시에 적재합니다."""
+        cached = self._get_cached(session_id)
+        if cached is not None:
+            return cached
+        db = SessionLocal()
+        try:
+            progress = db.query(SurveyProgress).filter(SurveyProgress.session_id == session_id).first()
+        finally:
+            db.close()
+        return self._fill_from_row(session_id, progress)
+
+    async def get_async(self, session_id: str) -> Optional[dict]:
+        """get의 비동기 버전 (캐시 미스 시 비동기 세션으로 조회)."""
+        cached = self._get_cached(session_id)
+        if cached is not None:
+            return cached
+        async with get_async_session_factory()() as db:
+            result = await db.execute(select(SurveyProgress).where(SurveyProgress.session_id == session_id))
+            progress = result.scalars().first()
+        return self._fill_from_row(session_id, progress)
+
+    def _get_cached(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            entry['touched'] = time.monotonic()
+            return self._public_view(entry)
+
+    def _fill_from_row(self, session_id: str, progress) -> Optional[dict]:
+        if not progress:
+            return None
+        entry = {
+            'student_name': progress.student_name,
+            'school_level': progress.school_level,
+            'scores': decode_answer_positions(progress.progress_data, QUESTIONNAIRE_VERSION)[1],
+            'completed': progress.completed,
+            'total_questions': progress.total_questions,
+            'last_updated': progress.last_updated or datetime.now(),
+            'touched': time.monotonic(),
+        }
+        with self._lock:
+            # DB 조회 중에 put이 들어왔다면 캐시 값이 더 최신이므로 유지
+            entry = self._entries.setdefault(session_id, entry)
+            return self._public_view(entry)
+
+    @staticmethod
+    def _public_view(entry: dict) -> dict:
+        return {
+            'student_name': entry['student_name'] or "",
+            'school_level': entry['school_level'] or "초등",
+            # 화면 위치 순서의 보기 문자열 (미응답 None)
+            'answers': [None if s is None else ANSWER_OPTIONS[s - 1] for s in entry['scores']],
+            'completed': entry['completed'],
+            'total_questions': entry['total_questions'],
+            'last_updated': entry['last_updated'].strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+    # --- 플러시 ---
+    def _take_dirty_rows(self, session_id: Optional[str]) -> list:
+        """기록할 dirty 세션을 upsert용 행으로 꺼내고 dirty 표시를 지웁니다."""
+        with self._lock:
+            if session_id is not None:
+                targets = [session_id] if session_id in self._dirty else []
+            else:
+                targets = list(self._dirty)
+            rows = []
+            for sid in targets:
+                entry = self._entries[sid]
+                rows.append({
+                    'session_id': sid,
+                    'student_name': entry['student_name'],
+                    'school_level': entry['school_level'],
+                    'progress_data': encode_answer_positions(entry['scores']),
+                    'completed': entry['completed'],
+                    'total_questions': entry['total_questions'],
+                    'last_updated': entry['last_updated'],
+                })
+                self._dirty.discard(sid)
+            return rows
+
+    def _restore_dirty(self, rows: list, error: Exception):
+        print(f"진행상황 플러시 오류: {error}")
+        # 실패한 세션은 다음 주기에 다시 시도 (그 사이 put된 최신 값은 그대로 유지)
+        with self._lock:
+            self._dirty.update(row['session_id'] for row in rows)
+
+    def flush(self, session_id: Optional[str] = None) -> int:
+        """
+        dirty 세션을 DB에 기록합니다. session_id를 주면 해당 세션만 기록합니다.
+        반환값: 기록한 세션 수
+        """
+        with self._flush_lock:
+            rows = self._take_dirty_rows(session_id)
+            if not rows:
+                return 0
+            db = SessionLocal()
+            try:
+                commit_with_retry(db, lambda s: upsert_progress_rows(s, rows))
+                return len(rows)
+            except Exception as e:
+                db.rollback()
+                self._restore_dirty(rows, e)
+                return 0
+            finally:
+                db.close()
+
+    async def flush_async(self, session_id: Optional[str] = None) -> int:
+        """
+        flush의 비동기 버전 (제출 핸들러 등 이벤트 루프에서 호출).
+        _flush_lock 없이 주기 플러시와 겹칠 수 있지만, upsert가 더 최근 last_updated 행을 덮어쓰지 않으므로
+        늦게 커밋된 쪽이 옛 값을 남기지 않습니다.
+        """
+        rows = self._take_dirty_rows(session_id)
+        if not rows:
+            return 0
+        try:
+            async with get_async_session_factory()() as db:
+                await commit_with_retry_async(db, lambda s: s.run_sync(lambda sync_db: upsert_progress_rows(sync_db, rows)))
+            return len(rows)
+        except Exception as e:
+            self._restore_dirty(rows, e)
+            return 0
+
+    def _evict_idle(self):
+        """오래 사용되지 않은 clean 세션을 캐시에서 제거합니다."""
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            stale = [sid for sid, entry in self._entries.items()
+                     if sid not in self._dirty and entry['touched'] < cutoff]
+            for sid in stale:
+                del self._entries[sid]
+
+    def _flush_and_evict(self):
+        self.flush()
+        self._evict_idle()
+
+    def _reset_after_fork(self):
+        """fork된 자식에서 부모의 락과 캐시를 버립니다 (플러셔 스레드는 PeriodicWorker가 비움). dirty 항목은 부모가 기록합니다."""
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._entries = {}
+        self._dirty = set()
+
+    def stop(self):
+        """타이머를 멈추고 남은 dirty 세션을 모두 기록합니다(종료 시 호출)."""
+        self._flusher.stop()
+        self.flush()
+
+
+progress_cache = ProgressCache()
+atexit.register(progress_cache.stop)
+after_fork(progress_cache._reset_after_fork)
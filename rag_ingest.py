@@ -0,0 +1,416 @@
+"""
+RAG 벡터스토어 구축·갱신 (chroma_db, chroma_db/advice, chroma_db/curriculum).
+
+esli_03은 미리 만들어 둔 Chroma 저장소를 읽기만 하므로, 참고 문서(refer/코멘트참고.pdf 등)를
+바꾸면 이 스크립트로 다시 넣습니다.
+
+1) 원본 파일의 해시 계산·텍스트 추출·청크 분할을 프로세스 풀에서 파일별로 병렬 처리
+2) 청크 ID = (원본 경로, 쪽, 청크 내용)의 sha256 → 내용이 같은 청크는 ID도 같음
+3) 저장소에 없는 청크만 RAG_EMBED_BATCH_SIZE개씩 묶어 임베딩하고 upsert,
+   원본에서 사라진 청크는 삭제
+4) 컬렉션 폴더의 ingest_manifest.json에 원본별 파일 해시와 청크 ID를 기록
+
+파일 해시와 청크 설정이 매니페스트와 같으면 추출도 임베딩도 하지 않으므로,
+바뀐 것이 없는 코퍼스를 다시 넣으면 임베딩 호출은 0회입니다.
+임베딩 도중 실패하면 청크가 모두 저장된 원본만 매니페스트에 반영하고, 다시 실행하면
+이미 저장된 청크는 건너뛰고 나머지만 임베딩합니다.
+
+임베더:
+    openai  - LLM 게이트웨이 경유 text-embedding-3-large (esli_03 검색과 같은 모델, 기본값)
+    local   - chromadb 기본 ONNX 모델(all-MiniLM-L6-v2). 차원이 달라 esli_03 검색에는 쓸 수 없고
+              오프라인 점검용입니다.
+    모듈:이름 - embed(texts) / describe()를 가진 객체를 돌려주는 사용자 정의 팩토리
+매니페스트의 임베더와 다른 임베더로 넣으면 컬렉션을 비우고 처음부터 다시 만듭니다.
+매니페스트 없이 문서가 들어 있는 저장소(이 스크립트 이전에 직접 만든 chroma_db/* 등, 문서 ID가 uuid)도
+청크 ID로 대조할 수 없어 그대로 두면 옛 문서와 새 청크가 중복되므로, 처음 넣을 때 비우고 다시 만듭니다.
+이때는 원본 경로를 꼭 주어야 합니다 (빈 저장소가 되지 않도록). --rebuild로 언제든 강제로 다시 만들 수 있습니다.
+실행 중인 서버는 저장소를 프로세스 시작 시 한 번 열므로, 갱신 후 재시작해야 반영됩니다.
+
+명령행:
+    python rag_ingest.py ingest default refer/코멘트참고.pdf
+    python rag_ingest.py ingest advice docs/advice/ --workers 4
+    python rag_ingest.py ingest advice            # 매니페스트에 기록된 원본을 다시 확인
+    python rag_ingest.py ingest default refer/코멘트참고.pdf --rebuild   # 비우고 처음부터
+    python rag_ingest.py status
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+import importlib
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Optional, List, Dict
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CHROMA_DB_DIR = os.path.join(BASE_DIR, "chroma_db")
+COLLECTION_DIRS = {
+    "default": CHROMA_DB_DIR,
+    "advice": os.path.join(CHROMA_DB_DIR, "advice"),
+    "curriculum": os.path.join(CHROMA_DB_DIR, "curriculum"),
+}
+# langchain_community Chroma가 collection_name을 주지 않았을 때 쓰는 이름 (esli_03이 이 컬렉션을 읽음)
+COLLECTION_NAME = "langchain"
+MANIFEST_FILE = "ingest_manifest.json"
+MANIFEST_VERSION = 1
+
+RAG_CHUNK_SIZE = int(os.getenv("RAG_CHUNK_SIZE", "800"))
+RAG_CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "120"))
+RAG_EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "256"))
+RAG_EMBED_CONCURRENCY = int(os.getenv("RAG_EMBED_CONCURRENCY", "4"))
+RAG_INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", str(min(os.cpu_count() or 1, 8))))
+RAG_EMBEDDER = os.getenv("RAG_EMBEDDER", "openai")
+
+SUPPORTED_SUFFIXES = (".pdf", ".txt", ".md")
+
+
+# --------------------
+# 임베더
+# --------------------
+class OpenAIEmbedder:
+    """LLM 게이트웨이 경유 OpenAI 임베딩 (재시도·동시성 제한·사용량 기록은 게이트웨이가 담당)"""
+
+    def __init__(self, model: Optional[str] = None):
+        from llm_gateway import DEFAULT_EMBEDDING_MODEL
+        self.model = model or DEFAULT_EMBEDDING_MODEL
+
+    def describe(self) -> dict:
+        return {"name": "openai", "model": self.model}
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        from llm_gateway import get_gateway
+        return get_gateway().embed(texts, model=self.model)
+
+
+class LocalEmbedder:
+    """chromadb에 포함된 ONNX 임베딩 (네트워크·API 키 없이 동작)"""
+
+    def __init__(self):
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+        self._fn = DefaultEmbeddingFunction()
+
+    def describe(self) -> dict:
+        return {"name": "local", "model": "all-MiniLM-L6-v2"}
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [[float(x) for x in vector] for vector in self._fn(texts)]
+
+
+EMBEDDERS = {"openai": OpenAIEmbedder, "local": LocalEmbedder}
+
+
+def load_embedder(spec: str):
+    """'openai' / 'local' 또는 '모듈:이름' 형식으로 임베더를 만듭니다."""
+    if spec in EMBEDDERS:
+        return EMBEDDERS[spec]()
+    module_name, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"알 수 없는 임베더입니다: {spec} (openai, local 또는 모듈:이름)")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+# --------------------
+# 추출·분할 (프로세스 풀 작업)
+# --------------------
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _extract_pages(path: str) -> List[tuple]:
+    """[(쪽 번호 또는 None, 텍스트)]. PDF는 쪽별로, 텍스트 파일은 한 덩어리로 돌려줍니다."""
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+        reader = PdfReader(path)
+        return [(i + 1, page.extract_text() or "") for i, page in enumerate(reader.pages)]
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return [(None, f.read())]
+
+
+def chunk_id(source: str, page: Optional[int], text: str) -> str:
+    return hashlib.sha256(f"{source}\0{page or ''}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+
+def _process_source(path: str, source: str, known_sha: Optional[str], chunk_size: int, chunk_overlap: int) -> dict:
+    """
+    원본 하나를 처리합니다. 파일 해시가 known_sha와 같으면 추출 없이 unchanged로 돌려주고,
+    아니면 쪽별로 나눈 청크 목록을 돌려줍니다 (같은 원본 안의 중복 청크는 하나만).
+    """
+    sha = _file_sha256(path)
+    result = {"source": source, "sha256": sha, "size": os.path.getsize(path), "mtime": os.path.getmtime(path)}
+    if sha == known_sha:
+        return {**result, "unchanged": True}
+
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks, seen = [], set()
+    for page, text in _extract_pages(path):
+        for piece in splitter.split_text(text):
+            piece = piece.strip()
+            if not piece:
+                continue
+            cid = chunk_id(source, page, piece)
+            if cid in seen:
+                continue
+            seen.add(cid)
+            metadata = {"source": source}
+            if page is not None:
+                metadata["page"] = page
+            chunks.append((cid, piece, metadata))
+    return {**result, "unchanged": False, "chunks": chunks}
+
+
+# --------------------
+# 매니페스트 / 저장소
+# --------------------
+def _manifest_path(collection: str) -> str:
+    return os.path.join(COLLECTION_DIRS[collection], MANIFEST_FILE)
+
+
+def load_manifest(collection: str) -> dict:
+    try:
+        with open(_manifest_path(collection), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "collection": collection, "embedder": None, "chunking": None, "sources": {}}
+
+
+def _save_manifest(collection: str, manifest: dict):
+    path = _manifest_path(collection)
+    manifest["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def _open_collection(collection: str, reset: bool = False):
+    import chromadb
+    client = chromadb.PersistentClient(path=COLLECTION_DIRS[collection])
+    if reset:
+        try:
+            client.delete_collection(COLLECTION_NAME)
+        except Exception:
+            pass  # 아직 컬렉션이 없음
+    # 임베딩은 직접 계산해 넣으므로 컬렉션 임베딩 함수는 두지 않습니다 (LangChain Chroma와 같은 방식)
+    return client, client.get_or_create_collection(COLLECTION_NAME, embedding_function=None)
+
+
+def _collection_count(collection: str) -> int:
+    """컬렉션에 들어 있는 문서 수 (저장소나 컬렉션이 없으면 0)"""
+    if not os.path.isdir(COLLECTION_DIRS[collection]):
+        return 0
+    import chromadb
+    client = chromadb.PersistentClient(path=COLLECTION_DIRS[collection])
+    try:
+        return client.get_collection(COLLECTION_NAME).count()
+    except Exception:
+        return 0  # 아직 컬렉션이 없음
+
+
+def _existing_ids(store, ids: List[str], batch: int) -> set:
+    found = set()
+    for i in range(0, len(ids), batch):
+        found.update(store.get(ids=ids[i:i + batch], include=[])["ids"])
+    return found
+
+
+def _source_key(path: str) -> str:
+    path = os.path.abspath(path)
+    rel = os.path.relpath(path, BASE_DIR)
+    return path if rel.startswith("..") else rel.replace(os.sep, "/")
+
+
+def _source_path(source: str) -> str:
+    return source if os.path.isabs(source) else os.path.join(BASE_DIR, source)
+
+
+def expand_sources(paths: List[str]) -> Dict[str, str]:
+    """파일/폴더 경로를 {원본 키: 절대 경로}로 펼칩니다 (폴더는 지원 확장자를 재귀 탐색)."""
+    found = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(SUPPORTED_SUFFIXES):
+                        full = os.path.join(root, name)
+                        found[_source_key(full)] = os.path.abspath(full)
+        elif os.path.isfile(path):
+            found[_source_key(path)] = os.path.abspath(path)
+        else:
+            raise FileNotFoundError(f"원본 파일이 없습니다: {path}")
+    return found
+
+
+# --------------------
+# 수집
+# --------------------
+def ingest(collection: str, paths: Optional[List[str]] = None, embedder=None, workers: int = RAG_INGEST_WORKERS,
+           batch_size: int = RAG_EMBED_BATCH_SIZE, concurrency: int = RAG_EMBED_CONCURRENCY,
+           prune: bool = False, dry_run: bool = False, rebuild: bool = False) -> dict:
+    """
+    collection 저장소를 원본과 맞춥니다. paths를 주지 않으면 매니페스트에 기록된 원본을 다시 확인합니다.
+    prune=True면 이번 paths에 없는 기존 원본의 청크도 지웁니다 (디스크에서 사라진 원본은 항상 지움).
+    rebuild=True면 컬렉션을 비우고 처음부터 다시 넣습니다 (임베더가 바뀌었거나 매니페스트 없는 기존 저장소면 자동).
+    """
+    if collection not in COLLECTION_DIRS:
+        raise ValueError(f"알 수 없는 컬렉션입니다: {collection} ({', '.join(COLLECTION_DIRS)})")
+    started = time.perf_counter()
+    os.makedirs(COLLECTION_DIRS[collection], exist_ok=True)
+    embedder = embedder or load_embedder(RAG_EMBEDDER)
+    manifest = load_manifest(collection)
+    chunking = {"chunk_size": RAG_CHUNK_SIZE, "chunk_overlap": RAG_CHUNK_OVERLAP}
+    stats = {"collection": collection, "sources": 0, "unchanged_sources": 0, "changed_sources": 0,
+             "removed_sources": 0, "failed_sources": 0, "chunks_embedded": 0, "chunks_reused": 0,
+             "chunks_deleted": 0, "embedding_calls": 0, "rebuilt": False}
+
+    if paths:
+        sources = expand_sources(paths)
+    else:
+        sources = {s: _source_path(s) for s in manifest["sources"]}
+
+    # 임베더가 바뀌면 벡터 공간이 달라지므로 처음부터 다시 만듭니다.
+    if manifest["embedder"] is not None and manifest["embedder"] != embedder.describe():
+        print(f"[RAG] 임베더 변경 {manifest['embedder']} → {embedder.describe()}: {collection} 컬렉션을 다시 만듭니다")
+        rebuild = True
+    # 매니페스트 없이 문서가 있는 저장소는 어떤 문서가 어느 원본인지 알 수 없으므로 비우고 다시 만듭니다.
+    elif manifest["embedder"] is None and not rebuild and _collection_count(collection):
+        print(f"[RAG] 매니페스트 없는 기존 {collection} 저장소: 중복을 막기 위해 비우고 다시 만듭니다")
+        rebuild = True
+    if rebuild:
+        if not sources:
+            raise ValueError(f"{collection} 컬렉션을 다시 만들려면 원본 경로를 지정해야 합니다 (비운 뒤 넣을 원본이 없음)")
+        manifest["sources"] = {}
+        stats["rebuilt"] = True
+    # 청크 설정이 바뀌면 파일이 같아도 다시 나눠야 합니다 (내용이 같은 청크는 ID가 같아 재사용됨).
+    rechunk = manifest["chunking"] != chunking
+    removed = [s for s in manifest["sources"]
+               if not os.path.isfile(_source_path(s)) or (prune and s not in sources)]
+    sources = {s: p for s, p in sources.items() if os.path.isfile(p)}
+    stats["sources"] = len(sources)
+
+    # 1) 해시·추출·분할 (프로세스 풀)
+    results = []
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(sources) or 1))) as pool:
+        futures = {
+            pool.submit(_process_source, path, source,
+                        None if rechunk else (manifest["sources"].get(source) or {}).get("sha256"),
+                        RAG_CHUNK_SIZE, RAG_CHUNK_OVERLAP): source
+            for source, path in sources.items()
+        }
+        for future in as_completed(futures):
+            results.append(future.result())
+    changed = [r for r in results if not r["unchanged"]]
+    stats["unchanged_sources"] = len(results) - len(changed)
+    stats["changed_sources"] = len(changed)
+    stats["removed_sources"] = len(removed)
+
+    if dry_run or (not changed and not removed and not rebuild):
+        stats["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+        return stats
+
+    client, store = _open_collection(collection, reset=rebuild)
+    max_batch = client.get_max_batch_size()
+
+    # 2) 저장소에 없는 청크만 임베딩 (중단 후 재실행 시 이미 넣은 청크는 건너뜀)
+    pending = {cid: (text, metadata) for r in changed for cid, text, metadata in r["chunks"]}
+    present = _existing_ids(store, list(pending), max_batch)
+    stats["chunks_reused"] = len(present)
+    todo = [cid for cid in pending if cid not in present]
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    stored, error = set(present), None
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(embedder.embed, [pending[cid][0] for cid in ids]): ids for ids in batches}
+        for future in as_completed(futures):
+            ids = futures[future]
+            try:
+                vectors = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            stats["embedding_calls"] += 1
+            store.upsert(ids=ids, embeddings=vectors, documents=[pending[cid][0] for cid in ids],
+                         metadatas=[pending[cid][1] for cid in ids])
+            stored.update(ids)
+            stats["chunks_embedded"] += len(ids)
+
+    # 3) 청크가 모두 저장된 원본만 매니페스트에 반영하고, 사라진 청크를 지웁니다.
+    stale = []
+    for r in changed:
+        new_ids = [cid for cid, _, _ in r["chunks"]]
+        if any(cid not in stored for cid in new_ids):
+            stats["failed_sources"] += 1
+            continue
+        old_ids = set((manifest["sources"].get(r["source"]) or {}).get("chunks", []))
+        stale.extend(old_ids.difference(new_ids))
+        manifest["sources"][r["source"]] = {
+            "sha256": r["sha256"], "size": r["size"], "mtime": r["mtime"], "chunks": new_ids,
+            "ingested_at": datetime.now().isoformat(timespec="seconds"),
+        }
+    for source in removed:
+        stale.extend(manifest["sources"].pop(source).get("chunks", []))
+    for i in range(0, len(stale), max_batch):
+        store.delete(ids=stale[i:i + max_batch])
+    stats["chunks_deleted"] = len(stale)
+
+    manifest["embedder"] = embedder.describe()
+    if not stats["failed_sources"]:
+        manifest["chunking"] = chunking
+    _save_manifest(collection, manifest)
+    stats["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+    if error is not None:
+        stats["error"] = f"{type(error).__name__}: {error}"
+    return stats
+
+
+def collection_status(collection: str) -> dict:
+    manifest = load_manifest(collection)
+    return {
+        "collection": collection,
+        "path": COLLECTION_DIRS[collection],
+        "embedder": manifest["embedder"],
+        "chunking": manifest["chunking"],
+        "sources": len(manifest["sources"]),
+        "chunks": sum(len(s.get("chunks", [])) for s in manifest["sources"].values()),
+        "updated_at": manifest.get("updated_at"),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RAG 벡터스토어 구축·갱신")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("ingest")
+    run.add_argument("collection", choices=list(COLLECTION_DIRS))
+    run.add_argument("paths", nargs="*", help="원본 파일 또는 폴더 (생략 시 매니페스트의 원본)")
+    run.add_argument("--embedder", default=RAG_EMBEDDER, help="openai, local 또는 모듈:이름")
+    run.add_argument("--workers", type=int, default=RAG_INGEST_WORKERS)
+    run.add_argument("--batch-size", type=int, default=RAG_EMBED_BATCH_SIZE)
+    run.add_argument("--concurrency", type=int, default=RAG_EMBED_CONCURRENCY)
+    run.add_argument("--prune", action="store_true", help="이번에 주지 않은 기존 원본의 청크도 삭제")
+    run.add_argument("--dry-run", action="store_true", help="바뀐 원본만 확인하고 임베딩·저장은 하지 않음")
+    run.add_argument("--rebuild", action="store_true", help="컬렉션을 비우고 처음부터 다시 넣음")
+    status = sub.add_parser("status")
+    status.add_argument("collection", nargs="?", choices=list(COLLECTION_DIRS))
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        try:
+            result = ingest(args.collection, args.paths, embedder=load_embedder(args.embedder), workers=args.workers,
+                            batch_size=args.batch_size, concurrency=args.concurrency,
+                            prune=args.prune, dry_run=args.dry_run, rebuild=args.rebuild)
+        except ValueError as e:
+            parser.error(str(e))
+        print(json.dumps(result, ensure_ascii=False, indent=1))
+        if "error" in result:
+            sys.exit(1)
+    else:
+        for name in ([args.collection] if args.collection else COLLECTION_DIRS):
+            print(json.dumps(collection_status(name), ensure_ascii=False))
@@ -0,0 +1,314 @@
+"""
+보고서 생성 백그라운드 작업 큐.
+
+제출(submit)은 report_jobs 테이블에 작업을 넣고 작업 ID만 돌려받습니다.
+같은 프로세스의 워커 스레드(REPORT_WORKERS)가 작업을 점유(lease)해서
+점수 계산 → LLM 4개 섹션 → SurveyResponse 저장을 수행하고, 결과를 작업 행에 기록합니다.
+- 중복 제출: 세션+응답 해시(idempotency_key)가 같으면 기존 작업을 그대로 돌려줍니다.
+- 재시작 복구: 점유 만료(lease_until)가 지난 running 작업은 다른 워커가 다시 가져갑니다.
+- 점유 연장: 보고서를 만드는 동안 REPORT_JOB_HEARTBEAT초마다 lease_until을 늘리므로, LLM 지연·재시도로
+  REPORT_JOB_LEASE보다 오래 걸려도 다른 워커가 같은 작업을 다시 만들지 않습니다.
+  연장하려는데 이미 다른 워커가 가져갔으면 생성을 중단합니다 (LLM 비용을 두 번 쓰지 않도록).
+- 결과 저장과 작업 완료 표시는 한 트랜잭션이며, 점유를 잃은 워커의 결과는 버려집니다.
+"""
+import os
+import uuid
+import socket
+import hashlib
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, List, Sequence, Union
+
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.exc import IntegrityError
+
+from background import after_fork
+from database import SessionLocal, ReportJob, get_async_session_factory, commit_with_retry
+from answer_codec import encode_answers, encode_answer_positions, decode_answers
+from esli_01 import calculate_scores
+from esli_02 import build_report_async, _new_survey_response, _add_survey_response, _db_save_failed_report
+from metrics import stage_span
+from profiler import profile_block
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "4"))
+REPORT_JOB_LEASE = float(os.getenv("REPORT_JOB_LEASE", "600"))             # 점유 유지 시간(초)
+REPORT_JOB_HEARTBEAT = float(os.getenv("REPORT_JOB_HEARTBEAT", str(REPORT_JOB_LEASE / 3)))  # 점유 연장 주기(초)
+REPORT_JOB_MAX_ATTEMPTS = int(os.getenv("REPORT_JOB_MAX_ATTEMPTS", "3"))
+REPORT_JOB_POLL_INTERVAL = float(os.getenv("REPORT_JOB_POLL_INTERVAL", "2"))  # 다른 프로세스가 넣은 작업 확인 주기
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+def _idempotency_key(session_id: str, student_name: str, school_level: str, encoded: str) -> str:
+    raw = "|".join([session_id or "", student_name, school_level, encoded])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _job_view(job: ReportJob) -> dict:
+    return {
+        'job_id': job.job_id,
+        'status': job.status,
+        'student_name': job.student_name,
+        'attempts': job.attempts,
+        'response_id': job.response_id,
+        'report_content': job.report_content,
+        'error': job.error,
+    }
+
+
+_wakeup = threading.Event()
+
+
+def enqueue_report_job(session_id: str, student_name: str, school_level: str,
+                       responses: Union[Sequence[int], dict]) -> str:
+    """
+    보고서 작업을 등록하고 작업 ID를 반환합니다.
+    responses는 화면 위치 순서의 1~4 점수 목록(UI 제출) 또는 {문항 텍스트: 1~4 점수}입니다.
+    같은 세션에서 같은 응답으로 다시 제출하면 기존 작업 ID를 반환하며,
+    실패로 끝난 작업이었다면 다시 대기열에 올립니다.
+    """
+    encoded = encode_answers(responses) if isinstance(responses, dict) else encode_answer_positions(responses)
+    key = _idempotency_key(session_id, student_name, school_level, encoded)
+    db = SessionLocal()
+    try:
+        job = ReportJob(
+            job_id=uuid.uuid4().hex,
+            idempotency_key=key,
+            session_id=session_id,
+            student_name=student_name,
+            school_level=school_level,
+            responses_json=encoded,
+            status=JOB_QUEUED,
+        )
+        try:
+            commit_with_retry(db, lambda s: s.add(job))
+            job_id = job.job_id
+        except IntegrityError:
+            db.rollback()
+            existing = db.execute(select(ReportJob).where(ReportJob.idempotency_key == key)).scalars().one()
+            job_id = existing.job_id
+            if existing.status == JOB_FAILED:
+                commit_with_retry(db, lambda s: s.execute(
+                    update(ReportJob)
+                    .where(ReportJob.id == existing.id, ReportJob.status == JOB_FAILED)
+                    .values(status=JOB_QUEUED, attempts=0, error=None, worker_id=None, lease_until=None)
+                ))
+        _wakeup.set()
+        return job_id
+    finally:
+        db.close()
+
+
+def get_report_job(job_id: str) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        job = db.execute(select(ReportJob).where(ReportJob.job_id == job_id)).scalars().first()
+        return _job_view(job) if job else None
+    finally:
+        db.close()
+
+
+async def get_report_job_async(job_id: str) -> Optional[dict]:
+    """get_report_job의 비동기 버전 (UI 폴링용)."""
+    async with get_async_session_factory()() as db:
+        job = (await db.execute(select(ReportJob).where(ReportJob.job_id == job_id))).scalars().first()
+        return _job_view(job) if job else None
+
+
+class _LeaseLost(Exception):
+    pass
+
+
+class ReportWorker(threading.Thread):
+    def __init__(self, index: int, stop_event: threading.Event):
+        super().__init__(name=f"report-worker-{index}", daemon=True)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+        self.stop_event = stop_event
+
+    def _claimable(self, now: datetime):
+        return or_(
+            ReportJob.status == JOB_QUEUED,
+            and_(ReportJob.status == JOB_RUNNING, ReportJob.lease_until < now),
+        )
+
+    def _claim(self) -> Optional[ReportJob]:
+        """대기 중이거나 점유가 만료된 작업 하나를 원자적으로 점유합니다(compare-and-set)."""
+        now = datetime.now()
+        db = SessionLocal()
+        try:
+            # 재시도 한도를 넘긴 채 점유가 만료된 작업은 실패로 마감
+            commit_with_retry(db, lambda s: s.execute(
+                update(ReportJob)
+                .where(ReportJob.status == JOB_RUNNING, ReportJob.lease_until < now,
+                       ReportJob.attempts >= REPORT_JOB_MAX_ATTEMPTS)
+                .values(status=JOB_FAILED, error="작업 점유 만료 (재시도 한도 초과)", worker_id=None)
+            ))
+            candidates = db.execute(
+                select(ReportJob.id).where(self._claimable(now)).order_by(ReportJob.id).limit(10)
+            ).scalars().all()
+            for job_pk in candidates:
+                result = db.execute(
+                    update(ReportJob)
+                    .where(ReportJob.id == job_pk, self._claimable(now))
+                    .values(status=JOB_RUNNING, worker_id=self.worker_id,
+                            lease_until=now + timedelta(seconds=REPORT_JOB_LEASE),
+                            attempts=ReportJob.attempts + 1)
+                )
+                db.commit()
+                if result.rowcount == 1:
+                    return db.get(ReportJob, job_pk)
+            return None
+        except Exception as e:
+            db.rollback()
+            print(f"--- [오류] 보고서 작업 점유 실패: {e} ---")
+            return None
+        finally:
+            db.close()
+
+    def _finish(self, job: ReportJob, values: dict, new_response=None, student_scores: dict = None) -> bool:
+        """작업 결과를 기록합니다. 점유를 잃었으면(다른 워커가 가져감) False를 반환하고 아무것도 남기지 않습니다."""
+        db = SessionLocal()
+        try:
+            def apply(s):
+                if new_response is not None:
+                    _add_survey_response(s, new_response, student_scores or {})
+                    s.flush()
+                    values['response_id'] = new_response.id
+                result = s.execute(
+                    update(ReportJob)
+                    .where(ReportJob.id == job.id, ReportJob.worker_id == self.worker_id,
+                           ReportJob.status == JOB_RUNNING)
+                    .values(lease_until=None, **values)
+                )
+                if result.rowcount != 1:
+                    raise _LeaseLost()
+            commit_with_retry(db, apply)
+            return True
+        except _LeaseLost:
+            db.rollback()
+            print(f"--- [경고] 보고서 작업 {job.job_id}의 점유를 잃어 결과를 버립니다. ---")
+            return False
+        finally:
+            db.close()
+
+    def _renew_lease(self, job: ReportJob) -> bool:
+        """점유를 REPORT_JOB_LEASE만큼 연장합니다. 다른 워커가 가져갔으면 False."""
+        db = SessionLocal()
+        renewed = []
+        try:
+            def apply(s):
+                result = s.execute(
+                    update(ReportJob)
+                    .where(ReportJob.id == job.id, ReportJob.worker_id == self.worker_id,
+                           ReportJob.status == JOB_RUNNING)
+                    .values(lease_until=datetime.now() + timedelta(seconds=REPORT_JOB_LEASE))
+                )
+                renewed[:] = [result.rowcount == 1]
+            commit_with_retry(db, apply)
+            return renewed[0]
+        except Exception as e:
+            # 일시적인 DB 오류는 다음 주기에 다시 연장합니다.
+            db.rollback()
+            print(f"--- [경고] 보고서 작업 {job.job_id} 점유 연장 실패: {e} ---")
+            return True
+        finally:
+            db.close()
+
+    async def _with_heartbeat(self, job: ReportJob, coro):
+        """coro를 실행하는 동안 주기적으로 점유를 연장합니다. 점유를 잃으면 coro를 취소하고 _LeaseLost."""
+        task = asyncio.ensure_future(coro)
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=REPORT_JOB_HEARTBEAT)
+            if done:
+                return task.result()
+            if not await asyncio.to_thread(self._renew_lease, job):
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                raise _LeaseLost()
+
+    def _process(self, job: ReportJob):
+        responses = decode_answers(job.responses_json)
+        report_md = None
+        try:
+            with stage_span("report", "scoring"):
+                raw_scores_df = calculate_scores(responses)
+            report_md, student_scores = asyncio.run(self._with_heartbeat(
+                job, build_report_async(job.student_name, responses, job.school_level, raw_scores_df)
+            ))
+            new_response = _new_survey_response(job.student_name, responses, student_scores, report_md, job.school_level)
+            with stage_span("report", "db_save"):
+                saved = self._finish(job, {'status': JOB_DONE, 'report_content': report_md, 'error': None},
+                                     new_response, student_scores)
+            if saved:
+                print(f"--- [성공] {job.student_name} 학생 보고서 작업 완료 (작업: {job.job_id}) ---")
+        except _LeaseLost:
+            # 작업은 이미 다른 워커 소유이므로 상태를 건드리지 않습니다.
+            print(f"--- [경고] 보고서 작업 {job.job_id}의 점유를 잃어 생성을 중단했습니다. ---")
+        except Exception as e:
+            print(f"--- [오류] 보고서 작업 {job.job_id} 처리 실패 ({job.attempts}회차): {e} ---")
+            if job.attempts < REPORT_JOB_MAX_ATTEMPTS:
+                self._finish(job, {'status': JOB_QUEUED, 'worker_id': None, 'error': str(e)})
+                _wakeup.set()
+            else:
+                # 보고서까지 만들어졌다면 DB 저장 실패 안내와 함께 내용은 보여줍니다.
+                content = _db_save_failed_report(report_md) if report_md else None
+                self._finish(job, {'status': JOB_FAILED, 'error': str(e), 'report_content': content})
+
+    def run(self):
+        while not self.stop_event.is_set():
+            job = self._claim()
+            if job is None:
+                _wakeup.wait(REPORT_JOB_POLL_INTERVAL)
+                _wakeup.clear()
+                continue
+            try:
+                with profile_block("report_job", job.job_id):
+                    self._process(job)
+            except Exception as e:
+                # 결과 기록 자체가 실패해도 워커는 살아남고, 작업은 점유 만료 후 재시도됩니다.
+                print(f"--- [오류] 보고서 작업 {job.job_id} 결과 기록 실패: {e} ---")
+
+
+class ReportWorkerPool:
+    def __init__(self):
+        self._stop_event = threading.Event()
+        self._workers: List[ReportWorker] = []
+        self._lock = threading.Lock()
+
+    def start(self, count: int = REPORT_WORKERS):
+        """워커 스레드를 시작합니다. 이미 실행 중이면 아무것도 하지 않습니다."""
+        with self._lock:
+            if any(w.is_alive() for w in self._workers):
+                return
+            self._stop_event.clear()
+            self._workers = [ReportWorker(i, self._stop_event) for i in range(count)]
+            for worker in self._workers:
+                worker.start()
+            print(f"보고서 작업 워커 {count}개를 시작했습니다.")
+
+    def stop(self):
+        self._stop_event.set()
+        _wakeup.set()
+
+    def _reset_after_fork(self):
+        # 부모의 워커 스레드는 자식에 없으므로 자식에서 start()를 다시 호출할 수 있게 비웁니다.
+        global _wakeup
+        _wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._workers = []
+        self._lock = threading.Lock()
+
+
+report_workers = ReportWorkerPool()
+after_fork(report_workers._reset_after_fork)
+
+
+def start_report_workers(count: int = REPORT_WORKERS):
+    report_workers.start(count)
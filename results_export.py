@@ -0,0 +1,232 @@
+"""
+검사 결과 열 형식(Parquet/Arrow) 증분 내보내기 (분석용).
+
+survey_responses에서 id, 시각, 이름, 학교급, 응답(responses_json), 점수(scores_json)만 읽어
+문항별 점수(q001 …, 1~4 / 미응답은 null)와 항목별 T점수·백분위(<항목>_t, <항목>_pct) 열로 펼쳐 씁니다.
+보고서 본문(report_content)은 조회하지 않습니다.
+
+- 증분: 마지막으로 내보낸 id(high-watermark)를 내보내기 폴더의 _watermark.json에 두고,
+  실행할 때마다 그 뒤의 행만 새 파일(part-<첫 id>-<끝 id>.parquet)로 씁니다.
+  폴더 전체를 하나의 데이터셋으로 읽으면 됩니다 (pd.read_parquet(폴더) / pyarrow.dataset).
+- 시작할 때의 최대 id까지만 내보내므로, 실행 중에 들어온 행은 다음 실행에 포함됩니다.
+- id 순서로 RESULTS_EXPORT_BATCH행씩 읽고 곧바로 파일에 쓰므로 메모리 사용량은 배치 크기에만 비례합니다.
+- 문항 열 이름은 문항 ID(questionnaire.QUESTION_IDS) 기준이고, 열 → 문항 텍스트 대응은
+  파일 스키마 메타데이터(esli.questions)에 들어 있습니다. 이전 버전 응답은 현재 문항 순서로 옮겨 씁니다.
+
+명령행 (야간 작업 등):
+    python results_export.py                       # 지난 실행 이후 증분
+    python results_export.py --format arrow        # Arrow IPC 파일로
+    python results_export.py --full                # 처음부터 다시 (기존 part 파일 교체)
+"""
+import os
+import json
+import argparse
+from datetime import datetime
+from typing import List
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select, func
+
+from answer_codec import decode_answer_positions
+from database import SessionLocal, SurveyResponse
+from questionnaire import QUESTIONNAIRE_VERSION, get_registry
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_EXPORT_DIR = os.getenv("RESULTS_EXPORT_DIR", os.path.join(BASE_DIR, "exports", "survey_responses"))
+RESULTS_EXPORT_BATCH = int(os.getenv("RESULTS_EXPORT_BATCH", "2000"))
+
+WATERMARK_FILE = "_watermark.json"
+# 항목 원점수에서 합산하는 종합 항목 (esli_01._raw_scores_frame과 같음)
+COMPOSITE_CATEGORIES = ["학습전략", "학습기술"]
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+def question_columns(version: int = QUESTIONNAIRE_VERSION) -> List[tuple]:
+    """[(열 이름, 문항 텍스트)] 화면 순서"""
+    registry = get_registry(version)
+    return [(f"q{qid:03d}", registry.text(position)) for position, qid in enumerate(registry.question_ids)]
+
+
+def score_categories(version: int = QUESTIONNAIRE_VERSION) -> List[str]:
+    return list(get_registry(version).category_names) + COMPOSITE_CATEGORIES
+
+
+def export_schema(version: int = QUESTIONNAIRE_VERSION) -> pa.Schema:
+    questions = question_columns(version)
+    fields = [
+        pa.field("id", pa.int64(), nullable=False),
+        pa.field("timestamp", pa.timestamp("us")),
+        pa.field("student_name", pa.string()),
+        pa.field("school_level", pa.string()),
+        *[pa.field(name, pa.int8()) for name, _ in questions],
+    ]
+    for category in score_categories(version):
+        fields += [pa.field(f"{category}_t", pa.int16()), pa.field(f"{category}_pct", pa.int16())]
+    metadata = {
+        "esli.questionnaire_version": str(version),
+        "esli.questions": json.dumps(dict(questions), ensure_ascii=False),
+    }
+    return pa.schema(fields, metadata=metadata)
+
+
+def _record_batch(rows, schema: pa.Schema, version: int) -> pa.RecordBatch:
+    """(id, timestamp, 이름, 학교급, responses_json, scores_json) 행들 → 스키마에 맞춘 RecordBatch"""
+    count = get_registry(version).question_count
+    answers = np.zeros((len(rows), count), dtype=np.int8)
+    answered = np.zeros((len(rows), count), dtype=bool)
+    categories = score_categories(version)
+    t_scores = np.zeros((len(rows), len(categories)), dtype=np.int16)
+    percentiles = np.zeros_like(t_scores)
+    has_score = np.zeros(t_scores.shape, dtype=bool)
+    column_of = {name: i for i, name in enumerate(categories)}
+
+    for i, (_, _, _, _, responses_json, scores_json) in enumerate(rows):
+        try:
+            scores = decode_answer_positions(responses_json, version)[1]
+        except (ValueError, TypeError):
+            scores = []  # 해석할 수 없는 응답은 모두 null
+        for position, value in enumerate(scores):
+            if value is not None:
+                answers[i, position] = value
+                answered[i, position] = True
+        try:
+            student_scores = json.loads(scores_json) if scores_json else {}
+        except (TypeError, ValueError):
+            student_scores = {}
+        for category, data in student_scores.items():
+            j = column_of.get(category)
+            if j is None or not isinstance(data, dict) or data.get("t_score") is None:
+                continue
+            t_scores[i, j] = int(data["t_score"])
+            percentiles[i, j] = int(data.get("percentile") or 0)
+            has_score[i, j] = True
+
+    arrays = [
+        pa.array([row[0] for row in rows], pa.int64()),
+        pa.array([row[1] for row in rows], pa.timestamp("us")),
+        pa.array([row[2] for row in rows], pa.string()),
+        pa.array([row[3] for row in rows], pa.string()),
+        *[pa.array(answers[:, p], pa.int8(), mask=~answered[:, p]) for p in range(count)],
+    ]
+    for j in range(len(categories)):
+        arrays += [pa.array(t_scores[:, j], pa.int16(), mask=~has_score[:, j]),
+                   pa.array(percentiles[:, j], pa.int16(), mask=~has_score[:, j])]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _Writer:
+    """Parquet(zstd) / Arrow IPC 파일에 배치를 이어 씁니다."""
+
+    def __init__(self, path: str, schema: pa.Schema, fmt: str):
+        self._sink = None
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(path, schema, compression="zstd")
+        else:
+            self._sink = pa.OSFile(path, "wb")
+            self._writer = pa.ipc.new_file(self._sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+        self._parquet = fmt == "parquet"
+
+    def write(self, batch: pa.RecordBatch):
+        if self._parquet:
+            self._writer.write_batch(batch)
+        else:
+            self._writer.write(batch)
+
+    def close(self):
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+
+def load_watermark(out_dir: str = RESULTS_EXPORT_DIR) -> dict:
+    try:
+        with open(os.path.join(out_dir, WATERMARK_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"last_id": 0, "files": []}
+
+
+def _save_watermark(out_dir: str, state: dict):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def export_results(out_dir: str = RESULTS_EXPORT_DIR, fmt: str = "parquet", batch_size: int = RESULTS_EXPORT_BATCH,
+                   full: bool = False, version: int = QUESTIONNAIRE_VERSION) -> dict:
+    """
+    워터마크 이후의 검사 결과를 새 파일 하나로 내보내고 워터마크를 옮깁니다.
+    full=True면 처음부터 내보내고, 성공하면 이전 part 파일을 지웁니다.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"지원하지 않는 형식입니다: {fmt} ({', '.join(FORMATS)})")
+    os.makedirs(out_dir, exist_ok=True)
+    state = {"last_id": 0, "files": []} if full else load_watermark(out_dir)
+    previous_files = load_watermark(out_dir).get("files", []) if full else []
+    start_id = state["last_id"]
+
+    columns = (SurveyResponse.id, SurveyResponse.timestamp, SurveyResponse.student_name,
+               SurveyResponse.school_level, SurveyResponse.responses_json, SurveyResponse.scores_json)
+    schema = export_schema(version)
+    db = SessionLocal()
+    try:
+        upper = db.execute(select(func.max(SurveyResponse.id))).scalar() or 0
+        if upper <= start_id:
+            return {"rows": 0, "last_id": start_id, "file": None}
+
+        path = os.path.join(out_dir, f"part-{start_id + 1:09d}-{upper:09d}{FORMATS[fmt]}")
+        tmp = f"{path}.tmp"
+        writer = _Writer(tmp, schema, fmt)
+        written, last_id = 0, start_id
+        try:
+            while True:
+                rows = db.execute(
+                    select(*columns)
+                    .where(SurveyResponse.id > last_id, SurveyResponse.id <= upper)
+                    .order_by(SurveyResponse.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                writer.write(_record_batch(rows, schema, version))
+                written += len(rows)
+                last_id = rows[-1][0]
+        finally:
+            writer.close()
+    finally:
+        db.close()
+
+    if not written:
+        os.remove(tmp)
+        return {"rows": 0, "last_id": start_id, "file": None}
+    os.replace(tmp, path)
+    state["last_id"] = upper
+    state["files"] = state.get("files", []) + [os.path.basename(path)]
+    state["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    _save_watermark(out_dir, state)
+    for filename in previous_files:
+        if filename not in state["files"]:
+            try:
+                os.remove(os.path.join(out_dir, filename))
+            except OSError:
+                pass
+    return {"rows": written, "last_id": upper, "file": path}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="검사 결과 Parquet/Arrow 증분 내보내기")
+    parser.add_argument("--out-dir", default=RESULTS_EXPORT_DIR)
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet")
+    parser.add_argument("--batch-size", type=int, default=RESULTS_EXPORT_BATCH)
+    parser.add_argument("--full", action="store_true", help="워터마크를 무시하고 처음부터 다시 내보냄")
+    args = parser.parse_args()
+
+    result = export_results(args.out_dir, args.format, args.batch_size, args.full)
+    if result["file"]:
+        print(f"검사 결과 내보내기 완료: {result['rows']}행 → {result['file']} (워터마크 id {result['last_id']})")
+    else:
+        print(f"내보낼 새 검사 결과가 없습니다 (워터마크 id {result['last_id']})")
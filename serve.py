@@ -0,0 +1,226 @@
+"""
+멀티 프로세스 서빙 모드.
+
+1. 부모 프로세스가 모듈/기준표 캐시를 미리 올리고(preload) gc.freeze()로 고정합니다.
+2. SERVE_WORKERS개의 워커를 fork합니다. 각 워커는 127.0.0.1:(SERVE_WORKER_BASE_PORT + i)에서
+   esli_00.create_app()을 uvicorn으로 실행합니다. DB 엔진/LLM 게이트웨이/진행상황 캐시/Chroma 핸들은
+   각 모듈의 fork 훅(background.after_fork)으로 자식에서 새로 만들어지고, 기준표 캐시는 읽기 전용으로 공유됩니다.
+3. 부모는 PORT에서 리버스 프록시로 동작하며, 쿠키(esli_worker)로 브라우저 세션을 같은 워커에 고정합니다.
+   (Gradio의 gr.State와 큐 이벤트는 워커 프로세스 메모리에 있으므로 세션 고정이 필요합니다)
+4. 죽은 워커는 같은 포트로 다시 띄웁니다.
+
+사용법:
+    SERVE_WORKERS=4 python serve.py
+"""
+import os
+import gc
+import sys
+import time
+import atexit
+import signal
+import contextlib
+import itertools
+import threading
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", str(os.cpu_count() or 1)))
+SERVE_WORKER_BASE_PORT = int(os.getenv("SERVE_WORKER_BASE_PORT", "9100"))
+SERVE_RESPAWN_DELAY = float(os.getenv("SERVE_RESPAWN_DELAY", "1"))
+WORKER_COOKIE = "esli_worker"
+
+# 프록시가 그대로 넘기면 안 되는 hop-by-hop 헤더
+HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade",
+}
+
+
+def preload():
+    """fork 전에 무거운 모듈과 참조데이터를 올려 워커들이 copy-on-write로 공유하게 합니다."""
+    import database
+    import esli_02
+    import esli_00  # gradio / langchain / 질문 목록 등
+
+    database.init_db()
+    database.seed_reference_data()
+    levels = esli_02.preload_reference_data()
+    print(f"기준표 캐시 적재 완료: {levels}")
+    # 부모는 더 이상 DB를 쓰지 않으므로 커넥션을 닫아둡니다(자식은 fork 훅에서 새 풀 사용).
+    database.engine.dispose()
+    # 적재된 객체를 GC 추적 대상에서 빼서, 자식의 GC가 공유 페이지를 건드려 복사되지 않게 합니다.
+    gc.freeze()
+    return esli_00
+
+
+def _exit_with_parent(parent_pid: int):
+    """부모(프록시)가 비정상 종료되면 워커도 스스로 종료합니다."""
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os.kill(os.getpid(), signal.SIGTERM)
+    threading.Thread(target=watch, name="serve-parent-watch", daemon=True).start()
+
+
+def run_worker(index: int, port: int, esli_00):
+    """fork된 자식 프로세스에서 실행됩니다."""
+    from llm_gateway import get_gateway
+    from llm_scheduler import LLMScheduler, LLM_RPM_LIMIT, LLM_TPM_LIMIT
+
+    # LLM 요청 한도는 프로세스별 스케줄러가 관리하므로 워커 수만큼 나눠 갖습니다.
+    get_gateway().scheduler = LLMScheduler(LLM_RPM_LIMIT / SERVE_WORKERS, LLM_TPM_LIMIT / SERVE_WORKERS)
+    esli_00.start_report_workers()
+    esli_00.start_usage_rollup()
+    esli_00.start_log_archiver()
+    app = esli_00.create_app(esli_00.create_final_survey())
+    print(f"워커 {index} 시작 (pid={os.getpid()}, port={port})")
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+class Supervisor:
+    def __init__(self, esli_00, count: int = SERVE_WORKERS, base_port: int = SERVE_WORKER_BASE_PORT):
+        self.esli_00 = esli_00
+        self.ports = [base_port + i for i in range(count)]
+        self.pids = {}  # pid → 워커 번호
+        self._stopping = False
+
+    def spawn(self, index: int):
+        parent_pid = os.getpid()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                _exit_with_parent(parent_pid)
+                run_worker(index, self.ports[index], self.esli_00)
+            except BaseException as e:
+                print(f"워커 {index} 비정상 종료: {e}")
+                code = 1
+            finally:
+                atexit._run_exitfuncs()  # 진행상황 캐시 플러시 등
+                os._exit(code)
+        self.pids[pid] = index
+
+    def start(self):
+        for index in range(len(self.ports)):
+            self.spawn(index)
+        threading.Thread(target=self._watch, name="serve-supervisor", daemon=True).start()
+
+    def _watch(self):
+        while not self._stopping:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                time.sleep(SERVE_RESPAWN_DELAY)
+                continue
+            index = self.pids.pop(pid, None)
+            if index is None or self._stopping:
+                continue
+            print(f"워커 {index} 종료됨(status={status}), 다시 시작합니다.")
+            time.sleep(SERVE_RESPAWN_DELAY)
+            self.spawn(index)
+
+    def stop(self):
+        self._stopping = True
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def _worker_from_cookie(value, count: int):
+    try:
+        index = int(value)
+    except (TypeError, ValueError):
+        return None
+    return index if 0 <= index < count else None
+
+
+def create_proxy(ports: list) -> Starlette:
+    """쿠키 기반 세션 고정 리버스 프록시 (HTTP/SSE 스트리밍 지원)"""
+    clients = [
+        httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}",
+            timeout=httpx.Timeout(None, connect=5),
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=100),
+        )
+        for port in ports
+    ]
+    next_worker = itertools.count()
+
+    async def health(request: Request):
+        return JSONResponse({"status": "healthy", "service": "learning-assessment", "workers": len(ports)})
+
+    async def proxy(request: Request):
+        index = _worker_from_cookie(request.cookies.get(WORKER_COOKIE), len(ports))
+        assign = index is None
+        if assign:
+            index = next(next_worker) % len(ports)
+
+        headers = [(k, v) for k, v in request.headers.raw if k.decode("latin-1").lower() not in HOP_HEADERS]
+        if request.client:
+            forwarded = request.headers.get("x-forwarded-for")
+            headers = [(k, v) for k, v in headers if k.lower() != b"x-forwarded-for"]
+            headers.append((b"x-forwarded-for",
+                            f"{forwarded}, {request.client.host}".encode() if forwarded else request.client.host.encode()))
+        client = clients[index]
+        upstream = client.build_request(
+            request.method,
+            httpx.URL(path=request.url.path, query=request.url.query.encode("utf-8")),
+            headers=headers,
+            content=None if request.method in ("GET", "HEAD") else request.stream(),
+        )
+        try:
+            resp = await client.send(upstream, stream=True)
+        except httpx.TransportError:
+            # 워커 재시작 중: 다음 요청은 다른 워커로 가도록 쿠키를 다시 배정합니다.
+            response = Response("워커를 재시작하는 중입니다. 잠시 후 새로고침해주세요.", status_code=502)
+            response.set_cookie(WORKER_COOKIE, str((index + 1) % len(ports)), httponly=True, samesite="lax")
+            return response
+
+        response = StreamingResponse(resp.aiter_raw(), status_code=resp.status_code,
+                                     background=BackgroundTask(resp.aclose))
+        response.raw_headers = [(k, v) for k, v in resp.headers.raw if k.decode("latin-1").lower() not in HOP_HEADERS]
+        if assign:
+            response.set_cookie(WORKER_COOKIE, str(index), httponly=True, samesite="lax")
+        return response
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        yield
+        for client in clients:
+            await client.aclose()
+
+    methods = ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+    return Starlette(
+        routes=[Route("/health", health), Route("/{path:path}", proxy, methods=methods)],
+        lifespan=lifespan,
+    )
+
+
+def main():
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py는 fork를 지원하는 OS(Linux/macOS)에서만 실행할 수 있습니다. 로컬에서는 esli_00.py를 사용하세요.")
+    port = int(os.getenv("PORT", 7861))
+    host = os.getenv("HOST", "0.0.0.0")
+
+    esli_00 = preload()
+    supervisor = Supervisor(esli_00)
+    supervisor.start()
+    print(f"프록시 시작: {host}:{port} → 워커 {len(supervisor.ports)}개 {supervisor.ports}")
+    try:
+        uvicorn.run(create_proxy(supervisor.ports), host=host, port=port, log_level="warning")
+    finally:
+        supervisor.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+typing_rules 도입 전 esli_02의 규칙 판정 함수 (if/elif) 그대로의 사본.
+typing_rules의 규칙 표가 기존 판정과 같은 결과를 내는지 비교하는 기준이므로 고치지 마세요.
+"""
+
+
+def get_motivation_analysis(scores):
+    t_self_achieve = scores['자기성취']['t_score']
+    t_social = scores['사회적 관계']['t_score']
+    t_reward_punish = scores['직접적 보상처벌']['t_score']
+    if t_self_achieve > 114:
+        return "자기 주도적 학습형", "자기 주도적 학습형에 가장 가까운 특성을 보이고 있습니다.", "자신이 원하는 이상이나 직업 등, 자신이 관심 있는 분야의 호기심을 충족시키기 위해 공부를 합니다.", "학습에 대한 호기심을 꾸준히 가질 수 있도록, 학생이 스스로 찾고 노력하는 것을 자주 격려하고 지지해 주시기 바랍니다."
+    elif t_social > 114:
+        return "사회 기대적 학습형", "사회 기대적 학습형에 가장 가까운 특성을 보이고 있습니다.", "다른 사람에게 좋은 모습을 보여주어야 한다는 생각에 공부를 합니다.", "자신이 타인의 기대에 부응하고 있다고 느끼도록 해주시기 바랍니다."
+    elif t_self_achieve > 85:
+        return "현상 유지적 학습형", "현상 유지적 학습형에 가장 가까운 특성을 보이고 있습니다.", "막연히 지금보다 나은 사람이 되거나 나의 미래를 준비하기 위해 공부하고자 생각합니다.", "적극적으로 학생이 원하는 것을 찾을 수 있도록 도와주는 것이 필요합니다."
+    elif t_social > 85:
+        return "군중 심리적 학습형", "군중 심리적 학습형에 가장 가까운 특성을 보이고 있습니다.", "다른 친구들이 모두 공부를 할 때 자신도 공부 하지 않으면 뒤쳐질 것이란 생각으로 공부를 하는 학생들입니다.", "자신이 어떤 사람이고 무엇을 좋아하는지 탐색하면서, 자기 자신을 믿을 수 있도록 끊임없이 칭찬과 격려를 해주는 것이 필요합니다."
+    elif t_reward_punish > 114:
+        return "타인 주도적 학습형", "타인 주도적 학습형에 가장 가까운 특성을 보이고 있습니다.", "용돈이나 선물처럼 누가 약속한 물질적인 보상을 얻기 위해 공부하거나, 공부를 하지 않아서 혼이 나는 것을 피하기 위한 목적으로 공부를 합니다.", "학생이 공부를 하는 것을 인정해주고 칭찬하여 꼭 눈에 보이는 보상이 아니더라도 공부를 통해 만족감을 얻을 수 있도록 해주는 것이 좋습니다."
+    else:
+        return "학습 동기 부재형", "학습 동기 부재형에 가장 가까운 특성을 보이고 있습니다.", "공부를 하는 이유가 그 어떤 것을 통해서도 생기지 않는 경우입니다.", "학생이 좋아하는 것이 무엇인지 찾아보고, 좋아하는 것과 공부가 연결될 수 있는 고리를 찾아보시기 바랍니다."
+
+def get_strategy_analysis(scores):
+    t_strategy = scores['학습전략']['t_score']
+    t_skill = scores['학습기술']['t_score']
+    def get_level(score):
+        if score > 114: return '상'
+        if score >= 86: return '중'
+        return '하'
+    strategy_level, skill_level = get_level(t_strategy), get_level(t_skill)
+    analysis_map = {('상', '상'): "학습 전략과 기술이 모두 뛰어난 상태입니다.", ('상', '중'): "학습 전략 부분은 뛰어나지만, 학습 기술 부분은 일반적인 수준입니다.", ('상', '하'): "학습 전략 부분은 뛰어나지만, 학습 기술 부분이 취약합니다.", ('중', '상'): "학습 기술 부분은 뛰어나지만, 학습 전략 부분은 일반적인 수준입니다.", ('중', '중'): "학습 전략과 기술 부분 모두 일반적인 수준입니다.", ('중', '하'): "학습 전략 부분은 일반적인 반면, 학습 기술 부분이 취약합니다.", ('하', '상'): "학습 기술 부분은 뛰어나지만, 학습 전략 부분이 취약합니다.", ('하', '중'): "학습 기술 부분은 일반적인 반면, 학습 전략 부분이 취약합니다.", ('하', '하'): "학습 전략과 기술이 모두 취약한 상태입니다."}
+    coaching_map = {('하', '중'): "생각하는 힘은 좋지만, 체계적인 학습 관리와 효율적인 공부법이 필요해요."}
+    return analysis_map.get((strategy_level, skill_level), ""), coaching_map.get(('하', '중'), "맞춤형 코칭이 필요합니다.")
+
+def get_hindrance_analysis(scores):
+    psych_hindrance = any([scores['스트레스민감성']['t_score'] > 114, scores['학습효능감']['t_score'] < 86, scores['친구관계']['t_score'] < 86, scores['가정환경']['t_score'] < 86, scores['학교환경']['t_score'] < 86])
+    behav_hindrance = any([scores['수면조절']['t_score'] < 86, scores['학습집중력']['t_score'] < 86, scores['TV프로그램']['t_score'] > 114, scores['컴퓨터']['t_score'] > 114, scores['스마트기기']['t_score'] > 114])
+    if not psych_hindrance and not behav_hindrance: return "학습을 방해하는 심리적, 행동적 요인 모두 특별히 나쁜 영역 없이 긍정적인 상태를 보이고 있습니다.", "공부에 집중할 수 있는 좋은 마음과 행동 습관을 가지고 있어요."
+    if psych_hindrance and not behav_hindrance: return "학습 방해 부분에서는 심리적 부분에서 좋지 않은 영향을 받고 있는 것 같습니다.", "심리적 안정감을 찾기 위한 노력이 필요합니다."
+    if not psych_hindrance and behav_hindrance: return "학습 방해 부분에서는 행동적 부분에서 좋지 않은 영향을 받고 있는 것 같습니다.", "학습 습관을 개선하기 위한 노력이 필요합니다."
+    return "학습 방해 부분에서는 심리적 부분과 행동적 부분 모두 좋지 않은 영향을 받고 있는 것 같습니다.", "심리적, 행동적 측면 모두 개선이 필요합니다."
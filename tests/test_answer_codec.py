@@ -0,0 +1,146 @@
+import json
+import random
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import database
+import questionnaire
+from answer_codec import (
+    ENCODING_PREFIX,
+    decode_answer_positions,
+    decode_answers,
+    encode_answer_positions,
+    encode_answers,
+    is_encoded,
+)
+from database import Base, SurveyProgress, SurveyResponse, create_db_engine
+from questionnaire import ANSWER_OPTIONS, QUESTIONNAIRE_VERSION, get_registry
+
+COUNT = get_registry().question_count
+
+
+def _random_scores(seed: int, missing: float = 0.2) -> list:
+    rng = random.Random(seed)
+    return [None if rng.random() < missing else rng.randint(1, 4) for _ in range(COUNT)]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_positions_round_trip_with_missing_answers(seed):
+    scores = _random_scores(seed)
+    encoded = encode_answer_positions(scores)
+    assert is_encoded(encoded)
+    assert encoded.startswith(f"{ENCODING_PREFIX}{QUESTIONNAIRE_VERSION}:")
+    assert decode_answer_positions(encoded) == (QUESTIONNAIRE_VERSION, scores)
+
+
+@pytest.mark.parametrize("scores", [[None] * COUNT, [4] * COUNT, [1] * COUNT, [None] + [1] * (COUNT - 1)])
+def test_positions_round_trip_edge_cases(scores):
+    encoded = encode_answer_positions(scores)
+    # 미응답이 없으면 응답 여부 비트맵을 붙이지 않습니다.
+    assert encoded.count(":") == (2 if None in scores else 1)
+    assert decode_answer_positions(encoded)[1] == scores
+
+
+def test_dict_round_trip_as_scores_and_labels():
+    registry = get_registry()
+    scores = _random_scores(1)
+    responses = {registry.text(p): s for p, s in enumerate(scores)}
+    encoded = encode_answers(responses)
+    assert is_encoded(encoded)
+    assert decode_answers(encoded) == responses
+    labels = {q: (ANSWER_OPTIONS[s - 1] if s else None) for q, s in responses.items()}
+    assert decode_answers(encoded, as_labels=True) == labels
+    # 보기 문자열로 들어와도 같은 인코딩
+    assert encode_answers(labels) == encoded
+
+
+def test_wrong_length_is_rejected():
+    with pytest.raises(ValueError):
+        encode_answer_positions([1] * (COUNT - 1))
+
+
+def test_unrepresentable_answers_fall_back_to_json():
+    registry = get_registry()
+    for responses in ({"없는 문항": 3}, {registry.text(0): 7}, {registry.text(0): "모르겠다"}):
+        encoded = encode_answers(responses)
+        assert not is_encoded(encoded)
+        assert json.loads(encoded) == responses
+        assert decode_answers(encoded) == responses
+
+
+def test_legacy_json_row():
+    registry = get_registry()
+    legacy = {registry.text(0): 3, registry.text(1): ANSWER_OPTIONS[0], registry.text(2): None, "없는 문항": 2}
+    data = json.dumps(legacy, ensure_ascii=False)
+    # dict 디코딩은 저장된 값을 그대로 돌려줍니다.
+    assert decode_answers(data) == legacy
+    # 위치 디코딩은 현재 문항 체계로 해석하고, 알 수 없는 문항·값은 미응답으로 둡니다.
+    version, scores = decode_answer_positions(data)
+    assert version == QUESTIONNAIRE_VERSION
+    assert scores[:3] == [3, 1, None] and scores[3:] == [None] * (COUNT - 3)
+    assert decode_answer_positions("") == (QUESTIONNAIRE_VERSION, [None] * COUNT)
+
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        decode_answer_positions("B1:AAAA")
+
+
+def test_decode_remaps_between_questionnaire_versions(monkeypatch):
+    # 뒤 두 파트의 순서를 바꾸고 첫 파트를 뺀 가상의 다음 버전
+    parts = questionnaire.QUESTION_PARTS
+    layout = [parts[2], parts[1]]
+    monkeypatch.setitem(questionnaire.QUESTION_LAYOUTS, 2, layout)
+    monkeypatch.setitem(questionnaire.QUESTION_ORDERS, 2, questionnaire._flatten(*(q for _, _, q in layout)))
+    monkeypatch.setattr(questionnaire, "_REGISTRIES", dict(questionnaire._REGISTRIES))
+
+    v1, v2 = get_registry(1), get_registry(2)
+    scores = _random_scores(3)
+    encoded = encode_answer_positions(scores, version=1)
+    version, remapped = decode_answer_positions(encoded, version=2)
+    assert version == 2 and len(remapped) == v2.question_count
+    by_question = {v1.question_ids[p]: s for p, s in enumerate(scores)}
+    assert remapped == [by_question[qid] for qid in v2.question_ids]
+    # 저장된 버전의 레지스트리로 풀므로, 현재 버전과 달라도 원래 값이 그대로 나옵니다.
+    assert decode_answer_positions(encoded) == (1, scores)
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'codec.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(database, "SessionLocal", factory)
+    yield factory
+    engine.dispose()
+
+
+def test_migrate_answer_encoding_is_lossless_and_idempotent(temp_db):
+    registry = get_registry()
+    responses = [{registry.text(p): s for p, s in enumerate(_random_scores(seed)) if s is not None} for seed in range(5)]
+    progress = {registry.text(p): (ANSWER_OPTIONS[s - 1] if s else None) for p, s in enumerate(_random_scores(9))}
+    unrepresentable = {"없는 문항": 2}
+    db = temp_db()
+    for r in responses + [unrepresentable]:
+        db.add(SurveyResponse(student_name="학생", responses_json=json.dumps(r, ensure_ascii=False)))
+    db.add(SurveyProgress(session_id="s1", progress_data=json.dumps(progress, ensure_ascii=False)))
+    db.commit()
+
+    database.migrate_answer_encoding(batch_size=2)
+    db.expire_all()
+    stored = [row.responses_json for row in db.query(SurveyResponse).order_by(SurveyResponse.id)]
+    assert all(is_encoded(s) for s in stored[:-1])
+    for original, data in zip(responses, stored):
+        # 응답하지 않은 문항은 미응답(None)으로 채워집니다.
+        assert decode_answers(data) == {registry.text(p): original.get(registry.text(p)) for p in range(COUNT)}
+    assert json.loads(stored[-1]) == unrepresentable
+    progress_data = db.query(SurveyProgress).one().progress_data
+    assert is_encoded(progress_data)
+    assert decode_answers(progress_data, as_labels=True) == progress
+
+    database.migrate_answer_encoding(batch_size=2)
+    db.expire_all()
+    assert [row.responses_json for row in db.query(SurveyResponse).order_by(SurveyResponse.id)] == stored
+    assert db.query(SurveyProgress).one().progress_data == progress_data
+    db.close()
@@ -0,0 +1,85 @@
+import itertools
+import random
+
+import pytest
+
+import esli_02
+import typing_rules
+from tests import legacy_typing
+
+# 판정 기준(85/86/114/115) 주변 값과 양 끝
+BOUNDARY = [0, 40, 84, 85, 86, 87, 100, 113, 114, 115, 116, 200]
+
+
+def _student(values: dict) -> dict:
+    return {name: {'t_score': t, 'percentile': 50} for name, t in values.items()}
+
+
+def _random_students(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [
+        _student({name: rng.choice(BOUNDARY) if rng.random() < 0.7 else rng.randint(0, 200)
+                  for name in typing_rules.RULE_CATEGORIES})
+        for _ in range(count)
+    ]
+
+
+PAIRS = [
+    (legacy_typing.get_motivation_analysis, typing_rules.motivation_for, esli_02.get_motivation_analysis),
+    (legacy_typing.get_strategy_analysis, typing_rules.strategy_for, esli_02.get_strategy_analysis),
+    (legacy_typing.get_hindrance_analysis, typing_rules.hindrance_for, esli_02.get_hindrance_analysis),
+]
+
+
+def test_motivation_matches_legacy_on_boundary_grid():
+    for a, b, c in itertools.product(BOUNDARY, repeat=3):
+        scores = _student({"자기성취": a, "사회적 관계": b, "직접적 보상처벌": c})
+        assert typing_rules.motivation_for(scores) == legacy_typing.get_motivation_analysis(scores)
+
+
+def test_strategy_matches_legacy_on_boundary_grid():
+    for a, b in itertools.product(BOUNDARY, repeat=2):
+        scores = _student({"학습전략": a, "학습기술": b})
+        assert typing_rules.strategy_for(scores) == legacy_typing.get_strategy_analysis(scores)
+
+
+@pytest.mark.parametrize("legacy, single, report", PAIRS)
+def test_single_student_matches_legacy(legacy, single, report):
+    for scores in _random_students(5000):
+        expected = legacy(scores)
+        assert single(scores) == expected
+        assert report(scores) == expected
+
+
+def test_batch_matches_legacy():
+    students = _random_students(5000, seed=1)
+    result = typing_rules.classify_students(typing_rules.t_score_frame(students))
+    for row, scores in zip(result.itertuples(index=False), students):
+        assert (row.motivation_type, row.motivation_summary, row.motivation_reason,
+                row.motivation_coaching) == legacy_typing.get_motivation_analysis(scores)
+        assert (row.strategy_analysis, row.strategy_coaching) == legacy_typing.get_strategy_analysis(scores)
+        assert (row.hindrance_analysis, row.hindrance_coaching) == legacy_typing.get_hindrance_analysis(scores)
+
+
+@pytest.mark.parametrize("legacy, single, report", PAIRS)
+def test_missing_category_raises_like_legacy(legacy, single, report):
+    scores = _random_students(1)[0]
+    for name in typing_rules.RULE_CATEGORIES:
+        partial = {k: v for k, v in scores.items() if k != name}
+        try:
+            legacy(partial)
+        except KeyError:
+            with pytest.raises(KeyError):
+                single(partial)
+            with pytest.raises(KeyError):
+                report(partial)
+        else:
+            assert single(partial) == legacy(partial)
+
+
+def test_batch_marks_students_missing_categories_as_none():
+    scores = _random_students(1)[0]
+    del scores["학습전략"]
+    row = typing_rules.classify_students(typing_rules.t_score_frame([scores])).iloc[0]
+    assert row.strategy_analysis is None and row.strategy_coaching is None
+    assert row.motivation_type == legacy_typing.get_motivation_analysis(scores)[0]
@@ -0,0 +1,211 @@
+"""
+학습 동기 / 학습 전략·기술 / 학습 방해 요인 유형 판정 규칙.
+
+판정 기준(항목, 비교, T점수 기준)과 결과 문구를 아래 표에 데이터로 두고,
+학생 N명 × 항목 T점수 행렬에 대해 조건별로 한 번씩 배열 비교해 전원을 동시에 판정합니다.
+esli_02.get_motivation_analysis / get_strategy_analysis / get_hindrance_analysis는 같은 규칙 표를
+한 학생 dict에 대해 그대로 평가하므로(motivation_for 등), 일괄 판정과 보고서 결과가 항상 같습니다.
+
+- 동기: 위에서부터 처음 맞는 규칙 (조건 목록은 모두 만족해야 함, 빈 목록은 기본 규칙)
+- 전략/기술: 학습전략·학습기술 각각의 수준(상/중/하) 조합
+- 방해 요인: 심리/행동 조건 중 하나라도 맞으면 해당 요인 있음, 두 요인 유무 조합
+판정에 쓰는 항목이 하나라도 없는 학생은 None으로 둡니다 (한 학생 판정 함수는 KeyError).
+"""
+import operator
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+_OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+Condition = Tuple[str, str, float]  # (항목, 비교, T점수 기준)
+
+# --------------------
+# 규칙 표
+# --------------------
+# (조건 목록, (유형, 요약, 핵심 특징, 코칭 방향))
+MOTIVATION_RULES: List[Tuple[List[Condition], Tuple[str, str, str, str]]] = [
+    ([("자기성취", ">", 114)],
+     ("자기 주도적 학습형", "자기 주도적 학습형에 가장 가까운 특성을 보이고 있습니다.",
+      "자신이 원하는 이상이나 직업 등, 자신이 관심 있는 분야의 호기심을 충족시키기 위해 공부를 합니다.",
+      "학습에 대한 호기심을 꾸준히 가질 수 있도록, 학생이 스스로 찾고 노력하는 것을 자주 격려하고 지지해 주시기 바랍니다.")),
+    ([("사회적 관계", ">", 114)],
+     ("사회 기대적 학습형", "사회 기대적 학습형에 가장 가까운 특성을 보이고 있습니다.",
+      "다른 사람에게 좋은 모습을 보여주어야 한다는 생각에 공부를 합니다.",
+      "자신이 타인의 기대에 부응하고 있다고 느끼도록 해주시기 바랍니다.")),
+    ([("자기성취", ">", 85)],
+     ("현상 유지적 학습형", "현상 유지적 학습형에 가장 가까운 특성을 보이고 있습니다.",
+      "막연히 지금보다 나은 사람이 되거나 나의 미래를 준비하기 위해 공부하고자 생각합니다.",
+      "적극적으로 학생이 원하는 것을 찾을 수 있도록 도와주는 것이 필요합니다.")),
+    ([("사회적 관계", ">", 85)],
+     ("군중 심리적 학습형", "군중 심리적 학습형에 가장 가까운 특성을 보이고 있습니다.",
+      "다른 친구들이 모두 공부를 할 때 자신도 공부 하지 않으면 뒤쳐질 것이란 생각으로 공부를 하는 학생들입니다.",
+      "자신이 어떤 사람이고 무엇을 좋아하는지 탐색하면서, 자기 자신을 믿을 수 있도록 끊임없이 칭찬과 격려를 해주는 것이 필요합니다.")),
+    ([("직접적 보상처벌", ">", 114)],
+     ("타인 주도적 학습형", "타인 주도적 학습형에 가장 가까운 특성을 보이고 있습니다.",
+      "용돈이나 선물처럼 누가 약속한 물질적인 보상을 얻기 위해 공부하거나, 공부를 하지 않아서 혼이 나는 것을 피하기 위한 목적으로 공부를 합니다.",
+      "학생이 공부를 하는 것을 인정해주고 칭찬하여 꼭 눈에 보이는 보상이 아니더라도 공부를 통해 만족감을 얻을 수 있도록 해주는 것이 좋습니다.")),
+    ([],
+     ("학습 동기 부재형", "학습 동기 부재형에 가장 가까운 특성을 보이고 있습니다.",
+      "공부를 하는 이유가 그 어떤 것을 통해서도 생기지 않는 경우입니다.",
+      "학생이 좋아하는 것이 무엇인지 찾아보고, 좋아하는 것과 공부가 연결될 수 있는 고리를 찾아보시기 바랍니다.")),
+]
+# 규칙에 나오지 않아도 판정 전에 있어야 하는 항목 (기존 판정 함수가 세 점수를 모두 먼저 읽음)
+MOTIVATION_CATEGORIES = ("자기성취", "사회적 관계", "직접적 보상처벌")
+
+STRATEGY_AXES = ("학습전략", "학습기술")
+# (비교, 기준, 수준) 위에서부터 처음 맞는 수준, 마지막은 기본값
+STRATEGY_LEVELS = [(">", 114, "상"), (">=", 86, "중"), (None, None, "하")]
+STRATEGY_ANALYSIS = {
+    ("상", "상"): "학습 전략과 기술이 모두 뛰어난 상태입니다.",
+    ("상", "중"): "학습 전략 부분은 뛰어나지만, 학습 기술 부분은 일반적인 수준입니다.",
+    ("상", "하"): "학습 전략 부분은 뛰어나지만, 학습 기술 부분이 취약합니다.",
+    ("중", "상"): "학습 기술 부분은 뛰어나지만, 학습 전략 부분은 일반적인 수준입니다.",
+    ("중", "중"): "학습 전략과 기술 부분 모두 일반적인 수준입니다.",
+    ("중", "하"): "학습 전략 부분은 일반적인 반면, 학습 기술 부분이 취약합니다.",
+    ("하", "상"): "학습 기술 부분은 뛰어나지만, 학습 전략 부분이 취약합니다.",
+    ("하", "중"): "학습 기술 부분은 일반적인 반면, 학습 전략 부분이 취약합니다.",
+    ("하", "하"): "학습 전략과 기술이 모두 취약한 상태입니다.",
+}
+# 기존 판정은 수준 조합과 관계없이 이 코칭 제목 하나만 돌려줍니다 (보고서 결과 유지).
+STRATEGY_COACHING = "생각하는 힘은 좋지만, 체계적인 학습 관리와 효율적인 공부법이 필요해요."
+
+# 요인별 조건 (하나라도 맞으면 그 요인이 있음)
+HINDRANCE_FACTORS: Dict[str, List[Condition]] = {
+    "psych": [("스트레스민감성", ">", 114), ("학습효능감", "<", 86), ("친구관계", "<", 86),
+              ("가정환경", "<", 86), ("학교환경", "<", 86)],
+    "behav": [("수면조절", "<", 86), ("학습집중력", "<", 86), ("TV프로그램", ">", 114),
+              ("컴퓨터", ">", 114), ("스마트기기", ">", 114)],
+}
+# (심리 요인 있음, 행동 요인 있음) → (분석, 코칭 제목)
+HINDRANCE_OUTPUTS = {
+    (False, False): ("학습을 방해하는 심리적, 행동적 요인 모두 특별히 나쁜 영역 없이 긍정적인 상태를 보이고 있습니다.",
+                     "공부에 집중할 수 있는 좋은 마음과 행동 습관을 가지고 있어요."),
+    (True, False): ("학습 방해 부분에서는 심리적 부분에서 좋지 않은 영향을 받고 있는 것 같습니다.",
+                    "심리적 안정감을 찾기 위한 노력이 필요합니다."),
+    (False, True): ("학습 방해 부분에서는 행동적 부분에서 좋지 않은 영향을 받고 있는 것 같습니다.",
+                    "학습 습관을 개선하기 위한 노력이 필요합니다."),
+    (True, True): ("학습 방해 부분에서는 심리적 부분과 행동적 부분 모두 좋지 않은 영향을 받고 있는 것 같습니다.",
+                   "심리적, 행동적 측면 모두 개선이 필요합니다."),
+}
+HINDRANCE_CATEGORIES = tuple(category for conditions in HINDRANCE_FACTORS.values() for category, _, _ in conditions)
+
+RULE_CATEGORIES = tuple(dict.fromkeys(MOTIVATION_CATEGORIES + STRATEGY_AXES + HINDRANCE_CATEGORIES))
+
+
+# --------------------
+# 평가
+# --------------------
+def t_score_frame(scores_list: Sequence[dict], categories: Sequence[str] = RULE_CATEGORIES) -> pd.DataFrame:
+    """[{항목: {'t_score', ...}}] (compute_student_scores 결과 목록) → 학생 × 항목 T점수 행렬. 없는 항목은 NaN."""
+    rows = [[(scores.get(name) or {}).get('t_score', np.nan) for name in categories] for scores in scores_list]
+    return pd.DataFrame(rows, columns=list(categories), dtype=float)
+
+
+def _column(t, category: str, n: int) -> np.ndarray:
+    return np.asarray(t[category], dtype=float) if category in t else np.full(n, np.nan)
+
+
+def _rows(t) -> int:
+    return len(t) if isinstance(t, pd.DataFrame) else len(next(iter(t.values())))
+
+
+def _present(t, categories: Sequence[str], n: int) -> np.ndarray:
+    return np.logical_and.reduce([~np.isnan(_column(t, c, n)) for c in categories])
+
+
+def _holds(t, conditions: List[Condition], n: int) -> np.ndarray:
+    # NaN과의 비교는 항상 False
+    if not conditions:
+        return np.ones(n, dtype=bool)
+    return np.logical_and.reduce([_OPS[op](_column(t, c, n), threshold) for c, op, threshold in conditions])
+
+
+def classify_motivation(t) -> List[Optional[Tuple[str, str, str, str]]]:
+    """t: 학생 × 항목 T점수 (DataFrame 또는 {항목: 배열}). 학생별 (유형, 요약, 핵심 특징, 코칭 방향)"""
+    n = _rows(t)
+    matched = np.vstack([_holds(t, conditions, n) for conditions, _ in MOTIVATION_RULES])
+    first = np.argmax(matched, axis=0)  # 마지막 규칙은 항상 참이므로 처음 맞는 규칙의 번호
+    present = _present(t, MOTIVATION_CATEGORIES, n)
+    return [MOTIVATION_RULES[i][1] if ok else None for i, ok in zip(first.tolist(), present.tolist())]
+
+
+def _strategy_levels(values: np.ndarray) -> np.ndarray:
+    # 아래 수준부터 덮어써서 위쪽(먼저 나온) 수준이 남게 합니다.
+    levels = np.full(len(values), STRATEGY_LEVELS[-1][2], dtype=object)
+    for op, threshold, level in reversed(STRATEGY_LEVELS[:-1]):
+        levels[_OPS[op](values, threshold)] = level
+    return levels
+
+
+def classify_strategy(t) -> List[Optional[Tuple[str, str]]]:
+    """학생별 (분석, 코칭 제목)"""
+    n = _rows(t)
+    strategy, skill = (_strategy_levels(_column(t, axis, n)) for axis in STRATEGY_AXES)
+    present = _present(t, STRATEGY_AXES, n)
+    return [(STRATEGY_ANALYSIS.get((a, b), ""), STRATEGY_COACHING) if ok else None
+            for a, b, ok in zip(strategy.tolist(), skill.tolist(), present.tolist())]
+
+
+def classify_hindrance(t) -> List[Optional[Tuple[str, str]]]:
+    """학생별 (분석, 코칭 제목)"""
+    n = _rows(t)
+    flags = {
+        factor: np.logical_or.reduce([_OPS[op](_column(t, c, n), threshold) for c, op, threshold in conditions])
+        for factor, conditions in HINDRANCE_FACTORS.items()
+    }
+    present = _present(t, HINDRANCE_CATEGORIES, n)
+    return [HINDRANCE_OUTPUTS[(p, b)] if ok else None
+            for p, b, ok in zip(flags["psych"].tolist(), flags["behav"].tolist(), present.tolist())]
+
+
+def classify_students(t: pd.DataFrame) -> pd.DataFrame:
+    """학생 × 항목 T점수 행렬 → 학생별 동기 유형·전략/기술·방해 요인 판정 (행 순서 동일, 판정 불가는 None)"""
+    columns = {
+        ("motivation_type", "motivation_summary", "motivation_reason", "motivation_coaching"): classify_motivation(t),
+        ("strategy_analysis", "strategy_coaching"): classify_strategy(t),
+        ("hindrance_analysis", "hindrance_coaching"): classify_hindrance(t),
+    }
+    data = {}
+    for names, results in columns.items():
+        for i, name in enumerate(names):
+            data[name] = [r[i] if r is not None else None for r in results]
+    return pd.DataFrame(data, index=t.index)
+
+
+# --------------------
+# 한 학생 (보고서 생성 경로, 같은 규칙 표를 배열 없이 평가)
+# --------------------
+def _t_scores(scores: dict, categories: Sequence[str]) -> Dict[str, float]:
+    # 항목이 없으면 KeyError (기존 판정 함수와 같음)
+    return {name: scores[name]['t_score'] for name in categories}
+
+
+def _holds_one(t: Dict[str, float], conditions: List[Condition]) -> bool:
+    return all(_OPS[op](t[c], threshold) for c, op, threshold in conditions)
+
+
+def motivation_for(scores: dict) -> Tuple[str, str, str, str]:
+    """한 학생 점수 dict → (유형, 요약, 핵심 특징, 코칭 방향)"""
+    t = _t_scores(scores, MOTIVATION_CATEGORIES)
+    return next(output for conditions, output in MOTIVATION_RULES if _holds_one(t, conditions))
+
+
+def _strategy_level(value: float) -> str:
+    return next(level for op, threshold, level in STRATEGY_LEVELS if op is None or _OPS[op](value, threshold))
+
+
+def strategy_for(scores: dict) -> Tuple[str, str]:
+    """한 학생 점수 dict → (분석, 코칭 제목)"""
+    t = _t_scores(scores, STRATEGY_AXES)
+    levels = tuple(_strategy_level(t[axis]) for axis in STRATEGY_AXES)
+    return STRATEGY_ANALYSIS.get(levels, ""), STRATEGY_COACHING
+
+
+def hindrance_for(scores: dict) -> Tuple[str, str]:
+    """한 학생 점수 dict → (분석, 코칭 제목)"""
+    t = _t_scores(scores, HINDRANCE_CATEGORIES)
+    flags = {factor: any(_OPS[op](t[c], threshold) for c, op, threshold in conditions)
+             for factor, conditions in HINDRANCE_FACTORS.items()}
+    return HINDRANCE_OUTPUTS[(flags["psych"], flags["behav"])]